@@ -1,4 +1,5 @@
 from flask import Flask, jsonify, request, render_template, send_file
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 import sys
 import openpyxl
@@ -7,21 +8,158 @@ import xlwt
 from xlutils.copy import copy as xlutils_copy
 import requests
 import io
+import json
+import shutil
 import tempfile
 from urllib.parse import quote
 import re
-import gc
 import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
 from datetime import datetime
+from openpyxl.utils import get_column_letter
 
 # パスを追加
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+from utils.upload_buffer import SpooledUploadRequest, UploadBuffer, buffer_digest, open_buffer_reader, read_header
+from utils.streaming import WorkbookStream
+from utils.job_queue import JobStore, JobManager, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED, ACTIVE_STATUSES
+from utils.progress import ProgressTracker, format_sse
+from utils.checkpoint import CheckpointStore, make_checkpoint_key
+from utils.result_cache import ResultCache, make_cache_key
+from utils.manifest import ManifestStore, TranslationManifest
+from utils.batch_archive import BatchInput, BatchInputCollector, BatchLimitError, unique_entry_name, write_batch_archive
+from utils.pipeline import run_pipeline
+from utils.quota import CharacterBudget, CharacterBudgetExceeded, QuotaCache
+from utils.key_pool import DeepLKeyPool, NoAvailableKeyError, parse_api_keys
+from utils.batch_dispatcher import BatchDispatcher
+from utils.scheduler import FairScheduler, ScheduleTicket
+from utils.admission import AdmissionController, AdmissionRejected, estimate_workbook_memory
+from utils.memory_manager import MemoryManager
+from utils.deadline import Deadline, ReportStore
+from utils.cancellation import (
+    CancellationStore, CancellationToken, TranslationCancelled, is_connection_closed, is_valid_request_id
+)
+
 app = Flask(__name__, template_folder='../templates')
+app.request_class = SpooledUploadRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'excel-translator-secret-key')
 
+# リクエストごとのピークメモリ計測（tracemallocのオーバーヘッドがあるため任意）
+# tracemallocのピークはプロセス全体で1つのため、計測期間が他のリクエストと重なった場合は報告しない
+TRACE_MEMORY = os.environ.get('TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')
+
+# 非同期翻訳ジョブの設定（状態はローカルディスクに保存し、ワーカー再起動後も参照できる）
+JOB_STORE_DIR = os.environ.get('JOB_STORE_DIR') or os.path.join(tempfile.gettempdir(), 'excel-translator', 'jobs')
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 24 * 3600))
+# 進捗イベントストリームの設定（同期ワーカーを占有し続けないよう一定時間で切断し、クライアントが再接続する）
+JOB_EVENTS_POLL_SECONDS = float(os.environ.get('JOB_EVENTS_POLL_SECONDS', 0.5))
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get('JOB_EVENTS_MAX_SECONDS', 55))
+
+# 翻訳済みバッチのチェックポイント設定（保持期間を0にすると無効）
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR') or os.path.join(tempfile.gettempdir(), 'excel-translator', 'checkpoints')
+CHECKPOINT_TTL_SECONDS = int(os.environ.get('CHECKPOINT_TTL_SECONDS', 24 * 3600))
+
+# チェックポイントのキーに含める翻訳パラメータ
+CHECKPOINT_PARAMS = ('source_lang', 'target_lang', 'context', 'formality')
+
+# 翻訳結果キャッシュの設定（同じファイル・パラメータの再送信には前回の結果を返す。上限を0にすると無効）
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'excel-translator', 'result-cache')
+RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', 1024))
+
+# 結果キャッシュのキーに含めるパラメータ（出力形式・参照マニフェストによって結果ファイルが異なる）
+RESULT_CACHE_PARAMS = CHECKPOINT_PARAMS + ('output_format', 'reference_manifest')
+
+# 差分翻訳用マニフェストの設定（週次の改訂を想定して既定30日保持。0にすると無効）
+MANIFEST_DIR = os.environ.get('MANIFEST_DIR') or os.path.join(tempfile.gettempdir(), 'excel-translator', 'manifests')
+MANIFEST_TTL_SECONDS = int(os.environ.get('MANIFEST_TTL_SECONDS', 30 * 24 * 3600))
+
+# マニフェストを再利用できる翻訳パラメータ（一致しない場合は再利用しない）
+MANIFEST_PARAMS = CHECKPOINT_PARAMS
+
+# 複数の翻訳先言語を指定した場合に同時に翻訳する言語数
+TARGET_LANGUAGE_WORKERS = int(os.environ.get('TARGET_LANGUAGE_WORKERS', 4))
+ZIP_MIMETYPE = 'application/zip'
+# 処理期限に達した場合に結果に含める未翻訳のセルのレポート
+UNTRANSLATED_REPORT_NAME = 'untranslated.json'
+
+# 一括翻訳の設定（ワークブックの読み込み・保存はプロセスプールで並列実行。0の場合はジョブを実行するプロセスで実行）
+# BATCH_MAX_TOTAL_MB を変更する場合は nginx.conf の /api/batch の client_max_body_size も合わせる
+BATCH_PROCESS_WORKERS = int(os.environ.get('BATCH_PROCESS_WORKERS', min(os.cpu_count() or 1, 4)))
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 200))
+BATCH_MAX_TOTAL_MB = int(os.environ.get('BATCH_MAX_TOTAL_MB', 512))
+
+# 処理戦略（後ろほど保守的）
+PROCESSING_STRATEGIES = ('fast', 'standard', 'careful', 'ultra_safe')
+
+# シートの走査・翻訳・適用のパイプラインで段階間に待機できるシート数（0の場合は1シートずつ順番に処理）
+SHEET_PIPELINE_QUEUE_SIZE = int(os.environ.get('SHEET_PIPELINE_QUEUE_SIZE', 1))
+
+# 翻訳前にDeepLの残り文字数を確認する（使用状況は QUOTA_CACHE_SECONDS 秒間キャッシュ）
+QUOTA_PREFLIGHT = os.environ.get('QUOTA_PREFLIGHT', 'true').lower() in ('1', 'true', 'yes')
+QUOTA_CACHE_SECONDS = float(os.environ.get('QUOTA_CACHE_SECONDS', 60))
+# リクエストごとの翻訳文字数の上限（0の場合は上限なし。リクエストの max_characters でさらに小さくできる）
+REQUEST_CHAR_BUDGET = int(os.environ.get('REQUEST_CHAR_BUDGET', 0))
+# 文字数が上限を超える場合の処理（reject: 翻訳せずにエラー、trim: 上限まで翻訳して残りは原文のまま）
+QUOTA_ACTIONS = ('reject', 'trim')
+
+# 複数のDeepL APIキー（カンマ区切り。指定した場合は DEEPL_API_KEY より優先し、バッチをキー間で振り分ける）
+# 認証エラー・使用制限の応答を受けたキーは KEY_POOL_COOLDOWN_SECONDS 秒間ローテーションから外す（最後のキーは外さない）
+KEY_POOL_COOLDOWN_SECONDS = float(os.environ.get('KEY_POOL_COOLDOWN_SECONDS', 3600))
+
+# 同時に実行されるリクエストの同じ言語・パラメータ・文脈のバッチを結合する待機時間（ミリ秒、0の場合は待たずに送信）
+# 結合後の文字数が DISPATCH_MAX_BATCH_CHARS に達したバッチはすぐに送信する（翻訳中の同じテキストは常に共有）
+DISPATCH_LINGER_MS = float(os.environ.get('DISPATCH_LINGER_MS', 5))
+DISPATCH_MAX_BATCH_CHARS = int(os.environ.get('DISPATCH_MAX_BATCH_CHARS', 2000))
+
+# プロセス内で同時にDeepLへ送信するバッチ数と、送信枠の割り当て順の設定
+# （複雑さスコアの小さいファイルを優先し、待機1秒ごとにスコアから SCHEDULER_AGING_RATE を引く）
+SCHEDULER_MAX_CONCURRENT = int(os.environ.get('SCHEDULER_MAX_CONCURRENT', 4))
+SCHEDULER_AGING_RATE = float(os.environ.get('SCHEDULER_AGING_RATE', 100))
+# 送信枠を公平に配分するクライアントの識別（接続元アドレス）
+# リバースプロキシ（nginx など）の背後では信頼するプロキシの数を指定し、X-Forwarded-For から接続元アドレスを取得する
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+# X-Client-Id ヘッダーでクライアントを識別する（前段で認証したクライアントIDを設定する場合のみ有効にする）
+TRUST_CLIENT_ID_HEADER = os.environ.get('TRUST_CLIENT_ID_HEADER', '').lower() in ('1', 'true', 'yes')
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT, x_proto=TRUSTED_PROXY_COUNT)
+
+# ワークブックの解析前にZIP・OLEの情報からメモリ使用量を見積もり、ワーカープロセスごとの予算（MB、0の場合は制限なし）から予約する
+# 予算に空きがない場合は ADMISSION_QUEUE_SECONDS 秒まで待ち、空かなければ503（Retry-After付き）を返す（ジョブは空くまで待つ）
+MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', 1024))
+ADMISSION_QUEUE_SECONDS = float(os.environ.get('ADMISSION_QUEUE_SECONDS', 10))
+
+# バッチ・シートの処理後に完全なガベージコレクションを実行する条件（0の場合はその条件を使用しない）
+# 前回の実行からのRSSの増加量（MB）・メモリブロック数の増加量、またはRSSの上限（MB、GC_MIN_INTERVAL_SECONDS 秒に1回まで）
+GC_GROWTH_MB = int(os.environ.get('GC_GROWTH_MB', 64))
+GC_ALLOCATION_BLOCKS = int(os.environ.get('GC_ALLOCATION_BLOCKS', 1000000))
+GC_RSS_LIMIT_MB = int(os.environ.get('GC_RSS_LIMIT_MB', 0))
+GC_MIN_INTERVAL_SECONDS = float(os.environ.get('GC_MIN_INTERVAL_SECONDS', 1.0))
+
+# /api/translate の処理期限（秒、0の場合は期限なし。gunicornの timeout より短くし、保存・送信の時間を残す）
+# 残り時間で完了しないバッチは送信せず、翻訳済みの部分を返す（リクエストの deadline_seconds でさらに短くできる）
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 240))
+# 最初のバッチが完了するまでの見積もりに使う1文字あたりの時間（秒）
+DEADLINE_SECONDS_PER_CHAR = float(os.environ.get('DEADLINE_SECONDS_PER_CHAR', 0.002))
+# 処理期限に達したリクエストの未翻訳のセルのレポート（X-Untranslated-Report ヘッダーのURLで取得する）
+REPORT_DIR = os.environ.get('REPORT_DIR') or os.path.join(tempfile.gettempdir(), 'excel-translator', 'reports')
+REPORT_TTL_SECONDS = int(os.environ.get('REPORT_TTL_SECONDS', 24 * 3600))
+
+# /api/translate の翻訳中にクライアントの切断と取り消し要求（X-Request-Id ごと）を確認する間隔（秒）
+# 取り消し要求はワーカー間で共有するため CANCEL_DIR に記録し、CANCEL_TTL_SECONDS 秒後に削除する
+CANCEL_POLL_SECONDS = float(os.environ.get('CANCEL_POLL_SECONDS', 0.5))
+CANCEL_DIR = os.environ.get('CANCEL_DIR') or os.path.join(tempfile.gettempdir(), 'excel-translator', 'cancel')
+CANCEL_TTL_SECONDS = int(os.environ.get('CANCEL_TTL_SECONDS', 3600))
+
 def should_translate_cell(cell_value):
     """セルの内容を分析して翻訳が必要かどうかを判定"""
     if not cell_value:
@@ -179,6 +317,16 @@ def create_cell_mapping(sheet):
     
     return cell_mapping, translation_tasks
 
+def collect_translation_texts(sheet):
+    """翻訳が必要なセルのテキストを収集（create_cell_mapping と同じ判定・順序で、セルマッピングは作成しない）"""
+    translation_tasks = []
+    for row in range(1, sheet.max_row + 1):
+        for col in range(1, sheet.max_column + 1):
+            value = sheet.cell(row=row, column=col).value
+            if should_translate_cell(value):
+                translation_tasks.append({'cell_key': f"{row}_{col}", 'text': str(value)})
+    return translation_tasks
+
 def calculate_text_size(texts):
     """テキストリストの合計文字数を計算"""
     return sum(len(str(text)) for text in texts)
@@ -238,16 +386,89 @@ def create_dynamic_batches(translation_tasks, max_chars_per_batch=50000):
     
     return batches
 
-def translate_with_staged_fallback(translation_tasks, sheet, context, target_lang, source_lang, formality, api_key, processing_params):
-    """段階的フォールバック処理付きの翻訳"""
-    if not translation_tasks:
-        return {}
-    
-    # 処理パラメータを取得
-    max_chars_per_batch = processing_params['max_chars_per_batch']
-    context_limit = processing_params['context_limit']
-    enable_fallback = processing_params['enable_fallback']
+def translate_batch_with_checkpoint(texts, target_lang, source_lang, context, api_key, formality, checkpoint=None, budget=None, ticket=None):
+    """
+    チェックポイントに記録済みのバッチは再利用し、未記録の場合のみ翻訳して記録
+    
+    budgetにCharacterBudgetを渡すと送信前に文字数を確保し、上限を超える場合は
+    送信せずにCharacterBudgetExceededを送出する。
+    送信は get_dispatcher() を経由し、同時に実行される他のリクエストのバッチと結合される。
+    ticketにScheduleTicketを渡すと、結合したバッチを送信する場合にその優先度とクライアントで送信枠を待つ
+    （他のリクエストのバッチに結合された場合は送信枠を使わずに翻訳結果を待つ）。
+    ticketのリクエストが取り消された場合は送信せずにTranslationCancelledを送出する。
+    """
+    cancellation = ticket.cancellation if ticket is not None else None
+    if cancellation is not None:
+        cancellation.raise_if_cancelled()
+    
+    if checkpoint is not None:
+        cached = checkpoint.get(texts, context)
+        if cached is not None:
+            return cached, True
+    
+    if budget is not None and not budget.try_consume(calculate_text_size(texts)):
+        raise CharacterBudgetExceeded(f"Character budget exhausted ({budget.used}/{budget.limit})")
+    
+    translated = get_dispatcher().translate(
+        texts, (target_lang, source_lang, context, formality, api_key), cancellation, ticket
+    )
     
+    if checkpoint is not None and translated and len(translated) == len(texts):
+        checkpoint.put(texts, context, translated)
+    return translated, False
+
+_dispatcher = None
+
+def get_dispatcher():
+    """リクエストをまたいでバッチを結合する送信の窓口を取得（ワーカープロセスごとに遅延生成）"""
+    global _dispatcher
+    if _dispatcher is None or _dispatcher[0] != os.getpid():
+        _dispatcher = (os.getpid(), BatchDispatcher(
+            send_dispatched_batch, linger_seconds=DISPATCH_LINGER_MS / 1000, max_batch_chars=DISPATCH_MAX_BATCH_CHARS,
+            slot=lambda ticket: get_scheduler().slot(ticket)
+        ))
+    return _dispatcher[1]
+
+_scheduler = None
+
+def get_scheduler():
+    """DeepLへの送信枠を割り当てるスケジューラーを取得（ワーカープロセスごとに遅延生成）"""
+    global _scheduler
+    if _scheduler is None or _scheduler[0] != os.getpid():
+        _scheduler = (os.getpid(), FairScheduler(SCHEDULER_MAX_CONCURRENT, aging_rate=SCHEDULER_AGING_RATE))
+    return _scheduler[1]
+
+def create_schedule_ticket(options, complexity_score, strategy, cancellation=None):
+    """リクエストのクライアントとファイルの複雑さスコアから送信の優先度を作成（取り消し状態を含む）"""
+    return ScheduleTicket(options.get('client_id'), complexity_score, strategy, cancellation)
+
+_memory_manager = None
+
+def get_memory_manager():
+    """ガベージコレクションの実行を管理するオブジェクトを取得（ワーカープロセスごとに遅延生成）"""
+    global _memory_manager
+    if _memory_manager is None or _memory_manager[0] != os.getpid():
+        _memory_manager = (os.getpid(), MemoryManager(
+            growth_bytes=GC_GROWTH_MB * 1024 * 1024,
+            allocation_blocks=GC_ALLOCATION_BLOCKS,
+            rss_limit_bytes=GC_RSS_LIMIT_MB * 1024 * 1024,
+            min_interval=GC_MIN_INTERVAL_SECONDS
+        ))
+    return _memory_manager[1]
+
+def collect_garbage(progress=None):
+    """メモリ使用量がしきい値を超えた場合のみガベージコレクションを実行し、かかった時間を進捗に記録"""
+    seconds = get_memory_manager().maybe_collect()
+    if seconds and progress is not None:
+        progress.gc_collected(seconds)
+
+def send_dispatched_batch(texts, key):
+    """結合したバッチを送信（keyは翻訳先言語・翻訳元言語・文脈・フォーマリティ・APIキー）"""
+    target_lang, source_lang, context, formality, api_key = key
+    return translate_batch(texts, target_lang, source_lang, context, api_key, formality)
+
+def build_sheet_context(sheet, context, context_limit):
+    """シート名とヘッダー情報を含む翻訳用の文脈を作成"""
     # 文脈の最適化
     sheet_context = f"シート名: {sheet.title}. " if sheet.title else ""
     
@@ -270,12 +491,44 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
     if len(full_context) > context_limit:
         full_context = full_context[:context_limit] + "..."
     
+    return full_context
+
+def translate_with_staged_fallback(translation_tasks, sheet, context, target_lang, source_lang, formality, api_key, processing_params, progress=None, checkpoint=None, full_context=None, budget=None, ticket=None, deadline=None):
+    """
+    段階的フォールバック処理付きの翻訳
+    
+    progressにProgressTrackerを渡すと進捗を記録し、checkpointにCheckpointを渡すと
+    完了したバッチを記録して、記録済みのバッチは翻訳せずに再利用する。
+    full_contextを渡すとシートの文脈を作成せずにそのまま使用する
+    （複数言語の翻訳で同じシートを参照する場合など）。
+    budgetにCharacterBudgetを渡すと、文字数の上限を超えるバッチは送信せずに原文のままにする。
+    ticketにScheduleTicketを渡すと、その優先度で送信枠を待つ。
+    deadlineにDeadlineを渡すと、残り時間で完了しないバッチ以降は送信せず、フォールバックも行わない
+    （送信しなかったセルは翻訳結果に含めず、原文のまま残す）。
+    ticketのリクエストが取り消された場合はTranslationCancelledを送出する。
+    """
+    if not translation_tasks:
+        return {}
+    
+    # 処理パラメータを取得
+    max_chars_per_batch = processing_params['max_chars_per_batch']
+    enable_fallback = processing_params['enable_fallback']
+    
+    if full_context is None:
+        full_context = build_sheet_context(sheet, context, processing_params['context_limit'])
+    
     # 動的バッチ作成
     batches = create_dynamic_batches(translation_tasks, max_chars_per_batch)
     translations = {}
     failed_tasks = []
     
     print(f"Processing {len(translation_tasks)} tasks in {len(batches)} batches")
+    if progress:
+        progress.batches_planned_for_sheet(len(batches), sum(len(task['text']) for task in translation_tasks))
+    if deadline is not None:
+        estimated_seconds = deadline.estimate(sum(len(task['text']) for task in translation_tasks))
+        if estimated_seconds > deadline.remaining():
+            print(f"Deadline: {len(batches)} batches need ~{estimated_seconds:.0f}s, {deadline.remaining():.0f}s remaining")
     
     # 第1段階: 通常のバッチ処理
     for batch_idx, batch_tasks in enumerate(batches):
@@ -284,15 +537,28 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
         
         print(f"Batch {batch_idx + 1}/{len(batches)}: {len(batch_tasks)} tasks, {batch_char_count} chars")
         
+        # 処理期限までに完了しないバッチは送信しない（チェックポイントに記録済みのバッチは再利用する）
+        if (deadline is not None and not (checkpoint is not None and checkpoint.contains(batch_texts, full_context))
+                and not deadline.allows(batch_char_count)):
+            print(f"Translation batch {batch_idx + 1} skipped: deadline reached")
+            continue
+        
+        resumed = False
+        started_at = time.monotonic()
         try:
-            translated_batch = translate_batch(
+            translated_batch, resumed = translate_batch_with_checkpoint(
                 batch_texts,
                 target_lang,
                 source_lang,
                 full_context,
                 api_key,
-                formality
+                formality,
+                checkpoint,
+                budget,
+                ticket
             )
+            if deadline is not None and not resumed:
+                deadline.record_batch(batch_char_count, time.monotonic() - started_at)
             
             # 翻訳結果をマッピング
             for j, task in enumerate(batch_tasks):
@@ -301,6 +567,12 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
                 else:
                     failed_tasks.append(task)
                     
+        except TranslationCancelled:
+            raise
+        except CharacterBudgetExceeded as e:
+            # 文字数の上限に達したバッチは送信しない（小さなバッチは次の段階で残りの文字数に収まれば翻訳する）
+            print(f"Translation batch {batch_idx + 1} skipped: {e}")
+            failed_tasks.extend(batch_tasks)
         except Exception as e:
             error_msg = str(e)
             print(f"Translation batch {batch_idx + 1} error: {error_msg}")
@@ -355,25 +627,40 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
                 # 413エラー以外の場合は通常の失敗として扱う
                 failed_tasks.extend(batch_tasks)
         
-        # メモリ解放
+        if progress:
+            progress.batch_completed(batch_char_count, resumed)
+        
+        # メモリ解放（使用量がしきい値を超えた場合のみ）
         del batch_texts
-        gc.collect()
+        collect_garbage(progress)
+    
+    # 処理期限に達した場合は個別のフォールバックを行わない（失敗したセルは原文のまま残す）
+    if deadline is not None and deadline.reached:
+        enable_fallback = False
     
     # 第2段階: 失敗したタスクの個別処理（フォールバック有効時）
     if failed_tasks and enable_fallback:
         print(f"Fallback processing for {len(failed_tasks)} failed tasks")
         
         for task in failed_tasks:
+            if deadline is not None and not deadline.allows(len(task['text'])):
+                print("Fallback processing stopped: deadline reached")
+                break
             try:
                 # 文脈を簡略化して個別処理
                 simple_context = context[:200] if context else ""
-                single_translation = translate_batch(
+                if progress:
+                    progress.fallback_called()
+                single_translation, _ = translate_batch_with_checkpoint(
                     [task['text']],
                     target_lang,
                     source_lang,
                     simple_context,
                     api_key,
-                    formality
+                    formality,
+                    checkpoint,
+                    budget,
+                    ticket
                 )
                 
                 if single_translation:
@@ -381,6 +668,8 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
                 else:
                     translations[task['cell_key']] = task['text']
                     
+            except TranslationCancelled:
+                raise
             except Exception as single_error:
                 print(f"Single task fallback error: {str(single_error)}")
                 translations[task['cell_key']] = task['text']
@@ -391,19 +680,27 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
         if task['cell_key'] not in translations:
             remaining_failed.append(task)
     
-    if remaining_failed and enable_fallback:
+    if remaining_failed and enable_fallback and not (deadline is not None and deadline.reached):
         print(f"Final fallback processing for {len(remaining_failed)} tasks")
         
         for task in remaining_failed:
+            if deadline is not None and not deadline.allows(len(task['text'])):
+                print("Final fallback processing stopped: deadline reached")
+                break
             try:
                 # 文脈なしで処理
-                final_translation = translate_batch(
+                if progress:
+                    progress.fallback_called()
+                final_translation, _ = translate_batch_with_checkpoint(
                     [task['text']],
                     target_lang,
                     source_lang,
                     "",
                     api_key,
-                    formality
+                    formality,
+                    checkpoint,
+                    budget,
+                    ticket
                 )
                 
                 if final_translation:
@@ -411,6 +708,8 @@ def translate_with_staged_fallback(translation_tasks, sheet, context, target_lan
                 else:
                     translations[task['cell_key']] = task['text']
                     
+            except TranslationCancelled:
+                raise
             except Exception as final_error:
                 print(f"Final fallback error: {str(final_error)}")
                 translations[task['cell_key']] = task['text']
@@ -593,10 +892,8 @@ def get_processing_parameters(strategy):
 
 def detect_file_format(file_data):
     """ファイル形式（XLS/XLSX）を検出"""
-    # ファイルの先頭バイトを確認
-    file_data.seek(0)
-    header = file_data.read(8)
-    file_data.seek(0)
+    # ファイルの先頭バイトを確認（バッファはコピーしない）
+    header = read_header(file_data)
     
     # XLSX形式（ZIP形式）の場合
     if header.startswith(b'PK'):
@@ -609,6 +906,70 @@ def detect_file_format(file_data):
     # ファイル名から判定
     return 'unknown'
 
+def convert_xls_to_xlsx(file_data):
+    """XLSファイルをXLSXに変換（値・結合セル・列幅・行高さを移行）"""
+    book = xlrd.open_workbook(file_contents=file_data, formatting_info=True)
+    out_wb = openpyxl.Workbook()
+    out_wb.remove(out_wb.active)
+
+    for sheet_index in range(book.nsheets):
+        xls_sheet = book.sheet_by_index(sheet_index)
+        out_sheet = out_wb.create_sheet(title=xls_sheet.name)
+
+        # セル値と表示形式を移行
+        for row in range(xls_sheet.nrows):
+            for col in range(xls_sheet.ncols):
+                cell_type = xls_sheet.cell_type(row, col)
+                if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                    continue
+
+                value = xls_sheet.cell_value(row, col)
+                if cell_type == xlrd.XL_CELL_DATE:
+                    try:
+                        value = xlrd.xldate_as_datetime(value, book.datemode)
+                    except Exception:
+                        pass
+                elif cell_type == xlrd.XL_CELL_BOOLEAN:
+                    value = bool(value)
+                elif cell_type == xlrd.XL_CELL_NUMBER and float(value).is_integer():
+                    value = int(value)
+
+                out_cell = out_sheet.cell(row=row + 1, column=col + 1, value=value)
+                # 「=」で始まる文字列を数式として書き出さない
+                if cell_type == xlrd.XL_CELL_TEXT:
+                    out_cell.data_type = 's'
+
+                try:
+                    xf = book.xf_list[xls_sheet.cell_xf_index(row, col)]
+                    format_str = book.format_map[xf.format_key].format_str
+                    if format_str and format_str != 'General':
+                        out_cell.number_format = format_str
+                except Exception:
+                    pass
+
+        # 結合セルを移行（xlrdは終端を含まない0ベース）
+        for rlo, rhi, clo, chi in xls_sheet.merged_cells:
+            out_sheet.merge_cells(start_row=rlo + 1, start_column=clo + 1,
+                                  end_row=rhi, end_column=chi)
+
+        # 列幅を移行（1/256文字単位 → 文字単位）
+        for col_index, col_info in xls_sheet.colinfo_map.items():
+            letter = get_column_letter(col_index + 1)
+            out_sheet.column_dimensions[letter].width = col_info.width / 256
+            if col_info.hidden:
+                out_sheet.column_dimensions[letter].hidden = True
+
+        # 行高さを移行（twips → ポイント）
+        for row_index, row_info in xls_sheet.rowinfo_map.items():
+            if row_info.has_default_height:
+                continue
+            out_sheet.row_dimensions[row_index + 1].height = row_info.height / 20
+            if row_info.hidden:
+                out_sheet.row_dimensions[row_index + 1].hidden = True
+
+    # 中間のXLSXシリアライズを避け、ワークブックをそのまま返す
+    return out_wb
+
 class UnifiedWorkbook:
     """XLS/XLSX両対応の統一ワークブッククラス"""
     
@@ -616,13 +977,18 @@ class UnifiedWorkbook:
         self.file_format = file_format
         self.original_filename = None
         self.translated_data = {}  # 翻訳データを保存
-        self.original_file_data = file_data.getvalue()  # 元のファイルデータを保存
         
-        if file_format == 'xlsx':
-            self.workbook = openpyxl.load_workbook(file_data)
+        # 元データのコピーは保持しない（XLSの保存はxlrdのワークブックから複製する）
+        if file_format == 'xlsx' and isinstance(file_data, openpyxl.Workbook):
+            # XLSから変換済みのワークブック
+            self.workbook = file_data
+            self.sheetnames = self.workbook.sheetnames
+        elif file_format == 'xlsx':
+            with open_buffer_reader(file_data) as reader:
+                self.workbook = openpyxl.load_workbook(reader)
             self.sheetnames = self.workbook.sheetnames
         elif file_format == 'xls':
-            self.workbook = xlrd.open_workbook(file_contents=file_data.read(), formatting_info=True)
+            self.workbook = xlrd.open_workbook(file_contents=file_data, formatting_info=True)
             self.sheetnames = self.workbook.sheet_names()
             # XLSファイルの書き込み用ワークブックを作成
             self.write_workbook = None
@@ -915,13 +1281,45 @@ def health():
         'current_directory': current_dir,
         'template_folder': app.template_folder,
         'environment_variables': list(os.environ.keys()),
-        'deepl_api_key_exists': bool(os.environ.get('DEEPL_API_KEY')),
+        'deepl_api_key_exists': bool(get_deepl_api_key()),
+        'deepl_keys': get_key_pool(get_deepl_api_key()).stats() if get_deepl_api_key() else [],
+        'dispatcher': get_dispatcher().stats(),
+        'scheduler': get_scheduler().stats(),
+        'admission': get_admission_controller().stats(),
+        'memory': get_memory_manager().stats(),
         'files_in_current_dir': os.listdir(os.getcwd()),
         'files_in_parent_dir': os.listdir(parent_dir) if os.path.exists(parent_dir) else 'parent directory not found'
     })
 
+def get_deepl_api_key():
+    """DeepL APIキーの設定を取得（DEEPL_API_KEYS を優先し、複数のキーはカンマ区切りのまま返す）"""
+    return os.environ.get('DEEPL_API_KEYS') or os.environ.get('DEEPL_API_KEY')
+
+_key_pools = None
+_key_pools_lock = threading.Lock()
+
+def get_key_pool(api_key):
+    """APIキーの設定（カンマ区切りで複数指定可）に対応するキーのプールを取得（ワーカープロセスごとに遅延生成）"""
+    global _key_pools
+    with _key_pools_lock:
+        # preload_app でフォークしたワーカーは親プロセスのプール（キーの停止状態）を共有しない
+        if _key_pools is None or _key_pools[0] != os.getpid():
+            _key_pools = (os.getpid(), {})
+        pools = _key_pools[1]
+        pool = pools.get(api_key)
+        if pool is None:
+            pool = DeepLKeyPool(parse_api_keys(api_key), get_quota_cache(), cooldown_seconds=KEY_POOL_COOLDOWN_SECONDS)
+            pools[api_key] = pool
+        return pool
+
 def translate_batch(texts, target_lang, source_lang, context, api_key, formality=None):
-    """DeepL APIを使用して複数のテキストを一括翻訳"""
+    """
+    DeepL APIを使用して複数のテキストを一括翻訳
+    
+    api_keyにカンマ区切りで複数のキーを指定すると、残り文字数と直近の応答時間から
+    送信するキーを選択する。認証エラー・使用制限の応答を受けたキーはローテーションから外し、
+    別のキーで送信し直す。
+    """
     if not texts:
         return []
     
@@ -940,7 +1338,6 @@ def translate_batch(texts, target_lang, source_lang, context, api_key, formality
     url = "https://api-free.deepl.com/v2/translate"
     
     data = {
-        'auth_key': api_key,
         'text': non_empty_texts,
         'target_lang': target_lang,
         'source_lang': source_lang if source_lang != 'auto' else None
@@ -956,7 +1353,24 @@ def translate_batch(texts, target_lang, source_lang, context, api_key, formality
     # 常に高品質モードを使用
     data['model_type'] = 'quality_optimized'
     
-    response = requests.post(url, data=data)
+    key_pool = get_key_pool(api_key)
+    chars = calculate_text_size(non_empty_texts)
+    for _ in range(len(key_pool)):
+        try:
+            key = key_pool.acquire(chars)
+        except NoAvailableKeyError as e:
+            raise Exception(f"DeepL API error: {e.status_code} - {e}")
+        data['auth_key'] = key.api_key
+        started_at = time.monotonic()
+        try:
+            response = requests.post(url, data=data)
+        except Exception:
+            key_pool.release(key)
+            raise
+        key_pool.release(key, chars, time.monotonic() - started_at, response.status_code)
+        # 認証エラー・使用制限のキーはローテーションから外れるため、別のキーで送信し直す
+        if response.status_code not in (403, 456):
+            break
     
     if response.status_code == 200:
         result = response.json()
@@ -971,11 +1385,912 @@ def translate_batch(texts, target_lang, source_lang, context, api_key, formality
     else:
         raise Exception(f"DeepL API error: {response.status_code} - {response.text}")
 
+def fetch_usage(api_key):
+    """DeepL APIの使用状況（今月の翻訳文字数 character_count と上限 character_limit）を取得"""
+    url = "https://api-free.deepl.com/v2/usage"
+    
+    response = requests.get(url, headers={'Authorization': f"DeepL-Auth-Key {api_key}"}, timeout=10)
+    
+    if response.status_code == 200:
+        return response.json()
+    else:
+        raise Exception(f"DeepL API error: {response.status_code} - {response.text}")
+
+class TranslationError(Exception):
+    """翻訳処理のエラー（HTTPステータスコード・レスポンスに含める詳細情報付き）"""
+    
+    def __init__(self, message, status_code=500, details=None, headers=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.details = details or {}
+        self.headers = headers or {}
+    
+    def to_response(self):
+        """エラーレスポンスを作成"""
+        return jsonify({'error': self.message, **self.details}), self.status_code, self.headers
+
+def parse_target_languages(values):
+    """翻訳先言語の指定（複数指定・カンマ区切り）を重複のない一覧に変換"""
+    languages = []
+    for value in values:
+        for lang in value.split(','):
+            lang = lang.strip().upper()
+            if lang and lang not in languages:
+                languages.append(lang)
+    return languages
+
+def get_target_languages(options):
+    """翻訳パラメータから翻訳先言語の一覧を取得"""
+    return parse_target_languages([options.get('target_lang') or ''])
+
+def parse_character_limit(value):
+    """リクエストの文字数の上限を整数に変換（未指定・0の場合はNone）"""
+    if value in (None, ''):
+        return None
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise TranslationError('max_characters must be an integer', 400)
+    if limit < 0:
+        raise TranslationError('max_characters must not be negative', 400)
+    return limit or None
+
+def parse_deadline_seconds(value):
+    """リクエストの処理期限を秒数に変換（未指定・0の場合はNone）"""
+    if value in (None, ''):
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise TranslationError('deadline_seconds must be a number', 400)
+    if seconds < 0:
+        raise TranslationError('deadline_seconds must not be negative', 400)
+    return seconds or None
+
+def get_translation_options(form):
+    """リクエストフォームから翻訳パラメータを取得"""
+    on_quota_exceeded = form.get('on_quota_exceeded', 'reject')
+    if on_quota_exceeded not in QUOTA_ACTIONS:
+        raise TranslationError(f"on_quota_exceeded must be one of: {', '.join(QUOTA_ACTIONS)}", 400)
+    return {
+        'source_lang': form.get('source_lang', 'JA'),
+        # 複数の翻訳先言語はカンマ区切りで保持する（1言語の場合は従来どおり）
+        'target_lang': ','.join(parse_target_languages(form.getlist('target_lang'))) or 'EN-US',
+        'context': form.get('context', ''),
+        'formality': form.get('formality', 'default'),
+        'output_format': form.get('output_format', 'original'),
+        # 差分翻訳: 以前の翻訳のマニフェストID（原文が変わっていないセルは再利用）
+        'reference_manifest': form.get('reference_manifest', ''),
+        # このリクエストでDeepLに送信する文字数の上限と、上限・残り文字数を超える場合の処理
+        'max_characters': parse_character_limit(form.get('max_characters')),
+        'on_quota_exceeded': on_quota_exceeded,
+        'deadline_seconds': parse_deadline_seconds(form.get('deadline_seconds')),
+        'client_id': get_client_id()
+    }
+
+def get_client_id():
+    """送信枠を公平に配分する単位（信頼する場合は X-Client-Id ヘッダー、それ以外は接続元アドレス）"""
+    if TRUST_CLIENT_ID_HEADER and request.headers.get('X-Client-Id'):
+        return request.headers['X-Client-Id']
+    # TRUSTED_PROXY_COUNT を指定した場合は ProxyFix が X-Forwarded-For の接続元アドレスに置き換える
+    return request.remote_addr
+
+def load_workbook_from_buffer(file_data, filename, output_format='original'):
+    """バッファからワークブックを読み込み（形式検出・XLS→XLSX変換を含む）"""
+    file_format = detect_file_format(file_data)
+    
+    if file_format == 'unknown':
+        # ファイル名から判定
+        file_extension = filename.lower().split('.')[-1] if '.' in filename else ''
+        if file_extension == 'xlsx':
+            file_format = 'xlsx'
+        elif file_extension == 'xls':
+            file_format = 'xls'
+        else:
+            raise TranslationError('Unsupported file format. Please use .xlsx or .xls files.', 400)
+    
+    print(f"Detected file format: {file_format}")
+    
+    # XLS→XLSX変換モード（xlutilsによる保存処理を回避）
+    conversion_seconds = None
+    if file_format == 'xls' and output_format == 'xlsx':
+        conversion_start = time.perf_counter()
+        try:
+            file_data = convert_xls_to_xlsx(file_data)
+        except Exception as e:
+            print(f"Error converting XLS to XLSX: {e}")
+            raise TranslationError(f'Failed to convert XLS file: {str(e)}')
+        conversion_seconds = time.perf_counter() - conversion_start
+        file_format = 'xlsx'
+        print(f"Converted XLS to XLSX in {conversion_seconds:.3f}s")
+    
+    # 統一ワークブックを作成
+    try:
+        wb = UnifiedWorkbook(file_data, file_format)
+        print(f"Successfully created UnifiedWorkbook with {len(wb.sheetnames)} sheets")
+    except Exception as e:
+        print(f"Error creating UnifiedWorkbook: {e}")
+        import traceback
+        traceback.print_exc()
+        raise TranslationError(f'Failed to read file: {str(e)}')
+    
+    return wb, conversion_seconds
+
+def open_checkpoint(file_digest, options):
+    """入力ファイルと翻訳パラメータに対応するチェックポイントを開く（無効な場合はNone）"""
+    if CHECKPOINT_TTL_SECONDS <= 0:
+        return None
+    try:
+        store = CheckpointStore(CHECKPOINT_DIR, ttl_seconds=CHECKPOINT_TTL_SECONDS)
+        params = {name: options.get(name) for name in CHECKPOINT_PARAMS}
+        return store.open(make_checkpoint_key(file_digest, params))
+    except OSError as e:
+        # チェックポイントが使えなくても翻訳は続行する
+        print(f"Checkpoint unavailable: {e}")
+        return None
+
+def get_result_cache():
+    """翻訳結果キャッシュを取得（無効な場合はNone）"""
+    if RESULT_CACHE_MAX_MB <= 0:
+        return None
+    try:
+        return ResultCache(RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+    except OSError as e:
+        print(f"Result cache unavailable: {e}")
+        return None
+
+def make_result_cache_key(file_digest, options):
+    """入力ファイルのハッシュと翻訳パラメータから結果キャッシュのキーを作成"""
+    params = {name: options.get(name) for name in RESULT_CACHE_PARAMS}
+    # app.py（ExcelTranslator）の結果とは区別する
+    params['engine'] = 'api'
+    return make_cache_key(file_digest, params)
+
+def save_output(save_func, writer, cache_writer=None):
+    """save_funcで結果を書き出し、cache_writerがあれば同じ内容をキャッシュに登録"""
+    if cache_writer is None:
+        save_func(writer)
+        return
+    try:
+        save_func(cache_writer.tee(writer))
+        cache_writer.commit()
+    finally:
+        # 書き出しに失敗した場合（クライアント切断を含む）は登録しない
+        cache_writer.abort()
+
+def get_manifest_store():
+    """マニフェストストアを取得（無効な場合はNone）"""
+    if MANIFEST_TTL_SECONDS <= 0:
+        return None
+    try:
+        return ManifestStore(MANIFEST_DIR, ttl_seconds=MANIFEST_TTL_SECONDS)
+    except OSError as e:
+        print(f"Manifest store unavailable: {e}")
+        return None
+
+def load_reference_manifest(options):
+    """差分翻訳の参照マニフェストを読み込み（指定がない場合はNone）"""
+    manifest_id = options.get('reference_manifest')
+    if not manifest_id:
+        return None
+    if len(get_target_languages(options)) > 1:
+        raise TranslationError('Reference manifest cannot be used with multiple target languages', 400)
+    store = get_manifest_store()
+    reference = store.load(manifest_id) if store else None
+    if reference is None:
+        raise TranslationError('Reference manifest not found or expired', 404)
+    if not reference.is_compatible(options):
+        raise TranslationError('Reference manifest was created with different translation parameters', 400)
+    print(f"Loaded reference manifest {manifest_id} with {len(reference)} entries")
+    return reference
+
+def create_manifest(options):
+    """今回の翻訳を記録するマニフェストを作成"""
+    return TranslationManifest({name: options.get(name) for name in MANIFEST_PARAMS})
+
+def save_manifest(manifest):
+    """マニフェストを保存してIDを返す（無効・失敗時はNone）"""
+    store = get_manifest_store()
+    if store is None:
+        return None
+    try:
+        return store.save(manifest)
+    except OSError as e:
+        print(f"Failed to save manifest: {e}")
+        return None
+
+def deduplicate_tasks(translation_tasks):
+    """同じ原文の翻訳タスクを1つにまとめる（原文ごとのセルキーの一覧も返す）"""
+    unique_tasks = []
+    cell_keys_by_text = {}
+    for task in translation_tasks:
+        cell_keys = cell_keys_by_text.get(task['text'])
+        if cell_keys is None:
+            cell_keys_by_text[task['text']] = [task['cell_key']]
+            unique_tasks.append(task)
+        else:
+            cell_keys.append(task['cell_key'])
+    return unique_tasks, cell_keys_by_text
+
+def split_reused_tasks(translation_tasks, reference):
+    """参照マニフェストに原文がある翻訳タスクを分離（未翻訳のタスクと再利用する翻訳を返す）"""
+    if reference is None:
+        return translation_tasks, {}
+    pending_tasks = []
+    reused_translations = {}
+    for task in translation_tasks:
+        reused = reference.lookup(task['text'])
+        if reused is None:
+            pending_tasks.append(task)
+        else:
+            reused_translations[task['cell_key']] = reused
+    return pending_tasks, reused_translations
+
+def scan_sheet(sheet, context, processing_params):
+    """シートを走査し、翻訳に必要な情報（セルマッピング・翻訳タスク・文脈）をまとめる"""
+    # 結合セルの情報を保存
+    merged_ranges = preserve_merged_cells(sheet)
+    
+    # セルマッピングと翻訳タスクを作成
+    cell_mapping, translation_tasks = create_cell_mapping(sheet)
+    
+    # 文脈は翻訳結果を適用する前の内容から作成する
+    full_context = build_sheet_context(sheet, context, processing_params['context_limit']) if translation_tasks else ''
+    
+    return {
+        'sheet': sheet,
+        'merged_ranges': merged_ranges,
+        'cell_mapping': cell_mapping,
+        'tasks': translation_tasks,
+        'full_context': full_context
+    }
+
+def translate_sheet_tasks(sheet_plan, translation_tasks, options, api_key, processing_params, progress=None, checkpoint=None, budget=None, ticket=None, deadline=None):
+    """シートの翻訳タスクを1つの翻訳先言語に翻訳（同じ原文は1回だけ翻訳する）"""
+    unique_tasks, cell_keys_by_text = deduplicate_tasks(translation_tasks)
+    
+    # 翻訳の実行（段階的フォールバック付き）
+    unique_translations = translate_with_staged_fallback(
+        unique_tasks,
+        sheet_plan['sheet'],
+        options['context'],
+        options['target_lang'],
+        options['source_lang'],
+        options['formality'],
+        api_key,
+        processing_params,
+        progress,
+        checkpoint,
+        full_context=sheet_plan['full_context'],
+        budget=budget,
+        ticket=ticket,
+        deadline=deadline
+    )
+    
+    translations = {}
+    for task in unique_tasks:
+        translation = unique_translations.get(task['cell_key'])
+        if translation is not None:
+            for cell_key in cell_keys_by_text[task['text']]:
+                translations[cell_key] = translation
+    return translations
+
+def record_manifest(manifest, translation_tasks, translations):
+    """次回の差分翻訳用に原文と翻訳を記録（翻訳できずに原文のままのセルは記録しない）"""
+    if manifest is None:
+        return
+    for task in translation_tasks:
+        translation = translations.get(task['cell_key'])
+        if translation is not None and translation != task['text']:
+            manifest.add(task['text'], translation)
+
+def collect_untranslated_cells(sheet_plan, translations):
+    """翻訳結果のないセル（処理期限などで送信しなかったセル）のセル番地と原文の一覧"""
+    cell_mapping = sheet_plan['cell_mapping']
+    return [
+        {'cell': cell_mapping[task['cell_key']]['coordinate'], 'text': task['text']}
+        for task in sheet_plan['tasks']
+        if task['cell_key'] not in translations
+    ]
+
+def apply_sheet_translations(sheet_plan, translations, manifest=None):
+    """翻訳結果をシートに適用して検証し、結合セルを復元"""
+    sheet = sheet_plan['sheet']
+    cell_mapping = sheet_plan['cell_mapping']
+    
+    record_manifest(manifest, sheet_plan['tasks'], translations)
+    
+    # 翻訳結果をシートに適用
+    apply_translations_to_sheet(sheet, cell_mapping, translations)
+    
+    # 翻訳の正確性を検証
+    validation_results = validate_translation_accuracy(sheet, cell_mapping, translations)
+    if validation_results['errors']:
+        print(f"Validation errors for sheet {sheet.title}: {validation_results['errors']}")
+    
+    print(f"Sheet {sheet.title} completed: {validation_results['cells_translated']}/{validation_results['cells_needing_translation']} cells translated")
+    
+    # 結合セルを復元
+    restore_merged_cells(sheet, sheet_plan['merged_ranges'])
+    
+    return validation_results
+
+def analyze_workbook(wb):
+    """ファイルの複雑さを分析して処理パラメータを決定"""
+    file_analysis = analyze_file_complexity(wb)
+    processing_params = get_processing_parameters(file_analysis['processing_strategy'])
+    
+    print(f"File analysis: {file_analysis['total_sheets']} sheets, {file_analysis['total_cells']} cells, {file_analysis['total_text_chars']} chars")
+    print(f"Processing strategy: {file_analysis['processing_strategy']}")
+    print(f"Processing parameters: {processing_params}")
+    
+    return file_analysis, processing_params
+
+def count_unsent_characters(unique_tasks, full_context, processing_params, checkpoint=None):
+    """重複を除いた翻訳タスクのうち、チェックポイントに記録されていないバッチの文字数を計算"""
+    chars = 0
+    for batch_tasks in create_dynamic_batches(unique_tasks, processing_params['max_chars_per_batch']):
+        texts = [task['text'] for task in batch_tasks]
+        if checkpoint is not None and checkpoint.contains(texts, full_context):
+            continue
+        chars += calculate_text_size(texts)
+    return chars
+
+def count_billable_characters(wb, options, processing_params, checkpoints=None, reference=None):
+    """
+    翻訳でDeepLに送信する文字数を翻訳前に計算
+    
+    セルの分類・シート内の重複の除去・参照マニフェストの再利用・チェックポイントに
+    記録済みのバッチの再利用を翻訳時と同じ手順で適用する（失敗時のフォールバックの再送信は含まない）。
+    checkpointsには翻訳先言語ごとのチェックポイントを渡す。
+    
+    Returns:
+        全翻訳先言語の合計文字数
+    """
+    target_langs = get_target_languages(options)
+    checkpoints = checkpoints or {}
+    chars = 0
+    for sheet_name in wb.sheetnames:
+        sheet = wb.get_sheet(sheet_name)
+        translation_tasks = collect_translation_texts(sheet)
+        if not translation_tasks:
+            continue
+        full_context = build_sheet_context(sheet, options['context'], processing_params['context_limit'])
+        pending_tasks, _ = split_reused_tasks(translation_tasks, reference)
+        unique_tasks, _ = deduplicate_tasks(pending_tasks)
+        for target_lang in target_langs:
+            chars += count_unsent_characters(unique_tasks, full_context, processing_params, checkpoints.get(target_lang))
+    return chars
+
+_quota_cache = None
+
+def get_quota_cache():
+    """DeepLの残り文字数のキャッシュを取得（ワーカープロセスごとに遅延生成）"""
+    global _quota_cache
+    if _quota_cache is None or _quota_cache[0] != os.getpid():
+        _quota_cache = (os.getpid(), QuotaCache(fetch_usage, ttl_seconds=QUOTA_CACHE_SECONDS))
+    return _quota_cache[1]
+
+def create_character_budget(options, api_key, count_characters):
+    """
+    送信する文字数をリクエストの上限・DeepLの残り文字数と比較し、文字数の上限を作成
+    
+    count_charactersは送信する文字数を返す関数（上限の確認が不要な場合は呼び出さない）。
+    文字数が上限を超える場合、on_quota_exceeded が reject であれば翻訳せずにエラーとし、
+    trim であれば上限まで翻訳する（残りのセルは原文のまま）。
+    
+    Returns:
+        (CharacterBudget, 送信する文字数（計算しなかった場合はNone）)
+    
+    Raises:
+        TranslationError: 文字数が上限を超え、on_quota_exceeded が reject の場合（402）
+    """
+    limits = [limit for limit in (REQUEST_CHAR_BUDGET, options.get('max_characters')) if limit]
+    if not limits and not QUOTA_PREFLIGHT:
+        return CharacterBudget(), None
+    
+    billable = count_characters()
+    remaining = None
+    if QUOTA_PREFLIGHT and billable > 0:
+        remaining = get_key_pool(api_key).remaining()
+        if remaining is not None:
+            limits.append(remaining)
+    limit = min(limits) if limits else None
+    print(f"Preflight: {billable} billable characters (limit: {limit}, remaining quota: {remaining})")
+    
+    if limit is not None and billable > limit:
+        if options.get('on_quota_exceeded', 'reject') != 'trim':
+            raise TranslationError(
+                f"Translation requires {billable} characters but only {limit} are available",
+                402,
+                {'billable_characters': billable, 'character_limit': limit, 'remaining_quota': remaining}
+            )
+        print(f"Trimming translation to {limit} characters")
+    return CharacterBudget(limit), billable
+
+def get_character_report(budget, billable):
+    """送信した文字数と上限をまとめる（ジョブの状態・一括翻訳のレポート用）"""
+    return {
+        'billable': billable,
+        'sent': budget.used,
+        'limit': budget.limit,
+        'limit_reached': budget.exhausted
+    }
+
+def set_character_headers(response, budget, billable):
+    """送信した文字数と上限をレスポンスヘッダーに設定"""
+    if billable is not None:
+        response.headers['X-Billable-Characters'] = str(billable)
+    response.headers['X-Characters-Sent'] = str(budget.used)
+    if budget.limit is not None:
+        response.headers['X-Character-Limit'] = str(budget.limit)
+    if budget.exhausted:
+        # 上限に達して原文のまま残したセルがある
+        response.headers['X-Character-Limit-Reached'] = 'true'
+
+_admission_controller = None
+
+def create_deadline(options, default_seconds=0):
+    """既定の処理期限とリクエストの deadline_seconds の短い方で処理期限を作成（どちらもない場合はNone）"""
+    limits = [seconds for seconds in (default_seconds, options.get('deadline_seconds')) if seconds]
+    return Deadline(min(limits), initial_seconds_per_char=DEADLINE_SECONDS_PER_CHAR) if limits else None
+
+def save_untranslated_report(deadline):
+    """処理期限に達した場合は未翻訳のセルのレポートを保存してIDを返す（保存できない場合はNone）"""
+    if deadline is None or not deadline.reached:
+        return None
+    try:
+        return ReportStore(REPORT_DIR, ttl_seconds=REPORT_TTL_SECONDS).save(deadline.report())
+    except OSError as e:
+        print(f"Report store unavailable: {e}")
+        return None
+
+def wants_partial_archive():
+    """処理期限に達した結果をZIP（ワークブックとレポート）で受け取るか（Accept に application/zip を明示した場合）"""
+    return any(mimetype == ZIP_MIMETYPE for mimetype, _ in request.accept_mimetypes)
+
+def set_deadline_headers(response, deadline, report_id=None):
+    """処理期限に達して一部を未翻訳のまま返す場合、その旨と未翻訳のセル数・レポートのURLをヘッダーに設定"""
+    if deadline is None or not deadline.reached:
+        return
+    response.headers['X-Translation-Incomplete'] = 'deadline'
+    response.headers['X-Untranslated-Cells'] = str(deadline.report()['cells_untranslated'])
+    if report_id:
+        response.headers['X-Untranslated-Report'] = f"/api/translate/reports/{report_id}"
+
+def get_partial_archive_file_name(original_filename):
+    """処理期限に達した翻訳結果（翻訳済みのファイルと未翻訳のセルのレポート）のZIPのファイル名を取得"""
+    name, _ = os.path.splitext(original_filename)
+    return f"{name}_partial.zip"
+
+def write_partial_archive(wb, translated_filename, writer, deadline):
+    """翻訳済みの部分を適用したワークブックと未翻訳のセルのレポートをZIPに書き出す"""
+    with zipfile.ZipFile(writer, 'w') as archive:
+        entry = zipfile.ZipInfo(translated_filename, date_time=time.localtime()[:6])
+        entry.compress_type = zipfile.ZIP_STORED if wb.file_format == 'xlsx' else zipfile.ZIP_DEFLATED
+        with archive.open(entry, 'w') as entry_writer:
+            wb.save(entry_writer)
+        archive.writestr(UNTRANSLATED_REPORT_NAME, json.dumps(deadline.report(), ensure_ascii=False, indent=2))
+
+_cancellation_store = None
+
+def get_cancellation_store():
+    """取り消し要求の記録を取得（ワーカープロセスごとに遅延生成）"""
+    global _cancellation_store
+    if _cancellation_store is None or _cancellation_store[0] != os.getpid():
+        _cancellation_store = (os.getpid(), CancellationStore(CANCEL_DIR, ttl_seconds=CANCEL_TTL_SECONDS))
+    return _cancellation_store[1]
+
+def create_request_cancellation(request_id=None):
+    """
+    クライアントの切断と取り消し要求を確認する取り消し状態を作成
+    
+    クライアントのソケット（gunicorn.socket / werkzeug.socket）が閉じられた場合と、
+    request_id の取り消しが /api/translate/<request_id>/cancel で要求された場合に取り消す。
+    """
+    client_socket = request.environ.get('gunicorn.socket') or request.environ.get('werkzeug.socket')
+    store = get_cancellation_store() if request_id else None
+    
+    def probe():
+        if is_connection_closed(client_socket):
+            return 'client disconnected'
+        if store is not None and store.is_requested(request_id):
+            return 'cancel requested'
+        return None
+    
+    return CancellationToken(probe, poll_interval=CANCEL_POLL_SECONDS)
+
+def get_job_cancel_id(job_id):
+    """ジョブの取り消し要求を記録するID（X-Request-Id とは区別する）"""
+    return f"job-{job_id}"
+
+def create_job_cancellation(job_id):
+    """/api/jobs/<job_id>/cancel で取り消しが要求された場合に取り消す取り消し状態を作成"""
+    store = get_cancellation_store()
+    cancel_id = get_job_cancel_id(job_id)
+    
+    def probe():
+        return 'cancel requested' if store.is_requested(cancel_id) else None
+    
+    return CancellationToken(probe, poll_interval=CANCEL_POLL_SECONDS)
+
+def get_admission_controller():
+    """メモリ予算による受付制御を取得（ワーカープロセスごとに遅延生成）"""
+    global _admission_controller
+    if _admission_controller is None or _admission_controller[0] != os.getpid():
+        _admission_controller = (os.getpid(), AdmissionController(
+            MEMORY_BUDGET_MB * 1024 * 1024, queue_timeout=ADMISSION_QUEUE_SECONDS
+        ))
+    return _admission_controller[1]
+
+def admit_workbook(buffer, block=False):
+    """
+    ワークブックを解析する前にメモリ使用量を見積もり、プロセスのメモリ予算から予約
+    
+    Returns:
+        MemoryReservation（処理の完了時に release_memory_reservation で解放する）
+    
+    Raises:
+        TranslationError: 予算に空きがなく、待機時間内に予約できなかった場合（503、Retry-After付き）
+    """
+    estimate = estimate_workbook_memory(buffer)
+    try:
+        reservation = get_admission_controller().reserve(estimate, block=block)
+    except AdmissionRejected as e:
+        print(f"Admission rejected: {e}")
+        raise TranslationError(
+            'Server is busy processing other files. Please retry later.', 503,
+            {'estimated_memory_mb': round(estimate / (1024 * 1024), 1), 'retry_after': e.retry_after},
+            {'Retry-After': str(e.retry_after)}
+        )
+    print(f"Admitted workbook with estimated peak memory {estimate / (1024 * 1024):.1f} MB")
+    return reservation
+
+def admit_batch(inputs, block=False):
+    """
+    一括翻訳の前に、同時に読み込むファイル（BATCH_PROCESS_WORKERS件）の見積もりの合計をメモリ予算から予約
+    
+    Returns:
+        MemoryReservation（処理の完了時に解放する）
+    
+    Raises:
+        TranslationError: 予算に空きがなく、待機時間内に予約できなかった場合（503、Retry-After付き）
+    """
+    estimates = []
+    for batch_input in inputs:
+        with open(batch_input.path, 'rb') as f, UploadBuffer(f) as upload:
+            estimates.append(estimate_workbook_memory(upload.buffer))
+    # プロセスプールでは最大 BATCH_PROCESS_WORKERS 件を同時に読み込む
+    estimate = sum(sorted(estimates, reverse=True)[:max(BATCH_PROCESS_WORKERS, 1)])
+    try:
+        reservation = get_admission_controller().reserve(estimate, block=block)
+    except AdmissionRejected as e:
+        print(f"Admission rejected for batch: {e}")
+        raise TranslationError(
+            'Server is busy processing other files. Please retry later.', 503,
+            {'estimated_memory_mb': round(estimate / (1024 * 1024), 1), 'retry_after': e.retry_after},
+            {'Retry-After': str(e.retry_after)}
+        )
+    print(f"Admitted batch of {len(inputs)} files with estimated peak memory {estimate / (1024 * 1024):.1f} MB")
+    return reservation
+
+# TRACE_MEMORY で計測中のリクエスト（計測の開始時に他のリクエストが計測中なら双方を重複として記録する）
+_memory_traces = {}
+_memory_traces_lock = threading.Lock()
+
+def start_memory_trace():
+    """
+    リクエストのピークメモリの計測を開始
+    
+    Returns:
+        計測の状態（TRACE_MEMORYが無効な場合はNone、終了時に finish_memory_trace に渡す）
+    """
+    if not TRACE_MEMORY:
+        return None
+    with _memory_traces_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        overlapped = bool(_memory_traces)
+        for other in _memory_traces.values():
+            other['overlapped'] = True
+        # 他のリクエストの計測中はピークをリセットしない
+        if not overlapped:
+            tracemalloc.reset_peak()
+        trace = {'baseline': tracemalloc.get_traced_memory()[0], 'overlapped': overlapped}
+        _memory_traces[id(trace)] = trace
+    return trace
+
+def get_traced_peak(trace):
+    """計測開始からのピークメモリ（バイト、計測していない場合・他のリクエストと計測期間が重なった場合はNone）"""
+    if trace is None or not tracemalloc.is_tracing():
+        return None
+    with _memory_traces_lock:
+        if trace['overlapped']:
+            return None
+        return tracemalloc.get_traced_memory()[1] - trace['baseline']
+
+def finish_memory_trace(trace):
+    """ピークメモリの計測を終了"""
+    if trace is None:
+        return
+    with _memory_traces_lock:
+        _memory_traces.pop(id(trace), None)
+
+def release_memory_reservation(reservation, memory_trace=None):
+    """メモリ予約を解放（memory_traceを渡すとtracemallocで計測したピークを見積もりと比較し、計測を終了する）"""
+    actual_peak = get_traced_peak(memory_trace)
+    finish_memory_trace(memory_trace)
+    reservation.release(actual_peak)
+
+def translate_workbook(wb, options, api_key, progress_callback=None, checkpoint=None, reference=None, manifest=None, budget=None, analysis=None, deadline=None, cancellation=None):
+    """
+    ワークブックの全シートを翻訳
+    
+    progress_callbackには進捗のスナップショットが渡される。
+    checkpointを渡すと完了したバッチを記録し、記録済みのバッチは再利用する。
+    referenceに以前の翻訳のマニフェストを渡すと、原文が一致するセルは
+    位置に関係なく翻訳を再利用し、それ以外のセルのみ翻訳する。
+    manifestには今回の翻訳結果（原文と翻訳の対応）が記録される。
+    シートの走査・翻訳・適用は段階ごとのスレッドで並行して行い、段階間のキューの
+    上限（SHEET_PIPELINE_QUEUE_SIZE）で同時に保持するシート数を制限する。
+    budgetにCharacterBudgetを渡すと、DeepLに送信する文字数を上限までに制限する。
+    analysisにanalyze_workbookの結果を渡すと再度分析しない。
+    DeepLへの送信枠はファイルの複雑さスコアとクライアント（options['client_id']）に応じて割り当てられる。
+    deadlineにDeadlineを渡すと、処理期限までに完了しないバッチは送信せず、
+    翻訳されなかったセルをdeadlineに記録する。
+    cancellationにCancellationTokenを渡すと、取り消された時点でDeepLへの送信をやめて
+    TranslationCancelledを送出する。
+    """
+    file_analysis, processing_params = analysis or analyze_workbook(wb)
+    ticket = create_schedule_ticket(
+        options, file_analysis['complexity_score'], file_analysis['processing_strategy'], cancellation
+    )
+    
+    progress = ProgressTracker(
+        progress_callback,
+        sheets_total=len(wb.sheetnames),
+        chars_estimated=file_analysis['total_text_chars']
+    )
+    
+    # シートの走査・翻訳・適用をパイプラインで処理し、シートNの翻訳中に
+    # シートN+1の走査とシートN-1への適用を並行して行う
+    def scan_stage(sheet_name):
+        sheet = wb.get_sheet(sheet_name)
+        
+        print(f"Processing sheet: {sheet_name}")
+        
+        sheet_plan = scan_sheet(sheet, options['context'], processing_params)
+        translation_tasks = sheet_plan['tasks']
+        
+        # 差分翻訳: 原文が参照マニフェストにあるセルは翻訳を再利用
+        pending_tasks, reused_translations = split_reused_tasks(translation_tasks, reference)
+        if reference is not None:
+            print(f"Reusing {len(reused_translations)}/{len(translation_tasks)} translations for sheet {sheet_name}")
+        progress.sheet_scanned(len(translation_tasks), len(reused_translations))
+        return sheet_plan, pending_tasks, reused_translations
+    
+    def translate_stage(scanned):
+        sheet_plan, pending_tasks, reused_translations = scanned
+        if not sheet_plan['tasks']:
+            return sheet_plan, None
+        
+        translations = translate_sheet_tasks(
+            sheet_plan, pending_tasks, options, api_key, processing_params, progress, checkpoint, budget, ticket,
+            deadline
+        )
+        translations.update(reused_translations)
+        return sheet_plan, translations
+    
+    def apply_stage(translated):
+        sheet_plan, translations = translated
+        if translations is None:
+            print(f"No translation tasks found for sheet {sheet_plan['sheet'].title}")
+            progress.sheet_completed()
+            return
+        
+        validation_results = apply_sheet_translations(sheet_plan, translations, manifest)
+        if deadline is not None:
+            deadline.record_untranslated(
+                options['target_lang'], sheet_plan['sheet'].title, collect_untranslated_cells(sheet_plan, translations)
+            )
+        
+        # シート処理後のメモリ解放（使用量がしきい値を超えた場合のみ）
+        collect_garbage(progress)
+        
+        progress.sheet_completed(
+            validation_results['cells_needing_translation'],
+            validation_results['cells_translated']
+        )
+    
+    run_pipeline(
+        wb.sheetnames,
+        [scan_stage, translate_stage, apply_stage],
+        queue_size=SHEET_PIPELINE_QUEUE_SIZE,
+        name='translation-sheet'
+    )
+    
+    if checkpoint is not None:
+        print(f"Checkpoint: {checkpoint.hits} batches reused, {checkpoint.stored} batches stored")
+    
+    return progress.snapshot()
+
+def get_output_file_info(original_filename, wb):
+    """翻訳後のファイル名とMIMEタイプを取得"""
+    # ファイル名を生成（翻訳済みの接尾辞を追加、出力形式の拡張子を使用）
+    name, _ = os.path.splitext(original_filename)
+    ext = '.xlsx' if wb.file_format == 'xlsx' else '.xls'
+    translated_filename = f"{name}_translated{ext}"
+    mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' if wb.file_format == 'xlsx' else 'application/vnd.ms-excel'
+    return translated_filename, mimetype
+
+def translate_language(sheet_plans, options, api_key, processing_params, progress, checkpoint=None, manifest=None, budget=None, ticket=None, deadline=None):
+    """走査済みの全シートを1つの翻訳先言語に翻訳（シートには適用せず、シートごとの翻訳結果を返す）"""
+    translations_by_sheet = []
+    for sheet_plan in sheet_plans:
+        translation_tasks = sheet_plan['tasks']
+        progress.sheet_scanned(len(translation_tasks))
+        if not translation_tasks:
+            translations_by_sheet.append({})
+            progress.sheet_completed()
+            continue
+        
+        translations = translate_sheet_tasks(
+            sheet_plan, translation_tasks, options, api_key, processing_params, progress, checkpoint, budget, ticket,
+            deadline
+        )
+        record_manifest(manifest, translation_tasks, translations)
+        if deadline is not None:
+            deadline.record_untranslated(
+                options['target_lang'], sheet_plan['sheet'].title, collect_untranslated_cells(sheet_plan, translations)
+            )
+        translations_by_sheet.append(translations)
+        progress.sheet_completed(len(translation_tasks), len(translations))
+    
+    print(f"Language {options['target_lang']} completed")
+    return translations_by_sheet
+
+def translate_workbook_languages(wb, options, api_key, progress_callback=None, checkpoints=None, manifests=None, budget=None, analysis=None, deadline=None, cancellation=None):
+    """
+    ワークブックを複数の翻訳先言語に翻訳
+    
+    シートの走査とセルの分類は1回だけ行い、言語ごとの翻訳を並行して実行する。
+    翻訳結果はシートに適用せずに返し、write_language_archive で言語ごとに適用して保存する。
+    checkpointsとmanifestsには翻訳先言語ごとのチェックポイントとマニフェストを渡す。
+    budgetの文字数の上限とdeadlineの処理期限、cancellationの取り消し状態は全言語で共有する。
+    
+    Returns:
+        (シートの走査結果, 翻訳先言語ごとのシート別翻訳結果, 進捗のスナップショット)
+    """
+    target_langs = get_target_languages(options)
+    checkpoints = checkpoints or {}
+    manifests = manifests or {}
+    file_analysis, processing_params = analysis or analyze_workbook(wb)
+    ticket = create_schedule_ticket(
+        options, file_analysis['complexity_score'], file_analysis['processing_strategy'], cancellation
+    )
+    
+    sheet_plans = []
+    for sheet_name in wb.sheetnames:
+        print(f"Scanning sheet: {sheet_name}")
+        sheet_plans.append(scan_sheet(wb.get_sheet(sheet_name), options['context'], processing_params))
+    
+    # 進捗は言語とシートの組み合わせごとに数える
+    progress = ProgressTracker(
+        progress_callback,
+        sheets_total=len(sheet_plans) * len(target_langs),
+        chars_estimated=file_analysis['total_text_chars'] * len(target_langs)
+    )
+    
+    max_workers = max(1, min(TARGET_LANGUAGE_WORKERS, len(target_langs)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translation-language') as executor:
+        futures = {
+            target_lang: executor.submit(
+                translate_language, sheet_plans, dict(options, target_lang=target_lang), api_key,
+                processing_params, progress, checkpoints.get(target_lang), manifests.get(target_lang), budget, ticket,
+                deadline
+            )
+            for target_lang in target_langs
+        }
+        results = {target_lang: future.result() for target_lang, future in futures.items()}
+    
+    return sheet_plans, results, progress.snapshot()
+
+def reset_workbook_translations(wb, sheet_plans):
+    """シートに適用した翻訳を取り消して原文に戻す"""
+    if wb.file_format == 'xls':
+        # XLSの翻訳は保存時に書き込むため、翻訳データを削除するだけでよい
+        wb.translated_data.clear()
+        return
+    for sheet_plan in sheet_plans:
+        for cell_info in sheet_plan['cell_mapping'].values():
+            if cell_info['needs_translation']:
+                cell_info['cell_object'].value = cell_info['original_value']
+
+def get_language_file_name(original_filename, wb, target_lang):
+    """翻訳先言語ごとの出力ファイル名を取得"""
+    translated_filename, _ = get_output_file_info(original_filename, wb)
+    name, ext = os.path.splitext(translated_filename)
+    return f"{name}_{target_lang}{ext}"
+
+def get_archive_file_name(original_filename):
+    """複数言語の翻訳結果をまとめたZIPのファイル名を取得"""
+    name, _ = os.path.splitext(original_filename)
+    return f"{name}_translated.zip"
+
+def write_language_archive(wb, original_filename, sheet_plans, results, writer, manifest_ids=None, deadline=None):
+    """
+    翻訳先言語ごとに翻訳を適用したワークブックをZIPに書き出す
+    
+    ワークブックは1つのため、言語ごとに原文に戻してから適用・保存する。
+    各言語のファイル名・マニフェストID・翻訳セル数を report.json として追加する。
+    deadlineの処理期限に達していた場合は、翻訳されなかったセルのレポートを untranslated.json として追加する。
+    
+    Returns:
+        翻訳先言語ごとの結果の一覧
+    """
+    manifest_ids = manifest_ids or {}
+    report = {}
+    # XLSXは圧縮済みのため再圧縮しない
+    compress_type = zipfile.ZIP_STORED if wb.file_format == 'xlsx' else zipfile.ZIP_DEFLATED
+    with zipfile.ZipFile(writer, 'w') as archive:
+        for target_lang, translations_by_sheet in results.items():
+            reset_workbook_translations(wb, sheet_plans)
+            cells_needing_translation = 0
+            cells_translated = 0
+            for sheet_plan, translations in zip(sheet_plans, translations_by_sheet):
+                if not sheet_plan['tasks']:
+                    continue
+                validation_results = apply_sheet_translations(sheet_plan, translations)
+                cells_needing_translation += validation_results['cells_needing_translation']
+                cells_translated += validation_results['cells_translated']
+            
+            filename = get_language_file_name(original_filename, wb, target_lang)
+            entry = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+            entry.compress_type = compress_type
+            with archive.open(entry, 'w') as entry_writer:
+                wb.save(entry_writer)
+            report[target_lang] = {
+                'filename': filename,
+                'manifest_id': manifest_ids.get(target_lang),
+                'cells_needing_translation': cells_needing_translation,
+                'cells_translated': cells_translated
+            }
+            print(f"Saved {filename} to archive")
+            collect_garbage()
+        
+        archive.writestr('report.json', json.dumps({'languages': report}, ensure_ascii=False, indent=2))
+        if deadline is not None and deadline.reached:
+            archive.writestr(UNTRANSLATED_REPORT_NAME, json.dumps(deadline.report(), ensure_ascii=False, indent=2))
+    return report
+
+def open_language_stores(file_digest, options):
+    """翻訳先言語ごとのチェックポイントとマニフェストを作成"""
+    checkpoints = {}
+    manifests = {}
+    for target_lang in get_target_languages(options):
+        # 1言語の翻訳と同じキーのため、以前の1言語の翻訳のチェックポイントも再利用できる
+        language_options = dict(options, target_lang=target_lang)
+        checkpoints[target_lang] = open_checkpoint(file_digest, language_options)
+        manifests[target_lang] = create_manifest(language_options)
+    return checkpoints, manifests
+
+def save_language_manifests(manifests):
+    """翻訳先言語ごとのマニフェストを保存してIDを返す"""
+    return {target_lang: save_manifest(manifest) for target_lang, manifest in manifests.items()}
+
 @app.route('/api/translate', methods=['POST'])
 def api_translate():
+    upload = None
+    reservation = None
+    memory_trace = None
+    # クライアントが指定したリクエストIDで翻訳中の取り消しを受け付ける
+    request_id = request.headers.get('X-Request-Id')
+    if request_id is not None and not is_valid_request_id(request_id):
+        return jsonify({'error': 'X-Request-Id must be 1-64 letters, digits, "-" or "_"'}), 400
     try:
         # 環境変数チェック
-        deepl_api_key = os.environ.get('DEEPL_API_KEY')
+        deepl_api_key = get_deepl_api_key()
         if not deepl_api_key:
             return jsonify({'error': 'DEEPL_API_KEY not found in environment variables'}), 500
         
@@ -988,120 +2303,869 @@ def api_translate():
             return jsonify({'error': 'No file selected'}), 400
         
         # パラメータ取得
-        source_lang = request.form.get('source_lang', 'JA')
-        target_lang = request.form.get('target_lang', 'EN-US')
-        context = request.form.get('context', '')
-        formality = request.form.get('formality', 'default')
+        options = get_translation_options(request.form)
+        # 処理期限はリクエストの受付から数える（gunicornの timeout より前に送信を打ち切る）
+        deadline = create_deadline(options, REQUEST_DEADLINE_SECONDS)
+        # クライアントが切断した場合・取り消しを要求した場合はDeepLへの送信をやめる
+        cancellation = create_request_cancellation(request_id)
         
-        # ファイル形式を検出
-        file_data = io.BytesIO(file.read())
-        file_format = detect_file_format(file_data)
+        memory_trace = start_memory_trace()
         
-        if file_format == 'unknown':
-            # ファイル名から判定
-            file_extension = file.filename.lower().split('.')[-1] if '.' in file.filename else ''
-            if file_extension == 'xlsx':
-                file_format = 'xlsx'
-            elif file_extension == 'xls':
-                file_format = 'xls'
-            else:
-                return jsonify({'error': 'Unsupported file format. Please use .xlsx or .xls files.'}), 400
+        # アップロードデータを1つのバッファとして保持し、以降の処理で共有する
+        # （閾値を超える場合は一時ファイルをメモリマップして読み取る）
+        upload = UploadBuffer(file.stream)
+        print(f"Upload size: {upload.size} bytes (memory-mapped: {upload.is_mapped})")
+        file_digest = buffer_digest(upload.buffer)
+        
+        # 同じファイル・パラメータの翻訳結果がキャッシュされていれば解析せずに返す
+        result_cache = get_result_cache()
+        cache_key = make_result_cache_key(file_digest, options)
+        cached = result_cache.get(cache_key) if result_cache else None
+        if cached is not None:
+            try:
+                cached_file = open(cached.path, 'rb')
+            except OSError:
+                # 別のワーカーが削除した場合は通常どおり翻訳する
+                cached = None
+        if cached is not None:
+            name, _ = os.path.splitext(file.filename)
+            print(f"Result cache hit for {file.filename} ({cached.size} bytes)")
+            response = send_file(
+                cached_file,
+                as_attachment=True,
+                download_name=f"{name}_translated{cached.extension}",
+                mimetype=cached.mimetype,
+                conditional=False
+            )
+            response.headers['X-Result-Cache'] = 'HIT'
+            if cached.metadata.get('manifest_id'):
+                response.headers['X-Translation-Manifest'] = cached.metadata['manifest_id']
+            return response
         
-        print(f"Detected file format: {file_format}")
+        reference = load_reference_manifest(options)
+        target_langs = get_target_languages(options)
+        # 解析前にメモリ使用量を見積もり、予算に空きがない場合は待機または503を返す
+        reservation = admit_workbook(upload.buffer)
+        wb, conversion_seconds = load_workbook_from_buffer(upload.buffer, file.filename, options['output_format'])
+        # 解析後はアップロードバッファを解放
+        upload.close()
         
-        # 統一ワークブックを作成
+        analysis = analyze_workbook(wb)
+        if len(target_langs) > 1:
+            # 複数言語: 走査は1回だけ行い、言語ごとのファイルをZIPにまとめて返す
+            checkpoints, manifests = open_language_stores(file_digest, options)
+            # 翻訳前に送信する文字数を確認し、上限を超える場合は翻訳しない
+            budget, billable = create_character_budget(options, deepl_api_key, lambda: count_billable_characters(
+                wb, options, analysis[1], checkpoints
+            ))
+            sheet_plans, results, summary = translate_workbook_languages(
+                wb, options, deepl_api_key, checkpoints=checkpoints, manifests=manifests,
+                budget=budget, analysis=analysis, deadline=deadline, cancellation=cancellation
+            )
+            manifest_ids = save_language_manifests(manifests)
+            manifest_id = None
+            translated_filename, mimetype = get_archive_file_name(file.filename), ZIP_MIMETYPE
+            save_func = lambda writer: write_language_archive(
+                wb, file.filename, sheet_plans, results, writer, manifest_ids, deadline
+            )
+            cache_metadata = {'manifest_ids': manifest_ids}
+        else:
+            checkpoint = open_checkpoint(file_digest, options)
+            manifest = create_manifest(options)
+            budget, billable = create_character_budget(options, deepl_api_key, lambda: count_billable_characters(
+                wb, options, analysis[1], {options['target_lang']: checkpoint}, reference
+            ))
+            summary = translate_workbook(
+                wb, options, deepl_api_key, checkpoint=checkpoint, reference=reference, manifest=manifest,
+                budget=budget, analysis=analysis, deadline=deadline, cancellation=cancellation
+            )
+            manifest_id = save_manifest(manifest)
+            translated_filename, mimetype = get_output_file_info(file.filename, wb)
+            save_func = wb.save
+            cache_metadata = {'manifest_id': manifest_id}
+            if deadline is not None and deadline.reached and wants_partial_archive():
+                # 処理期限に達した場合、クライアントが要求したときは翻訳済みの部分と未翻訳のセルのレポートをZIPにまとめて返す
+                workbook_filename = translated_filename
+                translated_filename, mimetype = get_partial_archive_file_name(file.filename), ZIP_MIMETYPE
+                save_func = lambda writer: write_partial_archive(wb, workbook_filename, writer, deadline)
+        
+        # 翻訳されたファイルをシリアライズしながら送信（一時ファイルは作成しない）
+        print(f"Streaming translated file as {wb.file_format} format")
+        cache_writer = None
+        # 文字数の上限・処理期限で一部を原文のまま残した結果はキャッシュしない
+        if result_cache is not None and not budget.exhausted and not (deadline is not None and deadline.reached):
+            cache_writer = result_cache.open_writer(
+                cache_key, mimetype, os.path.splitext(translated_filename)[1], cache_metadata
+            )
+        # ワークブックは送信完了まで保持されるため、メモリ予約はストリームを閉じるときに解放する
+        admitted, reservation = reservation, None
+        traced, memory_trace = memory_trace, None
+        save_start = time.perf_counter()
+        stream = WorkbookStream(
+            lambda writer: save_output(save_func, writer, cache_writer),
+            on_close=lambda: release_memory_reservation(admitted, traced)
+        )
         try:
-            wb = UnifiedWorkbook(file_data, file_format)
-            print(f"Successfully created UnifiedWorkbook with {len(wb.sheetnames)} sheets")
+            # 書き出し前に失敗した場合はここでエラーレスポンスを返す
+            stream.prime()
         except Exception as e:
-            print(f"Error creating UnifiedWorkbook: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': f'Failed to read file: {str(e)}'}), 500
+            stream.close()
+            print(f"Error saving translated file: {e}")
+            return jsonify({'error': f'Failed to save translated file: {str(e)}'}), 500
+        # xlwtはファイル全体を生成してから書き出すため、XLSは最初のチャンクまでが保存処理の時間
+        save_seconds = time.perf_counter() - save_start
         
-        # ファイルの複雑さを分析
-        file_analysis = analyze_file_complexity(wb)
-        processing_params = get_processing_parameters(file_analysis['processing_strategy'])
+        # レスポンス終了時（クライアント切断を含む）にストリームが閉じられ、保存スレッドも停止する
+        response = send_file(
+            stream,
+            as_attachment=True,
+            download_name=translated_filename,
+            mimetype=mimetype,
+            conditional=False
+        )
+        response.headers['X-Result-Cache'] = 'MISS'
+        set_character_headers(response, budget, billable)
+        set_deadline_headers(response, deadline, save_untranslated_report(deadline))
+        if len(target_langs) > 1:
+            response.headers['X-Target-Languages'] = ','.join(target_langs)
+        # 次回の差分翻訳で参照するマニフェストIDと、再利用したセルの割合を報告
+        if manifest_id:
+            response.headers['X-Translation-Manifest'] = manifest_id
+        if reference is not None:
+            response.headers['X-Cells-Reused'] = f"{summary['cells_reused']}/{summary['cells_to_translate']}"
+            response.headers['X-Cells-Reused-Ratio'] = f"{summary['reuse_ratio'] or 0:.4f}"
+        # XLS→XLSX変換の時間と、変換しない場合のxlutilsによる保存の時間を報告（比較用）
+        if conversion_seconds is not None:
+            response.headers['X-XLS-Conversion-Seconds'] = f"{conversion_seconds:.3f}"
+        elif wb.file_format == 'xls' and mimetype != ZIP_MIMETYPE:
+            response.headers['X-XLS-Save-Seconds'] = f"{save_seconds:.3f}"
+            print(f"Saved XLS with xlutils in {save_seconds:.3f}s")
+        # 翻訳中に実行したガベージコレクションの時間（保存中は含まない）
+        response.headers['X-GC-Seconds'] = f"{summary['gc_seconds']:.3f}"
+        traced_peak = get_traced_peak(traced)
+        if traced_peak is not None:
+            peak_mb = traced_peak / (1024 * 1024)
+            response.headers['X-Peak-Memory-MB'] = f"{peak_mb:.1f}"
+            print(f"Peak traced memory for request: {peak_mb:.1f} MB")
+        response.headers['X-Memory-Estimate-MB'] = f"{admitted.estimate / (1024 * 1024):.1f}"
+        if request_id:
+            response.headers['X-Request-Id'] = request_id
+        return response
         
-        print(f"File analysis: {file_analysis['total_sheets']} sheets, {file_analysis['total_cells']} cells, {file_analysis['total_text_chars']} chars")
-        print(f"Processing strategy: {file_analysis['processing_strategy']}")
-        print(f"Processing parameters: {processing_params}")
+    except TranslationCancelled as e:
+        # 完了したバッチはチェックポイントに記録済みのため、再送信すると続きから翻訳する
+        print(f"Translation cancelled: {e.reason}")
+        return jsonify({'error': str(e), 'reason': e.reason}), 499
+    except TranslationError as e:
+        return e.to_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if upload is not None:
+            upload.close()
+        if reservation is not None:
+            reservation.release()
+        finish_memory_trace(memory_trace)
+        if request_id:
+            get_cancellation_store().clear(request_id)
+
+@app.route('/api/translate/reports/<report_id>', methods=['GET'])
+def api_translate_report(report_id):
+    """処理期限に達したリクエストの未翻訳のセルのレポートを取得"""
+    try:
+        report = ReportStore(REPORT_DIR, ttl_seconds=REPORT_TTL_SECONDS).load(report_id)
+    except OSError:
+        report = None
+    if report is None:
+        return jsonify({'error': 'Report not found or expired'}), 404
+    return jsonify(report)
+
+@app.route('/api/translate/<request_id>/cancel', methods=['POST'])
+def api_translate_cancel(request_id):
+    """X-Request-Id を指定して送信した翻訳中のリクエストを取り消す（別のワーカーが処理中でも伝わる）"""
+    if not is_valid_request_id(request_id):
+        return jsonify({'error': 'Invalid request id'}), 400
+    get_cancellation_store().request(request_id)
+    return jsonify({'request_id': request_id, 'status': 'cancel_requested'}), 202
+
+def run_admitted_job(job, store):
+    """メモリ予算に空きができるまで待ってからジョブを翻訳（取り消しが要求された場合は中止する）"""
+    cancellation = create_job_cancellation(job['job_id'])
+    try:
+        if job.get('batch_inputs'):
+            reservation = admit_batch([BatchInput(**batch_input) for batch_input in job['batch_inputs']], block=True)
+        else:
+            with open(job['input_path'], 'rb') as f, UploadBuffer(f) as upload:
+                reservation = admit_workbook(upload.buffer, block=True)
+        try:
+            # 待機中に取り消された場合は翻訳しない
+            cancellation.raise_if_cancelled()
+            if job.get('batch_inputs'):
+                return run_batch_job(job, store, cancellation)
+            return run_translation_job(job, store, cancellation)
+        finally:
+            reservation.release()
+    finally:
+        get_cancellation_store().clear(get_job_cancel_id(job['job_id']))
+
+def run_translation_job(job, store, cancellation=None):
+    """保存された入力ファイルを翻訳し、結果をジョブディレクトリに書き出す"""
+    deepl_api_key = get_deepl_api_key()
+    if not deepl_api_key:
+        raise TranslationError('DEEPL_API_KEY not found in environment variables')
+    
+    options = job['params']
+    job_id = job['job_id']
+    
+    with open(job['input_path'], 'rb') as f, UploadBuffer(f) as upload:
+        file_digest = buffer_digest(upload.buffer)
+        result_cache = get_result_cache()
+        cache_key = make_result_cache_key(file_digest, options)
+        cached = result_cache.get(cache_key) if result_cache else None
+        if cached is not None:
+            # キャッシュされた結果をジョブの結果としてコピー
+            name, _ = os.path.splitext(job['filename'])
+            result_path = os.path.join(store.job_dir(job_id), 'result' + cached.extension)
+            try:
+                shutil.copyfile(cached.path, result_path)
+            except OSError:
+                # 別のワーカーが削除した場合は通常どおり翻訳する
+                cached = None
+        if cached is not None:
+            print(f"Result cache hit for job {job_id}")
+            return {
+                'result_path': result_path,
+                'result_filename': f"{name}_translated{cached.extension}",
+                'result_mimetype': cached.mimetype,
+                'result_cached': True,
+                'manifest_id': cached.metadata.get('manifest_id')
+            }
         
-        # 全シートを新しいセル対応保証アルゴリズムで処理
-        for sheet_name in wb.sheetnames:
-            sheet = wb.get_sheet(sheet_name)
-            
-            print(f"Processing sheet: {sheet_name}")
-            
-            # 結合セルの情報を保存
-            merged_ranges = preserve_merged_cells(sheet)
-            
-            # セルマッピングと翻訳タスクを作成
-            cell_mapping, translation_tasks = create_cell_mapping(sheet)
-            
-            if not translation_tasks:
-                print(f"No translation tasks found for sheet {sheet_name}")
-                continue
-            
-            # 翻訳の実行（段階的フォールバック付き）
-            translations = translate_with_staged_fallback(
-                translation_tasks,
-                sheet,
-                context,
-                target_lang,
-                source_lang,
-                formality,
-                deepl_api_key,
-                processing_params
-            )
-            
-            # 翻訳結果をシートに適用
-            apply_translations_to_sheet(sheet, cell_mapping, translations)
-            
-            # 翻訳の正確性を検証
-            validation_results = validate_translation_accuracy(sheet, cell_mapping, translations)
-            if validation_results['errors']:
-                print(f"Validation errors for sheet {sheet_name}: {validation_results['errors']}")
-            
-            print(f"Sheet {sheet_name} completed: {validation_results['cells_translated']}/{validation_results['cells_needing_translation']} cells translated")
-            
-            # 結合セルを復元
-            restore_merged_cells(sheet, merged_ranges)
-            
-            # シート処理後のメモリ解放
-            gc.collect()
+        reference = load_reference_manifest(options)
+        # 再実行されたジョブは前回までに完了したバッチを再利用する
+        checkpoint = open_checkpoint(file_digest, options)
+        wb, conversion_seconds = load_workbook_from_buffer(upload.buffer, job['filename'], options['output_format'])
+    
+    def on_progress(summary):
+        store.update(job_id, progress=summary)
+    
+    analysis = analyze_workbook(wb)
+    if len(get_target_languages(options)) > 1:
+        return run_language_job(
+            job, store, wb, file_digest, deepl_api_key, on_progress, result_cache, cache_key, conversion_seconds,
+            analysis, cancellation
+        )
+    
+    # 翻訳前に送信する文字数を確認し、上限を超える場合はジョブを失敗させる
+    budget, billable = create_character_budget(options, deepl_api_key, lambda: count_billable_characters(
+        wb, options, analysis[1], {options['target_lang']: checkpoint}, reference
+    ))
+    manifest = create_manifest(options)
+    # ジョブはgunicornの timeout の対象外のため、リクエストで deadline_seconds を指定した場合のみ期限を設ける
+    deadline = create_deadline(options)
+    summary = translate_workbook(
+        wb, options, deepl_api_key, progress_callback=on_progress,
+        checkpoint=checkpoint, reference=reference, manifest=manifest, budget=budget, analysis=analysis,
+        deadline=deadline, cancellation=cancellation
+    )
+    manifest_id = save_manifest(manifest)
+    
+    translated_filename, mimetype = get_output_file_info(job['filename'], wb)
+    result_path = os.path.join(store.job_dir(job_id), 'result' + os.path.splitext(translated_filename)[1])
+    wb.save(result_path)
+    incomplete = deadline is not None and deadline.reached
+    if result_cache is not None and not budget.exhausted and not incomplete:
+        result_cache.put_file(
+            cache_key, result_path, mimetype, os.path.splitext(result_path)[1], {'manifest_id': manifest_id}
+        )
+    
+    return {
+        'manifest_id': manifest_id,
+        'progress': summary,
+        'characters': get_character_report(budget, billable),
+        'untranslated': deadline.report() if incomplete else None,
+        'result_path': result_path,
+        'result_filename': translated_filename,
+        'result_mimetype': mimetype,
+        'conversion_seconds': conversion_seconds
+    }
+
+def run_language_job(job, store, wb, file_digest, api_key, on_progress, result_cache, cache_key, conversion_seconds, analysis=None, cancellation=None):
+    """複数言語のジョブを翻訳し、言語ごとのファイルをまとめたZIPをジョブディレクトリに書き出す"""
+    options = job['params']
+    analysis = analysis or analyze_workbook(wb)
+    checkpoints, manifests = open_language_stores(file_digest, options)
+    budget, billable = create_character_budget(options, api_key, lambda: count_billable_characters(
+        wb, options, analysis[1], checkpoints
+    ))
+    deadline = create_deadline(options)
+    sheet_plans, results, summary = translate_workbook_languages(
+        wb, options, api_key, progress_callback=on_progress, checkpoints=checkpoints, manifests=manifests,
+        budget=budget, analysis=analysis, deadline=deadline, cancellation=cancellation
+    )
+    manifest_ids = save_language_manifests(manifests)
+    
+    result_path = os.path.join(store.job_dir(job['job_id']), 'result.zip')
+    with open(result_path, 'wb') as f:
+        languages = write_language_archive(wb, job['filename'], sheet_plans, results, f, manifest_ids, deadline)
+    incomplete = deadline is not None and deadline.reached
+    if result_cache is not None and not budget.exhausted and not incomplete:
+        result_cache.put_file(cache_key, result_path, ZIP_MIMETYPE, '.zip', {'manifest_ids': manifest_ids})
+    
+    return {
+        'manifest_id': None,
+        'languages': languages,
+        'progress': summary,
+        'characters': get_character_report(budget, billable),
+        'untranslated': deadline.report() if incomplete else None,
+        'result_path': result_path,
+        'result_filename': get_archive_file_name(job['filename']),
+        'result_mimetype': ZIP_MIMETYPE,
+        'conversion_seconds': conversion_seconds
+    }
+
+_job_manager = None
+
+def get_job_manager():
+    """ジョブマネージャーを取得（ワーカープロセスごとに遅延生成）"""
+    global _job_manager
+    # preload_app でフォークされた場合、親プロセスのスレッドプールは使用できないため再生成する
+    if _job_manager is None or _job_manager.pid != os.getpid():
+        store = JobStore(JOB_STORE_DIR, ttl_seconds=JOB_TTL_SECONDS)
+        store.cleanup()
+        _job_manager = JobManager(store, run_admitted_job, max_workers=JOB_WORKERS)
+        # 再起動前のワーカーが処理していたジョブを再開
+        _job_manager.recover()
+    return _job_manager
+
+def job_to_response(job):
+    """ジョブの状態をAPIレスポンス用に変換"""
+    job_id = job['job_id']
+    response = {
+        'job_id': job_id,
+        'status': job['status'],
+        'filename': job['filename'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+        'status_url': f"/api/jobs/{job_id}",
+        'events_url': f"/api/jobs/{job_id}/events"
+    }
+    if job['status'] == JOB_COMPLETED:
+        response['result_url'] = f"/api/jobs/{job_id}/result"
+        response['result_filename'] = job['result_filename']
+        response['manifest_id'] = job.get('manifest_id')
+        if job.get('languages'):
+            response['languages'] = job['languages']
+        if job.get('characters'):
+            response['characters'] = job['characters']
+        # 処理期限に達した場合の未翻訳のセル（同じファイル・パラメータで再実行すると残りのみ翻訳する）
+        if job.get('untranslated'):
+            response['untranslated'] = job['untranslated']
+        # 一括翻訳のファイル数・文字数などの集計（ファイルごとの結果は結果のZIPのレポートに含まれる）
+        if job.get('batch'):
+            response['batch'] = job['batch']
+    return response
+
+@app.route('/api/jobs', methods=['POST'])
+def api_create_job():
+    """翻訳ジョブを登録してジョブIDを返す"""
+    try:
+        if not get_deepl_api_key():
+            return jsonify({'error': 'DEEPL_API_KEY not found in environment variables'}), 500
+        
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        options = get_translation_options(request.form)
+        # 参照マニフェストは登録時に確認する
+        load_reference_manifest(options)
+        
+        manager = get_job_manager()
+        job = manager.store.create(file.stream, file.filename, options)
+        manager.submit(job['job_id'])
+        print(f"Queued translation job {job['job_id']} for {file.filename}")
         
-        # 翻訳されたファイルを一時ファイルに保存（元の形式を保持）
-        file_extension = '.xlsx' if wb.file_format == 'xlsx' else '.xls'
+        return jsonify(job_to_response(job)), 202
+        
+    except TranslationError as e:
+        return e.to_response()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    """翻訳ジョブの状態と進捗を返す"""
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    # 処理していたワーカーが終了している場合は再投入
+    manager.recover(job_id)
+    return jsonify(job_to_response(job))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def api_job_events(job_id):
+    """翻訳ジョブの進捗をServer-Sent Eventsで配信"""
+    manager = get_job_manager()
+    if manager.store.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    manager.recover(job_id)
+    
+    def generate():
+        # ジョブの状態ファイルを監視し、更新された場合のみ送信する（別ワーカーで実行中のジョブにも対応）
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        last_updated = None
+        yield format_sse({'job_id': job_id}, event='open', retry_ms=1000)
+        while True:
+            job = manager.store.get(job_id)
+            if job is None:
+                yield format_sse({'error': 'Job not found'}, event='failed')
+                return
+            if job['updated_at'] != last_updated:
+                last_updated = job['updated_at']
+                if job['status'] in ACTIVE_STATUSES:
+                    yield format_sse(job_to_response(job), event='progress', event_id=str(last_updated))
+                else:
+                    yield format_sse(job_to_response(job), event=job['status'], event_id=str(last_updated))
+                    return
+            if time.monotonic() >= deadline:
+                return
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+    
+    response = app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def api_job_cancel(job_id):
+    """翻訳ジョブを取り消す（実行中のワーカーは次のバッチの送信前に中止し、ジョブを cancelled にする）"""
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] not in ACTIVE_STATUSES:
+        return jsonify({'error': 'Job is already finished', 'status': job['status']}), 409
+    get_cancellation_store().request(get_job_cancel_id(job_id))
+    print(f"Cancel requested for job {job_id}")
+    return jsonify({'job_id': job_id, 'status': 'cancel_requested'}), 202
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def api_job_result(job_id):
+    """完了した翻訳ジョブの結果ファイルを返す"""
+    manager = get_job_manager()
+    job = manager.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == JOB_FAILED:
+        return jsonify({'error': job['error'], 'status': job['status']}), 500
+    if job['status'] == JOB_CANCELLED:
+        return jsonify({'error': job['error'], 'status': job['status']}), 410
+    if job['status'] != JOB_COMPLETED:
+        return jsonify({'error': 'Job is not completed yet', 'status': job['status']}), 409
+    
+    return send_file(
+        job['result_path'],
+        as_attachment=True,
+        download_name=job['result_filename'],
+        mimetype=job['result_mimetype'],
+        conditional=True
+    )
+
+def scan_batch_file(input_path, filename, options):
+    """
+    一括翻訳の1ファイルを読み込み、シートごとの翻訳タスクを抽出（プロセスプールで実行）
+    
+    ワークブックはプロセス間で受け渡せないため、翻訳に必要なテキストと文脈のみを返す。
+    """
+    with open(input_path, 'rb') as f, UploadBuffer(f) as upload:
+        digest = buffer_digest(upload.buffer)
+        wb, _ = load_workbook_from_buffer(upload.buffer, filename, options['output_format'])
+    file_analysis, processing_params = analyze_workbook(wb)
+    
+    sheets = []
+    for sheet_name in wb.sheetnames:
+        sheet_plan = scan_sheet(wb.get_sheet(sheet_name), options['context'], processing_params)
+        sheets.append({
+            'title': sheet_name,
+            'full_context': sheet_plan['full_context'],
+            'tasks': [{'cell_key': task['cell_key'], 'text': task['text']} for task in sheet_plan['tasks']]
+        })
+    
+    return {
+        'digest': digest,
+        'strategy': file_analysis['processing_strategy'],
+        'complexity_score': file_analysis['complexity_score'],
+        'sheets': sheets
+    }
+
+def apply_batch_file(input_path, filename, options, strategy, translations_by_sheet, output_path):
+    """
+    一括翻訳の1ファイルを再度読み込み、翻訳結果を適用して保存（プロセスプールで実行）
+    
+    Returns:
+        出力形式と翻訳セル数
+    """
+    with open(input_path, 'rb') as f, UploadBuffer(f) as upload:
+        wb, _ = load_workbook_from_buffer(upload.buffer, filename, options['output_format'])
+    processing_params = get_processing_parameters(strategy)
+    
+    cells_needing_translation = 0
+    cells_translated = 0
+    for sheet_name in wb.sheetnames:
+        sheet_plan = scan_sheet(wb.get_sheet(sheet_name), options['context'], processing_params)
+        if not sheet_plan['tasks']:
+            continue
+        validation_results = apply_sheet_translations(sheet_plan, translations_by_sheet.get(sheet_name, {}))
+        cells_needing_translation += validation_results['cells_needing_translation']
+        cells_translated += validation_results['cells_translated']
+    
+    translated_filename, _ = get_output_file_info(filename, wb)
+    output_path = os.path.splitext(output_path)[0] + os.path.splitext(translated_filename)[1]
+    wb.save(output_path)
+    return {
+        'output_path': output_path,
+        'output_filename': translated_filename,
+        'cells_needing_translation': cells_needing_translation,
+        'cells_translated': cells_translated
+    }
+
+_batch_pool = None
+
+def get_batch_pool():
+    """一括翻訳用のプロセスプールを取得（無効な場合はNone、ワーカープロセスごとに遅延生成）"""
+    global _batch_pool
+    if BATCH_PROCESS_WORKERS <= 0:
+        return None
+    # ジョブ・ストリーミングのスレッドを持つプロセスからフォークしないようにspawnで起動する
+    if _batch_pool is None or _batch_pool[0] != os.getpid():
+        _batch_pool = (os.getpid(), ProcessPoolExecutor(
+            max_workers=BATCH_PROCESS_WORKERS, mp_context=multiprocessing.get_context('spawn')
+        ))
+    return _batch_pool[1]
+
+def map_batch_files(func, arg_lists):
+    """
+    一括翻訳の各ファイルを処理（プロセスプールが有効な場合は並列実行）
+    
+    Returns:
+        ファイルごとの (結果, エラーメッセージ) の一覧
+    """
+    global _batch_pool
+    pool = get_batch_pool()
+    if pool is None:
+        futures = None
+    else:
+        futures = [pool.submit(func, *args) for args in arg_lists]
+    
+    results = []
+    for index, args in enumerate(arg_lists):
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-                print(f"Saving translated file as {file_extension} format")
-                wb.save(tmp_file.name)
-                tmp_file_path = tmp_file.name
-                print(f"Successfully saved to {tmp_file_path}")
+            result = futures[index].result() if futures is not None else func(*args)
+            results.append((result, None))
+        except TranslationError as e:
+            results.append((None, e.message))
         except Exception as e:
-            print(f"Error saving translated file: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': f'Failed to save translated file: {str(e)}'}), 500
+            print(f"Batch file processing failed: {e}")
+            results.append((None, str(e)))
+    
+    # ワーカープロセスが異常終了した場合は次回のリクエストで作り直す
+    if pool is not None and getattr(pool, '_broken', False):
+        _batch_pool = None
+    return results
+
+def get_batch_processing_parameters(scans):
+    """一括翻訳の全ファイルで最も保守的な処理戦略のパラメータを取得"""
+    strategies = [scan['strategy'] for scan in scans if scan is not None] or ['standard']
+    return get_processing_parameters(max(strategies, key=PROCESSING_STRATEGIES.index))
+
+def group_batch_tasks(scans):
+    """一括翻訳の全ファイルの翻訳タスクを文脈ごとにまとめ、重複を除いた翻訳タスクの一覧を作成"""
+    texts_by_context = {}
+    for scan in scans:
+        if scan is None:
+            continue
+        for sheet in scan['sheets']:
+            texts = texts_by_context.setdefault(sheet['full_context'], {})
+            for task in sheet['tasks']:
+                texts.setdefault(task['text'], None)
+    return {
+        full_context: [{'cell_key': str(index), 'text': text} for index, text in enumerate(texts)]
+        for full_context, texts in texts_by_context.items()
+    }
+
+def count_batch_characters(scans, checkpoint=None):
+    """一括翻訳でDeepLに送信する文字数を翻訳前に計算（文脈ごとの重複・チェックポイントを除く）"""
+    processing_params = get_batch_processing_parameters(scans)
+    return sum(
+        count_unsent_characters(unique_tasks, full_context, processing_params, checkpoint)
+        for full_context, unique_tasks in group_batch_tasks(scans).items()
+    )
+
+def translate_batch_files(scans, options, api_key, progress=None, checkpoint=None, budget=None, deadline=None, cancellation=None):
+    """
+    一括翻訳の全ファイルの翻訳タスクを共通のスケジューラーで翻訳
+    
+    全ファイルのタスクを文脈（シート名・ヘッダー情報）ごとにまとめ、
+    同じ文脈の同じ原文はファイルをまたいで1回だけ翻訳する。
+    budgetの文字数の上限・deadlineの処理期限は全ファイルで共有する。
+    cancellationが取り消された場合はTranslationCancelledを送出する。
+    
+    Returns:
+        ファイルごとのシート別翻訳結果（{シート名: {セルキー: 翻訳}}）の一覧
+    """
+    # 最も保守的な処理戦略のパラメータで翻訳する
+    processing_params = get_batch_processing_parameters(scans)
+    tasks_by_context = group_batch_tasks(scans)
+    # 送信の優先度は全ファイルの複雑さスコアの合計で決める
+    ticket = create_schedule_ticket(
+        options,
+        sum(scan['complexity_score'] for scan in scans if scan is not None),
+        max([scan['strategy'] for scan in scans if scan is not None] or ['standard'], key=PROCESSING_STRATEGIES.index),
+        cancellation
+    )
+    
+    print(f"Batch scheduler: {sum(len(tasks) for tasks in tasks_by_context.values())} unique texts in {len(tasks_by_context)} contexts")
+    
+    translations_by_context = {}
+    for full_context, unique_tasks in tasks_by_context.items():
+        translations = translate_with_staged_fallback(
+            unique_tasks,
+            None,
+            options['context'],
+            options['target_lang'],
+            options['source_lang'],
+            options['formality'],
+            api_key,
+            processing_params,
+            progress,
+            checkpoint,
+            full_context=full_context,
+            budget=budget,
+            ticket=ticket,
+            deadline=deadline
+        )
+        translations_by_context[full_context] = {
+            task['text']: translations[task['cell_key']] for task in unique_tasks if task['cell_key'] in translations
+        }
+    
+    results = []
+    for scan in scans:
+        if scan is None:
+            results.append(None)
+            continue
+        translations_by_sheet = {}
+        for sheet in scan['sheets']:
+            translations = translations_by_context.get(sheet['full_context'], {})
+            translations_by_sheet[sheet['title']] = {
+                task['cell_key']: translations[task['text']] for task in sheet['tasks'] if task['text'] in translations
+            }
+        results.append(translations_by_sheet)
+    return results
+
+def make_batch_digest(scans):
+    """一括翻訳の全ファイルのハッシュからバッチ全体のハッシュを作成（チェックポイント用）"""
+    digests = sorted(scan['digest'] for scan in scans if scan is not None)
+    return hashlib.sha256('\n'.join(digests).encode('ascii')).hexdigest()
+
+def run_batch_translation(inputs, options, api_key, work_dir, progress_callback=None, deadline=None, cancellation=None):
+    """
+    一括翻訳を実行し、結果ファイルとレポートを作成
+    
+    読み込み・保存はプロセスプールで並列実行し、DeepLへの翻訳は
+    全ファイル共通のスケジューラーで重複を除いて実行する。
+    deadlineの処理期限に達した場合は残りのセルを原文のまま保存し、ファイルごとの未翻訳のセル数を記録する。
+    
+    Returns:
+        (結果ファイルの一覧, レポート)
+    """
+    started_at = time.monotonic()
+    
+    scan_results = map_batch_files(
+        scan_batch_file, [(batch_input.path, batch_input.name, options) for batch_input in inputs]
+    )
+    scans = [scan for scan, _ in scan_results]
+    
+    progress = ProgressTracker(progress_callback)
+    checkpoint = open_checkpoint(make_batch_digest(scans), options) if any(scans) else None
+    # 翻訳前に全ファイルで送信する文字数を確認し、上限を超える場合は翻訳しない
+    budget, billable = create_character_budget(options, api_key, lambda: count_batch_characters(scans, checkpoint))
+    translations = translate_batch_files(scans, options, api_key, progress, checkpoint, budget, deadline, cancellation)
+    incomplete = deadline is not None and deadline.reached
+    
+    apply_args = []
+    for index, (batch_input, scan, translations_by_sheet) in enumerate(zip(inputs, scans, translations)):
+        if scan is not None:
+            apply_args.append((
+                batch_input.path, batch_input.name, options, scan['strategy'], translations_by_sheet,
+                os.path.join(work_dir, f"output-{index}")
+            ))
+    apply_results = iter(map_batch_files(apply_batch_file, apply_args))
+    
+    outputs = []
+    files = []
+    used_names = set()
+    for batch_input, (scan, scan_error), translations_by_sheet in zip(inputs, scan_results, translations):
+        entry = {
+            'filename': batch_input.name,
+            'size': batch_input.size,
+            'status': 'failed',
+            'error': scan_error
+        }
+        if scan is not None:
+            entry['cells_to_translate'] = sum(len(sheet['tasks']) for sheet in scan['sheets'])
+            entry['chars'] = sum(len(task['text']) for sheet in scan['sheets'] for task in sheet['tasks'])
+            applied, apply_error = next(apply_results)
+            if applied is None:
+                entry['error'] = apply_error
+            else:
+                # 出力ファイル名はZIP内のディレクトリを含む
+                name = unique_entry_name(applied['output_filename'], used_names)
+                outputs.append({'name': name, 'path': applied['output_path']})
+                entry.update(
+                    status='completed',
+                    output=name,
+                    cells_needing_translation=applied['cells_needing_translation'],
+                    cells_translated=applied['cells_translated']
+                )
+                if incomplete:
+                    entry['cells_untranslated'] = sum(
+                        1 for sheet in scan['sheets'] for task in sheet['tasks']
+                        if task['cell_key'] not in translations_by_sheet.get(sheet['title'], {})
+                    )
+        files.append(entry)
+    
+    cells_to_translate = sum(entry.get('cells_to_translate', 0) for entry in files)
+    summary = progress.snapshot()
+    report = {
+        'files': files,
+        'summary': {
+            'files_total': len(files),
+            'files_completed': len(outputs),
+            'files_failed': len(files) - len(outputs),
+            'cells_to_translate': cells_to_translate,
+            'chars_total': sum(entry.get('chars', 0) for entry in files),
+            # 文脈ごとに重複を除いた後に翻訳した文字数
+            'chars_translated': summary['chars_planned'],
+            'batches_completed': summary['batches_completed'],
+            'batches_resumed': summary['batches_resumed'],
+            'characters': get_character_report(budget, billable),
+            'incomplete': incomplete,
+            'elapsed_seconds': round(time.monotonic() - started_at, 1)
+        }
+    }
+    return outputs, report
+
+def run_batch_job(job, store, cancellation=None):
+    """ジョブディレクトリに保存された一括翻訳の入力を翻訳し、結果とレポートのZIPを書き出す"""
+    deepl_api_key = get_deepl_api_key()
+    if not deepl_api_key:
+        raise TranslationError('DEEPL_API_KEY not found in environment variables')
+    
+    options = job['params']
+    job_id = job['job_id']
+    job_dir = store.job_dir(job_id)
+    inputs = [BatchInput(**batch_input) for batch_input in job['batch_inputs']]
+    
+    def on_progress(summary):
+        store.update(job_id, progress=summary)
+    
+    # 再実行された場合に前回の出力が残っていれば削除する
+    work_dir = os.path.join(job_dir, 'work')
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    try:
+        # ジョブはgunicornの timeout の対象外のため、リクエストで deadline_seconds を指定した場合のみ期限を設ける
+        deadline = create_deadline(options)
+        outputs, report = run_batch_translation(
+            inputs, options, deepl_api_key, work_dir, on_progress, deadline, cancellation
+        )
+        report['skipped'] = job.get('batch_skipped', [])
+        if not outputs:
+            raise TranslationError('No files could be translated', 422)
+        
+        result_path = os.path.join(job_dir, 'result.zip')
+        write_batch_archive(result_path, outputs, report)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    return {
+        'manifest_id': None,
+        'batch': report['summary'],
+        'characters': report['summary']['characters'],
+        'result_path': result_path,
+        'result_filename': 'translated_batch.zip',
+        'result_mimetype': ZIP_MIMETYPE
+    }
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch_translate():
+    """
+    複数ファイル（またはExcelファイルを含むZIP）の一括翻訳をジョブとして登録してジョブIDを返す
+    
+    進捗は /api/jobs/<job_id>、結果とレポートのZIPは /api/jobs/<job_id>/result で取得する。
+    """
+    manager = None
+    job = None
+    submitted = False
+    try:
+        if not get_deepl_api_key():
+            return jsonify({'error': 'DEEPL_API_KEY not found in environment variables'}), 500
+        
+        uploads = [file for file in request.files.getlist('file') + request.files.getlist('files') if file.filename]
+        if not uploads:
+            return jsonify({'error': 'No file provided'}), 400
         
-        # ファイル名を生成（翻訳済みの接頭辞を追加、元の拡張子を保持）
-        original_filename = file.filename
-        name, ext = os.path.splitext(original_filename)
-        translated_filename = f"{name}_translated{ext}"
+        options = get_translation_options(request.form)
+        if len(get_target_languages(options)) > 1:
+            return jsonify({'error': 'Batch translation supports a single target language'}), 400
+        if options['reference_manifest']:
+            return jsonify({'error': 'Reference manifest is not supported for batch translation'}), 400
         
-        # ファイルをダウンロード用に送信（適切なMIMEタイプを設定）
-        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' if wb.file_format == 'xlsx' else 'application/vnd.ms-excel'
+        # 入力はジョブディレクトリに展開し、ジョブの実行時（別のワーカーでの再開時を含む）に読み込む
+        manager = get_job_manager()
+        job = manager.store.create(None, 'translated_batch.zip', options)
+        input_dir = os.path.join(manager.store.job_dir(job['job_id']), 'inputs')
+        os.makedirs(input_dir)
+        collector = BatchInputCollector(
+            input_dir, max_files=BATCH_MAX_FILES, max_bytes=BATCH_MAX_TOTAL_MB * 1024 * 1024
+        )
+        try:
+            for file in uploads:
+                collector.add(file.stream, file.filename)
+        except BatchLimitError as e:
+            return jsonify({'error': str(e)}), 413
+        except zipfile.BadZipFile as e:
+            return jsonify({'error': f'Invalid zip archive: {str(e)}'}), 400
+        if not collector.inputs:
+            return jsonify({'error': 'No Excel files found in upload'}), 400
+        print(f"Batch translation: {len(collector.inputs)} files, {collector.total_bytes} bytes, {len(collector.skipped)} skipped")
         
-        return send_file(
-            tmp_file_path,
-            as_attachment=True,
-            download_name=translated_filename,
-            mimetype=mimetype
+        job = manager.store.update(
+            job['job_id'],
+            batch_inputs=[asdict(batch_input) for batch_input in collector.inputs],
+            batch_skipped=collector.skipped
         )
+        manager.submit(job['job_id'])
+        submitted = True
+        print(f"Queued batch translation job {job['job_id']}")
+        
+        return jsonify(job_to_response(job)), 202
         
+    except TranslationError as e:
+        return e.to_response()
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        # 投入前に失敗した場合は入力を残さない
+        if job is not None and not submitted:
+            manager.store.delete(job['job_id'])
 
 # Vercel用のエクスポート
 def app_handler(environ, start_response):
@@ -1,33 +1,138 @@
 from flask import Flask, render_template, request, jsonify, send_file, flash, redirect, url_for
-import os
 import io
+import os
+import tempfile
+import zipfile
 from werkzeug.utils import secure_filename
-from excel_translator import ExcelTranslator
+from excel_translator import ExcelTranslator, TranslationAuthorizationError
+from utils.upload_buffer import SpooledUploadRequest, UploadBuffer, buffer_digest
+from utils.result_store import ResultStore
+from utils.result_cache import ResultCache, make_cache_key
+from utils.response_helpers import negotiate_response_format, create_translation_result_response
+from utils.translator_pool import TranslatorPool
 from dotenv import load_dotenv
 
 # 環境変数を読み込み
 load_dotenv()
 
 app = Flask(__name__)
+app.request_class = SpooledUploadRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
 # 設定
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+ZIP_MIMETYPE = 'application/zip'
+
+# 翻訳結果ストアの設定（ダウンロードトークンで結果を受け渡す）
+RESULT_STORE_DIR = os.environ.get(
+    'RESULT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'excel-translator', 'results')
+)
+RESULT_TTL_SECONDS = int(os.environ.get('RESULT_TTL_SECONDS', 3600))
+RESULT_STORE_MAX_MB = int(os.environ.get('RESULT_STORE_MAX_MB', 512))
+
+# 翻訳結果キャッシュの設定（同じファイル・パラメータの再送信には前回の結果を返す。上限を0にすると無効）
+RESULT_CACHE_DIR = os.environ.get(
+    'RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'excel-translator', 'result-cache')
+)
+RESULT_CACHE_MAX_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', 1024))
 
 # DeepL APIキー（環境変数から取得）
 DEEPL_API_KEY = os.environ.get('DEEPL_API_KEY', 'a8ee58ad-8642-4c06-85b4-bc7d0e6e35a8:fx')
 
+# APIキーの検証結果の有効期限（秒）。期限内は検証のリクエストを送信しない
+API_KEY_VALIDATION_TTL_SECONDS = int(os.environ.get('API_KEY_VALIDATION_TTL_SECONDS', 600))
+
 # アップロードフォルダを作成
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+result_store = ResultStore(
+    RESULT_STORE_DIR,
+    ttl_seconds=RESULT_TTL_SECONDS,
+    max_bytes=RESULT_STORE_MAX_MB * 1024 * 1024
+)
+
+result_cache = ResultCache(
+    RESULT_CACHE_DIR,
+    max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024
+) if RESULT_CACHE_MAX_MB > 0 else None
+
+# 翻訳インスタンスはAPIキーごとにワーカープロセス内で共有する
+translator_pool = TranslatorPool(
+    lambda api_key: ExcelTranslator(api_key),
+    validation_ttl=API_KEY_VALIDATION_TTL_SECONDS
+)
+
 def allowed_file(filename):
     """
     アップロードされたファイルが許可された拡張子かチェック
     """
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_result_cache_key(upload, context, source_lang, target_lang):
+    """
+    アップロードファイルのハッシュと翻訳パラメータから結果キャッシュのキーを作成
+    """
+    return make_cache_key(buffer_digest(upload.buffer), {
+        # api/index.py の結果とは区別する
+        'engine': 'excel_translator',
+        'context': context,
+        'source_lang': source_lang,
+        'target_lang': target_lang
+    })
+
+def get_target_languages(form):
+    """
+    翻訳先言語の指定（複数指定・カンマ区切り）を重複のない一覧に変換
+    """
+    languages = []
+    for value in form.getlist('target_lang') or ['EN-US']:
+        for lang in value.split(','):
+            lang = lang.strip().upper()
+            if lang and lang not in languages:
+                languages.append(lang)
+    return languages or ['EN-US']
+
+def create_language_archive(outputs, filename):
+    """
+    翻訳先言語ごとの翻訳結果を1つのZIPにまとめる
+    """
+    name, ext = os.path.splitext(os.path.basename(filename))
+    archive = io.BytesIO()
+    # XLSXは圧縮済みのため再圧縮しない
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zf:
+        for target_lang, translated_data in outputs.items():
+            zf.writestr(f"{name}_translated_{target_lang}{ext}", translated_data)
+    return archive.getvalue()
+
+def get_translator():
+    """
+    APIキーを検証して共有の翻訳インスタンスを取得
+    
+    Returns:
+        翻訳インスタンス（APIキーが無効な場合はNone）
+    """
+    if not translator_pool.is_valid(DEEPL_API_KEY):
+        return None
+    return translator_pool.get(DEEPL_API_KEY)
+
+def get_cached_result(cache_key):
+    """
+    キャッシュされた翻訳結果を取得（存在しない場合はNone）
+    """
+    if result_cache is None:
+        return None
+    return result_cache.get_bytes(cache_key)
+
+def cache_result(cache_key, translated_data, filename, mimetype=XLSX_MIMETYPE):
+    """
+    翻訳結果をキャッシュに保存
+    """
+    if result_cache is not None:
+        result_cache.put(cache_key, translated_data, mimetype, os.path.splitext(filename)[1].lower())
+
 @app.route('/')
 def index():
     """
@@ -55,33 +160,34 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         try:
-            # ファイルデータを読み込み
-            file_data = file.read()
-            
-            # 翻訳処理
-            translator = ExcelTranslator(DEEPL_API_KEY)
-            
-            # APIキーの有効性を確認
-            if not translator.validate_api_key():
-                flash('DeepL APIキーが無効です。設定を確認してください。')
-                return redirect(url_for('index'))
-            
-            # 翻訳実行
-            translated_data = translator.translate_excel_file(
-                file_data=file_data,
-                context=context,
-                source_lang=source_lang,
-                target_lang=target_lang
-            )
+            # 翻訳実行（大きなファイルはメモリマップで読み取る）
+            with UploadBuffer(file.stream) as upload:
+                # 同じファイル・パラメータの翻訳結果がキャッシュされていれば再利用
+                cache_key = get_result_cache_key(upload, context, source_lang, target_lang)
+                translated_data = get_cached_result(cache_key)
+                
+                if translated_data is None:
+                    # APIキーの有効性を確認（検証結果はキャッシュされる）
+                    translator = get_translator()
+                    if translator is None:
+                        flash('DeepL APIキーが無効です。設定を確認してください。')
+                        return redirect(url_for('index'))
+                    
+                    translated_data = translator.translate_excel_file(
+                        file_data=upload.buffer,
+                        context=context,
+                        source_lang=source_lang,
+                        target_lang=target_lang
+                    )
+                    cache_result(cache_key, translated_data, file.filename)
             
             # 翻訳後のファイル名を生成
             original_filename = secure_filename(file.filename)
             name, ext = os.path.splitext(original_filename)
             translated_filename = f"{name}_translated{ext}"
             
-            # Base64エンコードしてテンプレートに渡す
-            import base64
-            encoded_data = base64.b64encode(translated_data).decode('utf-8')
+            # 結果をサーバー側に保存し、ダウンロードトークンをテンプレートに渡す
+            token = result_store.put(translated_data, translated_filename, XLSX_MIMETYPE)
         
             return render_template('result.html', 
                                      original_filename=original_filename,
@@ -89,8 +195,13 @@ def upload_file():
                                      context=context,
                                      source_lang=source_lang,
                                      target_lang=target_lang,
-                                     file_data=encoded_data)
+                                     download_url=url_for('download_file', token=token))
             
+        except TranslationAuthorizationError as e:
+            # 翻訳中の認証エラーは次のリクエストでAPIキーを再検証する
+            translator_pool.invalidate(DEEPL_API_KEY)
+            flash(f'翻訳処理中にエラーが発生しました: {str(e)}')
+            return redirect(url_for('index'))
         except Exception as e:
             flash(f'翻訳処理中にエラーが発生しました: {str(e)}')
             return redirect(url_for('index'))
@@ -102,25 +213,22 @@ def upload_file():
 @app.route('/download')
 def download_file():
     """
-    翻訳済みファイルのダウンロード
+    翻訳済みファイルのダウンロード（Rangeリクエスト対応）
     """
-    file_data = request.args.get('file_data')
-    filename = request.args.get('filename', 'translated_file.xlsx')
+    token = request.args.get('token', '')
+    stored = result_store.get(token)
     
-    if not file_data:
-        flash('ダウンロードするファイルが見つかりません。')
+    if stored is None:
+        flash('ダウンロードするファイルが見つかりません。有効期限が切れている可能性があります。')
         return redirect(url_for('index'))
     
     try:
-        # Base64デコード（実際の実装では適切なデータ受け渡し方法を使用）
-        import base64
-        decoded_data = base64.b64decode(file_data)
-        
         return send_file(
-            io.BytesIO(decoded_data),
+            stored.path,
             as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            download_name=stored.filename,
+            mimetype=stored.mimetype,
+            conditional=True
         )
     
     except Exception as e:
@@ -138,6 +246,11 @@ def health_check():
 def api_translate():
     """
     API形式での翻訳処理
+    
+    Acceptヘッダーに応じてレスポンス形式を切り替える:
+    - application/octet-stream: 翻訳済みファイルをバイナリで返す
+    - multipart/mixed: JSONメタデータとファイルを1つのレスポンスで返す
+    - それ以外: 従来のBase64埋め込みJSON
     """
     try:
         if 'file' not in request.files:
@@ -146,28 +259,63 @@ def api_translate():
         file = request.files['file']
         context = request.form.get('context', '')
         source_lang = request.form.get('source_lang', 'JA')
-        target_lang = request.form.get('target_lang', 'EN-US')
+        # 複数の翻訳先言語を指定した場合は言語ごとのファイルをZIPにまとめて返す
+        target_langs = get_target_languages(request.form)
+        target_lang = ','.join(target_langs)
         
         if not allowed_file(file.filename):
             return jsonify({'error': '許可されていないファイル形式です。'}), 400
         
-        # ファイルデータを読み込み
-        file_data = file.read()
-        
-        # 翻訳処理
-        translator = ExcelTranslator(DEEPL_API_KEY)
+        name, ext = os.path.splitext(os.path.basename(file.filename))
+        if len(target_langs) > 1:
+            translated_filename, mimetype = f"{name}_translated.zip", ZIP_MIMETYPE
+        else:
+            translated_filename, mimetype = f"{name}_translated{ext}", XLSX_MIMETYPE
         
-        if not translator.validate_api_key():
-            return jsonify({'error': 'DeepL APIキーが無効です。'}), 500
+        # 大きなファイルはメモリマップで読み取る
+        with UploadBuffer(file.stream) as upload:
+            # 同じファイル・パラメータの翻訳結果がキャッシュされていれば再利用
+            cache_key = get_result_cache_key(upload, context, source_lang, target_lang)
+            translated_data = get_cached_result(cache_key)
+            
+            if translated_data is None:
+                # 翻訳処理
+                translator = get_translator()
+                if translator is None:
+                    return jsonify({'error': 'DeepL APIキーが無効です。'}), 500
+                
+                if len(target_langs) > 1:
+                    # 読み込みと翻訳対象の判定は1回だけ行い、言語ごとに並行して翻訳する
+                    outputs = translator.translate_excel_file_multi(
+                        file_data=upload.buffer,
+                        context=context,
+                        source_lang=source_lang,
+                        target_langs=target_langs
+                    )
+                    translated_data = create_language_archive(outputs, file.filename)
+                else:
+                    translated_data = translator.translate_excel_file(
+                        file_data=upload.buffer,
+                        context=context,
+                        source_lang=source_lang,
+                        target_lang=target_lang
+                    )
+                cache_result(cache_key, translated_data, translated_filename, mimetype)
         
-        translated_data = translator.translate_excel_file(
-            file_data=file_data,
-            context=context,
-            source_lang=source_lang,
-            target_lang=target_lang
-        )
+        response_format = negotiate_response_format(request.accept_mimetypes)
+        if response_format != 'json':
+            return create_translation_result_response(
+                original_filename=file.filename,
+                translated_filename=translated_filename,
+                translated_data=translated_data,
+                context=context,
+                source_lang=source_lang,
+                target_lang=target_lang,
+                format_type=response_format,
+                mimetype=mimetype
+            )
         
-        # Base64エンコードして返す
+        # 従来のクライアント向け: Base64エンコードして返す
         import base64
         encoded_data = base64.b64encode(translated_data).decode('utf-8')
         
@@ -178,6 +326,10 @@ def api_translate():
             'context': context
         })
         
+    except TranslationAuthorizationError as e:
+        # 翻訳中の認証エラーは次のリクエストでAPIキーを再検証する
+        translator_pool.invalidate(DEEPL_API_KEY)
+        return jsonify({'error': str(e)}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
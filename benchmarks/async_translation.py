@@ -0,0 +1,66 @@
+"""
+ExcelTranslatorの同期APIと非同期APIの処理時間の比較
+
+ローカルのDeepLモックサーバー（応答の遅延を指定）に対して同じワークブックを翻訳する。
+
+使用例:
+    python benchmarks/async_translation.py --rows 2000 --latency 0.2 --concurrency 8
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_translator import ExcelTranslator
+from tests.mock_deepl_server import MockDeepLServer
+
+
+def build_workbook(rows: int) -> bytes:
+    """翻訳対象のテキストを含むワークブックを作成"""
+    workbook = openpyxl.Workbook()
+    for i in range(rows):
+        workbook.active.append([f"会議{i}", f"出張の報告{i}", "予定"])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='同期APIと非同期APIの処理時間を比較します。')
+    parser.add_argument('--rows', type=int, default=1000, help='行数（1行あたり2種類のテキスト）')
+    parser.add_argument('--latency', type=float, default=0.1, help='モックサーバーの応答の遅延（秒）')
+    parser.add_argument('--concurrency', type=int, default=4, help='非同期APIの同時リクエスト数')
+    parser.add_argument('--target-lang', default='EN-US', help='翻訳先言語（カンマ区切りで複数指定可）')
+    args = parser.parse_args()
+
+    data = build_workbook(args.rows)
+    target_langs = [lang.strip() for lang in args.target_lang.split(',') if lang.strip()]
+
+    with MockDeepLServer(latency=args.latency) as server:
+        translator = ExcelTranslator('benchmark', server_url=server.url, max_concurrency=args.concurrency)
+
+        started_at = time.perf_counter()
+        translator.translate_excel_file_multi(data, target_langs=target_langs)
+        sync_seconds = time.perf_counter() - started_at
+        sync_requests, sync_connections = server.requests, server.connections
+
+        started_at = time.perf_counter()
+        asyncio.run(translator.translate_excel_file_multi_async(data, target_langs=target_langs))
+        async_seconds = time.perf_counter() - started_at
+
+        print(f"Workbook: {args.rows} rows, {len(target_langs)} languages, latency {args.latency * 1000:.0f} ms")
+        print(f"sync : {sync_seconds:7.2f}s  {sync_requests} requests, {sync_connections} connections")
+        print(f"async: {async_seconds:7.2f}s  {server.requests - sync_requests} requests, "
+              f"{server.connections - sync_connections} connections, "
+              f"max {server.max_active_requests} concurrent (limit {args.concurrency})")
+        print(f"speedup: {sync_seconds / async_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
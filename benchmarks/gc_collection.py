@@ -0,0 +1,91 @@
+"""
+バッチ・シートごとの無条件のガベージコレクションと、メモリ使用量に応じた実行の処理時間の比較
+
+DeepLへの送信はモックに置き換え、api/index.py の translate_workbook で同じワークブックを翻訳する。
+
+使用例:
+    python benchmarks/gc_collection.py --sheets 10 --rows 2000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from unittest.mock import patch
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import index as api_index
+from utils.memory_manager import MemoryManager
+
+
+def build_workbook(sheets: int, rows: int) -> bytes:
+    """翻訳対象のテキストを含むワークブックを作成"""
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for sheet_index in range(sheets):
+        sheet = workbook.create_sheet(f"シート{sheet_index}")
+        sheet.append(['項目', '内容', '備考', '数量'])
+        for i in range(rows):
+            sheet.append([f"会議{i}", f"出張の報告{sheet_index}-{i}", "予定", i])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+class AlwaysCollect(MemoryManager):
+    """変更前の動作: 確認のたびに実行"""
+
+    def _should_collect(self) -> bool:
+        return True
+
+
+def fake_translate_batch(texts, target_lang, source_lang, context, api_key, formality=None):
+    return [f"{target_lang}:{text}" for text in texts]
+
+
+def run(data: bytes, manager: MemoryManager) -> tuple:
+    """ワークブックを読み込んで翻訳し、経過時間と進捗のスナップショットを返す"""
+    api_index._memory_manager = (os.getpid(), manager)
+    wb, _ = api_index.load_workbook_from_buffer(data, 'benchmark.xlsx')
+    options = {'context': '', 'target_lang': 'EN-US', 'source_lang': 'JA', 'formality': 'default'}
+    started_at = time.perf_counter()
+    summary = api_index.translate_workbook(wb, options, 'benchmark')
+    return time.perf_counter() - started_at, summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='ガベージコレクションの実行条件による処理時間を比較します。')
+    parser.add_argument('--sheets', type=int, default=10, help='シート数')
+    parser.add_argument('--rows', type=int, default=2000, help='シートごとの行数')
+    args = parser.parse_args()
+
+    data = build_workbook(args.sheets, args.rows)
+    api_index.DISPATCH_LINGER_MS = 0
+
+    with patch('api.index.translate_batch', side_effect=fake_translate_batch), \
+            patch('builtins.print'):
+        # 変更前の動作: バッチ・シートの処理後に毎回実行
+        always = AlwaysCollect()
+        always_seconds, always_summary = run(data, always)
+        # メモリ使用量がしきい値を超えた場合のみ実行（既定の設定）
+        pressure = MemoryManager(
+            growth_bytes=api_index.GC_GROWTH_MB * 1024 * 1024,
+            allocation_blocks=api_index.GC_ALLOCATION_BLOCKS,
+            rss_limit_bytes=api_index.GC_RSS_LIMIT_MB * 1024 * 1024,
+            min_interval=api_index.GC_MIN_INTERVAL_SECONDS
+        )
+        pressure_seconds, pressure_summary = run(data, pressure)
+
+    print(f"Workbook: {args.sheets} sheets x {args.rows} rows, {always_summary['batches_completed']} batches")
+    print(f"always  : {always_seconds:7.2f}s  {always.collections} collections, "
+          f"{always_summary['gc_seconds']:.2f}s in GC")
+    print(f"pressure: {pressure_seconds:7.2f}s  {pressure.collections} collections, "
+          f"{pressure_summary['gc_seconds']:.2f}s in GC")
+    print(f"speedup: {always_seconds / pressure_seconds:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
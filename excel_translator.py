@@ -2,28 +2,46 @@ import openpyxl
 import deepl
 import os
 import io
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
+from utils.upload_buffer import BufferLike, open_buffer_reader
+from utils.translation_cache import TranslationCache
+from utils.deepl_async import AsyncDeepLClient
 
 # ログ設定
 logger = logging.getLogger(__name__)
 
+class TranslationAuthorizationError(Exception):
+    """DeepL APIキーが無効な場合のエラー"""
+
 class ExcelTranslator:
     """
     Excelファイルの翻訳を行うクラス
     セルの結合、フォーマット、構造を保持しながら翻訳を実行
     """
     
-    def __init__(self, deepl_api_key: str):
+    # DeepLに1回で送信するテキスト数
+    batch_size = 50
+    
+    def __init__(self, deepl_api_key: str, translation_cache: Optional[TranslationCache] = None,
+                 server_url: Optional[str] = None, max_concurrency: int = 4):
         """
         翻訳クラスの初期化
         
         Args:
             deepl_api_key: DeepL APIキー
+            translation_cache: 翻訳キャッシュ（複数ファイルで共有する場合に指定）
+            server_url: DeepL APIサーバーのURL（省略時はAPIキーの種類から決定）
+            max_concurrency: 非同期APIで同時に送信するDeepLへのリクエスト数の上限
         """
         self.deepl_api_key = deepl_api_key
-        self.translator = deepl.Translator(deepl_api_key)
+        self.server_url = server_url
+        self.max_concurrency = max_concurrency
+        self.translator = deepl.Translator(deepl_api_key, server_url=server_url)
+        self.translation_cache = translation_cache
         logger.info("ExcelTranslator initialized")
         
     @lru_cache(maxsize=32)
@@ -133,13 +151,13 @@ class ExcelTranslator:
             
         return True
     
-    def translate_excel_file(self, file_data: bytes, context: str = "", 
+    def translate_excel_file(self, file_data: BufferLike, context: str = "", 
                            source_lang: str = "JA", target_lang: str = "EN-US") -> bytes:
         """
         Excelファイルの翻訳を実行
         
         Args:
-            file_data: Excelファイルのバイトデータ
+            file_data: Excelファイルのバイトデータ（bytes、memoryview、mmapなど）
             context: 翻訳文脈
             source_lang: 翻訳元言語
             target_lang: 翻訳先言語
@@ -147,74 +165,265 @@ class ExcelTranslator:
         Returns:
             翻訳後のExcelファイルバイトデータ
         """
+        return self.translate_excel_file_multi(file_data, context, source_lang, [target_lang])[target_lang]
+    
+    def translate_excel_file_multi(self, file_data: BufferLike, context: str = "",
+                                   source_lang: str = "JA",
+                                   target_langs: Optional[List[str]] = None) -> Dict[str, bytes]:
+        """
+        Excelファイルを複数の翻訳先言語に翻訳
+        
+        ワークブックの読み込みと翻訳対象セルの判定は1回だけ行い、
+        重複を除いたテキストを言語ごとに並行して翻訳する。
+        
+        Args:
+            file_data: Excelファイルのバイトデータ（bytes、memoryview、mmapなど）
+            context: 翻訳文脈
+            source_lang: 翻訳元言語
+            target_langs: 翻訳先言語の一覧
+            
+        Returns:
+            翻訳先言語ごとの翻訳後のExcelファイルバイトデータ
+        """
+        target_langs = list(dict.fromkeys(target_langs or ["EN-US"]))
         try:
-            logger.info(f"Starting translation: {source_lang} -> {target_lang}, context: {context}")
+            logger.info(f"Starting translation: {source_lang} -> {', '.join(target_langs)}, context: {context}")
             
-            # バイトデータからワークブックを読み込み
-            workbook = openpyxl.load_workbook(io.BytesIO(file_data))
+            workbook, cells, texts = self._load_translation_cells(file_data, context)
+            unique_texts = list(dict.fromkeys(texts))
+            logger.info(f"Translating {len(unique_texts)} unique texts from {len(cells)} cells")
             
-            # 文脈に応じた前処理ルールを取得
-            replacements = self.get_context_replacements(context)
+            # 言語ごとの翻訳を並行して実行
+            with ThreadPoolExecutor(max_workers=min(len(target_langs), 4)) as executor:
+                futures = {
+                    target_lang: executor.submit(self._translate_texts, unique_texts, source_lang, target_lang)
+                    for target_lang in target_langs
+                }
+                translations = {target_lang: future.result() for target_lang, future in futures.items()}
             
-            total_cells_translated = 0
+            return self._save_translations(workbook, cells, texts, translations)
             
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                logger.info(f"Processing sheet: {sheet_name}")
-                
-                # 翻訳対象のセルとテキストを収集
-                cells_to_translate = []
-                texts_to_translate = []
-                
-                for row in sheet.iter_rows():
-                    for cell in row:
-                        if isinstance(cell.value, str) and cell.value.strip():
-                            # 翻訳対象かどうかを判定
-                            if self.should_translate_text(cell.value):
-                                cells_to_translate.append(cell)
-                                # 前処理を適用
-                                processed_text = self.preprocess_text(cell.value, replacements)
-                                texts_to_translate.append(processed_text)
+        except Exception as e:
+            raise self._translation_error(e)
+    
+    async def translate_excel_file_async(self, file_data: BufferLike, context: str = "",
+                                         source_lang: str = "JA", target_lang: str = "EN-US",
+                                         client: Optional[AsyncDeepLClient] = None) -> bytes:
+        """
+        Excelファイルの翻訳を実行（asyncio版）
+        
+        Args:
+            file_data: Excelファイルのバイトデータ（bytes、memoryview、mmapなど）
+            context: 翻訳文脈
+            source_lang: 翻訳元言語
+            target_lang: 翻訳先言語
+            client: DeepLクライアント（複数の呼び出しで接続を共有する場合に指定）
+            
+        Returns:
+            翻訳後のExcelファイルバイトデータ（translate_excel_file と同じ内容）
+        """
+        outputs = await self.translate_excel_file_multi_async(file_data, context, source_lang, [target_lang], client)
+        return outputs[target_lang]
+    
+    async def translate_excel_file_multi_async(self, file_data: BufferLike, context: str = "",
+                                               source_lang: str = "JA",
+                                               target_langs: Optional[List[str]] = None,
+                                               client: Optional[AsyncDeepLClient] = None) -> Dict[str, bytes]:
+        """
+        Excelファイルを複数の翻訳先言語に翻訳（asyncio版）
+        
+        全言語・全バッチのDeepLへのリクエストを並行して送信し、同時に送信する数は
+        max_concurrency（clientを指定した場合はclientの設定）に制限する。
+        ワークブックの読み込みと保存はイベントループを止めないように別スレッドで行う。
+        タスクがキャンセルされた場合は送信中のリクエストもキャンセルする
+        （実行中のワークブックの読み込み・保存は完了後に破棄する）。
+        
+        Args:
+            file_data: Excelファイルのバイトデータ（bytes、memoryview、mmapなど）
+            context: 翻訳文脈
+            source_lang: 翻訳元言語
+            target_langs: 翻訳先言語の一覧
+            client: DeepLクライアント（省略時は呼び出しごとに作成して終了時に閉じる）
+            
+        Returns:
+            翻訳先言語ごとの翻訳後のExcelファイルバイトデータ
+        """
+        target_langs = list(dict.fromkeys(target_langs or ["EN-US"]))
+        try:
+            logger.info(f"Starting async translation: {source_lang} -> {', '.join(target_langs)}, context: {context}")
+            
+            workbook, cells, texts = await asyncio.to_thread(self._load_translation_cells, file_data, context)
+            unique_texts = list(dict.fromkeys(texts))
+            logger.info(f"Translating {len(unique_texts)} unique texts from {len(cells)} cells")
+            
+            own_client = client is None
+            if own_client:
+                client = AsyncDeepLClient(self.deepl_api_key, self.server_url, self.max_concurrency)
+            try:
+                translations = {}
+                for target_lang in target_langs:
+                    translations[target_lang] = self._get_cached_translations(unique_texts, source_lang, target_lang)
                 
-                # 翻訳対象がある場合のみ翻訳実行
-                if texts_to_translate:
-                    logger.info(f"Translating {len(texts_to_translate)} cells in sheet {sheet_name}")
-                    
-                    # バッチサイズを制限して処理
-                    batch_size = 50
-                    for i in range(0, len(texts_to_translate), batch_size):
-                        batch_texts = texts_to_translate[i:i + batch_size]
-                        batch_cells = cells_to_translate[i:i + batch_size]
-                        
-                        # DeepL APIで翻訳
-                        results = self.translator.translate_text(
-                            batch_texts,
-                            source_lang=source_lang,
-                            target_lang=target_lang
-                        )
-                        
-                        # 翻訳結果をセルに書き戻し
-                        for cell, result in zip(batch_cells, results):
-                            cell.value = result.text
-                            total_cells_translated += 1
+                # 全言語の未翻訳のバッチを並行して送信（いずれかが失敗した場合は残りをキャンセル）
+                try:
+                    async with asyncio.TaskGroup() as group:
+                        for target_lang in target_langs:
+                            pending_texts = [text for text in unique_texts if text not in translations[target_lang]]
+                            for i in range(0, len(pending_texts), self.batch_size):
+                                group.create_task(self._translate_batch_async(
+                                    client, pending_texts[i:i + self.batch_size], source_lang, target_lang,
+                                    translations[target_lang]
+                                ))
+                except ExceptionGroup as group_error:
+                    raise group_error.exceptions[0]
+            finally:
+                if own_client:
+                    await client.aclose()
             
-            logger.info(f"Translation completed: {total_cells_translated} cells translated")
+            return await asyncio.to_thread(self._save_translations, workbook, cells, texts, translations)
+            
+        except Exception as e:
+            raise self._translation_error(e)
+    
+    def _translation_error(self, error: Exception) -> Exception:
+        """翻訳中の例外を利用者向けのメッセージの例外に変換"""
+        if isinstance(error, deepl.exceptions.AuthorizationException):
+            logger.error("DeepL API authorization error")
+            return TranslationAuthorizationError("DeepL APIキーが無効です。")
+        if isinstance(error, deepl.exceptions.QuotaExceededException):
+            logger.error("DeepL API quota exceeded")
+            return Exception("DeepL APIの使用制限に達しました。")
+        logger.error(f"Translation error: {str(error)}")
+        return Exception(f"翻訳処理中にエラーが発生しました: {str(error)}")
+    
+    def _load_translation_cells(self, file_data: BufferLike, context: str) -> Tuple[Any, List[Any], List[str]]:
+        """ワークブックを読み込み、翻訳対象のセルと前処理後のテキストを収集"""
+        # バイトデータからワークブックを読み込み（バッファはコピーしない）
+        with open_buffer_reader(file_data) as reader:
+            workbook = openpyxl.load_workbook(reader)
+        cells, texts = self.collect_translation_cells(workbook, context)
+        return workbook, cells, texts
+    
+    def _save_translations(self, workbook, cells: List[Any], texts: List[str],
+                           translations: Dict[str, Dict[str, str]]) -> Dict[str, bytes]:
+        """
+        言語ごとに翻訳結果をセルに書き戻して保存
+        
+        Args:
+            workbook: openpyxlのワークブック
+            cells: 翻訳対象のセル
+            texts: セルごとの前処理後のテキスト
+            translations: 翻訳先言語ごとのテキストと翻訳結果の対応
+            
+        Returns:
+            翻訳先言語ごとの翻訳後のExcelファイルバイトデータ
+        """
+        original_values = [cell.value for cell in cells]
+        outputs = {}
+        for target_lang, language_translations in translations.items():
+            for cell, original_value, text in zip(cells, original_values, texts):
+                cell.value = language_translations.get(text, original_value)
             
-            # 翻訳後のファイルをバイトデータとして返す
             output = io.BytesIO()
             workbook.save(output)
-            output.seek(0)
-            return output.read()
+            outputs[target_lang] = output.getvalue()
+            logger.info(f"Translation completed for {target_lang}: {len(language_translations)} texts translated")
+        return outputs
+    
+    def collect_unique_texts(self, file_data: BufferLike, context: str = "") -> List[str]:
+        """
+        翻訳対象の前処理後のテキストを重複を除いて取得（翻訳は行わない）
+        
+        Args:
+            file_data: Excelファイルのバイトデータ
+            context: 翻訳文脈
             
-        except deepl.exceptions.AuthorizationError:
-            logger.error("DeepL API authorization error")
-            raise Exception("DeepL APIキーが無効です。")
-        except deepl.exceptions.QuotaExceededException:
-            logger.error("DeepL API quota exceeded")
-            raise Exception("DeepL APIの使用制限に達しました。")
-        except Exception as e:
-            logger.error(f"Translation error: {str(e)}")
-            raise Exception(f"翻訳処理中にエラーが発生しました: {str(e)}")
+        Returns:
+            翻訳対象のテキスト（出現順）
+        """
+        with open_buffer_reader(file_data) as reader:
+            workbook = openpyxl.load_workbook(reader)
+        _, texts = self.collect_translation_cells(workbook, context)
+        return list(dict.fromkeys(texts))
+    
+    def collect_translation_cells(self, workbook, context: str) -> Tuple[List[Any], List[str]]:
+        """
+        翻訳対象のセルと前処理後のテキストを収集
+        
+        Args:
+            workbook: openpyxlのワークブック
+            context: 翻訳文脈
+            
+        Returns:
+            翻訳対象のセルと、セルごとの前処理後のテキスト
+        """
+        # 文脈に応じた前処理ルールを取得
+        replacements = self.get_context_replacements(context)
+        
+        cells = []
+        texts = []
+        for sheet_name in workbook.sheetnames:
+            sheet = workbook[sheet_name]
+            logger.info(f"Processing sheet: {sheet_name}")
+            
+            for row in sheet.iter_rows():
+                for cell in row:
+                    if isinstance(cell.value, str) and cell.value.strip():
+                        # 翻訳対象かどうかを判定
+                        if self.should_translate_text(cell.value):
+                            cells.append(cell)
+                            # 前処理を適用
+                            texts.append(self.preprocess_text(cell.value, replacements))
+        return cells, texts
+    
+    def _translate_texts(self, texts: List[str], source_lang: str, target_lang: str) -> Dict[str, str]:
+        """
+        テキストを1つの翻訳先言語に翻訳
+        
+        Args:
+            texts: 翻訳対象のテキスト（重複なし）
+            source_lang: 翻訳元言語
+            target_lang: 翻訳先言語
+            
+        Returns:
+            テキストと翻訳結果の対応
+        """
+        translations = self._get_cached_translations(texts, source_lang, target_lang)
+        texts = [text for text in texts if text not in translations]
+        
+        # バッチサイズを制限して処理
+        for i in range(0, len(texts), self.batch_size):
+            batch_texts = texts[i:i + self.batch_size]
+            
+            # DeepL APIで翻訳
+            results = self.translator.translate_text(
+                batch_texts,
+                source_lang=source_lang,
+                target_lang=target_lang
+            )
+            
+            self._store_batch(batch_texts, [result.text for result in results], source_lang, target_lang, translations)
+        return translations
+    
+    async def _translate_batch_async(self, client: AsyncDeepLClient, batch_texts: List[str], source_lang: str,
+                                     target_lang: str, translations: Dict[str, str]) -> None:
+        """1バッチのテキストを非同期に翻訳し、結果をtranslationsに追加"""
+        results = await client.translate_texts(batch_texts, source_lang, target_lang)
+        self._store_batch(batch_texts, results, source_lang, target_lang, translations)
+    
+    def _get_cached_translations(self, texts: List[str], source_lang: str, target_lang: str) -> Dict[str, str]:
+        """キャッシュにある原文の翻訳を取得（キャッシュを使用しない場合は空）"""
+        if self.translation_cache is None:
+            return {}
+        return self.translation_cache.get_many(source_lang, target_lang, texts)
+    
+    def _store_batch(self, batch_texts: List[str], results: List[str], source_lang: str, target_lang: str,
+                     translations: Dict[str, str]) -> None:
+        """バッチの翻訳結果をtranslationsとキャッシュに追加"""
+        batch_translations = dict(zip(batch_texts, results))
+        if self.translation_cache is not None:
+            self.translation_cache.put_many(source_lang, target_lang, batch_translations)
+        translations.update(batch_translations)
     
     def _get_translation_context(self, context: str) -> str:
         """
@@ -246,17 +455,18 @@ class ExcelTranslator:
         """
         DeepL APIキーの有効性を検証
         
+        使用状況の取得で検証するため、翻訳の文字数は消費しない。
+        
         Returns:
             APIキーが有効かどうか
         """
         try:
-            # 簡単なテスト翻訳を実行
-            result = self.translator.translate_text("テスト", source_lang="JA", target_lang="EN-US")
-            logger.info(f"API key validation successful: {result.text}")
+            usage = self.translator.get_usage()
+            logger.info(f"API key validation successful: {usage}")
             return True
-        except deepl.exceptions.AuthorizationError:
+        except deepl.exceptions.AuthorizationException:
             logger.error("API key validation failed: Authorization error")
             return False
         except Exception as e:
             logger.error(f"API key validation failed: {str(e)}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,35 @@
+"""
+テスト共通の設定
+"""
+import os
+import pytest
+import app as app_module
+from api import index as api_index
+from utils.result_cache import ResultCache
+from utils.translator_pool import TranslatorPool
+from utils.quota import QuotaCache
+
+
+@pytest.fixture(autouse=True)
+def isolated_translation_storage(tmp_path, monkeypatch):
+    """チェックポイント・結果キャッシュ・マニフェストをテストごとの一時ディレクトリに保存し、翻訳インスタンスのプールを初期化"""
+    monkeypatch.setattr(api_index, 'CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    monkeypatch.setattr(api_index, 'RESULT_CACHE_DIR', str(tmp_path / 'result-cache'))
+    monkeypatch.setattr(api_index, 'MANIFEST_DIR', str(tmp_path / 'manifests'))
+    monkeypatch.setattr(api_index, 'CANCEL_DIR', str(tmp_path / 'cancel'))
+    monkeypatch.setattr(api_index, 'REPORT_DIR', str(tmp_path / 'reports'))
+    monkeypatch.setattr(app_module, 'result_cache', ResultCache(str(tmp_path / 'app-result-cache')))
+    # DeepLの使用状況は取得しない（残り文字数の確認が必要なテストは個別に設定する）
+    monkeypatch.setattr(api_index, '_quota_cache', (os.getpid(), QuotaCache(lambda api_key: None)))
+    monkeypatch.setattr(api_index, '_key_pools', None)
+    monkeypatch.setattr(api_index, '_dispatcher', None)
+    monkeypatch.setattr(api_index, '_scheduler', None)
+    monkeypatch.setattr(api_index, '_admission_controller', None)
+    monkeypatch.setattr(api_index, '_memory_manager', None)
+    monkeypatch.setattr(api_index, '_cancellation_store', None)
+    monkeypatch.delenv('DEEPL_API_KEYS', raising=False)
+    # 翻訳インスタンスとAPIキーの検証結果をテスト間で共有しない
+    monkeypatch.setattr(app_module, 'translator_pool', TranslatorPool(
+        app_module.translator_pool.factory, validation_ttl=app_module.API_KEY_VALIDATION_TTL_SECONDS
+    ))
+    return tmp_path
@@ -0,0 +1,90 @@
+"""
+テスト・ベンチマーク用のDeepL APIのモックサーバー
+
+/v2/translate へのリクエストに対して「翻訳先言語:原文」を返す。
+応答の遅延・同時リクエスト数・接続数を記録できる。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class MockDeepLServer:
+    """ローカルで起動するDeepL APIのモックサーバー"""
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Args:
+            latency: リクエストごとの応答の遅延（秒）
+        """
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self.active_requests = 0
+        self.max_active_requests = 0
+        # 設定すると、次のリクエストからこのステータスコードを返す
+        self.fail_status = None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> 'MockDeepLServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                with server._lock:
+                    server.requests += 1
+                    server.active_requests += 1
+                    server.max_active_requests = max(server.max_active_requests, server.active_requests)
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    if server.fail_status is not None:
+                        self._send(server.fail_status, {'message': 'mock error'})
+                        return
+                    params = parse_qs(body)
+                    target_lang = params.get('target_lang', [''])[0]
+                    translations = [{'detected_source_language': 'JA', 'text': f"{target_lang}:{text}"}
+                                    for text in params.get('text', [])]
+                    self._send(200, {'translations': translations})
+                finally:
+                    with server._lock:
+                        server.active_requests -= 1
+
+            def _send(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,120 @@
+"""
+メモリ使用量の見積もりと受付制御のテストコード
+"""
+import pytest
+import io
+import threading
+import zipfile
+import openpyxl
+import xlwt
+from unittest.mock import patch
+from api import index as api_index
+from utils import admission
+from utils.admission import AdmissionController, AdmissionRejected, estimate_workbook_memory
+
+MB = 1024 * 1024
+
+
+def _xlsx_data(rows):
+    workbook = openpyxl.Workbook()
+    for row in range(rows):
+        workbook.active.append([f"会議{row}", f"報告書{row}", row])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+class TestEstimateWorkbookMemory:
+    """estimate_workbook_memoryのテスト"""
+
+    def test_xlsx(self):
+        """XLSXは展開後のXMLのサイズから見積もり、行数に応じて増えるテスト"""
+        data = _xlsx_data(2000)
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            sheet_size = archive.getinfo('xl/worksheets/sheet1.xml').file_size
+
+        estimate = estimate_workbook_memory(data)
+
+        assert estimate >= admission.BASE_OVERHEAD + sheet_size * admission.XLSX_WORKSHEET_FACTOR
+        assert estimate > estimate_workbook_memory(_xlsx_data(10))
+
+    def test_xls(self):
+        """XLSはファイルサイズから見積もるテスト"""
+        workbook = xlwt.Workbook()
+        workbook.add_sheet('日程').write(0, 0, 'こんにちは')
+        output = io.BytesIO()
+        workbook.save(output)
+        data = output.getvalue()
+
+        assert estimate_workbook_memory(data) == int(admission.BASE_OVERHEAD + len(data) * admission.XLS_FACTOR)
+
+
+class TestAdmissionController:
+    """AdmissionControllerのテスト"""
+
+    def test_reserve_and_reject(self):
+        """予算を超える予約は待機後に拒否し、解放されると受け付けるテスト"""
+        controller = AdmissionController(100 * MB, queue_timeout=0.05)
+        first = controller.reserve(80 * MB)
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            controller.reserve(40 * MB)
+        assert exc_info.value.retry_after >= 1
+
+        # 待機中に解放されれば受け付ける
+        controller.queue_timeout = 5
+        threading.Timer(0.05, first.release, kwargs={'actual_peak': 60 * MB}).start()
+        second = controller.reserve(40 * MB)
+        second.release()
+        second.release()
+
+        stats = controller.stats()
+        assert (stats['admitted'], stats['rejected'], stats['active'], stats['reserved_mb']) == (2, 1, 0, 0)
+        assert stats['actual_to_estimate_avg'] == 0.75
+
+    def test_oversized_request_runs_alone(self):
+        """1件で予算を超えるリクエストは他に予約がない場合のみ受け付けるテスト"""
+        controller = AdmissionController(100 * MB, queue_timeout=0)
+
+        reservation = controller.reserve(500 * MB)
+        with pytest.raises(AdmissionRejected):
+            controller.reserve(1 * MB)
+        reservation.release()
+        controller.reserve(1 * MB).release()
+
+
+class TestApiTranslateAdmission:
+    """/api/translateの受付制御のテスト"""
+
+    @patch('api.index.translate_batch', side_effect=lambda texts, *args, **kwargs: [f"EN:{text}" for text in texts])
+    def test_busy_returns_503(self, mock_translate, monkeypatch):
+        """メモリ予算に空きがない場合は解析せずに503とRetry-Afterを返すテスト"""
+        monkeypatch.setenv('DEEPL_API_KEY', 'test-api-key:fx')
+        monkeypatch.setattr(api_index, 'MEMORY_BUDGET_MB', 64)
+        monkeypatch.setattr(api_index, 'ADMISSION_QUEUE_SECONDS', 0)
+        client = api_index.app.test_client()
+        controller = api_index.get_admission_controller()
+        other_request = controller.reserve(60 * MB)
+
+        with patch('api.index.load_workbook_from_buffer') as mock_load:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(_xlsx_data(10)), 'plan.xlsx'),
+            }, content_type='multipart/form-data')
+        assert response.status_code == 503
+        assert int(response.headers['Retry-After']) >= 1
+        assert response.get_json()['estimated_memory_mb'] > 0
+        assert not mock_load.called
+
+        other_request.release()
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(_xlsx_data(10)), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert float(response.headers['X-Memory-Estimate-MB']) > 0
+        response.get_data()
+        response.close()
+        assert controller.stats()['active'] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
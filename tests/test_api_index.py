@@ -0,0 +1,910 @@
+"""
+API（api/index.py）のテストコード
+"""
+import os
+import pytest
+import io
+import openpyxl
+import json
+import xlrd
+import xlwt
+import socket
+import threading
+import time
+import tracemalloc
+import zipfile
+from unittest.mock import patch
+from api import index as api_index
+
+
+def _fake_translate_batch(texts, target_lang, source_lang, context, api_key, formality=None):
+    """テキストに接頭辞を付けるだけのダミー翻訳"""
+    return [f"EN:{text}" for text in texts]
+
+
+def _fake_translate_batch_by_language(texts, target_lang, source_lang, context, api_key, formality=None):
+    """テキストに翻訳先言語の接頭辞を付けるだけのダミー翻訳"""
+    return [f"{target_lang}:{text}" for text in texts]
+
+
+class TestApiIndex:
+    """API翻訳処理のテスト"""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        """テスト用のFlaskクライアント"""
+        monkeypatch.setenv("DEEPL_API_KEY", "test-api-key:fx")
+        api_index.app.config['TESTING'] = True
+        return api_index.app.test_client()
+
+    @pytest.fixture
+    def sample_xls_data(self):
+        """テスト用のXLSデータ（結合セル・列幅・行高さ付き）"""
+        workbook = xlwt.Workbook()
+        sheet = workbook.add_sheet('日程')
+        sheet.write_merge(0, 0, 0, 1, 'こんにちは')
+        sheet.write(1, 0, 'さようなら')
+        sheet.write(1, 1, 123)
+        sheet.col(0).width = 256 * 30
+        sheet.row(1).height_mismatch = True
+        sheet.row(1).height = 20 * 30
+
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    @pytest.fixture
+    def sample_xlsx_data(self):
+        """テスト用のXLSXデータ"""
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet['A1'] = 'こんにちは'
+        sheet['B1'] = 'さようなら'
+        sheet['A2'] = 100
+
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    def test_convert_xls_to_xlsx(self, sample_xls_data):
+        """XLS→XLSX変換で値・結合セル・列幅・行高さが保持されるテスト"""
+        workbook = api_index.convert_xls_to_xlsx(sample_xls_data)
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+        sheet = openpyxl.load_workbook(output)['日程']
+
+        assert sheet['A1'].value == 'こんにちは'
+        assert sheet['A2'].value == 'さようなら'
+        assert sheet['B2'].value == 123
+        assert 'A1:B1' in [str(r) for r in sheet.merged_cells.ranges]
+        assert sheet.column_dimensions['A'].width == 30
+        assert sheet.row_dimensions[2].height == 30
+
+    def test_convert_xls_to_xlsx_keeps_text_starting_with_equals(self):
+        """「=」で始まる文字列がXLSXで数式にならないテスト"""
+        workbook = xlwt.Workbook()
+        workbook.add_sheet('日程').write(0, 0, '=SUM(A2:A3)')
+        data = io.BytesIO()
+        workbook.save(data)
+
+        output = io.BytesIO()
+        api_index.convert_xls_to_xlsx(data.getvalue()).save(output)
+        output.seek(0)
+        cell = openpyxl.load_workbook(output)['日程']['A1']
+
+        assert cell.value == '=SUM(A2:A3)'
+        assert cell.data_type == 's'
+
+    def test_unified_workbook_from_memoryview(self, sample_xlsx_data):
+        """memoryviewからコピーせずにワークブックを読み込めるテスト"""
+        workbook = api_index.UnifiedWorkbook(memoryview(sample_xlsx_data), 'xlsx')
+        sheet = workbook.get_sheet(workbook.sheetnames[0])
+        assert sheet.cell(1, 1).value == 'こんにちは'
+        assert not hasattr(workbook, 'original_file_data')
+
+    def test_detect_file_format_from_buffer(self, sample_xls_data, sample_xlsx_data):
+        """バッファからのファイル形式検出テスト"""
+        assert api_index.detect_file_format(sample_xlsx_data) == 'xlsx'
+        assert api_index.detect_file_format(memoryview(sample_xls_data)) == 'xls'
+        assert api_index.detect_file_format(b'plain text') == 'unknown'
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_xls_to_xlsx(self, mock_translate, client, sample_xls_data):
+        """XLS入力をXLSXとして出力するモードのテスト"""
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xls_data), 'schedule.xls'),
+            'output_format': 'xlsx',
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert 'schedule_translated.xlsx' in response.headers['Content-Disposition']
+        assert 'X-XLS-Conversion-Seconds' in response.headers
+        assert 'X-XLS-Save-Seconds' not in response.headers
+
+        workbook = openpyxl.load_workbook(io.BytesIO(response.data))
+        sheet = workbook['日程']
+        assert sheet['A1'].value == 'EN:こんにちは'
+        assert sheet['A2'].value == 'EN:さようなら'
+
+    @patch('utils.upload_buffer.UPLOAD_SPOOL_THRESHOLD', 1024)
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_memory_mapped_upload(self, mock_translate, client, sample_xlsx_data):
+        """閾値を超えるアップロードをメモリマップで処理するテスト"""
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        workbook = openpyxl.load_workbook(io.BytesIO(response.data))
+        assert workbook.active['A1'].value == 'EN:こんにちは'
+
+    @patch('utils.upload_buffer.UPLOAD_SPOOL_THRESHOLD', 1024)
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_memory_mapped_xls(self, mock_translate, client, sample_xls_data):
+        """メモリマップしたXLSアップロードの翻訳テスト"""
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xls_data), 'schedule.xls'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert 'schedule_translated.xls' in response.headers['Content-Disposition']
+        # 変換しない場合はxlutilsによる保存の時間を報告する
+        assert float(response.headers['X-XLS-Save-Seconds']) >= 0
+        assert 'X-XLS-Conversion-Seconds' not in response.headers
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_peak_memory(self, mock_translate, client, sample_xlsx_data, monkeypatch):
+        """TRACE_MEMORYで計測したピークメモリを返し、他のリクエストの計測中は返さないテスト"""
+        monkeypatch.setattr(api_index, 'TRACE_MEMORY', True)
+        monkeypatch.setattr(api_index, '_memory_traces', {})
+        was_tracing = tracemalloc.is_tracing()
+        try:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            }, content_type='multipart/form-data')
+            assert response.status_code == 200
+            assert float(response.headers['X-Peak-Memory-MB']) >= 0
+            response.close()
+            assert api_index._memory_traces == {}
+
+            # 計測期間が重なったリクエストはピークを報告しない
+            other = api_index.start_memory_trace()
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            }, content_type='multipart/form-data')
+            assert response.status_code == 200
+            assert 'X-Peak-Memory-MB' not in response.headers
+            assert api_index.get_traced_peak(other) is None
+            response.close()
+            api_index.finish_memory_trace(other)
+            assert api_index._memory_traces == {}
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_xlsx(self, mock_translate, client, sample_xlsx_data):
+        """XLSX翻訳の基本テスト"""
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        workbook = openpyxl.load_workbook(io.BytesIO(response.data))
+        sheet = workbook.active
+        assert sheet['A1'].value == 'EN:こんにちは'
+        assert sheet['B1'].value == 'EN:さようなら'
+        assert sheet['A2'].value == 100
+
+    @pytest.fixture
+    def job_manager(self, tmp_path, monkeypatch):
+        """一時ディレクトリを使用するジョブマネージャー"""
+        monkeypatch.setattr(api_index, 'JOB_STORE_DIR', str(tmp_path / 'jobs'))
+        monkeypatch.setattr(api_index, '_job_manager', None)
+        manager = api_index.get_job_manager()
+        yield manager
+        manager._executor.shutdown(wait=True)
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_jobs_lifecycle(self, mock_translate, client, job_manager, sample_xlsx_data):
+        """ジョブの登録・状態取得・結果取得のテスト"""
+        response = client.post('/api/jobs', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+        assert response.get_json()['status_url'] == f"/api/jobs/{job_id}"
+
+        job_manager._executor.shutdown(wait=True)
+
+        status = client.get(f"/api/jobs/{job_id}").get_json()
+        assert status['status'] == 'completed'
+        assert status['progress']['sheets_completed'] == 1
+        assert status['result_filename'] == 'plan_translated.xlsx'
+
+        result = client.get(status['result_url'])
+        assert result.status_code == 200
+        workbook = openpyxl.load_workbook(io.BytesIO(result.data))
+        assert workbook.active['A1'].value == 'EN:こんにちは'
+
+    def test_api_jobs_unknown_and_pending(self, client, job_manager, sample_xlsx_data):
+        """存在しないジョブと未完了ジョブの結果取得テスト"""
+        assert client.get('/api/jobs/' + 'f' * 32).status_code == 404
+        assert client.get('/api/jobs/../etc').status_code == 404
+
+        job = job_manager.store.create(io.BytesIO(sample_xlsx_data), 'plan.xlsx', {})
+        response = client.get(f"/api/jobs/{job['job_id']}/result")
+        assert response.status_code == 409
+
+    def test_api_job_cancel(self, client, job_manager, monkeypatch):
+        """取り消しを要求したジョブは残りのバッチを送信せず、cancelled として記録されるテスト"""
+        monkeypatch.setattr(api_index, 'CANCEL_POLL_SECONDS', 0)
+        workbook = openpyxl.Workbook()
+        workbook.active['A1'] = '会議'
+        workbook.create_sheet('報告')['A1'] = '報告書'
+        output = io.BytesIO()
+        workbook.save(output)
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_translate(texts, *args, **kwargs):
+            started.set()
+            release.wait(5)
+            return _fake_translate_batch(texts, *args, **kwargs)
+
+        with patch('api.index.translate_batch', side_effect=blocking_translate) as mock_translate:
+            job = client.post('/api/jobs', data={
+                'file': (io.BytesIO(output.getvalue()), 'plan.xlsx'),
+            }, content_type='multipart/form-data').get_json()
+            assert started.wait(5)
+            response = client.post(f"/api/jobs/{job['job_id']}/cancel")
+            assert response.status_code == 202
+            release.set()
+            job_manager._executor.shutdown(wait=True)
+
+        assert mock_translate.call_count == 1
+        status = client.get(job['status_url']).get_json()
+        assert status['status'] == 'cancelled'
+        assert 'result_url' not in status
+        assert client.get(f"/api/jobs/{job['job_id']}/result").status_code == 410
+        # 終了したジョブの取り消し要求は受け付けず、記録も残さない
+        assert client.post(f"/api/jobs/{job['job_id']}/cancel").status_code == 409
+        assert not api_index.get_cancellation_store().is_requested(api_index.get_job_cancel_id(job['job_id']))
+        assert client.post('/api/jobs/' + 'f' * 32 + '/cancel').status_code == 404
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_job_events(self, mock_translate, client, job_manager, sample_xlsx_data):
+        """ジョブの進捗がServer-Sent Eventsで配信されるテスト"""
+        response = client.post('/api/jobs', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+        job = response.get_json()
+        job_manager._executor.shutdown(wait=True)
+
+        events = client.get(job['events_url'])
+        assert events.mimetype == 'text/event-stream'
+        body = events.get_data(as_text=True)
+        assert 'event: open' in body
+        assert 'event: completed' in body
+        assert '"batches_completed": 1' in body
+
+    @patch('api.index.translate_batch')
+    def test_staged_fallback_reports_progress(self, mock_translate, sample_xlsx_data):
+        """バッチ計画・完了・フォールバック呼び出しが記録されるテスト"""
+        mock_translate.side_effect = [Exception("500 Server Error"), ['EN:1'], ['EN:2']]
+        workbook = api_index.UnifiedWorkbook(sample_xlsx_data, 'xlsx')
+        sheet = workbook.get_sheet(workbook.sheetnames[0])
+        _, tasks = api_index.create_cell_mapping(sheet)
+        tracker = api_index.ProgressTracker(sheets_total=1)
+
+        api_index.translate_with_staged_fallback(
+            tasks, sheet, '', 'EN-US', 'JA', 'default', 'key',
+            api_index.get_processing_parameters('standard'), tracker
+        )
+
+        snapshot = tracker.snapshot()
+        assert snapshot['batches_planned'] == 1
+        assert snapshot['batches_completed'] == 1
+        assert snapshot['fallback_calls'] == 2
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_resumes_from_checkpoint(self, mock_translate, client, sample_xlsx_data):
+        """再送信されたファイルは記録済みのバッチを翻訳しないテスト"""
+        for _ in range(2):
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            }, content_type='multipart/form-data')
+            assert response.status_code == 200
+
+        assert mock_translate.call_count == 1
+        workbook = openpyxl.load_workbook(io.BytesIO(response.data))
+        assert workbook.active['A1'].value == 'EN:こんにちは'
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_checkpoint_keyed_by_parameters(self, mock_translate, client, sample_xlsx_data):
+        """翻訳パラメータが異なる場合はチェックポイントを共有しないテスト"""
+        for target_lang in ('EN-US', 'DE'):
+            client.post('/api/translate', data={
+                'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+                'target_lang': target_lang,
+            }, content_type='multipart/form-data')
+
+        assert mock_translate.call_count == 2
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_staged_fallback_skips_checkpointed_batches(self, mock_translate, tmp_path):
+        """チェックポイントに記録済みのバッチのみ再利用されるテスト"""
+        workbook = openpyxl.Workbook()
+        workbook.active.title = 'Sheet'
+        for row in range(1, 5):
+            workbook.active.cell(row=row, column=1, value='テキスト' * 300 + str(row))
+        sheet = api_index.UnifiedWorkbook(workbook, 'xlsx').get_sheet('Sheet')
+        _, tasks = api_index.create_cell_mapping(sheet)
+        params = dict(api_index.get_processing_parameters('standard'), max_chars_per_batch=3000)
+        checkpoint = api_index.CheckpointStore(str(tmp_path)).open('0' * 64)
+
+        def run(tracker):
+            return api_index.translate_with_staged_fallback(
+                tasks, sheet, '', 'EN-US', 'JA', 'default', 'key', params, tracker, checkpoint
+            )
+
+        first = run(api_index.ProgressTracker(sheets_total=1))
+        batch_count = mock_translate.call_count
+        assert batch_count > 1
+
+        # 最後のバッチのみ未完了だった状態を再現
+        lines = open(checkpoint.path, encoding='utf-8').readlines()
+        with open(checkpoint.path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[:-1])
+        checkpoint = api_index.CheckpointStore(str(tmp_path)).open('0' * 64)
+        tracker = api_index.ProgressTracker(sheets_total=1)
+
+        assert run(tracker) == first
+        assert mock_translate.call_count == batch_count + 1
+        assert tracker.snapshot()['batches_resumed'] == batch_count - 1
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_result_cache(self, mock_translate, client, sample_xls_data):
+        """同じファイル・パラメータの再送信では解析・翻訳せずに結果を返すテスト"""
+        def post(output_format):
+            return client.post('/api/translate', data={
+                'file': (io.BytesIO(sample_xls_data), 'schedule.xls'),
+                'output_format': output_format,
+            }, content_type='multipart/form-data')
+
+        first = post('xlsx')
+        first_data = first.data
+        with patch('api.index.load_workbook_from_buffer') as mock_load:
+            second = post('xlsx')
+            assert not mock_load.called
+
+        assert first.headers['X-Result-Cache'] == 'MISS'
+        assert second.headers['X-Result-Cache'] == 'HIT'
+        assert second.data == first_data
+        assert 'schedule_translated.xlsx' in second.headers['Content-Disposition']
+        assert mock_translate.call_count == 1
+
+        # 出力形式が異なる場合は別の結果
+        third = post('original')
+        assert third.headers['X-Result-Cache'] == 'MISS'
+        assert 'schedule_translated.xls' in third.headers['Content-Disposition']
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_incremental(self, mock_translate, client):
+        """前回の翻訳のマニフェストを参照し、変更されたセルのみ翻訳するテスト"""
+        def workbook_data(rows):
+            workbook = openpyxl.Workbook()
+            for row in rows:
+                workbook.active.append(row)
+            output = io.BytesIO()
+            workbook.save(output)
+            return output.getvalue()
+
+        def post(data, **form):
+            return client.post('/api/translate', data=dict(form, file=(io.BytesIO(data), 'plan.xlsx')),
+                               content_type='multipart/form-data')
+
+        first = post(workbook_data([['会議', '昼食'], ['報告', '出張']]))
+        manifest_id = first.headers['X-Translation-Manifest']
+
+        # 行を挿入・移動し、1つのセルを変更した改訂版
+        mock_translate.reset_mock()
+        second = post(workbook_data([['休暇', '会議'], ['出張', '報告'], ['昼食', None]]),
+                      reference_manifest=manifest_id)
+
+        assert second.status_code == 200
+        translated_texts = [text for call in mock_translate.call_args_list for text in call.args[0]]
+        assert translated_texts == ['休暇']
+        assert second.headers['X-Cells-Reused'] == '4/5'
+        assert second.headers['X-Cells-Reused-Ratio'] == '0.8000'
+        assert second.headers['X-Translation-Manifest'] != manifest_id
+
+        sheet = openpyxl.load_workbook(io.BytesIO(second.data)).active
+        assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [
+            ['EN:休暇', 'EN:会議'], ['EN:出張', 'EN:報告'], ['EN:昼食', None]
+        ]
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_deduplicates_texts(self, mock_translate, client):
+        """同じ原文のセルは1回だけ翻訳されるテスト"""
+        workbook = openpyxl.Workbook()
+        for row in (['会議', '会議'], ['報告', '会議']):
+            workbook.active.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(output.getvalue()), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+
+        translated_texts = [text for call in mock_translate.call_args_list for text in call.args[0]]
+        assert sorted(translated_texts) == ['会議', '報告']
+        sheet = openpyxl.load_workbook(io.BytesIO(response.data)).active
+        assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [
+            ['EN:会議', 'EN:会議'], ['EN:報告', 'EN:会議']
+        ]
+
+    def test_api_translate_overlaps_sheets(self, client):
+        """次のシートの走査が前のシートの翻訳と並行して行われるテスト"""
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['会議', '報告'])
+        workbook.create_sheet('Second').append(['出張', '休暇'])
+        output = io.BytesIO()
+        workbook.save(output)
+
+        scanned_titles = []
+        second_scanned = threading.Event()
+        create_cell_mapping = api_index.create_cell_mapping
+
+        def scan(sheet):
+            scanned_titles.append(sheet.title)
+            if sheet.title == 'Second':
+                second_scanned.set()
+            return create_cell_mapping(sheet)
+
+        def translate(texts, *args, **kwargs):
+            # 最初のシートの翻訳中に次のシートが走査されるまで待つ
+            if '会議' in texts:
+                assert second_scanned.wait(timeout=5)
+            return _fake_translate_batch(texts, *args, **kwargs)
+
+        with patch('api.index.create_cell_mapping', side_effect=scan), \
+                patch('api.index.translate_batch', side_effect=translate):
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(output.getvalue()), 'plan.xlsx'),
+            }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert scanned_titles == ['Sheet', 'Second']
+        translated = openpyxl.load_workbook(io.BytesIO(response.data))
+        assert [[cell.value for cell in row] for row in translated['Sheet'].iter_rows()] == [['EN:会議', 'EN:報告']]
+        assert [[cell.value for cell in row] for row in translated['Second'].iter_rows()] == [['EN:出張', 'EN:休暇']]
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch_by_language)
+    def test_api_translate_multiple_languages(self, mock_translate, client, sample_xlsx_data):
+        """複数の翻訳先言語を指定すると言語ごとのファイルをZIPで返すテスト"""
+        with patch('api.index.create_cell_mapping', wraps=api_index.create_cell_mapping) as mock_scan:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+                'target_lang': ['EN-US', 'zh, ko', 'EN-US'],
+            }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/zip'
+        assert response.headers['X-Target-Languages'] == 'EN-US,ZH,KO'
+        assert 'plan_translated.zip' in response.headers['Content-Disposition']
+        # シートの走査は言語数に関係なく1回
+        assert mock_scan.call_count == 1
+        assert sorted(call.args[1] for call in mock_translate.call_args_list) == ['EN-US', 'KO', 'ZH']
+
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        report = json.loads(archive.read('report.json'))['languages']
+        for target_lang in ('EN-US', 'ZH', 'KO'):
+            entry = report[target_lang]
+            assert entry['filename'] == f"plan_translated_{target_lang}.xlsx"
+            assert entry['cells_translated'] == 2
+            assert entry['manifest_id']
+            sheet = openpyxl.load_workbook(io.BytesIO(archive.read(entry['filename']))).active
+            assert sheet['A1'].value == f"{target_lang}:こんにちは"
+            assert sheet['B1'].value == f"{target_lang}:さようなら"
+            assert sheet['A2'].value == 100
+
+        # 1言語の翻訳とチェックポイントを共有する
+        mock_translate.reset_mock()
+        single = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            'target_lang': 'ZH',
+        }, content_type='multipart/form-data')
+        assert not mock_translate.called
+        assert openpyxl.load_workbook(io.BytesIO(single.data)).active['A1'].value == 'ZH:こんにちは'
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch_by_language)
+    def test_api_translate_multiple_languages_xls(self, mock_translate, client, sample_xls_data):
+        """XLSの複数言語翻訳で言語ごとに翻訳が入れ替わるテスト"""
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xls_data), 'schedule.xls'),
+            'target_lang': 'EN-US,DE',
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        for target_lang in ('EN-US', 'DE'):
+            book = xlrd.open_workbook(file_contents=archive.read(f"schedule_translated_{target_lang}.xls"))
+            sheet = book.sheet_by_index(0)
+            assert sheet.cell_value(0, 0) == f"{target_lang}:こんにちは"
+            assert sheet.cell_value(1, 0) == f"{target_lang}:さようなら"
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch_by_language)
+    def test_api_jobs_multiple_languages(self, mock_translate, client, job_manager, sample_xlsx_data):
+        """複数言語のジョブの結果がZIPと言語ごとの結果として返されるテスト"""
+        response = client.post('/api/jobs', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            'target_lang': 'EN-US,KO',
+        }, content_type='multipart/form-data')
+        job_id = response.get_json()['job_id']
+        job_manager._executor.shutdown(wait=True)
+
+        status = client.get(f"/api/jobs/{job_id}").get_json()
+        assert status['status'] == 'completed'
+        assert status['result_filename'] == 'plan_translated.zip'
+        assert set(status['languages']) == {'EN-US', 'KO'}
+        assert status['progress']['sheets_completed'] == 2
+
+        result = client.get(status['result_url'])
+        archive = zipfile.ZipFile(io.BytesIO(result.data))
+        sheet = openpyxl.load_workbook(io.BytesIO(archive.read('plan_translated_KO.xlsx'))).active
+        assert sheet['A1'].value == 'KO:こんにちは'
+
+    @pytest.fixture
+    def batch_pool(self, monkeypatch):
+        """一括翻訳のプロセスプール（テスト終了時に停止）"""
+        monkeypatch.setattr(api_index, 'BATCH_PROCESS_WORKERS', 2)
+        monkeypatch.setattr(api_index, '_batch_pool', None)
+        yield
+        if api_index._batch_pool is not None:
+            api_index._batch_pool[1].shutdown(wait=True)
+
+    @staticmethod
+    def _workbook_data(rows, title='Sheet'):
+        """行の一覧からXLSXデータを作成"""
+        workbook = openpyxl.Workbook()
+        workbook.active.title = title
+        for row in rows:
+            workbook.active.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_batch(self, mock_translate, client, job_manager, batch_pool, sample_xls_data):
+        """複数ファイル・ZIPの一括翻訳ジョブで、ファイルをまたいで重複を除いて翻訳するテスト"""
+        march = self._workbook_data([['会議', '報告'], ['出張', '休暇'], ['予算', None]])
+        april = self._workbook_data([['会議', '報告'], ['出張', '休暇'], ['決算', '予算']])
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('2024/april.xlsx', april)
+            zf.writestr('2024/broken.xlsx', b'not a workbook')
+            zf.writestr('readme.txt', b'ignored')
+
+        response = client.post('/api/batch', data={
+            'file': [(io.BytesIO(march), 'march.xlsx'), (io.BytesIO(archive.getvalue()), 'month.zip'),
+                     (io.BytesIO(sample_xls_data), 'schedule.xls')],
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 202
+        job_manager._executor.shutdown(wait=True)
+        status = client.get(response.get_json()['status_url']).get_json()
+        assert status['status'] == 'completed'
+        assert status['result_filename'] == 'translated_batch.zip'
+        assert status['batch']['files_total'] == 4
+        assert status['batch']['files_failed'] == 1
+        assert not status['batch']['incomplete']
+        assert api_index._batch_pool is not None
+        # 同じ文脈（シート名・ヘッダー）の原文はファイルをまたいで1回だけ翻訳
+        translated_texts = [text for call in mock_translate.call_args_list for text in call.args[0]]
+        assert sorted(translated_texts) == sorted(['会議', '報告', '出張', '休暇', '予算', '決算', 'こんにちは', 'さようなら'])
+
+        result = client.get(status['result_url'])
+        assert result.mimetype == 'application/zip'
+        result = zipfile.ZipFile(io.BytesIO(result.data))
+        report = json.loads(result.read('report.json'))
+        assert [entry['status'] for entry in report['files']] == ['completed', 'completed', 'failed', 'completed']
+        assert report['files'][2]['filename'] == '2024/broken.xlsx'
+        assert report['files'][2]['error']
+        assert report['skipped'] == ['readme.txt']
+        assert report['summary']['files_completed'] == 3
+        assert report['summary']['cells_to_translate'] == 13
+
+        sheet = openpyxl.load_workbook(io.BytesIO(result.read('2024/april_translated.xlsx'))).active
+        assert [[cell.value for cell in row] for row in sheet.iter_rows()] == [
+            ['EN:会議', 'EN:報告'], ['EN:出張', 'EN:休暇'], ['EN:決算', 'EN:予算']
+        ]
+        assert openpyxl.load_workbook(io.BytesIO(result.read('march_translated.xlsx'))).active['A3'].value == 'EN:予算'
+        book = xlrd.open_workbook(file_contents=result.read('schedule_translated.xls'))
+        assert book.sheet_by_index(0).cell_value(0, 0) == 'EN:こんにちは'
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_batch_errors(self, mock_translate, client, job_manager, monkeypatch):
+        """一括翻訳の入力エラーのテスト（登録できない入力はジョブを残さない）"""
+        monkeypatch.setattr(api_index, 'BATCH_PROCESS_WORKERS', 0)
+        monkeypatch.setattr(api_index, 'BATCH_MAX_FILES', 1)
+
+        def post(files, **form):
+            return client.post('/api/batch', data=dict(form, file=files), content_type='multipart/form-data')
+
+        data = self._workbook_data([['会議']])
+        assert post([]).status_code == 400
+        assert post([(io.BytesIO(b'text'), 'notes.txt')]).status_code == 400
+        assert post([(io.BytesIO(b'not a zip'), 'month.zip')]).status_code == 400
+        assert post([(io.BytesIO(data), 'a.xlsx'), (io.BytesIO(data), 'b.xlsx')]).status_code == 413
+        assert post([(io.BytesIO(data), 'a.xlsx')], target_lang='EN-US,DE').status_code == 400
+        assert job_manager.store.list_job_ids() == []
+
+        # 翻訳できるファイルがない場合はジョブが失敗する
+        broken = post([(io.BytesIO(b'broken'), 'a.xlsx')])
+        assert broken.status_code == 202
+        completed = post([(io.BytesIO(data), 'a.xlsx')])
+        assert completed.status_code == 202
+        job_manager._executor.shutdown(wait=True)
+        status = client.get(broken.get_json()['status_url']).get_json()
+        assert status['status'] == 'failed'
+        assert status['error'] == 'No files could be translated'
+        assert client.get(completed.get_json()['status_url']).get_json()['status'] == 'completed'
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_batch_deadline(self, mock_translate, client, job_manager, monkeypatch):
+        """一括翻訳ジョブが処理期限に達した場合、未翻訳のセル数をレポートに記録するテスト"""
+        monkeypatch.setattr(api_index, 'BATCH_PROCESS_WORKERS', 0)
+        # 1文字あたり1秒の見積もりでは期限内に送信できるバッチがない
+        monkeypatch.setattr(api_index, 'DEADLINE_SECONDS_PER_CHAR', 1.0)
+        data = self._workbook_data([['会議', '報告']])
+
+        response = client.post('/api/batch', data={
+            'file': [(io.BytesIO(data), 'a.xlsx')],
+            'deadline_seconds': '1',
+        }, content_type='multipart/form-data')
+        assert response.status_code == 202
+        job_manager._executor.shutdown(wait=True)
+
+        status = client.get(response.get_json()['status_url']).get_json()
+        assert status['status'] == 'completed'
+        assert status['batch']['incomplete']
+        assert mock_translate.call_count == 0
+        report = json.loads(zipfile.ZipFile(io.BytesIO(client.get(status['result_url']).data)).read('report.json'))
+        assert report['files'][0]['cells_untranslated'] == 2
+
+    def test_api_translate_reference_manifest_errors(self, client, sample_xlsx_data):
+        """参照マニフェストが存在しない・パラメータが異なる場合のエラーテスト"""
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            'reference_manifest': '0' * 32,
+        }, content_type='multipart/form-data')
+        assert response.status_code == 404
+
+        manifest_id = api_index.save_manifest(api_index.create_manifest(
+            {'source_lang': 'JA', 'target_lang': 'DE', 'context': '', 'formality': 'default'}
+        ))
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            'reference_manifest': manifest_id,
+        }, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+        # 複数言語の翻訳では参照マニフェストを使用できない
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(sample_xlsx_data), 'plan.xlsx'),
+            'target_lang': 'EN-US,DE',
+            'reference_manifest': manifest_id,
+        }, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_quota_preflight(self, mock_translate, client, monkeypatch):
+        """送信する文字数がDeepLの残り文字数を超える場合は翻訳せずに拒否するテスト"""
+        usage = {'character_count': 995, 'character_limit': 1000}
+        monkeypatch.setattr(api_index, '_quota_cache', (os.getpid(), api_index.QuotaCache(lambda api_key: usage)))
+        # 送信する文字数は重複を除いた「会議」「報告書を作成」の8文字
+        data = self._workbook_data([['会議', '会議'], ['報告書を作成', '会議'], ['123', None]])
+
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 402
+        assert response.get_json()['billable_characters'] == 8
+        assert response.get_json()['remaining_quota'] == 5
+        assert not mock_translate.called
+
+        # 残り文字数が十分な場合は翻訳する（送信した文字数はキーのプールが差し引く）
+        usage['character_count'] = 0
+        api_index.get_quota_cache().invalidate('test-api-key:fx')
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'),
+        }, content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert response.headers['X-Billable-Characters'] == '8'
+        assert response.headers['X-Characters-Sent'] == '8'
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_character_budget_trim(self, mock_translate, client):
+        """リクエストの文字数の上限を超えるバッチは送信せず、上限内のセルのみ翻訳するテスト"""
+        data = self._workbook_data([['会議', '報告書を作成']])
+        form = {'max_characters': '5', 'on_quota_exceeded': 'trim'}
+
+        response = client.post('/api/translate', data=dict(form, file=(io.BytesIO(data), 'plan.xlsx')),
+                               content_type='multipart/form-data')
+
+        assert response.status_code == 200
+        assert response.headers['X-Character-Limit'] == '5'
+        assert response.headers['X-Characters-Sent'] == '2'
+        assert response.headers['X-Character-Limit-Reached'] == 'true'
+        sheet = openpyxl.load_workbook(io.BytesIO(response.data)).active
+        assert [cell.value for cell in sheet[1]] == ['EN:会議', '報告書を作成']
+        sent_texts = [text for call in mock_translate.call_args_list for text in call.args[0]]
+        assert '報告書を作成' not in sent_texts
+
+        # 一部を原文のまま残した結果はキャッシュしない
+        response = client.post('/api/translate', data=dict(form, file=(io.BytesIO(data), 'plan.xlsx')),
+                               content_type='multipart/form-data')
+        assert response.headers['X-Result-Cache'] == 'MISS'
+
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'), 'max_characters': 'many',
+        }, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_schedule_ticket(self, mock_translate, client, monkeypatch):
+        """送信枠をクライアントとファイルの処理戦略ごとに割り当て、待機状況を集計するテスト"""
+        monkeypatch.setattr(api_index, 'TRUST_CLIENT_ID_HEADER', True)
+        tickets = []
+        original_slot = api_index.FairScheduler.slot
+
+        def record_slot(scheduler, ticket=None):
+            tickets.append(ticket)
+            return original_slot(scheduler, ticket)
+
+        data = self._workbook_data([['会議', '報告書を作成']])
+        with patch.object(api_index.FairScheduler, 'slot', record_slot):
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(data), 'plan.xlsx'),
+            }, content_type='multipart/form-data', headers={'X-Client-Id': 'team-a'})
+
+        assert response.status_code == 200
+        assert [(ticket.client_id, ticket.priority_class) for ticket in tickets] == [('team-a', 'fast')]
+        stats = client.get('/health').get_json()['scheduler']
+        assert stats['fast']['granted'] == 1
+        assert stats['fast']['queued'] == 0
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_client_behind_proxy(self, mock_translate, client, monkeypatch):
+        """同じプロキシを経由するクライアントを X-Forwarded-For の接続元アドレスで区別し、X-Client-Id は信頼しないテスト"""
+        monkeypatch.setattr(api_index.app.wsgi_app, 'x_for', 1)
+        tickets = []
+        original_slot = api_index.FairScheduler.slot
+
+        def record_slot(scheduler, ticket=None):
+            tickets.append(ticket)
+            return original_slot(scheduler, ticket)
+
+        requests_by_client = [('203.0.113.10', 'spoofed-1'), ('203.0.113.20', 'spoofed-2'), ('203.0.113.10', 'spoofed-3')]
+        with patch.object(api_index.FairScheduler, 'slot', record_slot):
+            for index, (address, client_id) in enumerate(requests_by_client):
+                # 結果キャッシュを使わないよう内容の異なるファイルを送信する
+                data = self._workbook_data([[f'会議{index}']])
+                response = client.post('/api/translate', data={
+                    'file': (io.BytesIO(data), 'plan.xlsx'),
+                }, content_type='multipart/form-data', headers={
+                    'X-Forwarded-For': address, 'X-Client-Id': client_id
+                }, environ_base={'REMOTE_ADDR': '10.0.0.2'})
+                assert response.status_code == 200
+
+        assert [ticket.client_id for ticket in tickets] == ['203.0.113.10', '203.0.113.20', '203.0.113.10']
+
+    def test_api_translate_deadline(self, client):
+        """処理期限に達した場合は残りのバッチを送信せず、翻訳済みの部分と未翻訳のセルのレポートを返すテスト"""
+        workbook = openpyxl.Workbook()
+        workbook.active.title = '予定'
+        workbook.active['A1'] = '会議'
+        workbook.create_sheet('報告')['B2'] = '報告書'
+        output = io.BytesIO()
+        workbook.save(output)
+        data = output.getvalue()
+
+        def slow_translate(texts, *args, **kwargs):
+            time.sleep(0.2)
+            return _fake_translate_batch(texts, *args, **kwargs)
+
+        with patch('api.index.translate_batch', side_effect=slow_translate) as mock_translate:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(data), 'plan.xlsx'), 'deadline_seconds': '0.1',
+            }, content_type='multipart/form-data')
+
+        # 本文は翻訳済みの部分を適用したワークブックのまま返し、レポートは別に取得する
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        assert response.headers['X-Translation-Incomplete'] == 'deadline'
+        assert response.headers['X-Untranslated-Cells'] == '1'
+        assert [call.args[0] for call in mock_translate.call_args_list] == [['会議']]
+        translated = openpyxl.load_workbook(io.BytesIO(response.data))
+        assert translated['予定']['A1'].value == 'EN:会議'
+        assert translated['報告']['B2'].value == '報告書'
+        report = client.get(response.headers['X-Untranslated-Report']).get_json()
+        assert report['incomplete'] is True
+        assert report['languages'] == {'EN-US': [{'sheet': '報告', 'cells': [{'cell': 'B2', 'text': '報告書'}]}]}
+        assert client.get('/api/translate/reports/' + '0' * 32).status_code == 404
+
+        # Accept に application/zip を指定した場合はワークブックとレポートをZIPにまとめて返す
+        # （送信実績がない最初のバッチも仮定の速度で見積もり、期限内に完了しない場合は送信しない）
+        with patch('api.index.DEADLINE_SECONDS_PER_CHAR', 1.0), \
+                patch('api.index.translate_batch', side_effect=slow_translate) as mock_translate:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(data), 'plan.xlsx'), 'deadline_seconds': '0.1',
+            }, content_type='multipart/form-data', headers={'Accept': 'application/zip'})
+
+        assert response.headers['X-Translation-Incomplete'] == 'deadline'
+        assert mock_translate.call_count == 0
+        assert 'plan_partial.zip' in response.headers['Content-Disposition']
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            assert sorted(archive.namelist()) == ['plan_translated.xlsx', 'untranslated.json']
+            assert json.loads(archive.read('untranslated.json'))['languages'] == report['languages']
+
+        # 再度送信すると完了したバッチはチェックポイントから再利用し、残りのセルのみ翻訳する
+        with patch('api.index.translate_batch', side_effect=_fake_translate_batch) as mock_translate:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(data), 'plan.xlsx'),
+            }, content_type='multipart/form-data')
+
+        assert 'X-Translation-Incomplete' not in response.headers
+        assert [call.args[0] for call in mock_translate.call_args_list] == [['報告書']]
+        translated = openpyxl.load_workbook(io.BytesIO(response.data))
+        assert translated['報告']['B2'].value == 'EN:報告書'
+
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'), 'deadline_seconds': 'soon',
+        }, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+    @patch('api.index.translate_batch', side_effect=_fake_translate_batch)
+    def test_api_translate_cancel(self, mock_translate, client):
+        """取り消しを要求したリクエストはDeepLに送信せずに中止するテスト"""
+        data = self._workbook_data([['会議', '報告書を作成']])
+
+        response = client.post('/api/translate/req-1/cancel')
+        assert response.status_code == 202
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'),
+        }, content_type='multipart/form-data', headers={'X-Request-Id': 'req-1'})
+
+        assert response.status_code == 499
+        assert response.get_json()['reason'] == 'cancel requested'
+        assert mock_translate.call_count == 0
+
+        # リクエストの終了時に取り消し要求は削除される
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'),
+        }, content_type='multipart/form-data', headers={'X-Request-Id': 'req-1'})
+        assert response.status_code == 200
+        assert response.headers['X-Request-Id'] == 'req-1'
+
+        # クライアントの切断を検出した場合も中止する
+        server, peer = socket.socketpair()
+        peer.close()
+        try:
+            response = client.post('/api/translate', data={
+                'file': (io.BytesIO(data), 'plan.xlsx'), 'target_lang': 'DE',
+            }, content_type='multipart/form-data', environ_overrides={'werkzeug.socket': server})
+        finally:
+            server.close()
+        assert response.status_code == 499
+        assert response.get_json()['reason'] == 'client disconnected'
+        assert mock_translate.call_count == 1
+
+        assert client.post('/api/translate/..%2Fjobs/cancel').status_code in (400, 404)
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(data), 'plan.xlsx'),
+        }, content_type='multipart/form-data', headers={'X-Request-Id': 'a' * 65})
+        assert response.status_code == 400
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,92 @@
+"""
+一括翻訳の入力展開・結果ZIP作成のテストコード
+"""
+import pytest
+import io
+import json
+import os
+import zipfile
+from utils.batch_archive import (
+    BatchInputCollector, BatchLimitError, normalize_member_name, unique_entry_name, write_batch_archive
+)
+
+
+def _zip_data(members):
+    """メンバー名と内容の辞書からZIPデータを作成"""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return output.getvalue()
+
+
+class TestBatchArchive:
+    """BatchInputCollector・write_batch_archiveのテスト"""
+
+    def test_normalize_member_name(self):
+        """Excel以外・作業ディレクトリ外・macOSメタデータを除外するテスト"""
+        assert normalize_member_name('2024/03/plan.xlsx') == '2024/03/plan.xlsx'
+        assert normalize_member_name('.\\\\sub\\\\old.XLS') == 'sub/old.XLS'
+        assert normalize_member_name('../plan.xlsx') is None
+        assert normalize_member_name('/etc/../../plan.xlsx') is None
+        assert normalize_member_name('__MACOSX/._plan.xlsx') is None
+        assert normalize_member_name('notes.txt') is None
+
+    def test_unique_entry_name(self):
+        """重複するエントリ名に連番が付くテスト"""
+        used = set()
+        assert unique_entry_name('a/plan.xlsx', used) == 'a/plan.xlsx'
+        assert unique_entry_name('a/plan.xlsx', used) == 'a/plan (2).xlsx'
+        assert unique_entry_name('a/plan.xlsx', used) == 'a/plan (3).xlsx'
+
+    def test_collect_files_and_archive(self, tmp_path):
+        """ファイルとZIP内のExcelファイルが保存されるテスト"""
+        collector = BatchInputCollector(str(tmp_path))
+        collector.add(io.BytesIO(b'xlsx-data'), 'plan.xlsx')
+        collector.add(io.BytesIO(_zip_data({
+            'march/a.xlsx': b'a-data',
+            'march/b.xls': b'b-data',
+            'readme.txt': b'ignored',
+        })), 'month.zip')
+        collector.add(io.BytesIO(b'ignored'), 'notes.csv')
+
+        assert [batch_input.name for batch_input in collector.inputs] == ['plan.xlsx', 'march/a.xlsx', 'march/b.xls']
+        assert open(collector.inputs[2].path, 'rb').read() == b'b-data'
+        assert collector.inputs[2].path.endswith('.xls')
+        assert collector.skipped == ['readme.txt', 'notes.csv']
+        assert collector.total_bytes == len(b'xlsx-data') + len(b'a-data') + len(b'b-data')
+
+    def test_limits(self, tmp_path):
+        """ファイル数・展開後の合計サイズの上限を超えるとエラーになるテスト"""
+        collector = BatchInputCollector(str(tmp_path), max_files=1)
+        collector.add(io.BytesIO(b'data'), 'a.xlsx')
+        with pytest.raises(BatchLimitError):
+            collector.add(io.BytesIO(b'data'), 'b.xlsx')
+
+        # 圧縮率の高いZIPも実際の展開サイズで制限する
+        collector = BatchInputCollector(str(tmp_path), max_bytes=1024 * 1024)
+        with pytest.raises(BatchLimitError):
+            collector.add(io.BytesIO(_zip_data({'big.xlsx': b'\0' * (4 * 1024 * 1024)})), 'bomb.zip')
+
+    def test_invalid_archive(self, tmp_path):
+        """ZIPとして読み込めない場合のテスト"""
+        with pytest.raises(zipfile.BadZipFile):
+            BatchInputCollector(str(tmp_path)).add(io.BytesIO(b'not a zip'), 'month.zip')
+
+    def test_write_batch_archive(self, tmp_path):
+        """結果ファイルとレポートがZIPに書き出されるテスト"""
+        output_path = tmp_path / 'output.xlsx'
+        output_path.write_bytes(b'translated')
+        archive_path = str(tmp_path / 'result.zip')
+
+        write_batch_archive(archive_path, [{'name': 'a/plan_translated.xlsx', 'path': str(output_path)}],
+                            {'summary': {'files_total': 1}})
+
+        with zipfile.ZipFile(archive_path) as archive:
+            assert archive.read('a/plan_translated.xlsx') == b'translated'
+            assert archive.getinfo('a/plan_translated.xlsx').compress_type == zipfile.ZIP_STORED
+            assert json.loads(archive.read('report.json')) == {'summary': {'files_total': 1}}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,173 @@
+"""
+リクエストをまたいだバッチの結合のテストコード
+"""
+import pytest
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest.mock import patch
+from api import index as api_index
+from utils.batch_dispatcher import BatchDispatcher
+from utils.cancellation import CancellationToken, TranslationCancelled
+
+
+class _RecordingSender:
+    """送信したバッチを記録し、release が設定されるまで応答を待つ送信関数"""
+
+    def __init__(self, fail=False):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def __call__(self, texts, key):
+        with self._lock:
+            self.batches.append((list(texts), key))
+        self.release.wait(5)
+        if self.fail:
+            raise Exception("DeepL API error: 503 - unavailable")
+        return [f"{key}:{text}" for text in texts]
+
+
+class TestBatchDispatcher:
+    """BatchDispatcherのテスト"""
+
+    def test_merge_concurrent_batches(self):
+        """待機時間内に届いた同じキーのバッチを1つにまとめ、結果をそれぞれに返すテスト"""
+        sender = _RecordingSender()
+        dispatcher = BatchDispatcher(sender, linger_seconds=0.2)
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(dispatcher.translate, texts, key)
+                       for texts, key in ((['会議'], 'EN'), (['報告書', '資料'], 'EN'), (['会議'], 'DE'))]
+            results = [future.result() for future in futures]
+
+        assert results == [['EN:会議'], ['EN:報告書', 'EN:資料'], ['DE:会議']]
+        assert sorted(sorted(texts) for texts, key in sender.batches if key == 'EN') == [['会議', '報告書', '資料']]
+        assert len(sender.batches) == 2
+        assert dispatcher.stats()['batches_merged'] == 1
+
+    def test_coalesce_in_flight_texts(self):
+        """送信中のテキストは再送信せず、同じ翻訳結果を共有するテスト"""
+        sender = _RecordingSender()
+        sender.release.clear()
+        dispatcher = BatchDispatcher(sender, linger_seconds=0)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(dispatcher.translate, ['会議', '会議'], 'EN')
+            while not sender.batches:
+                threading.Event().wait(0.01)
+            second = executor.submit(dispatcher.translate, ['会議', '報告書'], 'EN')
+            threading.Event().wait(0.05)
+            sender.release.set()
+
+            assert first.result() == ['EN:会議', 'EN:会議']
+            assert second.result() == ['EN:会議', 'EN:報告書']
+
+        assert [texts for texts, key in sender.batches] == [['会議'], ['報告書']]
+        assert dispatcher.stats()['texts_coalesced'] == 2
+
+    def test_large_batch_and_errors(self):
+        """上限を超えるバッチは待たずに送信し、送信のエラーは待機中のすべての呼び出し元に送出するテスト"""
+        sender = _RecordingSender(fail=True)
+        dispatcher = BatchDispatcher(sender, linger_seconds=10, max_batch_chars=3)
+
+        with pytest.raises(Exception, match='503'):
+            dispatcher.translate(['報告書を作成'], 'EN')
+
+        # 失敗したテキストは共有せずに送信し直す
+        sender.fail = False
+        assert dispatcher.translate(['報告書を作成'], 'EN') == ['EN:報告書を作成']
+        assert len(sender.batches) == 2
+
+    def test_cancelled_request_texts_not_sent(self):
+        """取り消されたリクエストは翻訳結果を待たず、そのリクエストのみのテキストは送信しないテスト"""
+        sender = _RecordingSender()
+        dispatcher = BatchDispatcher(sender, linger_seconds=0.3)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(dispatcher.translate, ['会議'], 'EN')
+            while 'EN' not in dispatcher._open:
+                time.sleep(0.005)
+            cancellation = CancellationToken(poll_interval=0.01)
+            cancellation.cancel('cancel requested')
+            with pytest.raises(TranslationCancelled):
+                dispatcher.translate(['資料'], 'EN', cancellation)
+            assert leader.result(5) == ['EN:会議']
+
+        assert [texts for texts, _ in sender.batches] == [['会議']]
+        assert dispatcher.stats()['texts_cancelled'] == 1
+
+    def test_only_leader_takes_slot(self):
+        """送信枠はバッチを開いた呼び出し元のみが送信時に確保し、結合したリクエストは使わないテスト"""
+        sender = _RecordingSender()
+        slots = []
+        active = []
+
+        @contextmanager
+        def slot(ticket):
+            slots.append(ticket)
+            active.append(ticket)
+            try:
+                yield
+            finally:
+                active.remove(ticket)
+
+        dispatcher = BatchDispatcher(sender, linger_seconds=0.2, slot=slot)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(dispatcher.translate, ['会議'], 'EN', None, 'leader')
+            while 'EN' not in dispatcher._open:
+                time.sleep(0.005)
+            follower = executor.submit(dispatcher.translate, ['資料'], 'EN', None, 'follower')
+            assert leader.result(5) == ['EN:会議']
+            assert follower.result(5) == ['EN:資料']
+
+        assert slots == ['leader']
+        assert active == []
+        assert len(sender.batches) == 1
+
+
+class TestTranslateBatchDispatch:
+    """translate_batch_with_checkpointの送信の結合のテスト"""
+
+    @patch('api.index.translate_batch', side_effect=lambda texts, *args, **kwargs: [f"EN:{text}" for text in texts])
+    def test_requests_share_batches(self, mock_translate, monkeypatch):
+        """同時に翻訳する同じ言語・文脈のバッチをまとめて送信するテスト"""
+        monkeypatch.setattr(api_index, 'DISPATCH_LINGER_MS', 200)
+
+        def translate(texts):
+            return api_index.translate_batch_with_checkpoint(texts, 'EN-US', 'JA', 'シート名: 計画', 'key:fx', None)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(translate, [['会議', '資料'], ['会議']]))
+
+        assert results == [(['EN:会議', 'EN:資料'], False), (['EN:会議'], False)]
+        assert mock_translate.call_count == 1
+        texts, target_lang, source_lang, context, api_key, formality = mock_translate.call_args.args
+        assert sorted(texts) == ['会議', '資料']
+        assert (target_lang, context, api_key) == ('EN-US', 'シート名: 計画', 'key:fx')
+
+    @patch('api.index.translate_batch', side_effect=lambda texts, *args, **kwargs: [f"EN:{text}" for text in texts])
+    def test_merged_requests_share_one_slot(self, mock_translate, monkeypatch):
+        """送信枠が1つでも、結合されたリクエストは送信枠を待たずに翻訳結果を受け取るテスト"""
+        monkeypatch.setattr(api_index, 'DISPATCH_LINGER_MS', 200)
+        monkeypatch.setattr(api_index, 'SCHEDULER_MAX_CONCURRENT', 1)
+
+        def translate(args):
+            texts, client_id = args
+            ticket = api_index.ScheduleTicket(client_id, 0, 'fast')
+            return api_index.translate_batch_with_checkpoint(
+                texts, 'EN-US', 'JA', 'シート名: 計画', 'key:fx', None, ticket=ticket
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(translate, [(['会議'], 'a'), (['資料'], 'b')]))
+
+        assert results == [(['EN:会議'], False), (['EN:資料'], False)]
+        assert mock_translate.call_count == 1
+        assert api_index.get_scheduler().stats()['fast']['granted'] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
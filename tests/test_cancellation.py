@@ -0,0 +1,87 @@
+"""
+翻訳の取り消しのテストコード
+"""
+import pytest
+import socket
+import threading
+import time
+from utils.cancellation import (
+    CancellationStore, CancellationToken, TranslationCancelled, is_connection_closed, is_valid_request_id
+)
+
+
+class TestCancellationToken:
+    """CancellationTokenのテスト"""
+
+    def test_probe_interval(self):
+        """確認関数は最小間隔ごとに呼び出し、理由を返した時点で取り消すテスト"""
+        calls = []
+
+        def probe():
+            calls.append(time.monotonic())
+            return 'client disconnected' if len(calls) >= 2 else None
+
+        cancellation = CancellationToken(probe, poll_interval=0.05)
+        assert not cancellation.cancelled
+        # 最小間隔内は確認しない
+        assert not cancellation.cancelled
+        assert len(calls) == 1
+        time.sleep(0.06)
+        assert cancellation.cancelled
+        assert cancellation.reason == 'client disconnected'
+        with pytest.raises(TranslationCancelled):
+            cancellation.raise_if_cancelled()
+
+    def test_wait(self):
+        """待機中に取り消された場合はTranslationCancelledを送出するテスト"""
+        cancellation = CancellationToken(poll_interval=0.01)
+        done = threading.Event()
+        done.set()
+        cancellation.wait(done)
+
+        threading.Timer(0.05, cancellation.cancel, args=('cancel requested',)).start()
+        with pytest.raises(TranslationCancelled) as excinfo:
+            cancellation.wait(threading.Event())
+        assert excinfo.value.reason == 'cancel requested'
+
+
+class TestConnectionClosed:
+    """is_connection_closedのテスト"""
+
+    def test_detect_closed_peer(self):
+        """相手が閉じた場合のみ切断と判定し、受信済みのデータは読み取らないテスト"""
+        server, client = socket.socketpair()
+        try:
+            assert not is_connection_closed(server)
+            client.sendall(b'x')
+            assert not is_connection_closed(server)
+            assert server.recv(1) == b'x'
+            client.close()
+            assert is_connection_closed(server)
+        finally:
+            server.close()
+        assert not is_connection_closed(None)
+
+
+class TestCancellationStore:
+    """CancellationStoreのテスト"""
+
+    def test_request_and_clear(self, tmp_path):
+        """取り消し要求の記録・確認・削除と、リクエストIDの検証のテスト"""
+        store = CancellationStore(str(tmp_path))
+        other = CancellationStore(str(tmp_path))
+
+        store.request('req-1')
+        assert other.is_requested('req-1')
+        assert not other.is_requested('req-2')
+        other.clear('req-1')
+        assert not store.is_requested('req-1')
+
+        assert is_valid_request_id('0b6f1c2e-7d4a-4f3e-9a55-3f0e2c1d9b8a')
+        assert not is_valid_request_id('../jobs')
+        with pytest.raises(ValueError):
+            store.request('../jobs')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
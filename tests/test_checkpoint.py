@@ -0,0 +1,64 @@
+"""
+チェックポイントのテストコード
+"""
+import pytest
+import os
+import time
+from utils.checkpoint import Checkpoint, CheckpointStore, make_checkpoint_key
+
+
+class TestCheckpoint:
+    """Checkpoint・CheckpointStoreのテスト"""
+
+    def test_make_key(self):
+        """同じファイルとパラメータから同じキーが作成されるテスト"""
+        params = {'source_lang': 'JA', 'target_lang': 'EN-US'}
+        key = make_checkpoint_key('a' * 64, params)
+
+        assert key == make_checkpoint_key('a' * 64, dict(reversed(list(params.items()))))
+        assert key != make_checkpoint_key('a' * 64, {'source_lang': 'JA', 'target_lang': 'DE'})
+        assert key != make_checkpoint_key('b' * 64, params)
+
+    def test_put_and_reload(self, tmp_path):
+        """記録したバッチが別のインスタンスから再利用できるテスト"""
+        store = CheckpointStore(str(tmp_path))
+        key = make_checkpoint_key('a' * 64, {})
+        store.open(key).put(['こんにちは', '世界'], 'ctx', ['Hello', 'World'])
+
+        checkpoint = store.open(key)
+        assert checkpoint.get(['こんにちは', '世界'], 'ctx') == ['Hello', 'World']
+        assert checkpoint.get(['こんにちは', '世界'], 'other') is None
+        assert checkpoint.hits == 1
+
+    def test_truncated_line_is_ignored(self, tmp_path):
+        """書き込み途中で終了した行を無視するテスト"""
+        path = str(tmp_path / 'checkpoint.jsonl')
+        Checkpoint(path).put(['a'], '', ['A'])
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"batch": "trunc')
+
+        checkpoint = Checkpoint(path)
+        assert len(checkpoint) == 1
+        assert checkpoint.get(['a'], '') == ['A']
+
+    def test_expired_checkpoints_are_removed(self, tmp_path):
+        """保持期間を過ぎたチェックポイントが削除されるテスト"""
+        store = CheckpointStore(str(tmp_path), ttl_seconds=60)
+        old_key = make_checkpoint_key('a' * 64, {})
+        store.open(old_key).put(['a'], '', ['A'])
+        old_path = os.path.join(str(tmp_path), f"{old_key}.jsonl")
+        expired = time.time() - 120
+        os.utime(old_path, (expired, expired))
+
+        store.open(make_checkpoint_key('b' * 64, {}))
+
+        assert not os.path.exists(old_path)
+
+    def test_invalid_key(self, tmp_path):
+        """不正なキーを拒否するテスト"""
+        with pytest.raises(ValueError):
+            CheckpointStore(str(tmp_path)).open('../escape')
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,90 @@
+"""
+リクエストの処理期限のテストコード
+"""
+import pytest
+from unittest.mock import patch
+from utils.deadline import Deadline, ReportStore
+
+
+class TestDeadline:
+    """Deadlineのテスト"""
+
+    def test_allows_by_estimated_seconds(self):
+        """送信済みのバッチの速度から見積もった時間が残り時間を超えるバッチ以降は送信しないテスト"""
+        now = [1000.0]
+        with patch('utils.deadline.time.monotonic', side_effect=lambda: now[0]):
+            deadline = Deadline(10, initial_seconds_per_char=0.001)
+            # 送信実績がない場合は仮定の速度で見積もる
+            assert deadline.estimate(1000) == pytest.approx(1.0)
+            assert deadline.allows(10000)
+            deadline.record_batch(1000, 2.0)
+            now[0] += 2.0
+            assert deadline.estimate(3000) == pytest.approx(6.0)
+            assert deadline.allows(4000)
+            assert not deadline.allows(5000)
+            # 期限に達した後は小さなバッチも送信しない
+            assert not deadline.allows(1)
+
+        assert deadline.reached
+        assert deadline.batches_skipped == 2
+
+    def test_first_batch_uses_initial_rate(self):
+        """送信実績がなくても、仮定の速度で残り時間内に完了しないバッチは送信しないテスト"""
+        now = [1000.0]
+        with patch('utils.deadline.time.monotonic', side_effect=lambda: now[0]):
+            deadline = Deadline(10, initial_seconds_per_char=0.001)
+            assert not deadline.allows(20000)
+
+        assert deadline.reached
+
+    def test_expired(self):
+        """期限を過ぎた場合は送信実績がなくても送信しないテスト"""
+        now = [1000.0]
+        with patch('utils.deadline.time.monotonic', side_effect=lambda: now[0]):
+            deadline = Deadline(5)
+            now[0] += 6
+            assert deadline.remaining() == 0.0
+            assert not deadline.allows(1)
+
+    def test_report(self):
+        """翻訳されなかったセルを翻訳先言語・シートごとに集計するテスト"""
+        deadline = Deadline(60)
+        deadline.record_untranslated('EN-US', 'Sheet1', [{'cell': 'A1', 'text': '会議'}, {'cell': 'B2', 'text': '報告'}])
+        deadline.record_untranslated('EN-US', 'Sheet2', [])
+        deadline.record_untranslated('DE', 'Sheet1', [{'cell': 'A1', 'text': '会議'}])
+
+        report = deadline.report()
+
+        assert report['incomplete'] is False
+        assert report['cells_untranslated'] == 3
+        assert report['languages']['EN-US'] == [
+            {'sheet': 'Sheet1', 'cells': [{'cell': 'A1', 'text': '会議'}, {'cell': 'B2', 'text': '報告'}]}
+        ]
+        assert report['reason'] is None
+        assert report['deadline_seconds'] == 60
+
+
+
+class TestReportStore:
+    """ReportStoreのテスト"""
+
+    def test_save_and_load(self, tmp_path):
+        """レポートを保存してIDで取得し、不正なIDは拒否するテスト"""
+        store = ReportStore(str(tmp_path))
+        report_id = store.save({'incomplete': True, 'languages': {'EN-US': []}})
+
+        assert store.load(report_id) == {'incomplete': True, 'languages': {'EN-US': []}}
+        assert store.load('../' + report_id) is None
+        assert store.load('0' * 32) is None
+
+    def test_cleanup_expired(self, tmp_path):
+        """保持期間を過ぎたレポートを削除するテスト"""
+        store = ReportStore(str(tmp_path), ttl_seconds=-1)
+        report_id = store.save({'incomplete': True})
+        store.cleanup()
+
+        assert store.load(report_id) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -2,10 +2,14 @@
 Excel翻訳機能のテストコード
 """
 import pytest
+import asyncio
 import io
+import time
+import zipfile
 import openpyxl
 from unittest.mock import Mock, patch
-from excel_translator import ExcelTranslator
+from excel_translator import ExcelTranslator, TranslationAuthorizationError
+from tests.mock_deepl_server import MockDeepLServer
 
 
 class TestExcelTranslator:
@@ -100,20 +104,20 @@ class TestExcelTranslator:
         assert "general business document" in context
     
     @patch('deepl.Translator.translate_text')
-    def test_validate_api_key_success(self, mock_translate, translator):
-        """APIキー検証成功のテスト"""
-        mock_result = Mock()
-        mock_result.text = "Test"
-        mock_translate.return_value = mock_result
+    @patch('deepl.Translator.get_usage')
+    def test_validate_api_key_success(self, mock_usage, mock_translate, translator):
+        """APIキー検証成功のテスト（翻訳は実行しない）"""
+        mock_usage.return_value = Mock()
         
         assert translator.validate_api_key() == True
-        mock_translate.assert_called_once()
+        mock_usage.assert_called_once()
+        mock_translate.assert_not_called()
     
-    @patch('deepl.Translator.translate_text')
-    def test_validate_api_key_failure(self, mock_translate, translator):
+    @patch('deepl.Translator.get_usage')
+    def test_validate_api_key_failure(self, mock_usage, translator):
         """APIキー検証失敗のテスト"""
-        from deepl.exceptions import AuthorizationError
-        mock_translate.side_effect = AuthorizationError("Invalid API key")
+        from deepl.exceptions import AuthorizationException
+        mock_usage.side_effect = AuthorizationException("Invalid API key")
         
         assert translator.validate_api_key() == False
     
@@ -143,13 +147,47 @@ class TestExcelTranslator:
         assert sheet['A2'].value == "○"
         assert sheet['B2'].value == "×"
     
+    @patch('deepl.Translator.translate_text')
+    def test_translate_excel_file_multi(self, mock_translate, translator):
+        """複数言語の翻訳で重複を除いたテキストが言語ごとに翻訳されるテスト"""
+        def fake_translate(texts, source_lang, target_lang):
+            return [Mock(text=f"{target_lang}:{text}") for text in texts]
+        mock_translate.side_effect = fake_translate
+        
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet['A1'] = 'こんにちは'
+        sheet['B1'] = 'こんにちは'
+        sheet['A2'] = '○'
+        workbook.create_sheet('Sheet2')['A1'] = 'さようなら'
+        output = io.BytesIO()
+        workbook.save(output)
+        
+        results = translator.translate_excel_file_multi(
+            file_data=output.getvalue(),
+            source_lang="JA",
+            target_langs=["EN-US", "ZH"]
+        )
+        
+        assert set(results) == {"EN-US", "ZH"}
+        assert mock_translate.call_count == 2
+        for call in mock_translate.call_args_list:
+            assert call.args[0] == ['こんにちは', 'さようなら']
+        for target_lang, data in results.items():
+            workbook = openpyxl.load_workbook(io.BytesIO(data))
+            assert workbook.active['A1'].value == f"{target_lang}:こんにちは"
+            assert workbook.active['B1'].value == f"{target_lang}:こんにちは"
+            assert workbook.active['A2'].value == "○"
+            assert workbook['Sheet2']['A1'].value == f"{target_lang}:さようなら"
+    
     @patch('deepl.Translator.translate_text')
     def test_translate_excel_file_api_error(self, mock_translate, translator, sample_excel_data):
         """Excel翻訳API エラーのテスト"""
-        from deepl.exceptions import AuthorizationError
-        mock_translate.side_effect = AuthorizationError("Invalid API key")
+        from deepl.exceptions import AuthorizationException
+        mock_translate.side_effect = AuthorizationException("Invalid API key")
         
-        with pytest.raises(Exception) as exc_info:
+        # 翻訳インスタンスのプールはこの例外で無効なAPIキーを判定する
+        with pytest.raises(TranslationAuthorizationError) as exc_info:
             translator.translate_excel_file(
                 file_data=sample_excel_data,
                 context="テスト",
@@ -188,6 +226,66 @@ class TestExcelTranslator:
             )
         
         assert "翻訳処理中にエラーが発生しました" in str(exc_info.value)
+    
+    @staticmethod
+    def _sheet_parts(data):
+        """XLSXの内容のうち保存時刻を含まない部分を取得"""
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return {name: archive.read(name) for name in archive.namelist() if not name.startswith('docProps/')}
+    
+    def test_translate_excel_file_async(self):
+        """非同期APIが同期APIと同じ内容を出力し、同時リクエスト数を制限するテスト"""
+        workbook = openpyxl.Workbook()
+        for i in range(12):
+            workbook.active.append([f"項目{i}", f"説明{i}", "共通"])
+        output = io.BytesIO()
+        workbook.save(output)
+        
+        with MockDeepLServer(latency=0.02) as server:
+            translator = ExcelTranslator("test-api-key", server_url=server.url, max_concurrency=3)
+            translator.batch_size = 5
+            expected = translator.translate_excel_file_multi(output.getvalue(), target_langs=["EN-US", "ZH"])
+            sync_requests = server.requests
+            server.connections = 0
+            server.max_active_requests = 0
+            
+            actual = asyncio.run(translator.translate_excel_file_multi_async(
+                output.getvalue(), target_langs=["EN-US", "ZH"]
+            ))
+        
+        for target_lang in ("EN-US", "ZH"):
+            assert self._sheet_parts(actual[target_lang]) == self._sheet_parts(expected[target_lang])
+        sheet = openpyxl.load_workbook(io.BytesIO(actual["ZH"])).active
+        assert [cell.value for cell in sheet[1]] == ["ZH:項目0", "ZH:説明0", "ZH:共通"]
+        # 25種類のテキスト × 2言語を5件ずつのバッチで送信
+        assert server.requests - sync_requests == sync_requests == 10
+        assert 1 < server.max_active_requests <= 3
+        assert server.connections <= 3
+    
+    def test_translate_excel_file_async_cancel(self, sample_excel_data):
+        """非同期APIのタスクのキャンセルで送信中のリクエストが中断されるテスト"""
+        async def translate_and_cancel(translator):
+            task = asyncio.create_task(translator.translate_excel_file_async(sample_excel_data))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            started_at = time.monotonic()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return time.monotonic() - started_at
+        
+        with MockDeepLServer(latency=2) as server:
+            translator = ExcelTranslator("test-api-key", server_url=server.url)
+            assert asyncio.run(translate_and_cancel(translator)) < 1
+    
+    def test_translate_excel_file_async_quota_error(self, sample_excel_data):
+        """非同期APIの使用制限エラーのテスト"""
+        with MockDeepLServer() as server:
+            server.fail_status = 456
+            translator = ExcelTranslator("test-api-key", server_url=server.url)
+            with pytest.raises(Exception) as exc_info:
+                asyncio.run(translator.translate_excel_file_async(sample_excel_data))
+        
+        assert "使用制限に達しました" in str(exc_info.value)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+"""
+翻訳ジョブキューのテストコード
+"""
+import pytest
+import io
+import os
+import subprocess
+import sys
+import threading
+from utils.cancellation import TranslationCancelled
+from utils.job_queue import JobStore, JobManager, JOB_QUEUED, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED
+
+
+def _dead_pid():
+    """終了済みプロセスのIDを取得"""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class TestJobStore:
+    """JobStoreのテスト"""
+
+    def test_create_and_get(self, tmp_path):
+        """ジョブの作成と取得のテスト"""
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.XLSX', {'target_lang': 'EN-US'})
+
+        loaded = store.get(job['job_id'])
+        assert loaded['status'] == JOB_QUEUED
+        assert loaded['params'] == {'target_lang': 'EN-US'}
+        assert loaded['input_path'].endswith('input.xlsx')
+        with open(loaded['input_path'], 'rb') as f:
+            assert f.read() == b'data'
+
+    def test_state_survives_new_store(self, tmp_path):
+        """別のストアインスタンス（再起動後のワーカー）から状態を参照できるテスト"""
+        job = JobStore(str(tmp_path)).create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        JobStore(str(tmp_path)).update(job['job_id'], progress={'sheets_completed': 1})
+
+        assert JobStore(str(tmp_path)).get(job['job_id'])['progress'] == {'sheets_completed': 1}
+
+    def test_invalid_job_id(self, tmp_path):
+        """不正なジョブIDを拒否するテスト"""
+        store = JobStore(str(tmp_path))
+        assert store.get('../state') is None
+        assert store.get('') is None
+
+    def test_claim_is_exclusive(self, tmp_path):
+        """実行権が排他的に取得されるテスト"""
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+
+        assert store.claim(job['job_id'])
+        assert not store.claim(job['job_id'])
+        store.release(job['job_id'])
+        assert store.claim(job['job_id'])
+
+    def test_stale_claim_is_taken_over(self, tmp_path):
+        """終了したプロセスの実行権を引き継げるテスト"""
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        with open(os.path.join(store.job_dir(job['job_id']), 'claim'), 'w') as f:
+            f.write(str(_dead_pid()))
+
+        assert store.is_claim_stale(job['job_id'])
+        assert store.claim(job['job_id'])
+
+    def test_cleanup_expired_jobs(self, tmp_path):
+        """保持期間を過ぎた完了ジョブのみ削除されるテスト"""
+        store = JobStore(str(tmp_path), ttl_seconds=-1)
+        finished = store.create(io.BytesIO(b'data'), 'a.xlsx', {})
+        active = store.create(io.BytesIO(b'data'), 'b.xlsx', {})
+        store.update(finished['job_id'], status=JOB_COMPLETED)
+
+        store.cleanup()
+
+        assert store.get(finished['job_id']) is None
+        assert store.get(active['job_id']) is not None
+
+
+class TestJobManager:
+    """JobManagerのテスト"""
+
+    def test_run_job(self, tmp_path):
+        """ジョブが実行され結果が保存されるテスト"""
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+
+        manager = JobManager(store, lambda job, store: {'result_filename': 'out.xlsx'})
+        manager.submit(job['job_id'])
+        manager._executor.shutdown(wait=True)
+
+        loaded = store.get(job['job_id'])
+        assert loaded['status'] == JOB_COMPLETED
+        assert loaded['result_filename'] == 'out.xlsx'
+        assert loaded['attempts'] == 1
+        assert store.is_claim_stale(job['job_id'])
+
+    def test_failed_job(self, tmp_path):
+        """例外が発生したジョブが失敗として記録されるテスト"""
+        def runner(job, store):
+            raise ValueError("broken workbook")
+
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        manager = JobManager(store, runner)
+        manager.submit(job['job_id'])
+        manager._executor.shutdown(wait=True)
+
+        loaded = store.get(job['job_id'])
+        assert loaded['status'] == JOB_FAILED
+        assert loaded['error'] == "broken workbook"
+
+    def test_cancelled_job(self, tmp_path):
+        """取り消されたジョブが失敗と区別して記録され、再投入されないテスト"""
+        def runner(job, store):
+            raise TranslationCancelled('cancel requested')
+
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        manager = JobManager(store, runner)
+        manager.submit(job['job_id'])
+        manager._executor.shutdown(wait=True)
+
+        loaded = store.get(job['job_id'])
+        assert loaded['status'] == JOB_CANCELLED
+        assert loaded['error'] == 'Translation cancelled (cancel requested)'
+
+        manager = JobManager(store, runner)
+        manager.recover()
+        manager._executor.shutdown(wait=True)
+        assert store.get(job['job_id'])['attempts'] == 1
+
+    def test_recover_orphaned_job(self, tmp_path):
+        """終了したワーカーが実行中だったジョブを再開するテスト"""
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        store.update(job['job_id'], status='running', attempts=1)
+        with open(os.path.join(store.job_dir(job['job_id']), 'claim'), 'w') as f:
+            f.write(str(_dead_pid()))
+
+        manager = JobManager(store, lambda job, store: {})
+        manager.recover()
+        manager._executor.shutdown(wait=True)
+
+        loaded = store.get(job['job_id'])
+        assert loaded['status'] == JOB_COMPLETED
+        assert loaded['attempts'] == 2
+
+    def test_queued_job_not_recovered_by_other_manager(self, tmp_path):
+        """別のワーカーのプールで待機中のジョブは再投入せず、完了済みのジョブは再実行しないテスト"""
+        store = JobStore(str(tmp_path))
+        busy = store.create(io.BytesIO(b'data'), 'busy.xlsx', {})
+        queued = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        release = threading.Event()
+        calls = []
+
+        def runner(job, store):
+            calls.append(job['job_id'])
+            if job['job_id'] == busy['job_id']:
+                release.wait(5)
+            return {}
+
+        worker_a = JobManager(store, runner, max_workers=1)
+        worker_b = JobManager(store, runner)
+        worker_a.submit(busy['job_id'])
+        worker_a.submit(queued['job_id'])
+
+        # 投入したワーカーが実行中のため、状態の確認で再投入しない
+        worker_b.recover(queued['job_id'])
+        worker_b._executor.shutdown(wait=True)
+        assert calls.count(queued['job_id']) == 0
+
+        # 別のワーカーが先に実行を終えた場合、待機していたワーカーは実行しない
+        worker_b = JobManager(store, runner)
+        worker_b.submit(queued['job_id'])
+        worker_b._executor.shutdown(wait=True)
+        release.set()
+        worker_a._executor.shutdown(wait=True)
+
+        assert calls.count(queued['job_id']) == 1
+        loaded = store.get(queued['job_id'])
+        assert loaded['status'] == JOB_COMPLETED
+        assert loaded['attempts'] == 1
+        assert not store.has_claim(queued['job_id'])
+
+    def test_recover_job_of_dead_owner(self, tmp_path):
+        """投入したワーカーが実行前に終了したジョブを再開するテスト"""
+        store = JobStore(str(tmp_path))
+        job = store.create(io.BytesIO(b'data'), 'plan.xlsx', {})
+        store.update(job['job_id'], owner_pid=_dead_pid())
+
+        manager = JobManager(store, lambda job, store: {})
+        manager.recover(job['job_id'])
+        manager._executor.shutdown(wait=True)
+
+        assert store.get(job['job_id'])['status'] == JOB_COMPLETED
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,131 @@
+"""
+DeepL APIキーのプールのテストコード
+"""
+import os
+import pytest
+from unittest.mock import Mock, patch
+from api import index as api_index
+from utils.key_pool import DeepLKeyPool, NoAvailableKeyError, parse_api_keys
+from utils.quota import QuotaCache
+
+
+def _quota_cache(limits):
+    """キーごとの上限（character_limit）を返すQuotaCache"""
+    return QuotaCache(lambda api_key: {'character_count': 0, 'character_limit': limits[api_key]})
+
+
+class TestDeepLKeyPool:
+    """DeepLKeyPoolのテスト"""
+
+    def test_parse_api_keys(self):
+        """カンマ・空白区切りのAPIキーを重複なく分割するテスト"""
+        assert parse_api_keys('a:fx, b:fx,,a:fx\nc') == ['a:fx', 'b:fx', 'c']
+        assert parse_api_keys(None) == []
+
+    def test_acquire_by_quota_and_latency(self):
+        """残り文字数が足りるキーのうち、応答時間と残り文字数から見込まれる待ち時間が短いキーを選ぶテスト"""
+        pool = DeepLKeyPool(['a', 'b', 'c'], _quota_cache({'a': 1000, 'b': 1000, 'c': 5}))
+
+        # cは残り文字数が足りない
+        first = pool.acquire(10)
+        second = pool.acquire(10)
+        assert {first.api_key, second.api_key} == {'a', 'b'}
+        pool.release(first, 10, 0.05, 200)
+        pool.release(second, 10, 2.0, 200)
+
+        # 応答の速いキーを選び、送信中のバッチが増えると別のキーに振り分ける
+        assert pool.acquire(10).api_key == first.api_key
+
+        assert [item['characters'] for item in pool.stats()] == [10, 10, 0]
+        assert pool.remaining() == 1000 - 10 + 1000 - 10 + 5
+
+    def test_release_disables_key(self):
+        """使用制限・認証エラーの応答を受けたキーをローテーションから外し、待機時間後に戻すテスト"""
+        fetch_usage = Mock(return_value=None)
+        pool = DeepLKeyPool(['a', 'b'], QuotaCache(fetch_usage), cooldown_seconds=60)
+
+        key = pool.acquire(10)
+        pool.release(key, 10, 0.1, 456)
+        other = pool.acquire(10)
+        assert other.api_key != key.api_key
+        # 最後のローテーション中のキーは外さない
+        pool.release(other, 10, 0.1, 403)
+
+        assert pool.acquire(10).api_key == other.api_key
+        assert [item['errors'] for item in pool.stats()] == [1, 1]
+        assert [item['active'] for item in pool.stats()] == [key.api_key != 'a', key.api_key == 'a']
+
+        pool.cooldown_seconds = 0
+        pool.acquire(10)
+        assert all(item['active'] for item in pool.stats())
+
+    def test_single_key_stays_in_rotation(self):
+        """キーが1つの場合はエラーの応答後も外さず、残り文字数を取得し直して判定するテスト"""
+        usage = {'character_count': 1000, 'character_limit': 1000}
+        fetch_usage = Mock(side_effect=lambda api_key: dict(usage))
+        pool = DeepLKeyPool(['a'], QuotaCache(fetch_usage), cooldown_seconds=3600)
+
+        key = pool.acquire(0)
+        pool.release(key, 0, 0.1, 456)
+        assert pool.stats()[0]['active']
+
+        # 残り文字数が足りない間は送信しない
+        with pytest.raises(NoAvailableKeyError) as exc_info:
+            pool.acquire(10)
+        assert exc_info.value.status_code == 456
+
+        # プランの変更後は待機時間を待たずに送信できる
+        usage['character_limit'] = 500000
+        pool.quota_cache.invalidate('a')  # キャッシュの有効期限切れ
+        assert pool.acquire(10).api_key == 'a'
+        assert fetch_usage.call_count == 3
+
+
+class TestTranslateBatchKeyPool:
+    """translate_batchのキーの振り分けのテスト"""
+
+    def test_translate_batch_fails_over(self, monkeypatch):
+        """使用制限に達したキーを外して別のキーで送信し直し、キーごとに使用状況を集計するテスト"""
+        monkeypatch.setattr(api_index, '_quota_cache', (os.getpid(), _quota_cache({'key-a:fx': 1000, 'key-b:fx': 1000})))
+
+        def fake_post(url, data):
+            response = Mock()
+            if data['auth_key'] == 'key-a:fx':
+                response.status_code, response.text = 456, 'Quota exceeded'
+            else:
+                response.status_code = 200
+                response.json.return_value = {'translations': [{'text': f"EN:{text}"} for text in data['text']]}
+            return response
+
+        with patch('api.index.requests.post', side_effect=fake_post) as mock_post:
+            for _ in range(3):
+                assert api_index.translate_batch(['会議', ''], 'EN-US', 'JA', None, 'key-a:fx,key-b:fx') == ['EN:会議', '']
+
+        pool = api_index.get_key_pool('key-a:fx,key-b:fx')
+        stats = pool.stats()
+        # key-aは最初の使用制限の応答以降は使わない
+        assert mock_post.call_count in (3, 4)
+        assert [item['active'] for item in stats] == [False, True]
+        assert stats[1]['characters'] == 6
+        assert pool.remaining() == 994
+
+        # 送信し直すキーがない場合はエラーの応答をそのまま返す
+        with patch('api.index.requests.post', side_effect=fake_post):
+            with pytest.raises(Exception, match='456'):
+                api_index.translate_batch(['会議'], 'EN-US', 'JA', None, 'key-a:fx')
+
+    def test_reset_after_fork(self):
+        """別のプロセスから継承したキーのプールと残り文字数のキャッシュは作り直すテスト"""
+        pool = api_index.get_key_pool('key-a:fx,key-b:fx')
+        quota_cache = api_index.get_quota_cache()
+        assert api_index.get_key_pool('key-a:fx,key-b:fx') is pool
+
+        with patch('api.index.os.getpid', return_value=-1):
+            forked_pool = api_index.get_key_pool('key-a:fx,key-b:fx')
+            assert forked_pool is not pool
+            assert forked_pool.quota_cache is not quota_cache
+            assert api_index.get_quota_cache() is forked_pool.quota_cache
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
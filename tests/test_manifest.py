@@ -0,0 +1,60 @@
+"""
+差分翻訳用マニフェストのテストコード
+"""
+import pytest
+import os
+import time
+from utils.manifest import ManifestStore, TranslationManifest
+
+
+class TestManifest:
+    """TranslationManifest・ManifestStoreのテスト"""
+
+    def test_lookup_by_text(self):
+        """原文の内容で翻訳を参照できるテスト"""
+        manifest = TranslationManifest({'target_lang': 'EN-US'})
+        manifest.add('こんにちは', 'Hello')
+
+        assert manifest.lookup('こんにちは') == 'Hello'
+        assert manifest.lookup('こんばんは') is None
+
+    def test_is_compatible(self):
+        """翻訳パラメータが一致する場合のみ再利用できるテスト"""
+        manifest = TranslationManifest({'source_lang': 'JA', 'target_lang': 'EN-US'})
+
+        assert manifest.is_compatible({'source_lang': 'JA', 'target_lang': 'EN-US', 'output_format': 'xlsx'})
+        assert not manifest.is_compatible({'source_lang': 'JA', 'target_lang': 'DE'})
+
+    def test_save_and_load(self, tmp_path):
+        """保存したマニフェストをIDで読み込めるテスト"""
+        store = ManifestStore(str(tmp_path))
+        manifest = TranslationManifest({'target_lang': 'EN-US'})
+        manifest.add('こんにちは', 'Hello')
+        manifest_id = store.save(manifest)
+
+        loaded = ManifestStore(str(tmp_path)).load(manifest_id)
+        assert loaded.manifest_id == manifest_id
+        assert loaded.params == {'target_lang': 'EN-US'}
+        assert loaded.lookup('こんにちは') == 'Hello'
+
+    def test_load_invalid_or_missing(self, tmp_path):
+        """不正なIDや存在しないIDはNoneを返すテスト"""
+        store = ManifestStore(str(tmp_path))
+        assert store.load('../escape') is None
+        assert store.load('0' * 32) is None
+
+    def test_expired_manifests_are_removed(self, tmp_path):
+        """保持期間を過ぎたマニフェストが削除されるテスト"""
+        store = ManifestStore(str(tmp_path), ttl_seconds=60)
+        old_id = store.save(TranslationManifest({}))
+        expired = time.time() - 120
+        os.utime(os.path.join(str(tmp_path), f"{old_id}.json"), (expired, expired))
+
+        new_id = store.save(TranslationManifest({}))
+
+        assert store.load(old_id) is None
+        assert store.load(new_id) is not None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
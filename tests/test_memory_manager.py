@@ -0,0 +1,64 @@
+"""
+ガベージコレクションの実行管理のテストコード
+"""
+import pytest
+from unittest.mock import patch
+from utils.memory_manager import MemoryManager, get_rss
+from utils.progress import ProgressTracker
+
+
+class TestMemoryManager:
+    """MemoryManagerのテスト"""
+
+    def test_collect_on_allocation_growth(self):
+        """メモリブロック数の増加量がしきい値を超えた場合のみ実行するテスト"""
+        manager = MemoryManager(growth_bytes=0, allocation_blocks=50000)
+
+        with patch('utils.memory_manager.gc.collect', return_value=0) as mock_collect:
+            assert manager.maybe_collect() == 0.0
+            objects = [{'value': i} for i in range(100000)]
+            manager.maybe_collect()
+            # 実行後は現在の使用量が基準になる
+            manager.maybe_collect()
+
+        assert mock_collect.call_count == 1
+        assert (manager.checks, manager.collections) == (3, 1)
+        del objects
+
+    def test_collect_on_rss(self):
+        """RSSの増加量・上限による実行と、上限による実行の間隔のテスト"""
+        rss = [100 * 1024 * 1024]
+        manager_args = {'growth_bytes': 50 * 1024 * 1024, 'allocation_blocks': 0,
+                        'rss_limit_bytes': 120 * 1024 * 1024, 'min_interval': 60}
+        with patch('utils.memory_manager.get_rss', side_effect=lambda: rss[0]), \
+                patch('utils.memory_manager.gc.collect', return_value=0) as mock_collect:
+            manager = MemoryManager(**manager_args)
+            rss[0] += 10 * 1024 * 1024
+            manager.maybe_collect()
+            rss[0] += 50 * 1024 * 1024
+            manager.maybe_collect()
+            # 上限を超えたままでも最小間隔内は実行しない
+            manager.maybe_collect()
+            manager.min_interval = 0
+            manager.maybe_collect()
+
+        assert mock_collect.call_count == 2
+        assert manager.stats()['collections'] == 2
+
+    def test_get_rss(self):
+        """RSSを取得できる環境では正の値を返すテスト"""
+        rss = get_rss()
+        assert rss is None or rss > 0
+
+    def test_progress_records_gc_time(self):
+        """実行したガベージコレクションの時間を進捗に記録するテスト"""
+        progress = ProgressTracker()
+        progress.gc_collected(0.02)
+        progress.gc_collected(0.03)
+
+        snapshot = progress.snapshot()
+        assert (snapshot['gc_collections'], snapshot['gc_seconds']) == (2, 0.05)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
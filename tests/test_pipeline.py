@@ -0,0 +1,61 @@
+"""
+処理パイプラインのテストコード
+"""
+import pytest
+import threading
+import time
+from utils.pipeline import run_pipeline
+
+
+class TestPipeline:
+    """run_pipelineのテスト"""
+
+    def test_results_in_order(self):
+        """各段階を順に通した結果が入力の順に返るテスト"""
+        results = run_pipeline(range(10), [lambda x: x + 1, lambda x: x * 2, str])
+        assert results == [str((x + 1) * 2) for x in range(10)]
+
+    def test_sequential_mode(self):
+        """キューの上限が0の場合は呼び出し元のスレッドで順番に処理するテスト"""
+        thread_names = []
+        results = run_pipeline([1, 2], [lambda x: thread_names.append(threading.current_thread().name) or x],
+                               queue_size=0)
+        assert results == [1, 2]
+        assert set(thread_names) == {threading.current_thread().name}
+
+    def test_back_pressure(self):
+        """後の段階が遅い場合に前の段階が先行しすぎないテスト"""
+        produced = []
+        consumed = []
+        max_ahead = []
+
+        def produce(item):
+            produced.append(item)
+            max_ahead.append(len(produced) - len(consumed))
+            return item
+
+        def consume(item):
+            time.sleep(0.01)
+            consumed.append(item)
+            return item
+
+        run_pipeline(range(20), [produce, consume], queue_size=1)
+        # 処理中の要素 + キューの要素 + 次に処理する要素
+        assert max(max_ahead) <= 3
+
+    def test_stage_error(self):
+        """いずれかの段階の例外で全段階を停止して例外を送出するテスト"""
+        processed = []
+
+        def fail(item):
+            if item == 2:
+                raise ValueError('broken')
+            return item
+
+        with pytest.raises(ValueError, match='broken'):
+            run_pipeline(range(100), [lambda x: x, fail, processed.append])
+        assert processed == [0, 1]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
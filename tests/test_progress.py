@@ -0,0 +1,81 @@
+"""
+進捗計測のテストコード
+"""
+import pytest
+import json
+from unittest.mock import patch
+from utils.progress import ProgressTracker, format_sse
+
+
+class TestProgressTracker:
+    """ProgressTrackerのテスト"""
+
+    def test_counters(self):
+        """各カウンターがスナップショットに反映されるテスト"""
+        tracker = ProgressTracker(sheets_total=2)
+        tracker.sheet_scanned()
+        tracker.batches_planned_for_sheet(3, 300)
+        tracker.batch_completed(100)
+        tracker.fallback_called()
+        tracker.sheet_completed(10, 9)
+
+        snapshot = tracker.snapshot()
+        assert snapshot['sheets_scanned'] == 1
+        assert snapshot['sheets_completed'] == 1
+        assert snapshot['batches_planned'] == 3
+        assert snapshot['batches_completed'] == 1
+        assert snapshot['fallback_calls'] == 1
+        assert snapshot['chars_completed'] == 100
+        assert snapshot['cells_translated'] == 9
+
+    def test_emit_is_throttled(self):
+        """最小間隔内の通知が省略され、シート完了時は必ず通知されるテスト"""
+        events = []
+        tracker = ProgressTracker(events.append, sheets_total=1, min_interval=60)
+        tracker.batches_planned_for_sheet(100, 1000)
+        for _ in range(100):
+            tracker.batch_completed(10)
+        assert len(events) == 1
+
+        tracker.sheet_completed()
+        assert len(events) == 2
+        assert events[-1]['batches_completed'] == 100
+
+    def test_eta_seconds(self):
+        """処理済み文字数から残り時間を推定するテスト"""
+        with patch('utils.progress.time.monotonic', return_value=100.0):
+            tracker = ProgressTracker(sheets_total=1)
+        assert tracker.eta_seconds() is None
+
+        tracker.sheet_scanned()
+        tracker.batches_planned_for_sheet(4, 400)
+        tracker.batch_completed(100)
+        with patch('utils.progress.time.monotonic', return_value=110.0):
+            assert tracker.eta_seconds() == 30.0
+
+    def test_eta_uses_estimate_for_unscanned_sheets(self):
+        """未走査のシートがある場合はファイル解析時の文字数で見積もるテスト"""
+        with patch('utils.progress.time.monotonic', return_value=0.0):
+            tracker = ProgressTracker(sheets_total=2, chars_estimated=1000)
+        tracker.sheet_scanned()
+        tracker.batches_planned_for_sheet(1, 100)
+        tracker.batch_completed(100)
+        with patch('utils.progress.time.monotonic', return_value=10.0):
+            assert tracker.eta_seconds() == 90.0
+
+
+class TestFormatSse:
+    """format_sseのテスト"""
+
+    def test_format(self):
+        """SSE形式のメッセージを作成するテスト"""
+        message = format_sse({'status': '翻訳中'}, event='progress', event_id='1', retry_ms=1000)
+        lines = message.split('\n')
+
+        assert message.endswith('\n\n')
+        assert lines[:3] == ['retry: 1000', 'id: 1', 'event: progress']
+        assert json.loads(lines[3][len('data: '):]) == {'status': '翻訳中'}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,53 @@
+"""
+翻訳文字数の上限と残り文字数のキャッシュのテストコード
+"""
+import pytest
+from unittest.mock import Mock
+from utils.quota import CharacterBudget, QuotaCache
+
+
+class TestCharacterBudget:
+    """CharacterBudgetのテスト"""
+
+    def test_try_consume(self):
+        """上限を超える文字数は確保せず、上限に達したことを記録するテスト"""
+        budget = CharacterBudget(10)
+
+        assert budget.try_consume(6)
+        assert not budget.try_consume(5)
+        assert budget.try_consume(4)
+        assert (budget.used, budget.remaining, budget.exhausted) == (10, 0, True)
+
+    def test_unlimited(self):
+        """上限がない場合も送信した文字数を集計するテスト"""
+        budget = CharacterBudget()
+
+        assert budget.try_consume(1000)
+        assert (budget.used, budget.remaining, budget.exhausted) == (1000, None, False)
+
+
+class TestQuotaCache:
+    """QuotaCacheのテスト"""
+
+    def test_remaining_cached(self):
+        """使用状況を有効期限内は再取得せず、翻訳した文字数を差し引くテスト"""
+        fetch = Mock(return_value={'character_count': 400, 'character_limit': 1000})
+        cache = QuotaCache(fetch, ttl_seconds=60)
+
+        assert cache.remaining('key') == 600
+        cache.consume('key', 100)
+        assert cache.remaining('key') == 500
+        assert fetch.call_count == 1
+
+        cache.invalidate('key')
+        assert cache.remaining('key') == 600
+        assert fetch.call_count == 2
+
+    def test_unknown_quota(self):
+        """使用状況を取得できない場合・上限がない場合はNoneを返すテスト"""
+        assert QuotaCache(Mock(side_effect=Exception('timeout'))).remaining('key') is None
+        assert QuotaCache(Mock(return_value={'character_count': 5, 'character_limit': 0})).remaining('key') is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,105 @@
+"""
+レスポンス作成ヘルパーのテストコード
+"""
+import pytest
+import io
+import json
+import zipfile
+from unittest.mock import patch
+from werkzeug.datastructures import MIMEAccept
+from utils.response_helpers import negotiate_response_format
+
+
+class TestNegotiateResponseFormat:
+    """レスポンス形式のネゴシエーションのテスト"""
+
+    def test_default_is_json(self):
+        """Acceptヘッダーなし・*/* は従来のJSON形式になるテスト"""
+        assert negotiate_response_format(MIMEAccept()) == 'json'
+        assert negotiate_response_format(MIMEAccept([('*/*', 1)])) == 'json'
+
+    def test_octet_stream(self):
+        """application/octet-stream でバイナリ形式になるテスト"""
+        accept = MIMEAccept([('application/octet-stream', 1)])
+        assert negotiate_response_format(accept) == 'binary'
+
+    def test_multipart(self):
+        """multipart/mixed・multipart/* でmultipart形式になるテスト"""
+        assert negotiate_response_format(MIMEAccept([('multipart/mixed', 1)])) == 'multipart'
+        assert negotiate_response_format(MIMEAccept([('multipart/*', 1)])) == 'multipart'
+
+
+class TestApiTranslateResponseFormats:
+    """app.pyの/api/translateのレスポンス形式のテスト"""
+
+    @pytest.fixture
+    def client(self):
+        """ExcelTranslatorをモックしたテスト用クライアント"""
+        import app as app_module
+        with patch.object(app_module, 'ExcelTranslator') as translator_class:
+            translator = translator_class.return_value
+            translator.validate_api_key.return_value = True
+            translator.translate_excel_file.return_value = b"translated-bytes"
+            app_module.app.config['TESTING'] = True
+            yield app_module.app.test_client()
+
+    def _post(self, client, accept=None):
+        headers = {'Accept': accept} if accept else {}
+        return client.post('/api/translate', data={
+            'file': (io.BytesIO(b"dummy"), '日程表.xlsx'),
+            'context': '日程表',
+        }, content_type='multipart/form-data', headers=headers)
+
+    def test_legacy_json(self, client):
+        """従来のBase64 JSON形式のテスト"""
+        response = self._post(client)
+        data = response.get_json()
+
+        assert response.status_code == 200
+        assert data['success'] is True
+        assert data['translated_file'] == 'dHJhbnNsYXRlZC1ieXRlcw=='
+
+    def test_binary(self, client):
+        """バイナリ形式のテスト"""
+        response = self._post(client, 'application/octet-stream')
+
+        assert response.status_code == 200
+        assert response.data == b"translated-bytes"
+        assert "filename*=UTF-8''%E6%97%A5%E7%A8%8B%E8%A1%A8_translated.xlsx" in response.headers['Content-Disposition']
+        assert response.headers['X-Translation-Context'] == '%E6%97%A5%E7%A8%8B%E8%A1%A8'
+
+    def test_multipart(self, client):
+        """multipart形式のテスト"""
+        response = self._post(client, 'multipart/mixed')
+        boundary = response.mimetype_params['boundary'].encode()
+        parts = response.data.split(b'--' + boundary)
+
+        assert response.status_code == 200
+        assert parts[-1].strip() == b'--'
+        metadata_headers, metadata_body = parts[1].split(b'\r\n\r\n', 1)
+        assert b'application/json' in metadata_headers
+        assert json.loads(metadata_body)['translated_filename'] == '日程表_translated.xlsx'
+        file_headers, file_body = parts[2].split(b'\r\n\r\n', 1)
+        assert file_body == b"translated-bytes\r\n"
+
+    def test_multiple_languages(self, client):
+        """複数の翻訳先言語を指定するとZIPで返すテスト"""
+        import app as app_module
+        translator = app_module.ExcelTranslator.return_value
+        translator.translate_excel_file_multi.return_value = {'EN-US': b"en-bytes", 'ZH': b"zh-bytes"}
+
+        response = client.post('/api/translate', data={
+            'file': (io.BytesIO(b"dummy"), 'plan.xlsx'),
+            'target_lang': 'EN-US,ZH',
+        }, content_type='multipart/form-data', headers={'Accept': 'application/octet-stream'})
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/zip'
+        assert translator.translate_excel_file_multi.call_args.kwargs['target_langs'] == ['EN-US', 'ZH']
+        archive = zipfile.ZipFile(io.BytesIO(response.data))
+        assert archive.read('plan_translated_EN-US.xlsx') == b"en-bytes"
+        assert archive.read('plan_translated_ZH.xlsx') == b"zh-bytes"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,117 @@
+"""
+翻訳結果キャッシュのテストコード
+"""
+import pytest
+import io
+import os
+import time
+from unittest.mock import patch
+from utils.result_cache import ResultCache, make_cache_key
+
+
+def _age(cache, key, seconds):
+    """キャッシュの最終アクセス時刻を過去に変更"""
+    past = time.time() - seconds
+    os.utime(os.path.join(cache.root_dir, f"{key}.bin"), (past, past))
+
+
+class TestResultCache:
+    """ResultCacheのテスト"""
+
+    def test_make_key(self):
+        """パラメータが異なる場合は別のキーになるテスト"""
+        params = {'target_lang': 'EN-US', 'context': '日程表'}
+        assert make_cache_key('a' * 64, params) == make_cache_key('a' * 64, dict(params))
+        assert make_cache_key('a' * 64, params) != make_cache_key('a' * 64, dict(params, context=''))
+
+    def test_put_and_get(self, tmp_path):
+        """保存した結果を別のインスタンスから取得できるテスト"""
+        key = make_cache_key('a' * 64, {})
+        ResultCache(str(tmp_path / 'cache')).put(key, b'translated', 'application/test', '.xlsx')
+
+        cache = ResultCache(str(tmp_path / 'cache'))
+        cached = cache.get(key)
+        assert cached.mimetype == 'application/test'
+        assert cached.extension == '.xlsx'
+        assert cached.size == len(b'translated')
+        assert cache.get_bytes(key) == b'translated'
+        assert cache.get(make_cache_key('b' * 64, {})) is None
+
+    def test_tee_writer(self, tmp_path):
+        """送信と同時にキャッシュへ書き込めるテスト"""
+        cache = ResultCache(str(tmp_path / 'cache'))
+        key = make_cache_key('a' * 64, {})
+        destination = io.BytesIO()
+
+        writer = cache.open_writer(key, 'application/test', '.xlsx')
+        tee = writer.tee(destination)
+        tee.write(b'part1')
+        tee.write(b'part2')
+        writer.commit()
+
+        assert destination.getvalue() == b'part1part2'
+        assert cache.get_bytes(key) == b'part1part2'
+
+    def test_abort_discards(self, tmp_path):
+        """中断した書き込みが登録されないテスト"""
+        cache = ResultCache(str(tmp_path / 'cache'))
+        key = make_cache_key('a' * 64, {})
+
+        writer = cache.open_writer(key, 'application/test', '.xlsx')
+        writer.write(b'partial')
+        writer.abort()
+
+        assert cache.get(key) is None
+        assert not [name for name in os.listdir(cache.root_dir) if name.startswith('.tmp-')]
+
+    def test_lru_eviction(self, tmp_path):
+        """上限を超えた場合に最終アクセスが古い結果から削除されるテスト"""
+        cache = ResultCache(str(tmp_path / 'cache'), max_bytes=25)
+        keys = [make_cache_key(str(i) * 64, {}) for i in range(3)]
+        cache.put(keys[0], b'0' * 10, 'application/test', '.xlsx')
+        cache.put(keys[1], b'1' * 10, 'application/test', '.xlsx')
+        _age(cache, keys[0], 30)
+        _age(cache, keys[1], 20)
+        # 最初の結果にアクセスし、2番目を最も古い状態にする
+        assert cache.get(keys[0]) is not None
+
+        cache.put(keys[2], b'2' * 10, 'application/test', '.xlsx')
+
+        assert cache.get(keys[0]) is not None
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[2]) is not None
+
+    def test_invalid_key(self, tmp_path):
+        """不正なキーを拒否するテスト"""
+        cache = ResultCache(str(tmp_path / 'cache'))
+        assert cache.get('../escape') is None
+        with pytest.raises(ValueError):
+            cache.open_writer('../escape', 'application/test', '.xlsx')
+
+
+class TestAppResultCache:
+    """app.pyの/api/translateの結果キャッシュのテスト"""
+
+    def test_identical_upload_is_not_translated_again(self):
+        """同じファイル・パラメータの再送信ではDeepLを呼び出さないテスト"""
+        import app as app_module
+        with patch.object(app_module, 'ExcelTranslator') as translator_class:
+            translator = translator_class.return_value
+            translator.validate_api_key.return_value = True
+            translator.translate_excel_file.return_value = b"translated-bytes"
+            client = app_module.app.test_client()
+
+            responses = [
+                client.post('/api/translate', data={
+                    'file': (io.BytesIO(b"dummy"), 'plan.xlsx'),
+                    'context': context,
+                }, content_type='multipart/form-data', headers={'Accept': 'application/octet-stream'})
+                for context in ('日程表', '日程表', '財務諸表')
+            ]
+
+        assert [r.data for r in responses] == [b"translated-bytes"] * 3
+        assert translator.translate_excel_file.call_count == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
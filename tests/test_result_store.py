@@ -0,0 +1,95 @@
+"""
+翻訳結果ストアのテストコード
+"""
+import pytest
+import os
+import time
+from unittest.mock import patch
+from utils.result_store import ResultStore
+
+
+class TestResultStore:
+    """ResultStoreのテスト"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        """テスト用のストア"""
+        return ResultStore(str(tmp_path), ttl_seconds=60, max_bytes=1024)
+
+    def test_put_and_get(self, store):
+        """保存した結果をトークンで取得できるテスト"""
+        token = store.put(b"translated", "plan_translated.xlsx", "application/octet-stream")
+        stored = store.get(token)
+
+        assert stored is not None
+        assert stored.filename == "plan_translated.xlsx"
+        assert stored.size == len(b"translated")
+        with open(stored.path, 'rb') as f:
+            assert f.read() == b"translated"
+
+    def test_same_content_shares_blob(self, store):
+        """同じ内容は1つのファイルを共有するテスト"""
+        token1 = store.put(b"same", "a.xlsx", "application/octet-stream")
+        token2 = store.put(b"same", "b.xlsx", "application/octet-stream")
+
+        assert token1 != token2
+        assert store.get(token1).path == store.get(token2).path
+        assert len(os.listdir(store.blob_dir)) == 1
+
+    def test_invalid_token(self, store):
+        """不正なトークンのテスト"""
+        assert store.get("") is None
+        assert store.get("../../etc/passwd") is None
+        assert store.get("unknown-token") is None
+
+    def test_expired_token(self, store):
+        """有効期限切れのトークンのテスト"""
+        token = store.put(b"old", "old.xlsx", "application/octet-stream")
+
+        with patch('utils.result_store.time.time', return_value=time.time() + 120):
+            assert store.get(token) is None
+
+    def test_size_based_eviction(self, store):
+        """合計サイズの上限を超えた場合に古い結果から削除されるテスト"""
+        old_token = store.put(b"a" * 600, "old.xlsx", "application/octet-stream")
+        old_path = store.get(old_token).path
+        os.utime(old_path, (time.time() - 10, time.time() - 10))
+
+        new_token = store.put(b"b" * 600, "new.xlsx", "application/octet-stream")
+
+        assert store.get(old_token) is None
+        assert store.get(new_token) is not None
+
+
+class TestDownloadEndpoint:
+    """app.pyのダウンロードエンドポイントのテスト"""
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        """テスト用のFlaskクライアント（一時ディレクトリのストアを使用）"""
+        import app as app_module
+        with patch.object(app_module, 'result_store', ResultStore(str(tmp_path))):
+            app_module.app.config['TESTING'] = True
+            yield app_module.app.test_client(), app_module.result_store
+
+    def test_download_with_range(self, client):
+        """Rangeリクエストで部分取得できるテスト"""
+        test_client, store = client
+        token = store.put(b"0123456789", "plan_translated.xlsx", "application/octet-stream")
+
+        response = test_client.get(f'/download?token={token}', headers={'Range': 'bytes=2-5'})
+
+        assert response.status_code == 206
+        assert response.data == b"2345"
+        assert 'plan_translated.xlsx' in response.headers['Content-Disposition']
+
+    def test_download_unknown_token(self, client):
+        """存在しないトークンはトップページにリダイレクトされるテスト"""
+        test_client, _ = client
+        response = test_client.get('/download?token=missing')
+
+        assert response.status_code == 302
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
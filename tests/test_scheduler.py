@@ -0,0 +1,132 @@
+"""
+送信枠のスケジューラーのテストコード
+"""
+import pytest
+import threading
+import time
+from utils.cancellation import CancellationToken, TranslationCancelled
+from utils.scheduler import FairScheduler, ScheduleTicket
+
+
+class _Holder:
+    """別のスレッドで送信枠を確保し、release() まで保持する"""
+
+    def __init__(self, scheduler, ticket):
+        self.acquired = threading.Event()
+        self._release = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(scheduler, ticket))
+        self._thread.start()
+        assert self.acquired.wait(5)
+
+    def _run(self, scheduler, ticket):
+        with scheduler.slot(ticket):
+            self.acquired.set()
+            self._release.wait(5)
+
+    def release(self):
+        self._release.set()
+        self._thread.join(5)
+
+
+def _queue(scheduler, tickets, order=None):
+    """送信枠を待つスレッドを順に開始し、送信枠を得た順に名前を記録する"""
+    order = [] if order is None else order
+    queued = sum(stats['queued'] for stats in scheduler.stats().values())
+    threads = []
+    for name, ticket in tickets:
+        def run(name=name, ticket=ticket):
+            with scheduler.slot(ticket):
+                order.append(name)
+        thread = threading.Thread(target=run)
+        thread.start()
+        threads.append(thread)
+        # 待機の開始順を確定させる
+        while sum(stats['queued'] for stats in scheduler.stats().values()) < queued + len(threads):
+            time.sleep(0.005)
+    return order, threads
+
+
+class TestFairScheduler:
+    """FairSchedulerのテスト"""
+
+    def test_shortest_job_first(self):
+        """複雑さスコアの小さいリクエストのバッチを先に送信するテスト"""
+        scheduler = FairScheduler(max_concurrent=1, aging_rate=0)
+        holder = _Holder(scheduler, ScheduleTicket('a', 0))
+
+        order, threads = _queue(scheduler, [
+            ('large', ScheduleTicket('b', 1000, 'ultra_safe')),
+            ('small', ScheduleTicket('c', 20, 'fast')),
+        ])
+        holder.release()
+        for thread in threads:
+            thread.join(5)
+
+        assert order == ['small', 'large']
+        stats = scheduler.stats()
+        assert stats['ultra_safe']['granted'] == 1
+        assert stats['ultra_safe']['queued'] == 0
+        assert stats['ultra_safe']['max_wait_ms'] >= stats['fast']['max_wait_ms']
+
+    def test_aging(self):
+        """待機が長いバッチは複雑さスコアが大きくても先に送信するテスト"""
+        scheduler = FairScheduler(max_concurrent=1, aging_rate=100000)
+        holder = _Holder(scheduler, ScheduleTicket('a', 0))
+
+        order, threads = _queue(scheduler, [('large', ScheduleTicket('b', 1000))])
+        time.sleep(0.05)
+        threads += _queue(scheduler, [('small', ScheduleTicket('c', 20))], order)[1]
+        holder.release()
+        for thread in threads:
+            thread.join(5)
+
+        assert order == ['large', 'small']
+
+    def test_fair_share(self):
+        """送信枠の配分に達したクライアントのバッチは他のクライアントの後に送信するテスト"""
+        scheduler = FairScheduler(max_concurrent=2, aging_rate=0)
+        holders = [_Holder(scheduler, ScheduleTicket('a', 0)) for _ in range(2)]
+
+        order, threads = _queue(scheduler, [
+            ('a', ScheduleTicket('a', 0)),
+            ('b', ScheduleTicket('b', 500)),
+        ])
+        # aは送信枠を1つ使用中のため、スコアが小さくても空いた送信枠はbに割り当てる
+        holders[0].release()
+        for thread in threads:
+            thread.join(5)
+        holders[1].release()
+
+        assert order == ['b', 'a']
+
+
+    def test_cancelled_waiter(self):
+        """取り消されたリクエストのバッチは送信枠を待たずに待機をやめるテスト"""
+        scheduler = FairScheduler(max_concurrent=1)
+        holder = _Holder(scheduler, ScheduleTicket('a', 0))
+        cancellation = CancellationToken(poll_interval=0.01)
+        errors = []
+
+        def run():
+            try:
+                with scheduler.slot(ScheduleTicket('b', 0, 'fast', cancellation)):
+                    pass
+            except TranslationCancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        cancellation.cancel('client disconnected')
+        thread.join(5)
+        holder.release()
+
+        assert [e.reason for e in errors] == ['client disconnected']
+        stats = scheduler.stats()
+        assert stats['fast']['cancelled'] == 1
+        assert stats['fast']['queued'] == 0
+        # 取り消したバッチに送信枠は残らない
+        with scheduler.slot(ScheduleTicket('c', 0)):
+            pass
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,92 @@
+"""
+ストリーミング送信のテストコード
+"""
+import pytest
+import io
+import threading
+import openpyxl
+from utils.streaming import WorkbookStream
+
+
+class TestWorkbookStream:
+    """WorkbookStreamのテスト"""
+
+    def test_stream_returns_written_bytes(self):
+        """書き込まれたデータが順に読み取れるテスト"""
+        def save(writer):
+            for i in range(10):
+                writer.write(bytes([i]) * 100)
+
+        stream = WorkbookStream(save, chunk_size=64, max_pending_chunks=2)
+        data = stream.read()
+        stream.close()
+
+        assert data == b''.join(bytes([i]) * 100 for i in range(10))
+        assert stream.bytes_written == 1000
+
+    def test_stream_openpyxl_workbook(self):
+        """シーク不可のライターでもopenpyxlのXLSXを書き出せるテスト"""
+        workbook = openpyxl.Workbook()
+        workbook.active['A1'] = 'こんにちは'
+
+        with WorkbookStream(workbook.save) as stream:
+            data = stream.read()
+
+        loaded = openpyxl.load_workbook(io.BytesIO(data))
+        assert loaded.active['A1'].value == 'こんにちは'
+
+    def test_prime_raises_save_error(self):
+        """書き出し前の失敗がprimeで検出されるテスト"""
+        def save(writer):
+            raise ValueError("broken workbook")
+
+        stream = WorkbookStream(save)
+        with pytest.raises(IOError) as exc_info:
+            stream.prime()
+        stream.close()
+
+        assert "broken workbook" in str(exc_info.value)
+
+    def test_close_cancels_writer(self):
+        """読み取り側が閉じるとバックグラウンドの保存処理が中断されるテスト"""
+        finished = threading.Event()
+
+        def save(writer):
+            try:
+                while True:
+                    writer.write(b'x' * 1024)
+            finally:
+                finished.set()
+
+        stream = WorkbookStream(save, chunk_size=1024, max_pending_chunks=1)
+        stream.prime()
+        stream.close()
+
+        assert finished.wait(timeout=5)
+        assert stream.closed
+
+    def test_on_close_waits_for_save_thread(self):
+        """close() の待機時間内に保存スレッドが終了しない場合、on_close は保存スレッドの終了後に呼び出すテスト"""
+        release = threading.Event()
+        closed = []
+
+        stream = WorkbookStream(lambda writer: release.wait(5), on_close=lambda: closed.append(True),
+                                close_timeout=0.05)
+        stream.close()
+        assert closed == []
+
+        release.set()
+        stream._thread.join(5)
+        assert closed == [True]
+
+        # 保存が先に終了した場合は close() で1回だけ呼び出す
+        stream = WorkbookStream(lambda writer: writer.write(b'data'), on_close=lambda: closed.append(True))
+        assert stream.read() == b'data'
+        stream._thread.join(5)
+        assert len(closed) == 1
+        stream.close()
+        stream.close()
+        assert len(closed) == 2
+
+if __name__ == "__main__":
+    pytest.main([__file__])
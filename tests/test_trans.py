@@ -0,0 +1,111 @@
+"""
+一括翻訳コマンド（trans.py）のテストコード
+"""
+import pytest
+import io
+import os
+import time
+import openpyxl
+from unittest.mock import Mock, patch
+import trans
+from utils.translation_cache import TranslationCache
+
+
+def _fake_translate(texts, source_lang, target_lang):
+    """テキストに翻訳先言語の接頭辞を付けるだけのダミー翻訳"""
+    return [Mock(text=f"{target_lang}:{text}") for text in texts]
+
+
+def _write_workbook(path, values):
+    """セルの値の一覧をA列に書き込んだXLSXを作成"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    workbook = openpyxl.Workbook()
+    for value in values:
+        workbook.active.append([value])
+    workbook.save(path)
+
+
+class TestTransCommand:
+    """trans.pyのテスト"""
+
+    @pytest.fixture
+    def input_dir(self, tmp_path):
+        """入れ子のディレクトリに入力ファイルを配置"""
+        root = tmp_path / 'input'
+        _write_workbook(str(root / 'march' / 'a.xlsx'), ['会議', '報告'])
+        _write_workbook(str(root / 'april' / 'b.xlsx'), ['会議', '出張'])
+        (root / 'notes.txt').write_text('ignored')
+        _write_workbook(str(root / 'march' / 'a_translated.xlsx'), ['Meeting'])
+        return root
+
+    def test_find_input_files(self, input_dir):
+        """ディレクトリ・globパターンから入力ファイルを列挙し、以前の出力を除外するテスト"""
+        found = trans.find_input_files([str(input_dir)])
+        assert [relative for _, relative in found] == [
+            os.path.join('april', 'b.xlsx'), os.path.join('march', 'a.xlsx')
+        ]
+
+        found = trans.find_input_files([str(input_dir / '**' / '*.xlsx'), str(input_dir / 'march' / 'a.xlsx')])
+        assert sorted(relative for _, relative in found) == ['a.xlsx', 'b.xlsx']
+
+    def test_get_output_paths(self):
+        """出力先ディレクトリと翻訳先言語に応じた出力パスのテスト"""
+        assert trans.get_output_paths('in/a.xlsx', 'a.xlsx', None, ['EN-US']) == {'EN-US': 'in/a_translated.xlsx'}
+        assert trans.get_output_paths('in/m/a.xlsx', 'm/a.xlsx', 'out', ['EN-US', 'ZH']) == {
+            'EN-US': os.path.join('out', 'm', 'a_translated_EN-US.xlsx'),
+            'ZH': os.path.join('out', 'm', 'a_translated_ZH.xlsx'),
+        }
+
+    @patch('deepl.Translator.translate_text', side_effect=_fake_translate)
+    def test_translate_directory(self, mock_translate, input_dir, tmp_path, capsys):
+        """ディレクトリを並列に翻訳し、共有キャッシュで重複テキストを再送信しないテスト"""
+        output_dir = tmp_path / 'output'
+        cache_file = str(tmp_path / 'cache.jsonl')
+        argv = [str(input_dir), '-o', str(output_dir), '--jobs', '2', '--cache-file', cache_file, '--api-key', 'key']
+
+        assert trans.main(argv) == 0
+
+        sheet = openpyxl.load_workbook(str(output_dir / 'april' / 'b_translated.xlsx')).active
+        assert [row[0].value for row in sheet.iter_rows()] == ['EN-US:会議', 'EN-US:出張']
+        translated_texts = sorted(text for call in mock_translate.call_args_list for text in call.args[0])
+        assert translated_texts in (['会議', '出張', '報告'], ['会議', '会議', '出張', '報告'])
+        summary = capsys.readouterr().out
+        assert 'Files: 2 total, 2 translated' in summary
+        assert 'files/s' in summary and 'hit rate' in summary
+
+        # 出力が最新のファイルはスキップ
+        mock_translate.reset_mock()
+        assert trans.main(argv) == 0
+        assert not mock_translate.called
+        assert '2 up to date' in capsys.readouterr().out
+
+        # 入力が更新されたファイルのみ翻訳し、キャッシュ済みのテキストは送信しない
+        future = time.time() + 10
+        os.utime(str(input_dir / 'march' / 'a.xlsx'), (future, future))
+        assert trans.main(argv) == 0
+        assert not mock_translate.called
+        assert '1 translated, 1 up to date' in capsys.readouterr().out
+
+    @patch('deepl.Translator.translate_text')
+    def test_dry_run(self, mock_translate, input_dir, tmp_path, capsys):
+        """翻訳せずに送信文字数を推定するテスト（重複・キャッシュ済みのテキストを除く）"""
+        cache_file = str(tmp_path / 'cache.jsonl')
+        TranslationCache(cache_file).put_many('JA', 'EN-US', {'報告': 'Report'})
+
+        code = trans.main([str(input_dir), '-o', str(tmp_path / 'output'), '--cache-file', cache_file,
+                           '-t', 'EN-US,ZH', '--dry-run'])
+
+        assert code == 0
+        assert not mock_translate.called
+        assert not (tmp_path / 'output').exists()
+        # EN-US: 会議・出張（報告はキャッシュ済み）、ZH: 会議・報告・出張
+        assert 'Estimated billable characters: 10' in capsys.readouterr().out
+
+    def test_missing_inputs(self, tmp_path, capsys):
+        """入力ファイル・APIキーがない場合のテスト"""
+        assert trans.main([str(tmp_path), '--api-key', 'key']) == 2
+        assert trans.main([str(tmp_path), '--api-key', '']) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,37 @@
+"""
+翻訳キャッシュのテストコード
+"""
+import pytest
+from utils.translation_cache import TranslationCache
+
+
+class TestTranslationCache:
+    """TranslationCacheのテスト"""
+
+    def test_get_and_put(self):
+        """言語ペアごとに翻訳を保持し、ヒット率を集計するテスト"""
+        cache = TranslationCache()
+        cache.put_many('JA', 'EN-US', {'会議': 'Meeting'})
+
+        assert cache.get_many('JA', 'EN-US', ['会議', '報告']) == {'会議': 'Meeting'}
+        assert cache.get_many('ja', 'en-us', ['会議']) == {'会議': 'Meeting'}
+        assert cache.get_many('JA', 'DE', ['会議']) == {}
+        assert (cache.hits, cache.misses) == (2, 2)
+        assert cache.hit_rate == 0.5
+        assert cache.chars_translated == 2
+
+    def test_persistence(self, tmp_path):
+        """ファイルに保存した翻訳が次回も使用され、不完全な行は無視されるテスト"""
+        path = str(tmp_path / 'cache.jsonl')
+        TranslationCache(path).put_many('JA', 'EN-US', {'会議': 'Meeting', '報告': 'Report'})
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"key": "trunc')
+
+        cache = TranslationCache(path)
+        assert len(cache) == 2
+        assert cache.contains('JA', 'EN-US', '報告')
+        assert cache.hit_rate is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
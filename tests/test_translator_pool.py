@@ -0,0 +1,95 @@
+"""
+翻訳インスタンスのプールのテストコード
+"""
+import pytest
+import io
+from unittest.mock import Mock, patch
+from excel_translator import TranslationAuthorizationError
+from utils.translator_pool import TranslatorPool
+
+
+class TestTranslatorPool:
+    """TranslatorPoolのテスト"""
+
+    def test_reuses_translator_per_key(self):
+        """APIキーごとに翻訳インスタンスを1つだけ作成するテスト"""
+        factory = Mock(side_effect=lambda api_key: Mock(name=api_key))
+        pool = TranslatorPool(factory)
+
+        assert pool.get('key-a') is pool.get('key-a')
+        assert pool.get('key-a') is not pool.get('key-b')
+        assert factory.call_count == 2
+
+    def test_validation_cached_with_ttl(self):
+        """APIキーの検証結果を有効期限までキャッシュし、破棄すると再検証するテスト"""
+        translator = Mock()
+        translator.validate_api_key.return_value = True
+        pool = TranslatorPool(lambda api_key: translator, validation_ttl=60)
+
+        assert pool.is_valid('key') and pool.is_valid('key')
+        assert translator.validate_api_key.call_count == 1
+
+        pool.invalidate('key')
+        assert pool.is_valid('key')
+        assert translator.validate_api_key.call_count == 2
+
+        pool.validation_ttl = 0
+        assert pool.is_valid('key')
+        assert translator.validate_api_key.call_count == 3
+
+    def test_invalid_key_not_cached(self):
+        """無効と判定した結果はキャッシュしないテスト"""
+        translator = Mock()
+        translator.validate_api_key.side_effect = [False, True]
+        pool = TranslatorPool(lambda api_key: translator)
+
+        assert not pool.is_valid('key')
+        assert pool.is_valid('key')
+
+    def test_reset_after_fork(self):
+        """別のプロセスから継承したプールは翻訳インスタンスを作り直すテスト"""
+        factory = Mock(side_effect=lambda api_key: Mock())
+        pool = TranslatorPool(factory)
+        first = pool.get('key')
+
+        with patch('utils.translator_pool.os.getpid', return_value=-1):
+            assert pool.get('key') is not first
+        assert factory.call_count == 2
+
+
+class TestAppTranslatorPool:
+    """app.pyの翻訳インスタンスの共有のテスト"""
+
+    def _post(self, client, content):
+        return client.post('/api/translate', data={
+            'file': (io.BytesIO(content), 'plan.xlsx'),
+        }, content_type='multipart/form-data', headers={'Accept': 'application/octet-stream'})
+
+    def test_validation_cached_across_requests(self):
+        """リクエストをまたいで翻訳インスタンスと検証結果を再利用し、認証エラーで再検証するテスト"""
+        import app as app_module
+        with patch.object(app_module, 'ExcelTranslator') as translator_class:
+            translator = translator_class.return_value
+            translator.validate_api_key.return_value = True
+            translator.translate_excel_file.return_value = b"translated-bytes"
+            client = app_module.app.test_client()
+
+            assert self._post(client, b"first").data == b"translated-bytes"
+            assert self._post(client, b"second").data == b"translated-bytes"
+            assert translator_class.call_count == 1
+            assert translator.validate_api_key.call_count == 1
+
+            # 翻訳中の認証エラーで検証結果を破棄
+            translator.translate_excel_file.side_effect = TranslationAuthorizationError("DeepL APIキーが無効です。")
+            response = self._post(client, b"third")
+            assert response.status_code == 500
+            assert response.get_json()['error'] == "DeepL APIキーが無効です。"
+
+            translator.validate_api_key.return_value = False
+            response = self._post(client, b"fourth")
+            assert response.status_code == 500
+            assert translator.validate_api_key.call_count == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
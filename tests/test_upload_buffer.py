@@ -0,0 +1,95 @@
+"""
+アップロードバッファ操作のテストコード
+"""
+import pytest
+import io
+import tempfile
+import zipfile
+from utils.upload_buffer import BufferReader, UploadBuffer, open_buffer_reader, read_header
+
+
+class TestUploadBuffer:
+    """バッファ読み取りのテスト"""
+
+    def test_buffer_reader_read_and_seek(self):
+        """読み取りとシークのテスト"""
+        reader = BufferReader(memoryview(b"0123456789"))
+        assert reader.read(3) == b"012"
+        assert reader.tell() == 3
+        reader.seek(-2, io.SEEK_END)
+        assert reader.read() == b"89"
+        reader.seek(1)
+        assert reader.read(2) == b"12"
+
+    def test_buffer_reader_closed(self):
+        """クローズ後の読み取りエラーのテスト"""
+        reader = BufferReader(bytearray(b"abc"))
+        reader.close()
+        with pytest.raises(ValueError):
+            reader.read(1)
+
+    def test_buffer_reader_zipfile(self):
+        """ZIP解析に使用できるテスト"""
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, 'w') as archive:
+            archive.writestr('sheet.xml', '<sheet/>')
+
+        with zipfile.ZipFile(BufferReader(memoryview(output.getvalue()))) as archive:
+            assert archive.read('sheet.xml') == b'<sheet/>'
+
+    def test_open_buffer_reader_bytes(self):
+        """bytesはBytesIOとして開かれるテスト"""
+        assert isinstance(open_buffer_reader(b"abc"), io.BytesIO)
+        assert isinstance(open_buffer_reader(memoryview(b"abc")), BufferReader)
+
+    def test_read_header(self):
+        """先頭バイト取得のテスト"""
+        assert read_header(memoryview(b"PK\x03\x04rest"), 2) == b"PK"
+
+
+class TestUploadBufferSpooling:
+    """アップロードの退避とメモリマップのテスト"""
+
+    def test_small_upload_is_read_into_memory(self):
+        """閾値以下のアップロードはbytesとして読み込まれるテスト"""
+        with UploadBuffer(io.BytesIO(b"small"), threshold=1024) as upload:
+            assert upload.buffer == b"small"
+            assert not upload.is_mapped
+
+    def test_large_memory_stream_is_spooled_and_mapped(self):
+        """メモリ上の大きなストリームは一時ファイル経由でマップされるテスト"""
+        data = b"x" * 4096
+        upload = UploadBuffer(io.BytesIO(data), threshold=1024)
+        assert upload.is_mapped
+        assert upload.size == len(data)
+        assert upload.buffer[:4] == b"xxxx"
+        assert bytes(upload.buffer) == data
+        upload.close()
+        assert upload.buffer is None
+
+    def test_large_file_stream_is_mapped_without_copy(self):
+        """ディスク上のストリームは退避せずにマップされるテスト"""
+        with tempfile.TemporaryFile() as stream:
+            stream.write(b"PK" + b"y" * 4096)
+            with UploadBuffer(stream, threshold=1024) as upload:
+                assert upload.is_mapped
+                assert upload._spool_file is None
+                assert read_header(upload.buffer, 2) == b"PK"
+
+    def test_mapped_buffer_survives_consumer_close(self):
+        """利用側がclose()してもバッファが使い続けられるテスト（xlrd対策）"""
+        with UploadBuffer(io.BytesIO(b"w" * 4096), threshold=1024) as upload:
+            upload.buffer.close()
+            assert upload.buffer[:2] == b"ww"
+        assert upload._mmap is None
+
+    def test_mapped_buffer_closes_after_reader(self):
+        """リーダーを閉じた後にメモリマップを閉じられるテスト"""
+        upload = UploadBuffer(io.BytesIO(b"z" * 4096), threshold=1024)
+        with open_buffer_reader(upload.buffer) as reader:
+            assert reader.read(2) == b"zz"
+        upload.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
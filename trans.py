@@ -1,106 +1,286 @@
-import openpyxl
-import deepl
+"""
+Excelファイルの一括翻訳コマンド（ExcelTranslatorを使用）
+
+ファイル・ディレクトリ・globパターンを指定して、複数のファイルを並列に翻訳する。
+翻訳キャッシュは全ファイルで共有し、--cache-file を指定すると次回の実行でも再利用する。
+
+使用例:
+    python trans.py 日程表.xlsx
+    python trans.py input/ -o output/ -t EN-US,ZH --jobs 4
+    python trans.py "reports/**/*.xlsx" --cache-file .translation-cache.jsonl --dry-run
+"""
+import argparse
+import glob
+import logging
 import os
-import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+from excel_translator import ExcelTranslator
+from utils.translation_cache import TranslationCache
 
-# --- 設定 (ここをご自身の環境に合わせて編集してください) ---
+INPUT_EXTENSIONS = ('.xlsx',)
+DEFAULT_SUFFIX = '_translated'
 
-# 1. DeepLのAPIキーを入力してください
-DEEPL_API_KEY = "a8ee58ad-8642-4c06-85b4-bc7d0e6e35a8:fx"
 
-# 2. 翻訳したい元のExcelファイル名
-INPUT_FILENAME = "日程表.xlsx"
+def parse_languages(value: str) -> List[str]:
+    """翻訳先言語の指定（カンマ区切り）を重複のない一覧に変換"""
+    languages = []
+    for lang in value.split(','):
+        lang = lang.strip().upper()
+        if lang and lang not in languages:
+            languages.append(lang)
+    return languages
 
-# 3. 翻訳後に保存するファイル名
-OUTPUT_FILENAME = "Itinerary_English.xlsx"
 
-# 4. 日本語の定型文を、より翻訳しやすい表現に置換するルール
-ITINERARY_REPLACEMENTS = {
-    "食事：": "Meal: ",
-    "朝食": "Breakfast",
-    "昼食": "Lunch",
-    "夕食": "Dinner",
-    "宿泊：": "Accommodation: ",
-    "様": "",  # 「田中様」を「Tanaka」とするため
-    "ご一行": "Group",
-    "各自": "on your own / at your leisure",
-    "自由行動": "Free time",
-    "---": "---" # 区切り線はそのまま
-}
-# -----------------------------------------------------------
+def is_translated_output(path: str, suffix: str) -> bool:
+    """以前の実行で作成された翻訳結果のファイルか判定（入力から除外する）"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.endswith(suffix) or f"{suffix}_" in stem
 
 
-def preprocess_text(text, replacements):
+def find_input_files(patterns: List[str], suffix: str = DEFAULT_SUFFIX) -> List[Tuple[str, str]]:
     """
-    翻訳前に、定義したルールに基づいてテキストを置換する関数
+    ファイル・ディレクトリ・globパターンから入力ファイルを列挙
+
+    Args:
+        patterns: 入力の指定
+        suffix: 翻訳結果のファイル名の接尾辞（一致するファイルは除外）
+
+    Returns:
+        (入力ファイルのパス, 出力先での相対パス) の一覧
     """
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    return text
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            # ディレクトリは再帰的に探索し、構成を出力先に再現する
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    found.setdefault(os.path.abspath(path), (path, os.path.relpath(path, pattern)))
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+            for path in matches:
+                if os.path.isfile(path):
+                    found.setdefault(os.path.abspath(path), (path, os.path.basename(path)))
 
-def translate_excel_itinerary():
+    return [
+        (path, relative) for path, relative in found.values()
+        if path.lower().endswith(INPUT_EXTENSIONS)
+        # Excelの一時ファイル
+        and not os.path.basename(path).startswith('~$')
+        and not is_translated_output(path, suffix)
+    ]
+
+
+def get_output_paths(input_path: str, relative: str, output_dir: Optional[str], target_langs: List[str],
+                     suffix: str = DEFAULT_SUFFIX) -> Dict[str, str]:
     """
-    旅行の旅程表Excelを、文脈を考慮して自然な英語に翻訳する。
+    翻訳先言語ごとの出力ファイルのパスを取得
+
+    Args:
+        input_path: 入力ファイルのパス
+        relative: 出力先での相対パス
+        output_dir: 出力先ディレクトリ（省略時は入力ファイルと同じディレクトリ）
+        target_langs: 翻訳先言語
+        suffix: ファイル名の接尾辞
+
+    Returns:
+        翻訳先言語ごとの出力ファイルのパス
     """
-    if "YOUR_DEEPL_API_KEY" in DEEPL_API_KEY:
-        print("エラー: スクリプト内の DEEPL_API_KEY をご自身のキーに書き換えてください。")
-        return
-    if not os.path.exists(INPUT_FILENAME):
-        print(f"エラー: 入力ファイル '{INPUT_FILENAME}' が見つかりません。")
-        return
-
-    try:
-        translator = deepl.Translator(DEEPL_API_KEY)
-        print("DeepL APIに接続しました。")
-
-        workbook = openpyxl.load_workbook(INPUT_FILENAME)
-        print(f"'{INPUT_FILENAME}' を読み込み、旅程表として翻訳を開始します...")
-
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-            print(f"\nシート '{sheet_name}' の翻訳を開始...")
-
-            cells_to_translate = []
-            texts_to_translate = []
-
-            for row in sheet.iter_rows():
-                for cell in row:
-                    if isinstance(cell.value, str) and cell.value.strip():
-                        cells_to_translate.append(cell)
-                        # --- 前処理の実行 ---
-                        text = preprocess_text(cell.value, ITINERARY_REPLACEMENTS)
-                        texts_to_translate.append(text)
-
-            if not texts_to_translate:
-                print(f"シート '{sheet_name}' に翻訳対象のテキストがありませんでした。")
-                continue
-
-            # --- DeepL APIで翻訳を実行 ---
-            results = translator.translate_text(
-                texts_to_translate,
-                source_lang="JA",
-                target_lang="EN-US", # または "EN-GB"
-                # ★改善点: 文脈を伝える
-                context="This is a travel itinerary for a tour group."
+    base = os.path.join(output_dir, relative) if output_dir else input_path
+    stem, ext = os.path.splitext(base)
+    if len(target_langs) == 1:
+        return {target_langs[0]: f"{stem}{suffix}{ext}"}
+    return {target_lang: f"{stem}{suffix}_{target_lang}{ext}" for target_lang in target_langs}
+
+
+def is_up_to_date(input_path: str, output_paths: Dict[str, str]) -> bool:
+    """全ての出力ファイルが入力ファイルより新しいか判定"""
+    input_mtime = os.path.getmtime(input_path)
+    for output_path in output_paths.values():
+        try:
+            if os.path.getmtime(output_path) < input_mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class RunStats:
+    """実行結果の集計（スレッドセーフ）"""
+
+    def __init__(self):
+        self.files_total = 0
+        self.files_translated = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.chars_estimated = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, status: str, chars: int = 0) -> None:
+        """ファイルの処理結果を記録"""
+        with self._lock:
+            if status == 'translated':
+                self.files_translated += 1
+            elif status == 'skipped':
+                self.files_skipped += 1
+            elif status == 'failed':
+                self.files_failed += 1
+            self.chars_estimated += chars
+
+    def summary(self, cache: TranslationCache, dry_run: bool = False) -> str:
+        """スループットの集計を文字列で取得"""
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        lines = [
+            f"Files: {self.files_total} total, {self.files_translated} {'estimated' if dry_run else 'translated'}, "
+            f"{self.files_skipped} up to date, {self.files_failed} failed",
+        ]
+        if dry_run:
+            lines.append(f"Estimated billable characters: {self.chars_estimated}")
+        else:
+            hit_rate = cache.hit_rate
+            lines.append(
+                f"Elapsed: {elapsed:.1f}s, {self.files_translated / elapsed:.2f} files/s, "
+                f"{cache.chars_translated / elapsed:.0f} chars/s ({cache.chars_translated} chars sent to DeepL)"
             )
+            lines.append(
+                f"Cache: {cache.hits} hits, {cache.misses} misses"
+                + (f" ({hit_rate:.1%} hit rate)" if hit_rate is not None else "")
+            )
+        return "\n".join(lines)
+
+
+class CostEstimator:
+    """
+    DeepLに送信する文字数の推定（スレッドセーフ）
+
+    キャッシュ済みのテキストと、先に推定した別のファイルと重複するテキストは数えない
+    （実際の翻訳では共有キャッシュから再利用されるため）。
+    """
+
+    def __init__(self, translator: ExcelTranslator, cache: TranslationCache):
+        self.translator = translator
+        self.cache = cache
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def estimate_file(self, input_path: str, context: str, source_lang: str, target_langs: List[str]) -> int:
+        """
+        ファイルの翻訳でDeepLに送信する文字数を推定
+
+        Returns:
+            推定文字数
+        """
+        with open(input_path, 'rb') as f:
+            texts = self.translator.collect_unique_texts(f.read(), context)
+        chars = 0
+        with self._lock:
+            for target_lang in target_langs:
+                for text in texts:
+                    key = self.cache.make_key(source_lang, target_lang, text)
+                    if key in self._seen or self.cache.contains(source_lang, target_lang, text):
+                        continue
+                    self._seen.add(key)
+                    chars += len(text)
+        return chars
+
+
+def translate_file(translator: ExcelTranslator, input_path: str, output_paths: Dict[str, str], context: str,
+                   source_lang: str, target_langs: List[str]) -> None:
+    """ファイルを翻訳して言語ごとに保存"""
+    with open(input_path, 'rb') as f:
+        outputs = translator.translate_excel_file_multi(f.read(), context, source_lang, target_langs)
+    for target_lang, output_path in output_paths.items():
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        # 途中で中断しても不完全なファイルを最新の出力と判定しないように置き換える
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(outputs[target_lang])
+        os.replace(tmp_path, output_path)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数の定義"""
+    parser = argparse.ArgumentParser(description='Excelファイルを一括翻訳します。')
+    parser.add_argument('inputs', nargs='+', help='入力ファイル・ディレクトリ・globパターン（** で再帰）')
+    parser.add_argument('-o', '--output-dir', help='出力先ディレクトリ（省略時は入力ファイルと同じ場所）')
+    parser.add_argument('-s', '--source-lang', default='JA', help='翻訳元言語（既定: JA）')
+    parser.add_argument('-t', '--target-lang', default='EN-US', help='翻訳先言語（カンマ区切りで複数指定可、既定: EN-US）')
+    parser.add_argument('-c', '--context', default='', help='翻訳文脈（日程表、事業計画など）')
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='同時に翻訳するファイル数（既定: 4）')
+    parser.add_argument('--cache-file', help='翻訳キャッシュの保存先（省略時は実行中のみ共有）')
+    parser.add_argument('--suffix', default=DEFAULT_SUFFIX, help=f'出力ファイル名の接尾辞（既定: {DEFAULT_SUFFIX}）')
+    parser.add_argument('--force', action='store_true', help='出力が最新の場合も翻訳する')
+    parser.add_argument('--dry-run', action='store_true', help='翻訳せずにDeepLに送信する文字数を推定する')
+    parser.add_argument('--api-key', default=os.environ.get('DEEPL_API_KEY'), help='DeepL APIキー（既定: 環境変数 DEEPL_API_KEY）')
+    parser.add_argument('-v', '--verbose', action='store_true', help='詳細なログを出力する')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    コマンドのエントリーポイント
+
+    Returns:
+        終了コード（翻訳に失敗したファイルがある場合は1）
+    """
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    target_langs = parse_languages(args.target_lang)
+    if not target_langs:
+        print("エラー: 翻訳先言語を指定してください。", file=sys.stderr)
+        return 2
+    if not args.api_key and not args.dry_run:
+        print("エラー: DeepL APIキーを --api-key または環境変数 DEEPL_API_KEY で指定してください。", file=sys.stderr)
+        return 2
+
+    files = find_input_files(args.inputs, args.suffix)
+    if not files:
+        print("エラー: 翻訳対象のExcelファイルが見つかりません。", file=sys.stderr)
+        return 2
 
-            # 翻訳結果をセルに書き戻す
-            for cell, result in zip(cells_to_translate, results):
-                print(f"  {cell.coordinate}: '{cell.value}' -> '{result.text}'")
-                cell.value = result.text
+    cache = TranslationCache(args.cache_file)
+    # 推定のみの場合はDeepLに接続しないため、APIキーがなくてもよい
+    translator = ExcelTranslator(args.api_key or 'dry-run', translation_cache=cache)
+    estimator = CostEstimator(translator, cache)
+    stats = RunStats()
+    stats.files_total = len(files)
 
-            print(f"シート '{sheet_name}' の翻訳が完了しました。")
+    def process(input_path: str, relative: str) -> str:
+        output_paths = get_output_paths(input_path, relative, args.output_dir, target_langs, args.suffix)
+        if not args.force and is_up_to_date(input_path, output_paths):
+            stats.add('skipped')
+            return f"skip  {input_path} (up to date)"
+        started_at = time.monotonic()
+        try:
+            if args.dry_run:
+                chars = estimator.estimate_file(input_path, args.context, args.source_lang, target_langs)
+                stats.add('translated', chars)
+                return f"est   {input_path}: {chars} chars"
+            translate_file(translator, input_path, output_paths, args.context, args.source_lang, target_langs)
+        except Exception as e:
+            stats.add('failed')
+            return f"fail  {input_path}: {e}"
+        stats.add('translated')
+        return f"done  {input_path} -> {', '.join(output_paths.values())} ({time.monotonic() - started_at:.1f}s)"
 
-        workbook.save(OUTPUT_FILENAME)
-        print(f"\n✅ 翻訳がすべて完了しました！ 結果を '{OUTPUT_FILENAME}' に保存しました。")
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = [executor.submit(process, path, relative) for path, relative in files]
+        for index, future in enumerate(as_completed(futures), 1):
+            print(f"[{index}/{len(files)}] {future.result()}")
 
-    except deepl.exceptions.AuthorizationError:
-        print("エラー: DeepLのAPIキーが無効です。")
-    except deepl.exceptions.QuotaExceededException:
-        print("エラー: DeepLの無料版の文字数制限に達しました。")
-    except Exception as e:
-        print(f"予期せぬエラーが発生しました: {e}")
+    print()
+    print(stats.summary(cache, args.dry_run))
+    return 1 if stats.files_failed else 0
 
 
 if __name__ == "__main__":
-    translate_excel_itinerary()
+    sys.exit(main())
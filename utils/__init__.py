@@ -4,8 +4,10 @@
 from .validators import ValidationError, validate_file_upload, validate_translation_params, validate_api_key, validate_environment
 from .response_helpers import (
     create_error_response, create_success_response, create_translation_result_response,
-    create_health_response, log_request_info, handle_exception
+    create_health_response, log_request_info, handle_exception,
+    negotiate_response_format, create_binary_file_response, create_multipart_response
 )
+from .upload_buffer import BufferReader, open_buffer_reader, read_header
 
 __all__ = [
     'ValidationError',
@@ -18,5 +20,11 @@ __all__ = [
     'create_translation_result_response',
     'create_health_response',
     'log_request_info',
-    'handle_exception'
+    'handle_exception',
+    'negotiate_response_format',
+    'create_binary_file_response',
+    'create_multipart_response',
+    'BufferReader',
+    'open_buffer_reader',
+    'read_header'
 ]
\ No newline at end of file
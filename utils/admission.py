@@ -0,0 +1,196 @@
+"""
+ワークブックの解析前のメモリ使用量の見積もりと、プロセスごとのメモリ予算による受付制御
+"""
+import logging
+import math
+import threading
+import time
+import zipfile
+from typing import Any, Dict, Optional
+
+from utils.upload_buffer import BufferLike, open_buffer_reader, read_header
+
+
+logger = logging.getLogger(__name__)
+
+# 解析後のメモリ使用量の見積もり係数（実測値の比率で調整する）
+# tracemallocによる実測では、翻訳までのピークはXLSXで展開後のXMLの約18〜20倍、
+# XLSでファイルサイズの約31倍だったため、保存時の分を見込んで余裕を持たせている
+XLSX_WORKSHEET_FACTOR = 24.0
+XLSX_SHARED_STRINGS_FACTOR = 24.0
+XLSX_OTHER_FACTOR = 2.0
+XLS_FACTOR = 40.0
+# 解析するファイル以外に必要な固定のメモリ（バイト）
+BASE_OVERHEAD = 4 * 1024 * 1024
+
+_OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+
+def estimate_workbook_memory(buffer: BufferLike) -> int:
+    """
+    ワークブックを解析・翻訳・保存する間のピークメモリを、解析せずに見積もる
+
+    XLSXはZIPの中央ディレクトリに記録された展開後のサイズ、XLSはファイルサイズから見積もる。
+
+    Args:
+        buffer: アップロードされたファイルのバッファ
+
+    Returns:
+        見積もったピークメモリ（バイト）
+    """
+    size = len(buffer)
+    if read_header(buffer, len(_OLE_SIGNATURE)) == _OLE_SIGNATURE:
+        return int(BASE_OVERHEAD + size * XLS_FACTOR)
+
+    try:
+        with zipfile.ZipFile(open_buffer_reader(buffer)) as archive:
+            estimate = 0.0
+            for info in archive.infolist():
+                name = info.filename.lower()
+                if name.startswith('xl/worksheets/') and name.endswith('.xml'):
+                    estimate += info.file_size * XLSX_WORKSHEET_FACTOR
+                elif name == 'xl/sharedstrings.xml':
+                    estimate += info.file_size * XLSX_SHARED_STRINGS_FACTOR
+                else:
+                    estimate += info.file_size * XLSX_OTHER_FACTOR
+    except zipfile.BadZipFile:
+        # 形式を判定できない場合はXLSと同じ倍率で見積もる（解析時にエラーになる）
+        return int(BASE_OVERHEAD + size * XLS_FACTOR)
+    return int(BASE_OVERHEAD + estimate)
+
+
+class AdmissionRejected(Exception):
+    """メモリ予算に空きがなく、待機時間内に受け付けられなかった場合のエラー"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MemoryReservation:
+    """受け付けたリクエストのメモリ予約（処理の完了時に release() する）"""
+
+    def __init__(self, controller: 'AdmissionController', estimate: int):
+        self.controller = controller
+        self.estimate = estimate
+        self.admitted_at = time.monotonic()
+        self.released = False
+
+    def release(self, actual_peak: Optional[int] = None) -> None:
+        """
+        予約を解放（2回目以降の呼び出しは無視）
+
+        Args:
+            actual_peak: 実測したピークメモリ（バイト、計測していない場合はNone）
+        """
+        self.controller._release(self, actual_peak)
+
+
+class AdmissionController:
+    """
+    プロセスごとのメモリ予算に対してリクエストを受け付ける制御
+
+    ワークブックの解析前に見積もったメモリを予算から予約し、予算に空きがない場合は
+    queue_timeout 秒まで待機する。待機しても空かない場合は AdmissionRejected を送出する。
+    1件で予算を超えるリクエストは、他に予約がない場合のみ受け付ける。
+    実測したピークメモリを受け取った場合は、見積もりとの比率を集計する。スレッドセーフ。
+    """
+
+    def __init__(self, budget_bytes: int, queue_timeout: float = 10.0):
+        """
+        Args:
+            budget_bytes: プロセスごとのメモリ予算（バイト、0以下の場合は制限なし）
+            queue_timeout: 予算の空きを待つ時間の上限（秒）
+        """
+        self.budget_bytes = budget_bytes
+        self.queue_timeout = queue_timeout
+        self.reserved = 0
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._ratios = []
+        self._hold_seconds: Optional[float] = None
+        self._condition = threading.Condition()
+
+    def _fits(self, estimate: int) -> bool:
+        """予算に空きがあるか判定（ロック取得中に呼び出す）"""
+        if self.budget_bytes <= 0 or self.active == 0:
+            return True
+        return self.reserved + estimate <= self.budget_bytes
+
+    def retry_after(self) -> int:
+        """再試行までの目安（秒、受け付けたリクエストの平均処理時間）"""
+        return max(1, math.ceil(self._hold_seconds if self._hold_seconds is not None else 5))
+
+    def reserve(self, estimate: int, block: bool = False) -> MemoryReservation:
+        """
+        見積もったメモリを予約
+
+        Args:
+            estimate: 見積もったピークメモリ（バイト）
+            block: 予算が空くまで待ち続ける場合True（バックグラウンドのジョブなど）
+
+        Returns:
+            メモリ予約
+
+        Raises:
+            AdmissionRejected: blockがFalseで、queue_timeout 秒以内に予算が空かなかった場合
+        """
+        deadline = time.monotonic() + self.queue_timeout
+        with self._condition:
+            self.queued += 1
+            try:
+                while not self._fits(estimate):
+                    remaining = None if block else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejected(
+                            f"Memory budget exhausted ({self.reserved // (1024 * 1024)}/"
+                            f"{self.budget_bytes // (1024 * 1024)} MB reserved, "
+                            f"{estimate // (1024 * 1024)} MB requested)",
+                            self.retry_after()
+                        )
+                    self._condition.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.reserved += estimate
+            self.active += 1
+            self.admitted += 1
+        return MemoryReservation(self, estimate)
+
+    def _release(self, reservation: MemoryReservation, actual_peak: Optional[int]) -> None:
+        """予約を解放し、処理時間と見積もりの精度を記録"""
+        with self._condition:
+            if reservation.released:
+                return
+            reservation.released = True
+            self.reserved -= reservation.estimate
+            self.active -= 1
+            hold = time.monotonic() - reservation.admitted_at
+            self._hold_seconds = hold if self._hold_seconds is None else 0.8 * self._hold_seconds + 0.2 * hold
+            if actual_peak is not None and reservation.estimate:
+                self._ratios.append(actual_peak / reservation.estimate)
+                del self._ratios[:-100]
+            self._condition.notify_all()
+        if actual_peak is not None:
+            logger.info(
+                f"Memory estimate {reservation.estimate / (1024 * 1024):.1f} MB, "
+                f"actual peak {actual_peak / (1024 * 1024):.1f} MB"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """予約中のメモリ・受付件数と、見積もりに対する実測の比率（直近100件）"""
+        with self._condition:
+            ratios = list(self._ratios)
+            return {
+                'budget_mb': self.budget_bytes // (1024 * 1024),
+                'reserved_mb': round(self.reserved / (1024 * 1024), 1),
+                'active': self.active,
+                'queued': self.queued,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'estimate_samples': len(ratios),
+                'actual_to_estimate_avg': round(sum(ratios) / len(ratios), 3) if ratios else None,
+                'actual_to_estimate_max': round(max(ratios), 3) if ratios else None,
+            }
@@ -0,0 +1,173 @@
+"""
+複数ファイルの一括翻訳の入力（複数ファイル・ZIP）の展開と結果のZIP作成
+"""
+import json
+import logging
+import os
+import posixpath
+import shutil
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Any, Dict, IO, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls')
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BatchLimitError(ValueError):
+    """一括翻訳の入力がファイル数・サイズの上限を超えた場合のエラー"""
+
+
+@dataclass
+class BatchInput:
+    """一括翻訳の入力ファイル"""
+    name: str
+    path: str
+    size: int
+
+
+def normalize_member_name(name: str) -> Optional[str]:
+    """
+    ZIP内のファイル名を安全な相対パスに変換
+
+    Args:
+        name: ZIP内のファイル名
+
+    Returns:
+        相対パス（ディレクトリ・Excel以外・作業ディレクトリ外を指す場合はNone）
+    """
+    parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    # macOSのZIPに含まれるメタデータ
+    if parts[0] == '__MACOSX' or parts[-1].startswith('._'):
+        return None
+    if not parts[-1].lower().endswith(WORKBOOK_EXTENSIONS):
+        return None
+    return '/'.join(parts)
+
+
+def unique_entry_name(name: str, used: Set[str]) -> str:
+    """
+    ZIPのエントリ名が重複しないように連番を付与
+
+    Args:
+        name: エントリ名
+        used: 使用済みのエントリ名（追加される）
+
+    Returns:
+        重複しないエントリ名
+    """
+    candidate = name
+    stem, ext = posixpath.splitext(name)
+    index = 2
+    while candidate in used:
+        candidate = f"{stem} ({index}){ext}"
+        index += 1
+    used.add(candidate)
+    return candidate
+
+
+class BatchInputCollector:
+    """
+    一括翻訳の入力ファイルを作業ディレクトリに保存
+
+    アップロードされたExcelファイルはそのまま、ZIPはExcelファイルのみ展開する。
+    展開サイズはZIPのヘッダーではなく実際に書き出したバイト数で制限するため、
+    圧縮率の高いZIPでも上限を超えて展開しない。
+    """
+
+    def __init__(self, work_dir: str, max_files: int = 200, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            work_dir: 保存先の作業ディレクトリ
+            max_files: ファイル数の上限
+            max_bytes: 合計サイズの上限（バイト）
+        """
+        self.work_dir = work_dir
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.inputs: List[BatchInput] = []
+        self.skipped: List[str] = []
+        self.total_bytes = 0
+
+    def add(self, stream: IO[bytes], filename: str) -> None:
+        """
+        アップロードされたファイルを追加（ZIPの場合は展開）
+
+        Args:
+            stream: ファイルのストリーム
+            filename: ファイル名
+        """
+        if filename.lower().endswith('.zip'):
+            self.add_archive(stream)
+            return
+        name = normalize_member_name(os.path.basename(filename.replace('\\', '/')))
+        if name is None:
+            self.skipped.append(filename)
+            return
+        self._store(stream, name)
+
+    def add_archive(self, stream: IO[bytes]) -> None:
+        """
+        ZIP内のExcelファイルを展開して追加
+
+        Args:
+            stream: ZIPファイルのストリーム
+
+        Raises:
+            zipfile.BadZipFile: ZIPファイルとして読み込めない場合
+        """
+        with zipfile.ZipFile(stream) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                name = normalize_member_name(member.filename)
+                if name is None:
+                    self.skipped.append(member.filename)
+                    continue
+                with archive.open(member) as member_stream:
+                    self._store(member_stream, name)
+
+    def _store(self, stream: IO[bytes], name: str) -> None:
+        """ファイルを上限を確認しながら作業ディレクトリに書き出す"""
+        if len(self.inputs) >= self.max_files:
+            raise BatchLimitError(f"Too many files (limit: {self.max_files})")
+        path = os.path.join(self.work_dir, f"input-{len(self.inputs)}{posixpath.splitext(name)[1].lower()}")
+        size = 0
+        with open(path, 'wb') as f:
+            while True:
+                chunk = stream.read(_COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if self.total_bytes + size > self.max_bytes:
+                    raise BatchLimitError(f"Batch is too large (limit: {self.max_bytes // (1024 * 1024)} MB)")
+                f.write(chunk)
+        self.total_bytes += size
+        self.inputs.append(BatchInput(name=name, path=path, size=size))
+
+
+def write_batch_archive(path: str, outputs: List[Dict[str, str]], report: Dict[str, Any]) -> None:
+    """
+    翻訳結果のファイルとレポートをZIPに書き出す
+
+    Args:
+        path: 書き出すZIPのパス
+        outputs: 結果ファイルの一覧（name: エントリ名、path: ファイルのパス）
+        report: report.json として追加するレポート
+    """
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(path, 'w') as archive:
+        for output in outputs:
+            entry = zipfile.ZipInfo(output['name'], date_time=date_time)
+            # XLSXは圧縮済みのため再圧縮しない
+            entry.compress_type = zipfile.ZIP_STORED if output['name'].lower().endswith('.xlsx') else zipfile.ZIP_DEFLATED
+            with open(output['path'], 'rb') as src, archive.open(entry, 'w') as dst:
+                shutil.copyfileobj(src, dst, _COPY_CHUNK_SIZE)
+        archive.writestr('report.json', json.dumps(report, ensure_ascii=False, indent=2))
+    logger.info(f"Wrote batch archive with {len(outputs)} files ({os.path.getsize(path)} bytes)")
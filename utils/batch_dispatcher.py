@@ -0,0 +1,257 @@
+"""
+同時に実行されるリクエストの翻訳バッチの結合と、翻訳中の同じテキストの共有
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Hashable, List, Optional
+
+from utils.cancellation import CancellationToken, TranslationCancelled
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Segment:
+    """送信するテキスト1件の翻訳結果を待つための状態"""
+
+    def __init__(self):
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        # 翻訳結果を待っている呼び出し元の数（0になったテキストは送信しない）
+        self.waiters = 0
+        self._done = threading.Event()
+
+    def set_result(self, result: str) -> None:
+        self.result = result
+        self._done.set()
+
+    def set_error(self, error: BaseException) -> None:
+        self.error = error
+        self._done.set()
+
+    def wait(self, cancellation: Optional[CancellationToken] = None) -> str:
+        if cancellation is None:
+            self._done.wait()
+        else:
+            cancellation.wait(self._done)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _Group:
+    """同じ送信先（言語・パラメータ・文脈）のテキストをまとめた送信前のバッチ"""
+
+    def __init__(self, key: Hashable, deadline: float):
+        self.key = key
+        self.deadline = deadline
+        self.texts: List[str] = []
+        self.segments: List[_Segment] = []
+        self.chars = 0
+        self.callers = 0
+        self.closed = False
+
+
+class BatchDispatcher:
+    """
+    プロセス内のリクエストをまたいで翻訳バッチを結合する送信の窓口
+
+    同じキー（翻訳先・翻訳元言語、フォーマリティ、文脈、APIキー）のテキストは、
+    最初のバッチが届いてから linger_seconds の間に届いた他のリクエストのバッチと
+    1つのバッチにまとめて送信する。最初にバッチを開いた呼び出し元が待機後に送信し、
+    結合されたテキストの翻訳結果はそれぞれの呼び出し元に返す。結合後の文字数が
+    max_batch_chars に達したバッチは待機せずに送信する（それより大きいバッチは結合しない）。
+    送信中・送信待ちのテキストと同じテキストは再度送信せず、同じ翻訳結果を待つ。
+    送信に失敗した場合は、そのバッチのテキストを待つすべての呼び出し元に例外を送出する。
+    slotを渡すと、バッチを開いた呼び出し元のみが送信の直前に slot(ticket) で送信枠を確保する
+    （結合・共有したテキストを待つ呼び出し元は送信枠を使わない）。
+    取り消されたリクエストは翻訳結果を待たずに TranslationCancelled を送出し、
+    送信前のバッチから待つ呼び出し元がいなくなったテキストを除く。スレッドセーフ。
+    """
+
+    def __init__(self, send: Callable[[List[str], Hashable], List[str]], linger_seconds: float = 0.005,
+                 max_batch_chars: int = 2000, slot: Optional[Callable[[Any], ContextManager]] = None):
+        """
+        Args:
+            send: テキストの一覧とキーを受け取り、同じ順の翻訳結果を返す送信関数
+            linger_seconds: バッチを開いてから他のリクエストのテキストを待つ時間（秒、0の場合は待たない）
+            max_batch_chars: 結合するバッチの文字数の上限
+            slot: 送信枠を確保するコンテキストマネージャーを返す関数（ticketを受け取る）
+        """
+        self.send = send
+        self.linger_seconds = linger_seconds
+        self.max_batch_chars = max_batch_chars
+        self.slot = slot or (lambda ticket: nullcontext())
+        self.batches_sent = 0
+        self.texts_requested = 0
+        self.texts_sent = 0
+        self.texts_coalesced = 0
+        self.texts_cancelled = 0
+        self.batches_merged = 0
+        self._open: Dict[Hashable, _Group] = {}
+        self._in_flight: Dict[tuple, _Segment] = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+
+    def _close(self, group: _Group) -> None:
+        """送信待ちのバッチを締め切る（ロック取得中に呼び出す）"""
+        group.closed = True
+        if self._open.get(group.key) is group:
+            del self._open[group.key]
+        self._condition.notify_all()
+
+    def translate(self, texts: List[str], key: Hashable, cancellation: Optional[CancellationToken] = None,
+                  ticket: Any = None) -> List[str]:
+        """
+        テキストを翻訳（同時に届いた同じキーのバッチと結合して送信）
+
+        Args:
+            texts: 翻訳対象のテキスト
+            key: 結合できるバッチを識別するキー（送信関数にそのまま渡す）
+            cancellation: リクエストの取り消し状態
+            ticket: バッチを開いた場合に送信枠の確保（slot）に渡す値
+
+        Returns:
+            翻訳結果（テキストと同じ順）
+
+        Raises:
+            TranslationCancelled: 翻訳結果を待つ間にリクエストが取り消された場合
+            Exception: 送信関数が送出した例外
+        """
+        if not texts:
+            return []
+
+        led_group = None
+        with self._lock:
+            self.texts_requested += len(texts)
+            new_texts = []
+            for text in texts:
+                if (key, text) in self._in_flight or text in new_texts:
+                    self.texts_coalesced += 1
+                else:
+                    new_texts.append(text)
+
+            if new_texts:
+                chars = sum(len(text) for text in new_texts)
+                group = self._open.get(key)
+                if group is None or group.chars + chars > self.max_batch_chars:
+                    group = _Group(key, time.monotonic() + self.linger_seconds)
+                    self._open[key] = group
+                    led_group = group
+                elif group.callers == 1:
+                    self.batches_merged += 1
+                group.callers += 1
+                for text in new_texts:
+                    segment = _Segment()
+                    group.texts.append(text)
+                    group.segments.append(segment)
+                    self._in_flight[(key, text)] = segment
+                group.chars += chars
+                if group.chars >= self.max_batch_chars:
+                    self._close(group)
+
+            segments = [self._in_flight[(key, text)] for text in texts]
+            waiting = list({id(segment): segment for segment in segments}.values())
+            for segment in waiting:
+                segment.waiters += 1
+
+        if led_group is not None and self._flush(led_group, ticket, waiting, cancellation):
+            raise TranslationCancelled(cancellation.reason)
+        try:
+            return [segment.wait(cancellation) for segment in segments]
+        except TranslationCancelled:
+            self._abandon(waiting)
+            raise
+
+    def _abandon(self, segments: List[_Segment]) -> None:
+        """取り消されたリクエストが翻訳結果を待つのをやめる"""
+        with self._lock:
+            for segment in segments:
+                segment.waiters -= 1
+
+    def _drop_abandoned(self, group: _Group) -> None:
+        """待つ呼び出し元がいなくなったテキスト（取り消されたリクエストのみのテキスト）をバッチから除く（ロック取得中に呼び出す）"""
+        cancelled = [(text, segment) for text, segment in zip(group.texts, group.segments) if segment.waiters <= 0]
+        if not cancelled:
+            return
+        for text, segment in cancelled:
+            if self._in_flight.get((group.key, text)) is segment:
+                del self._in_flight[(group.key, text)]
+            segment.set_error(TranslationCancelled('no waiting requests'))
+        kept = [(text, segment) for text, segment in zip(group.texts, group.segments) if segment.waiters > 0]
+        group.texts = [text for text, _ in kept]
+        group.segments = [segment for _, segment in kept]
+        self.texts_cancelled += len(cancelled)
+
+    def _flush(self, group: _Group, ticket: Any, own_segments: List[_Segment],
+               cancellation: Optional[CancellationToken]) -> bool:
+        """
+        バッチを開いた呼び出し元が待機後に送信枠を確保してバッチを送信し、翻訳結果を配る
+
+        Returns:
+            バッチを開いたリクエストが取り消され、そのリクエストの待機をやめた場合True
+        """
+        with self._lock:
+            while not group.closed:
+                remaining = group.deadline - time.monotonic()
+                if remaining <= 0:
+                    self._close(group)
+                    break
+                self._condition.wait(remaining)
+
+        with ExitStack() as stack:
+            cancelled = cancellation is not None and cancellation.cancelled
+            if not cancelled:
+                try:
+                    stack.enter_context(self.slot(ticket))
+                except TranslationCancelled:
+                    cancelled = True
+            if cancelled:
+                # 取り消された場合も、結合した他のリクエストのテキストは取り消しに関係なく送信枠を待って送信する
+                self._abandon(own_segments)
+                with self._lock:
+                    self._drop_abandoned(group)
+                    if not group.texts:
+                        return True
+                stack.enter_context(self.slot(None))
+
+            # 送信枠を待つ間に取り消されたリクエストのみのテキストは送信しない
+            with self._lock:
+                self._drop_abandoned(group)
+                if not group.texts:
+                    return cancelled
+                self.batches_sent += 1
+                self.texts_sent += len(group.texts)
+
+            try:
+                results = self.send(list(group.texts), group.key)
+                if results is None or len(results) != len(group.texts):
+                    raise Exception(f"Translation returned {len(results or [])} results for {len(group.texts)} texts")
+            except BaseException as e:
+                for segment in group.segments:
+                    segment.set_error(e)
+            else:
+                for segment, result in zip(group.segments, results):
+                    segment.set_result(result)
+            finally:
+                with self._lock:
+                    for text, segment in zip(group.texts, group.segments):
+                        if self._in_flight.get((group.key, text)) is segment:
+                            del self._in_flight[(group.key, text)]
+                if group.callers > 1:
+                    logger.info(f"Sent merged batch of {len(group.texts)} texts from {group.callers} requests")
+        return cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        """送信したバッチ数と結合・共有・取り消したテキスト数"""
+        with self._lock:
+            return {
+                'batches_sent': self.batches_sent,
+                'batches_merged': self.batches_merged,
+                'texts_requested': self.texts_requested,
+                'texts_sent': self.texts_sent,
+                'texts_coalesced': self.texts_coalesced,
+                'texts_cancelled': self.texts_cancelled,
+            }
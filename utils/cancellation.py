@@ -0,0 +1,173 @@
+"""
+クライアントの切断・明示的な取り消しによる翻訳の中止
+"""
+import logging
+import os
+import re
+import select
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# 取り消しに使うリクエストIDの形式（クライアントが X-Request-Id ヘッダーで指定する）
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class TranslationCancelled(Exception):
+    """翻訳が取り消された場合のエラー"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Translation cancelled ({reason})")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    リクエストの翻訳の取り消し状態
+
+    cancel() で取り消すほか、probeを渡すと cancelled の参照時に poll_interval 秒に1回まで
+    呼び出し、取り消しの理由（文字列）を返した場合に取り消す（クライアントの切断の検出など）。
+    複数のスレッドから参照されるためスレッドセーフ（probeは同時に1つのスレッドからのみ呼び出す）。
+    """
+
+    def __init__(self, probe: Optional[Callable[[], Optional[str]]] = None, poll_interval: float = 0.5):
+        """
+        Args:
+            probe: 取り消すべき場合に理由を返す確認関数
+            poll_interval: probeを呼び出す最小間隔（秒）
+        """
+        self.probe = probe
+        self.poll_interval = poll_interval
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._last_probe = 0.0
+        self._probe_lock = threading.Lock()
+
+    def cancel(self, reason: str = 'cancelled') -> None:
+        """翻訳を取り消す（2回目以降の呼び出しは理由を変更しない）"""
+        if self._event.is_set():
+            return
+        self.reason = reason
+        self._event.set()
+        logger.info(f"Translation cancelled: {reason}")
+
+    @property
+    def cancelled(self) -> bool:
+        """取り消されているか（必要に応じてprobeで確認する）"""
+        if self._event.is_set():
+            return True
+        if self.probe is None or time.monotonic() - self._last_probe < self.poll_interval:
+            return False
+        # 他のスレッドが確認中の場合は待たずに結果を使う
+        if not self._probe_lock.acquire(blocking=False):
+            return self._event.is_set()
+        try:
+            self._last_probe = time.monotonic()
+            reason = self.probe()
+        finally:
+            self._probe_lock.release()
+        if reason:
+            self.cancel(reason)
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        """取り消されている場合はTranslationCancelledを送出"""
+        if self.cancelled:
+            raise TranslationCancelled(self.reason)
+
+    def wait(self, event: threading.Event) -> None:
+        """
+        イベントが設定されるまで待機
+
+        Raises:
+            TranslationCancelled: 待機中に取り消された場合
+        """
+        while not event.wait(self.poll_interval):
+            self.raise_if_cancelled()
+
+
+def is_connection_closed(sock: Optional[socket.socket]) -> bool:
+    """
+    クライアントが接続を閉じたか判定（受信済みのデータは読み取らない）
+
+    Args:
+        sock: クライアントとのソケット（WSGI環境の gunicorn.socket / werkzeug.socket）
+
+    Returns:
+        接続が閉じられている場合True（判定できない場合はFalse）
+    """
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except ValueError:
+        # TLSのソケット・閉じたファイル記述子は判定しない
+        return False
+    except OSError:
+        return True
+
+
+def is_valid_request_id(request_id: Optional[str]) -> bool:
+    """取り消しに使えるリクエストIDか判定"""
+    return bool(request_id) and bool(_REQUEST_ID_PATTERN.match(request_id))
+
+
+class CancellationStore:
+    """
+    ローカルディスク上の取り消し要求の記録
+
+    翻訳を処理するワーカーと取り消しを受け付けるワーカーが異なる場合でも伝わるよう、
+    リクエストIDごとに空のファイルを作成する。保持期間を過ぎた記録は要求時に削除する。
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 3600):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            ttl_seconds: 取り消し要求を保持する時間（秒）
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _path(self, request_id: str) -> str:
+        if not is_valid_request_id(request_id):
+            raise ValueError(f"Invalid request id: {request_id}")
+        return os.path.join(self.root_dir, f"{request_id}.cancel")
+
+    def request(self, request_id: str) -> None:
+        """リクエストの取り消しを記録"""
+        self.cleanup()
+        with open(self._path(request_id), 'w'):
+            pass
+
+    def is_requested(self, request_id: str) -> bool:
+        """リクエストの取り消しが記録されているか判定"""
+        return os.path.exists(self._path(request_id))
+
+    def clear(self, request_id: str) -> None:
+        """リクエストの取り消しの記録を削除（リクエストの終了時）"""
+        try:
+            os.remove(self._path(request_id))
+        except OSError:
+            pass
+
+    def cleanup(self) -> None:
+        """保持期間を過ぎた取り消し要求を削除"""
+        now = time.time()
+        for name in os.listdir(self.root_dir):
+            if not name.endswith('.cancel'):
+                continue
+            path = os.path.join(self.root_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                continue
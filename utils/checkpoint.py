@@ -0,0 +1,179 @@
+"""
+翻訳済みバッチのチェックポイント保存
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def make_checkpoint_key(file_digest: str, params: Dict[str, Any]) -> str:
+    """
+    ファイルのハッシュと翻訳パラメータからチェックポイントのキーを作成
+
+    Args:
+        file_digest: 入力ファイルのSHA-256ハッシュ
+        params: 言語ペア・文脈・敬語レベルなどの翻訳パラメータ
+
+    Returns:
+        チェックポイントのキー
+    """
+    payload = json.dumps({'file': file_digest, 'params': params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class Checkpoint:
+    """
+    1つのファイル・パラメータの組み合わせに対する翻訳済みバッチの記録
+
+    バッチはテキストと文脈のハッシュで識別し、翻訳が完了するたびに
+    1行のJSONとして追記する。プロセスが途中で終了しても、それまでに
+    書き込まれた行は次回の実行で再利用される（不完全な最終行は無視する）。
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 記録ファイルのパス
+        """
+        self.path = path
+        self.hits = 0
+        self.stored = 0
+        self._entries: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def batch_key(texts: List[str], context: str) -> str:
+        """バッチのテキストと文脈からキーを作成"""
+        payload = json.dumps([context, texts], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, texts: List[str], context: str) -> Optional[List[str]]:
+        """
+        翻訳済みのバッチを取得
+
+        Args:
+            texts: バッチのテキスト
+            context: 翻訳時の文脈
+
+        Returns:
+            翻訳結果（未記録の場合はNone）
+        """
+        translations = self._entries.get(self.batch_key(texts, context))
+        if translations is None or len(translations) != len(texts):
+            return None
+        self.hits += 1
+        return translations
+
+    def contains(self, texts: List[str], context: str) -> bool:
+        """翻訳済みのバッチが記録されているか判定（再利用数には含めない）"""
+        translations = self._entries.get(self.batch_key(texts, context))
+        return translations is not None and len(translations) == len(texts)
+
+    def put(self, texts: List[str], context: str, translations: List[str]) -> None:
+        """
+        翻訳済みのバッチを記録
+
+        Args:
+            texts: バッチのテキスト
+            context: 翻訳時の文脈
+            translations: 翻訳結果
+        """
+        key = self.batch_key(texts, context)
+        line = json.dumps({'batch': key, 'translations': translations}, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._entries[key] = list(translations)
+            # O_APPENDの1回の書き込みで追記し、複数ワーカーからの同時追記でも行が混ざらないようにする
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+            self.stored += 1
+
+    def discard(self) -> None:
+        """記録を削除"""
+        with self._lock:
+            self._entries.clear()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _load(self) -> None:
+        """記録ファイルを読み込み"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry['batch']] = entry['translations']
+                    except (ValueError, KeyError, TypeError):
+                        # 書き込み途中で終了した行
+                        continue
+        except FileNotFoundError:
+            return
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} checkpointed batches from {self.path}")
+
+
+class CheckpointStore:
+    """
+    ローカルディスク上のチェックポイントストア
+
+    チェックポイントはキーごとに1ファイルとして保存し、最終更新から
+    保持期間を過ぎたものは開く際に削除する。ディレクトリを共有すれば
+    再起動後のワーカーや別のワーカーから再開できる。
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 24 * 3600):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            ttl_seconds: チェックポイントを保持する時間（秒）
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root_dir, exist_ok=True)
+
+    def open(self, key: str) -> Checkpoint:
+        """
+        チェックポイントを開く
+
+        Args:
+            key: make_checkpoint_key で作成したキー
+
+        Returns:
+            チェックポイント
+        """
+        if not _KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid checkpoint key: {key}")
+        self.cleanup()
+        return Checkpoint(os.path.join(self.root_dir, f"{key}.jsonl"))
+
+    def cleanup(self) -> None:
+        """保持期間を過ぎたチェックポイントを削除"""
+        now = time.time()
+        for name in os.listdir(self.root_dir):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.root_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+                    logger.info(f"Removed expired checkpoint {name}")
+            except OSError:
+                continue
@@ -0,0 +1,194 @@
+"""
+リクエストごとの処理期限と、期限内に送信できるバッチの見積もり
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# 送信実績がない場合に仮定する1文字あたりの時間（秒、DeepLの応答が遅い場合を想定した控えめな値）
+DEFAULT_SECONDS_PER_CHAR = 0.002
+
+_REPORT_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Deadline:
+    """
+    リクエストの処理期限
+
+    送信したバッチの文字数と所要時間から1文字あたりの時間を求め、次のバッチが
+    残り時間内に完了する見込みがない場合は allows() がFalseを返す（以降のバッチは送信しない）。
+    最初のバッチの完了までは initial_seconds_per_char で見積もる。
+    送信を打ち切った場合は reached がTrueになり、翻訳されなかったセルを
+    record_untranslated() で記録してレポートを作成する。
+    複数言語の翻訳では複数のスレッドから同時に使用されるためスレッドセーフ。
+    """
+
+    def __init__(self, seconds: float, initial_seconds_per_char: float = DEFAULT_SECONDS_PER_CHAR):
+        """
+        Args:
+            seconds: 処理期限までの秒数（作成時点から）
+            initial_seconds_per_char: 送信実績がない場合に仮定する1文字あたりの時間（秒）
+        """
+        self.seconds = seconds
+        self.initial_seconds_per_char = initial_seconds_per_char
+        self.expires_at = time.monotonic() + seconds
+        self.reached = False
+        self.batches_skipped = 0
+        self._chars = 0
+        self._batch_seconds = 0.0
+        self._untranslated: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """残り時間（秒、期限を過ぎた場合は0）"""
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def estimate(self, chars: int) -> float:
+        """送信済みのバッチの速度（実績がない場合は仮定の速度）から、指定した文字数のバッチの所要時間を見積もる（秒）"""
+        with self._lock:
+            if not self._chars:
+                return self.initial_seconds_per_char * chars
+            return self._batch_seconds * chars / self._chars
+
+    def allows(self, chars: int) -> bool:
+        """
+        バッチを送信してよいか判定
+
+        Args:
+            chars: 送信するバッチの文字数
+
+        Returns:
+            残り時間内に完了する見込みがある場合True（ない場合は期限に達したことを記録し、
+            以降はバッチの大きさに関係なくFalse）
+        """
+        if not self.reached:
+            remaining = self.remaining()
+            if remaining > 0 and self.estimate(chars) <= remaining:
+                return True
+        with self._lock:
+            if not self.reached:
+                logger.warning(f"Deadline of {self.seconds:.0f}s reached, skipping remaining batches")
+            self.reached = True
+            self.batches_skipped += 1
+        return False
+
+    def record_batch(self, chars: int, seconds: float) -> None:
+        """送信したバッチの文字数と所要時間を記録"""
+        with self._lock:
+            self._chars += chars
+            self._batch_seconds += seconds
+
+    def record_untranslated(self, group: str, sheet_title: str, cells: List[Dict[str, Any]]) -> None:
+        """
+        翻訳されなかったセルを記録
+
+        Args:
+            group: レポートの分類（翻訳先言語）
+            sheet_title: シート名
+            cells: セル（cell: セル番地、text: 原文）の一覧
+        """
+        if not cells:
+            return
+        with self._lock:
+            self._untranslated.setdefault(group, []).append({'sheet': sheet_title, 'cells': cells})
+
+    def report(self) -> Dict[str, Any]:
+        """翻訳されなかったセルのレポート（翻訳先言語ごと）"""
+        with self._lock:
+            untranslated = {group: list(sheets) for group, sheets in self._untranslated.items()}
+        return {
+            'incomplete': self.reached,
+            'reason': 'deadline' if self.reached else None,
+            'deadline_seconds': self.seconds,
+            'batches_skipped': self.batches_skipped,
+            'cells_untranslated': sum(
+                len(sheet['cells']) for sheets in untranslated.values() for sheet in sheets
+            ),
+            'languages': untranslated,
+        }
+
+
+class ReportStore:
+    """
+    ローカルディスク上の未翻訳のセルのレポートの保存
+
+    処理期限に達したリクエストのレポートをIDごとに1つのJSONファイルとして保存し、
+    ワークブックとは別に取得できるようにする。保持期間を過ぎたものは保存時に削除する。
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 24 * 3600):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            ttl_seconds: レポートを保持する時間（秒）
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root_dir, exist_ok=True)
+
+    def save(self, report: Dict[str, Any]) -> str:
+        """
+        レポートを保存してIDを発行
+
+        Args:
+            report: Deadline.report() の結果
+
+        Returns:
+            レポートID
+        """
+        self.cleanup()
+        report_id = uuid.uuid4().hex
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(report_id))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return report_id
+
+    def load(self, report_id: str) -> Optional[Dict[str, Any]]:
+        """
+        レポートを読み込み
+
+        Args:
+            report_id: レポートID
+
+        Returns:
+            レポート（存在しない場合はNone）
+        """
+        if not report_id or not _REPORT_ID_PATTERN.match(report_id):
+            return None
+        try:
+            with open(self._path(report_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def cleanup(self) -> None:
+        """保持期間を過ぎたレポートを削除"""
+        now = time.time()
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def _path(self, report_id: str) -> str:
+        """レポートファイルのパスを取得"""
+        return os.path.join(self.root_dir, f"{report_id}.json")
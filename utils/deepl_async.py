@@ -0,0 +1,139 @@
+"""
+asyncio用のDeepL APIクライアント（httpxによる接続の再利用）
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+import deepl
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+DEEPL_SERVER_URL = 'https://api.deepl.com'
+DEEPL_SERVER_URL_FREE = 'https://api-free.deepl.com'
+# 再試行する応答（混雑・一時的な障害）
+_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+_HTTP_STATUS_QUOTA_EXCEEDED = 456
+
+
+def get_server_url(auth_key: str, server_url: Optional[str] = None) -> str:
+    """APIキーの種類（Free/Pro）に応じたサーバーURLを取得"""
+    if server_url:
+        return server_url.rstrip('/')
+    return DEEPL_SERVER_URL_FREE if deepl.util.auth_key_is_free_account(auth_key) else DEEPL_SERVER_URL
+
+
+def raise_for_status(response: httpx.Response) -> None:
+    """
+    DeepL APIの応答のエラーをdeeplパッケージの例外に変換（同期APIと同じ例外で扱うため）
+
+    Raises:
+        deepl.exceptions.DeepLException: 応答がエラーの場合
+    """
+    if response.status_code < 400:
+        return
+    message = ''
+    try:
+        body = response.json()
+        if isinstance(body, dict) and body.get('message'):
+            message = f", message: {body['message']}"
+    except ValueError:
+        pass
+    if response.status_code == 403:
+        raise deepl.exceptions.AuthorizationException(
+            f"Authorization failure, check auth_key{message}", http_status_code=403
+        )
+    if response.status_code == _HTTP_STATUS_QUOTA_EXCEEDED:
+        raise deepl.exceptions.QuotaExceededException(
+            f"Quota for this billing period has been exceeded{message}",
+            http_status_code=_HTTP_STATUS_QUOTA_EXCEEDED
+        )
+    if response.status_code == 429:
+        raise deepl.exceptions.TooManyRequestsException(
+            f"Too many requests{message}", should_retry=True, http_status_code=429
+        )
+    raise deepl.exceptions.DeepLException(
+        f"Unexpected status code: {response.status_code}{message}",
+        should_retry=response.status_code in _RETRY_STATUS_CODES,
+        http_status_code=response.status_code
+    )
+
+
+class AsyncDeepLClient:
+    """
+    DeepL APIの非同期クライアント
+
+    1つのhttpx.AsyncClientで接続を再利用し、同時に送信するリクエスト数を
+    max_concurrencyに制限する。混雑（429）や一時的な障害（5xx）の応答は
+    待機時間を延ばしながら再試行する。イベントループごとに作成し、
+    使用後は aclose() するか async with で使用する。
+    """
+
+    def __init__(self, auth_key: str, server_url: Optional[str] = None, max_concurrency: int = 4,
+                 timeout: float = 60.0, max_retries: int = 3, retry_backoff: float = 1.0):
+        """
+        Args:
+            auth_key: DeepL APIキー
+            server_url: APIサーバーのURL（省略時はAPIキーの種類から決定）
+            max_concurrency: 同時に送信するリクエスト数の上限
+            timeout: リクエストのタイムアウト（秒）
+            max_retries: 再試行の回数
+            retry_backoff: 最初の再試行までの待機時間（秒、再試行ごとに2倍）
+        """
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.requests_sent = 0
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._client = httpx.AsyncClient(
+            base_url=get_server_url(auth_key, server_url),
+            headers={'Authorization': f"DeepL-Auth-Key {auth_key}"},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max(1, max_concurrency),
+                                max_keepalive_connections=max(1, max_concurrency))
+        )
+
+    async def __aenter__(self) -> 'AsyncDeepLClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """接続を閉じる"""
+        await self._client.aclose()
+
+    async def translate_texts(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        """
+        テキストを一括翻訳
+
+        Args:
+            texts: 翻訳対象のテキスト
+            source_lang: 翻訳元言語
+            target_lang: 翻訳先言語
+
+        Returns:
+            翻訳結果（テキストと同じ順）
+        """
+        data = {'text': texts, 'source_lang': source_lang, 'target_lang': target_lang}
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                try:
+                    self.requests_sent += 1
+                    response = await self._client.post('/v2/translate', data=data)
+                    raise_for_status(response)
+                    return [translation['text'] for translation in response.json()['translations']]
+                except (deepl.exceptions.DeepLException, httpx.TransportError) as e:
+                    retryable = isinstance(e, httpx.TransportError) or e.should_retry
+                    if not retryable or attempt >= self.max_retries:
+                        if isinstance(e, httpx.TransportError):
+                            raise deepl.exceptions.ConnectionException(str(e), should_retry=True) from e
+                        raise
+                    error = e
+            # 待機中は同時実行数の枠を他のリクエストに譲る
+            delay = self.retry_backoff * (2 ** attempt)
+            attempt += 1
+            logger.warning(f"DeepL request failed ({error}), retrying in {delay:.1f}s ({attempt}/{self.max_retries})")
+            await asyncio.sleep(delay)
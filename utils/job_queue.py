@@ -0,0 +1,334 @@
+"""
+翻訳ジョブの永続化とバックグラウンド実行
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, IO, List, Optional
+
+from utils.cancellation import TranslationCancelled
+
+
+logger = logging.getLogger(__name__)
+
+# ジョブの状態
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+_STATE_FILE = 'state.json'
+_CLAIM_FILE = 'claim'
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _is_process_alive(pid: Optional[int]) -> bool:
+    """プロセスが実行中か判定（不明なプロセスIDは終了扱い）"""
+    if not pid or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    ローカルディスク上のジョブストア
+
+    ジョブごとにディレクトリを作成し、状態（state.json）、入力ファイル、
+    結果ファイルを保存する。状態はアトミックに書き換えるため、
+    同じディレクトリを共有する複数のワーカーから参照できる。
+    実行中のワーカーは claim ファイルに、ジョブを投入したワーカーは状態の owner_pid に
+    プロセスIDを記録し、プロセスが終了したジョブは別のワーカーが引き継げる。
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 24 * 3600):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            ttl_seconds: 完了・失敗したジョブを保持する時間（秒）
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root_dir, exist_ok=True)
+
+    def create(self, stream: Optional[IO[bytes]], filename: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        入力ファイルを保存してジョブを作成
+
+        Args:
+            stream: 入力ファイルのストリーム（Noneの場合は呼び出し元がジョブディレクトリに入力を保存する）
+            filename: 元のファイル名
+            params: 翻訳パラメータ
+
+        Returns:
+            ジョブの状態（投入前に他のワーカーが再投入しないよう、作成したプロセスを owner_pid に記録する）
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.root_dir, job_id)
+        os.makedirs(job_dir)
+
+        input_path = None
+        if stream is not None:
+            input_path = os.path.join(job_dir, 'input' + os.path.splitext(filename)[1].lower())
+            stream.seek(0)
+            with open(input_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, _COPY_CHUNK_SIZE)
+
+        now = time.time()
+        job = {
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'filename': filename,
+            'params': params,
+            'input_path': input_path,
+            'result_path': None,
+            'result_filename': None,
+            'result_mimetype': None,
+            'progress': {},
+            'error': None,
+            'attempts': 0,
+            'owner_pid': os.getpid(),
+            'created_at': now,
+            'updated_at': now
+        }
+        self._write_state(job_id, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        ジョブの状態を取得
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            ジョブの状態（存在しない場合はNone）
+        """
+        state_path = self._state_path(job_id)
+        if state_path is None:
+            return None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, job_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """
+        ジョブの状態を更新
+
+        Args:
+            job_id: ジョブID
+            **fields: 更新するフィールド
+
+        Returns:
+            更新後のジョブの状態
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        job['updated_at'] = time.time()
+        self._write_state(job_id, job)
+        return job
+
+    def job_dir(self, job_id: str) -> str:
+        """ジョブのディレクトリパスを取得"""
+        return os.path.join(self.root_dir, job_id)
+
+    def list_job_ids(self) -> List[str]:
+        """保存されているジョブIDの一覧を取得"""
+        return [name for name in os.listdir(self.root_dir) if self._state_path(name)]
+
+    def claim(self, job_id: str) -> bool:
+        """
+        ジョブの実行権を取得
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            実行権を取得できた場合True
+        """
+        claim_path = os.path.join(self.job_dir(job_id), _CLAIM_FILE)
+        for _ in range(2):
+            try:
+                fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self.is_claim_stale(job_id):
+                    return False
+                # 実行していたプロセスが終了している場合は引き継ぐ
+                self.release(job_id)
+                continue
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def has_claim(self, job_id: str) -> bool:
+        """ジョブの実行権（claim ファイル）が存在するか判定"""
+        return os.path.exists(os.path.join(self.job_dir(job_id), _CLAIM_FILE))
+
+    def release(self, job_id: str) -> None:
+        """ジョブの実行権を解放"""
+        try:
+            os.remove(os.path.join(self.job_dir(job_id), _CLAIM_FILE))
+        except OSError:
+            pass
+
+    def is_claim_stale(self, job_id: str) -> bool:
+        """
+        ジョブの実行権を持つプロセスが終了しているか判定
+
+        Args:
+            job_id: ジョブID
+
+        Returns:
+            実行権が存在しないか、保持プロセスが終了している場合True
+        """
+        claim_path = os.path.join(self.job_dir(job_id), _CLAIM_FILE)
+        try:
+            with open(claim_path, 'r') as f:
+                pid = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return True
+        return not _is_process_alive(pid)
+
+    def delete(self, job_id: str) -> None:
+        """ジョブを削除（投入前に入力の保存に失敗した場合など）"""
+        if self._state_path(job_id) is not None:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def cleanup(self) -> None:
+        """保持期間を過ぎた完了・失敗ジョブを削除"""
+        now = time.time()
+        for job_id in self.list_job_ids():
+            job = self.get(job_id)
+            if job is None or job['status'] in ACTIVE_STATUSES:
+                continue
+            if now - job['updated_at'] > self.ttl_seconds:
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def _state_path(self, job_id: str) -> Optional[str]:
+        """状態ファイルのパスを取得（不正なIDはNone）"""
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id) or len(job_id) != 32:
+            return None
+        return os.path.join(self.root_dir, job_id, _STATE_FILE)
+
+    def _write_state(self, job_id: str, job: Dict[str, Any]) -> None:
+        """状態ファイルをアトミックに書き込み"""
+        job_dir = self.job_dir(job_id)
+        fd, tmp_path = tempfile.mkstemp(dir=job_dir, prefix='.state-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(job_dir, _STATE_FILE))
+
+
+JobRunner = Callable[[Dict[str, Any], 'JobStore'], Dict[str, Any]]
+
+
+class JobManager:
+    """
+    ジョブをワーカープールで実行するマネージャー
+
+    runner はジョブの状態とストアを受け取り、結果フィールド
+    （result_path、result_filename、result_mimetype など）を返す関数。
+    runner が TranslationCancelled を送出した場合は取り消されたジョブとして記録する。
+    """
+
+    def __init__(self, store: JobStore, runner: JobRunner, max_workers: int = 2):
+        """
+        Args:
+            store: ジョブストア
+            runner: ジョブを実行する関数
+            max_workers: 同時に実行するジョブ数
+        """
+        self.store = store
+        self.runner = runner
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translation-job')
+        self._submitted = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str) -> None:
+        """ジョブをワーカープールに投入（実行権を取得するまでは投入したプロセスを owner_pid に記録）"""
+        with self._lock:
+            if job_id in self._submitted:
+                return
+            self._submitted.add(job_id)
+        self.store.update(job_id, owner_pid=self.pid)
+        self._executor.submit(self._run, job_id)
+
+    def recover(self, job_id: Optional[str] = None) -> None:
+        """
+        実行中のプロセスが終了したジョブを再投入
+
+        Args:
+            job_id: 対象のジョブID（省略時は全ジョブ）
+        """
+        job_ids = [job_id] if job_id else self.store.list_job_ids()
+        for candidate in job_ids:
+            job = self.store.get(candidate)
+            if job is None or job['status'] not in ACTIVE_STATUSES:
+                continue
+            with self._lock:
+                if candidate in self._submitted:
+                    continue
+            if self._is_orphaned(job):
+                logger.info(f"Recovering orphaned job {candidate}")
+                self.submit(candidate)
+
+    def _is_orphaned(self, job: Dict[str, Any]) -> bool:
+        """
+        ジョブを実行・投入したプロセスが終了しているか判定
+
+        実行中のジョブは claim ファイルのプロセスID、実行権の取得前のジョブ（他のワーカーの
+        プールで待機中）は投入したプロセスID（owner_pid）で判定する。
+        """
+        job_id = job['job_id']
+        if self.store.has_claim(job_id):
+            return self.store.is_claim_stale(job_id)
+        return not _is_process_alive(job.get('owner_pid'))
+
+    def _run(self, job_id: str) -> None:
+        """ジョブを実行（ワーカースレッド）"""
+        try:
+            if not self.store.claim(job_id):
+                return
+            try:
+                # 待機中に別のワーカーが実行を終えている場合は実行しない
+                job = self.store.get(job_id)
+                if job is None or job['status'] not in ACTIVE_STATUSES:
+                    return
+                job = self.store.update(job_id, status=JOB_RUNNING, error=None)
+                if job is None:
+                    return
+                job = self.store.update(job_id, attempts=job['attempts'] + 1)
+                result = self.runner(job, self.store)
+                self.store.update(job_id, status=JOB_COMPLETED, **result)
+                logger.info(f"Job {job_id} completed")
+            except TranslationCancelled as e:
+                logger.info(f"Job {job_id} cancelled: {e.reason}")
+                self.store.update(job_id, status=JOB_CANCELLED, error=str(e))
+            except Exception as e:
+                logger.exception(f"Job {job_id} failed: {e}")
+                self.store.update(job_id, status=JOB_FAILED, error=str(e))
+            finally:
+                self.store.release(job_id)
+        finally:
+            with self._lock:
+                self._submitted.discard(job_id)
@@ -0,0 +1,235 @@
+"""
+複数のDeepL APIキーへのバッチの振り分けとキーごとの使用状況の集計
+"""
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.quota import QuotaCache
+
+
+logger = logging.getLogger(__name__)
+
+# ローテーションから外す応答（403: 認証エラー、456: 使用制限）
+_HTTP_STATUS_FORBIDDEN = 403
+_HTTP_STATUS_QUOTA_EXCEEDED = 456
+DISABLING_STATUS_CODES = (_HTTP_STATUS_FORBIDDEN, _HTTP_STATUS_QUOTA_EXCEEDED)
+# 応答時間を計測していないキーに仮定する応答時間（秒）
+_DEFAULT_LATENCY = 1.0
+
+
+def parse_api_keys(value: Optional[str]) -> List[str]:
+    """
+    カンマ・空白区切りのAPIキーの指定を重複のない一覧に変換
+
+    Args:
+        value: APIキー（DEEPL_API_KEYS の形式、1つだけでもよい）
+
+    Returns:
+        APIキーの一覧（指定順）
+    """
+    keys = []
+    for key in re.split(r'[\s,]+', value or ''):
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+def mask_api_key(api_key: str) -> str:
+    """ログ・状態の表示用にAPIキーの末尾のみを残す"""
+    return f"...{api_key[-6:]}" if len(api_key) > 6 else '...'
+
+
+class NoAvailableKeyError(Exception):
+    """ローテーション中のAPIキーがない場合のエラー"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PooledKey:
+    """プール内の1つのAPIキーの状態と使用状況"""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.requests = 0
+        self.characters = 0
+        self.errors = 0
+        self.in_flight = 0
+        # 直近の応答時間（秒、指数移動平均）
+        self.latency: Optional[float] = None
+        # ローテーションから外した理由のステータスコードと時刻
+        self.disabled_status: Optional[int] = None
+        self.disabled_at = 0.0
+
+
+class DeepLKeyPool:
+    """
+    複数のDeepL APIキーにバッチを振り分けるプール
+
+    acquire() で送信に使うキーを選び、応答を受け取ったら release() で結果を記録する。
+    キーは残り文字数がバッチの文字数に足りるものから、直近の応答時間と送信中の
+    バッチ数から見込まれる待ち時間を残り文字数の割合で割った値が小さいものを選ぶ。
+    認証エラー（403）・使用制限（456）の応答を受けたキーは cooldown_seconds の間
+    ローテーションから外す。ただし最後のローテーション中のキーは外さず、残り文字数を
+    取得し直して次の acquire() で判定する（プランの変更後などは待機せずに送信できる）。
+    残り文字数は QuotaCache でキーごとに管理する。スレッドセーフ。
+    """
+
+    def __init__(self, api_keys: List[str], quota_cache: QuotaCache, cooldown_seconds: float = 3600,
+                 latency_alpha: float = 0.3):
+        """
+        Args:
+            api_keys: DeepL APIキーの一覧
+            quota_cache: キーごとの残り文字数のキャッシュ
+            cooldown_seconds: エラーの応答を受けたキーをローテーションから外す時間（秒）
+            latency_alpha: 応答時間の指数移動平均の重み（大きいほど直近の応答を重視）
+        """
+        if not api_keys:
+            raise ValueError("At least one DeepL API key is required")
+        self.quota_cache = quota_cache
+        self.cooldown_seconds = cooldown_seconds
+        self.latency_alpha = latency_alpha
+        self._keys = [PooledKey(api_key) for api_key in api_keys]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _active_keys(self) -> List[PooledKey]:
+        """ローテーション中のキー（ロック取得中に呼び出す。待機時間を過ぎたキーは戻す）"""
+        now = time.monotonic()
+        active = []
+        for key in self._keys:
+            if key.disabled_status is not None and now - key.disabled_at >= self.cooldown_seconds:
+                logger.info(f"Returning DeepL API key {mask_api_key(key.api_key)} to rotation")
+                key.disabled_status = None
+            if key.disabled_status is None:
+                active.append(key)
+        return active
+
+    def remaining(self) -> Optional[int]:
+        """
+        ローテーション中のキーの残り文字数の合計
+
+        Returns:
+            残り文字数（使用状況を取得できないキー・上限のないキーがある場合はNone）
+        """
+        with self._lock:
+            active = self._active_keys()
+        total = 0
+        for key in active:
+            remaining = self.quota_cache.remaining(key.api_key)
+            if remaining is None:
+                return None
+            total += remaining
+        return total
+
+    def acquire(self, chars: int) -> PooledKey:
+        """
+        バッチの送信に使うキーを選択
+
+        Args:
+            chars: 送信するバッチの文字数
+
+        Returns:
+            選択したキー（送信後に release() を呼び出す）
+
+        Raises:
+            NoAvailableKeyError: ローテーション中のキーがない、または残り文字数が足りない場合
+        """
+        with self._lock:
+            active = self._active_keys()
+            disabled_statuses = [key.disabled_status for key in self._keys if key.disabled_status is not None]
+        if not active:
+            raise NoAvailableKeyError(
+                "All DeepL API keys are out of rotation",
+                _HTTP_STATUS_QUOTA_EXCEEDED if _HTTP_STATUS_QUOTA_EXCEEDED in disabled_statuses
+                else _HTTP_STATUS_FORBIDDEN
+            )
+
+        # 残り文字数の取得（キャッシュの有効期限切れ時の通信）はロックの外で行う
+        quotas = {key.api_key: self.quota_cache.remaining(key.api_key) for key in active}
+        candidates = [key for key in active if quotas[key.api_key] is None or quotas[key.api_key] >= chars]
+        if not candidates:
+            raise NoAvailableKeyError(
+                f"No DeepL API key has {chars} characters remaining", _HTTP_STATUS_QUOTA_EXCEEDED
+            )
+        known_quotas = [quotas[key.api_key] for key in candidates if quotas[key.api_key] is not None]
+        max_quota = max(known_quotas, default=0)
+
+        with self._lock:
+            measured = [key.latency for key in candidates if key.latency is not None]
+            default_latency = sum(measured) / len(measured) if measured else _DEFAULT_LATENCY
+
+            def score(key: PooledKey) -> float:
+                latency = key.latency if key.latency is not None else default_latency
+                quota = quotas[key.api_key]
+                share = quota / max_quota if quota is not None and max_quota else 1.0
+                return latency * (key.in_flight + 1) / max(share, 1e-6)
+
+            selected = min(candidates, key=score)
+            selected.in_flight += 1
+        return selected
+
+    def release(self, key: PooledKey, chars: int = 0, latency: Optional[float] = None,
+                status_code: Optional[int] = None) -> None:
+        """
+        送信の結果を記録
+
+        Args:
+            key: acquire() で選択したキー
+            chars: 翻訳した文字数（失敗した場合は0）
+            latency: 応答時間（秒、応答がなかった場合はNone）
+            status_code: 応答のステータスコード（応答がなかった場合はNone）
+        """
+        failed = status_code != 200
+        disabled = False
+        with self._lock:
+            key.in_flight -= 1
+            key.requests += 1
+            if latency is not None:
+                key.latency = latency if key.latency is None else (
+                    self.latency_alpha * latency + (1 - self.latency_alpha) * key.latency
+                )
+            if failed:
+                key.errors += 1
+            else:
+                key.characters += chars
+            # 他にローテーション中のキーがない場合は外さない
+            if status_code in DISABLING_STATUS_CODES and any(
+                other is not key for other in self._active_keys()
+            ):
+                key.disabled_status = status_code
+                key.disabled_at = time.monotonic()
+                disabled = True
+        if chars and not failed:
+            self.quota_cache.consume(key.api_key, chars)
+        if status_code in DISABLING_STATUS_CODES:
+            # ローテーションに戻すとき（最後のキーは次の acquire() で）に使用状況を取得し直す
+            self.quota_cache.invalidate(key.api_key)
+            if disabled:
+                logger.warning(
+                    f"Removed DeepL API key {mask_api_key(key.api_key)} from rotation (status {status_code})"
+                )
+            else:
+                logger.warning(
+                    f"Keeping last DeepL API key {mask_api_key(key.api_key)} in rotation (status {status_code})"
+                )
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """キーごとの使用状況（APIキーは末尾のみ）"""
+        with self._lock:
+            return [{
+                'key': mask_api_key(key.api_key),
+                'active': key.disabled_status is None,
+                'disabled_status': key.disabled_status,
+                'requests': key.requests,
+                'characters': key.characters,
+                'errors': key.errors,
+                'in_flight': key.in_flight,
+                'latency_ms': round(key.latency * 1000) if key.latency is not None else None,
+            } for key in self._keys]
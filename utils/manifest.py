@@ -0,0 +1,162 @@
+"""
+翻訳結果のマニフェスト（セル内容のハッシュ → 翻訳）の保存と差分翻訳への再利用
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_MANIFEST_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def hash_cell_text(text: str) -> str:
+    """セルの原文のハッシュを取得"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TranslationManifest:
+    """
+    1回の翻訳で得られたセル原文のハッシュと翻訳の対応表
+
+    セルの位置ではなく原文の内容で対応付けるため、行の挿入や移動があっても
+    同じ原文のセルには前回の翻訳を再利用できる。
+    """
+
+    def __init__(self, params: Dict[str, Any], entries: Optional[Dict[str, str]] = None,
+                 manifest_id: Optional[str] = None, created_at: Optional[float] = None):
+        """
+        Args:
+            params: 翻訳パラメータ（言語ペア・敬語レベルなど）
+            entries: 原文のハッシュと翻訳の対応
+            manifest_id: マニフェストID（保存済みの場合）
+            created_at: 作成日時
+        """
+        self.params = params
+        self.entries = entries if entries is not None else {}
+        self.manifest_id = manifest_id
+        self.created_at = created_at if created_at is not None else time.time()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, text: str) -> Optional[str]:
+        """原文に対応する翻訳を取得（未登録の場合はNone）"""
+        return self.entries.get(hash_cell_text(text))
+
+    def add(self, text: str, translation: str) -> None:
+        """原文と翻訳を登録"""
+        self.entries[hash_cell_text(text)] = translation
+
+    def is_compatible(self, params: Dict[str, Any]) -> bool:
+        """
+        指定した翻訳パラメータで再利用できるか判定
+
+        Args:
+            params: 今回の翻訳パラメータ
+
+        Returns:
+            マニフェストの全パラメータが一致する場合True
+        """
+        return all(params.get(name) == value for name, value in self.params.items())
+
+
+class ManifestStore:
+    """
+    ローカルディスク上のマニフェストストア
+
+    マニフェストはIDごとに1つのJSONファイルとして保存する。
+    最終アクセスから保持期間を過ぎたものは保存時に削除する
+    （参照として読み込むと最終アクセス時刻を更新するため、
+    定期的に差分翻訳を続けている系列は削除されない）。
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 30 * 24 * 3600):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            ttl_seconds: マニフェストを保持する時間（秒）
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root_dir, exist_ok=True)
+
+    def save(self, manifest: TranslationManifest) -> str:
+        """
+        マニフェストを保存してIDを発行
+
+        Args:
+            manifest: 保存するマニフェスト
+
+        Returns:
+            マニフェストID
+        """
+        manifest.manifest_id = uuid.uuid4().hex
+        payload = {
+            'manifest_id': manifest.manifest_id,
+            'params': manifest.params,
+            'created_at': manifest.created_at,
+            'entries': manifest.entries
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(manifest.manifest_id))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        logger.info(f"Saved manifest {manifest.manifest_id} with {len(manifest)} entries")
+        self.cleanup()
+        return manifest.manifest_id
+
+    def load(self, manifest_id: str) -> Optional[TranslationManifest]:
+        """
+        マニフェストを読み込み
+
+        Args:
+            manifest_id: マニフェストID
+
+        Returns:
+            マニフェスト（存在しない場合はNone）
+        """
+        if not manifest_id or not _MANIFEST_ID_PATTERN.match(manifest_id):
+            return None
+        path = self._path(manifest_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return TranslationManifest(
+            payload['params'],
+            payload['entries'],
+            manifest_id=payload['manifest_id'],
+            created_at=payload['created_at']
+        )
+
+    def cleanup(self) -> None:
+        """保持期間を過ぎたマニフェストを削除"""
+        now = time.time()
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                continue
+
+    def _path(self, manifest_id: str) -> str:
+        """マニフェストファイルのパスを取得"""
+        return os.path.join(self.root_dir, f"{manifest_id}.json")
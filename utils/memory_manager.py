@@ -0,0 +1,113 @@
+"""
+メモリ使用量の増加に応じたガベージコレクションの実行
+"""
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def get_rss() -> Optional[int]:
+    """
+    プロセスの現在の常駐メモリ（RSS）を取得
+
+    Returns:
+        RSS（バイト、/proc を参照できない環境ではNone）
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryManager:
+    """
+    メモリ使用量がしきい値を超えた場合のみ完全なガベージコレクションを実行する管理
+
+    前回の実行からのRSSの増加量（growth_bytes）、Pythonのメモリブロック数の増加量
+    （allocation_blocks）のいずれかがしきい値を超えた場合、またはRSSが上限（rss_limit_bytes）を
+    超えている場合に gc.collect() を実行する。RSSが上限を超えたままの場合に毎回実行しないよう、
+    上限による実行は min_interval 秒に1回までとする。しきい値を0にした条件は使用しない。
+    通常の世代別の自動ガベージコレクションはそのまま動作する。スレッドセーフ。
+    """
+
+    def __init__(self, growth_bytes: int = 64 * 1024 * 1024, allocation_blocks: int = 1000000,
+                 rss_limit_bytes: int = 0, min_interval: float = 1.0):
+        """
+        Args:
+            growth_bytes: 実行するRSSの増加量（バイト）
+            allocation_blocks: 実行するメモリブロック数の増加量
+            rss_limit_bytes: 実行するRSSの上限（バイト）
+            min_interval: RSSの上限による実行の最小間隔（秒）
+        """
+        self.growth_bytes = growth_bytes
+        self.allocation_blocks = allocation_blocks
+        self.rss_limit_bytes = rss_limit_bytes
+        self.min_interval = min_interval
+        self.checks = 0
+        self.collections = 0
+        self.collect_seconds = 0.0
+        self._lock = threading.Lock()
+        self._reset_baseline()
+
+    def _reset_baseline(self) -> None:
+        """比較の基準を現在の使用量にする"""
+        self._baseline_rss = get_rss()
+        self._baseline_blocks = sys.getallocatedblocks()
+        self._last_collect = time.monotonic()
+
+    def _should_collect(self) -> bool:
+        """しきい値を超えているか判定（ロック取得中に呼び出す）"""
+        rss = get_rss()
+        if rss is not None and self._baseline_rss is not None:
+            if self.growth_bytes and rss - self._baseline_rss >= self.growth_bytes:
+                return True
+            if (self.rss_limit_bytes and rss >= self.rss_limit_bytes
+                    and time.monotonic() - self._last_collect >= self.min_interval):
+                return True
+        if self.allocation_blocks and sys.getallocatedblocks() - self._baseline_blocks >= self.allocation_blocks:
+            return True
+        return False
+
+    def maybe_collect(self) -> float:
+        """
+        しきい値を超えている場合のみガベージコレクションを実行
+
+        Returns:
+            ガベージコレクションにかかった時間（秒、実行しなかった場合は0）
+        """
+        with self._lock:
+            self.checks += 1
+            if not self._should_collect():
+                return 0.0
+            started_at = time.perf_counter()
+            collected = gc.collect()
+            elapsed = time.perf_counter() - started_at
+            self.collections += 1
+            self.collect_seconds += elapsed
+            self._reset_baseline()
+        logger.info(f"Garbage collection freed {collected} objects in {elapsed * 1000:.1f} ms")
+        return elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        """確認回数・実行回数と実行にかかった時間"""
+        with self._lock:
+            rss = get_rss()
+            return {
+                'checks': self.checks,
+                'collections': self.collections,
+                'collect_seconds': round(self.collect_seconds, 3),
+                'rss_mb': round(rss / (1024 * 1024), 1) if rss is not None else None,
+            }
@@ -0,0 +1,119 @@
+"""
+上限付きキューでつないだ段階ごとのスレッドによる処理パイプライン
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+# 後続の段階に終了を伝える番兵
+_DONE = object()
+# 停止の確認間隔（秒）
+_POLL_SECONDS = 0.1
+
+
+def _put(target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """キューに空きができるまで待って追加（停止された場合はFalse）"""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> Any:
+    """キューから要素が届くまで待って取得（停止された場合は番兵）"""
+    while not stop.is_set():
+        try:
+            return source.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_pipeline(items: Iterable[Any], stages: Sequence[Callable[[Any], Any]], queue_size: int = 1,
+                 name: str = 'pipeline') -> List[Any]:
+    """
+    要素を各段階に順番に通し、段階ごとに別のスレッドで並行して処理
+
+    段階の間は上限付きのキューでつなぐため、後の段階が遅い場合は前の段階が待機し、
+    同時に保持される要素は「段階数 + キューの上限 × (段階数 - 1)」個までに抑えられる。
+    各段階は要素を受け取った順に1つずつ処理するため、段階内の処理順は入力と同じになる。
+    いずれかの段階で例外が発生した場合は全段階を停止し、最初の例外を送出する
+    （実行中の処理は中断せず、その完了後に停止する）。
+
+    Args:
+        items: 入力の要素（最初の段階のスレッドで順に取り出す）
+        stages: 段階ごとの処理（前の段階の戻り値を受け取る）
+        queue_size: 段階間のキューの上限（0以下の場合はスレッドを使わず順番に処理）
+        name: スレッド名の接頭辞
+
+    Returns:
+        最後の段階の戻り値の一覧（入力の順）
+    """
+    if not stages:
+        return list(items)
+
+    if queue_size <= 0:
+        results = []
+        for item in items:
+            for stage in stages:
+                item = stage(item)
+            results.append(item)
+        return results
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages[:-1]]
+    stop = threading.Event()
+    errors = []
+    busy_seconds = [0.0] * len(stages)
+    results = []
+
+    def run_stage(index: int) -> None:
+        stage = stages[index]
+        source = iter(items) if index == 0 else None
+        try:
+            while not stop.is_set():
+                if source is not None:
+                    item = next(source, _DONE)
+                else:
+                    item = _get(queues[index - 1], stop)
+                if item is _DONE:
+                    break
+                started_at = time.monotonic()
+                item = stage(item)
+                busy_seconds[index] += time.monotonic() - started_at
+                if index == len(stages) - 1:
+                    results.append(item)
+                elif not _put(queues[index], item, stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            if index < len(stages) - 1:
+                _put(queues[index], _DONE, stop)
+
+    started_at = time.monotonic()
+    threads = [
+        threading.Thread(target=run_stage, args=(index,), name=f"{name}-{index}", daemon=True)
+        for index in range(len(stages))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    logger.info(
+        f"Pipeline {name}: {len(results)} items in {time.monotonic() - started_at:.2f}s "
+        f"(busy: {', '.join(f'{seconds:.2f}s' for seconds in busy_seconds)})"
+    )
+    return results
@@ -0,0 +1,185 @@
+"""
+翻訳処理の進捗計測とServer-Sent Events形式への変換
+"""
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+ProgressListener = Callable[[Dict[str, Any]], None]
+
+
+class ProgressTracker:
+    """
+    翻訳処理の進捗カウンター
+
+    バッチ処理のたびにカウンターを加算し、一定間隔ごとにのみ
+    スナップショットを作成してリスナーに通知する。
+    通知しない呼び出しはカウンター加算と時刻比較のみのため、
+    すべてのリクエストで有効にしても負荷はほとんどない。
+    残り時間は処理済み文字数あたりの経過時間から推定する。
+    複数言語の翻訳では複数のスレッドから同時に記録される。
+    """
+
+    def __init__(self, listener: Optional[ProgressListener] = None, sheets_total: int = 0,
+                 chars_estimated: int = 0, min_interval: float = 0.5):
+        """
+        Args:
+            listener: スナップショットを受け取る関数
+            sheets_total: シート数
+            chars_estimated: 翻訳対象の推定文字数（ファイル解析時の値）
+            min_interval: 通知の最小間隔（秒）
+        """
+        self.listener = listener
+        self.min_interval = min_interval
+        self.sheets_total = sheets_total
+        self.sheets_scanned = 0
+        self.sheets_completed = 0
+        self.batches_planned = 0
+        self.batches_completed = 0
+        self.batches_resumed = 0
+        self.fallback_calls = 0
+        self.chars_estimated = chars_estimated
+        self.chars_planned = 0
+        self.chars_completed = 0
+        self.chars_resumed = 0
+        self.cells_needing_translation = 0
+        self.cells_translated = 0
+        self.cells_to_translate = 0
+        self.cells_reused = 0
+        self.gc_collections = 0
+        self.gc_seconds = 0.0
+        self.started_at = time.monotonic()
+        self._last_emit = 0.0
+        self._lock = threading.Lock()
+
+    def sheet_scanned(self, task_count: int = 0, reused_count: int = 0) -> None:
+        """
+        シートの走査完了を記録
+
+        Args:
+            task_count: 翻訳対象のセル数
+            reused_count: そのうち以前の翻訳を再利用したセル数
+        """
+        with self._lock:
+            self.sheets_scanned += 1
+            self.cells_to_translate += task_count
+            self.cells_reused += reused_count
+        self.emit()
+
+    def batches_planned_for_sheet(self, batch_count: int, char_count: int) -> None:
+        """シートのバッチ計画を記録"""
+        with self._lock:
+            self.batches_planned += batch_count
+            self.chars_planned += char_count
+        self.emit()
+
+    def batch_completed(self, char_count: int, resumed: bool = False) -> None:
+        """バッチの翻訳完了を記録（resumedはチェックポイントから再利用した場合True）"""
+        with self._lock:
+            self.batches_completed += 1
+            if resumed:
+                self.batches_resumed += 1
+                self.chars_resumed += char_count
+            self.chars_completed += char_count
+        self.emit()
+
+    def fallback_called(self) -> None:
+        """フォールバックの翻訳呼び出しを記録"""
+        with self._lock:
+            self.fallback_calls += 1
+        self.emit()
+
+    def gc_collected(self, seconds: float) -> None:
+        """処理中に実行したガベージコレクションの時間を記録（通知はしない）"""
+        with self._lock:
+            self.gc_collections += 1
+            self.gc_seconds += seconds
+
+    def sheet_completed(self, cells_needing_translation: int = 0, cells_translated: int = 0) -> None:
+        """シートの処理完了を記録"""
+        with self._lock:
+            self.sheets_completed += 1
+            self.cells_needing_translation += cells_needing_translation
+            self.cells_translated += cells_translated
+        self.emit(force=True)
+
+    def eta_seconds(self) -> Optional[float]:
+        """残り時間の推定値（秒）。推定できない場合はNone"""
+        # 再利用したバッチは時間がかからないため速度の計算から除外する
+        chars_translated = self.chars_completed - self.chars_resumed
+        if chars_translated <= 0:
+            return None
+        if self.sheets_scanned >= self.sheets_total:
+            chars_total = self.chars_planned
+        else:
+            # 未走査のシートはファイル解析時の文字数で見積もる
+            chars_total = max(self.chars_estimated, self.chars_planned)
+        remaining = max(chars_total - self.chars_completed, 0)
+        elapsed = time.monotonic() - self.started_at
+        return round(elapsed * remaining / chars_translated, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """現在の進捗を辞書として取得"""
+        return {
+            'sheets_total': self.sheets_total,
+            'sheets_scanned': self.sheets_scanned,
+            'sheets_completed': self.sheets_completed,
+            'batches_planned': self.batches_planned,
+            'batches_completed': self.batches_completed,
+            'batches_resumed': self.batches_resumed,
+            'fallback_calls': self.fallback_calls,
+            'chars_planned': self.chars_planned,
+            'chars_completed': self.chars_completed,
+            'cells_needing_translation': self.cells_needing_translation,
+            'cells_translated': self.cells_translated,
+            'cells_to_translate': self.cells_to_translate,
+            'cells_reused': self.cells_reused,
+            'gc_collections': self.gc_collections,
+            'gc_seconds': round(self.gc_seconds, 3),
+            'reuse_ratio': round(self.cells_reused / self.cells_to_translate, 4) if self.cells_to_translate else None,
+            'elapsed_seconds': round(time.monotonic() - self.started_at, 1),
+            'eta_seconds': self.eta_seconds()
+        }
+
+    def emit(self, force: bool = False) -> None:
+        """
+        リスナーに進捗を通知（最小間隔内の通知は省略）
+
+        Args:
+            force: 間隔に関係なく通知する場合True
+        """
+        if self.listener is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_emit < self.min_interval:
+            return
+        with self._lock:
+            self._last_emit = now
+            self.listener(self.snapshot())
+
+
+def format_sse(data: Dict[str, Any], event: Optional[str] = None, event_id: Optional[str] = None,
+               retry_ms: Optional[int] = None) -> str:
+    """
+    Server-Sent Events形式のメッセージを作成
+
+    Args:
+        data: 送信するデータ（JSONに変換）
+        event: イベント名
+        event_id: イベントID
+        retry_ms: 再接続までの待機時間（ミリ秒）
+
+    Returns:
+        SSEメッセージ
+    """
+    lines = []
+    if retry_ms is not None:
+        lines.append(f"retry: {retry_ms}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
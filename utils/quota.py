@@ -0,0 +1,127 @@
+"""
+DeepL APIの残り文字数の確認と、リクエストごとの翻訳文字数の上限
+"""
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class CharacterBudgetExceeded(Exception):
+    """翻訳文字数の上限を超えるため、バッチを送信しなかった場合のエラー"""
+
+
+class CharacterBudget:
+    """
+    1つのリクエストでDeepLに送信する文字数の上限
+
+    バッチを送信する前に try_consume() で文字数を確保し、上限を超える場合は送信しない。
+    上限がない場合（limit=None）も送信した文字数を集計する。
+    複数言語の翻訳では複数のスレッドから同時に使用されるためスレッドセーフ。
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        """
+        Args:
+            limit: 文字数の上限（Noneの場合は上限なし）
+        """
+        self.limit = limit
+        self.used = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> Optional[int]:
+        """残りの文字数（上限がない場合はNone）"""
+        if self.limit is None:
+            return None
+        return max(self.limit - self.used, 0)
+
+    def try_consume(self, chars: int) -> bool:
+        """
+        文字数を確保
+
+        Args:
+            chars: 送信するバッチの文字数
+
+        Returns:
+            確保できた場合True（上限を超える場合は確保せず、上限に達したことを記録）
+        """
+        with self._lock:
+            if self.limit is not None and self.used + chars > self.limit:
+                self.exhausted = True
+                return False
+            self.used += chars
+            return True
+
+
+class QuotaCache:
+    """
+    APIキーごとのDeepL APIの残り文字数のキャッシュ
+
+    使用状況の取得は有効期限（ttl_seconds）ごとに1回だけ行う。有効期限内に
+    翻訳した文字数は consume() で差し引き、同時に実行されるリクエストが
+    同じ残り文字数を前提にしないようにする。スレッドセーフ。
+    """
+
+    def __init__(self, fetch_usage: Callable[[str], Optional[Dict[str, Any]]], ttl_seconds: float = 60):
+        """
+        Args:
+            fetch_usage: APIキーから使用状況（character_count・character_limit）を取得する関数
+                         （取得できない場合はNone）
+            ttl_seconds: 取得した使用状況の有効期限（秒）
+        """
+        self.fetch_usage = fetch_usage
+        self.ttl_seconds = ttl_seconds
+        self.fetches = 0
+        self._remaining: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def remaining(self, api_key: str) -> Optional[int]:
+        """
+        残り文字数を取得
+
+        Args:
+            api_key: DeepL APIキー
+
+        Returns:
+            残り文字数（使用状況を取得できない場合・上限がない場合はNone）
+        """
+        with self._lock:
+            cached = self._remaining.get(api_key)
+        if cached is not None and time.monotonic() - cached[1] < self.ttl_seconds:
+            return cached[0]
+
+        self.fetches += 1
+        try:
+            usage = self.fetch_usage(api_key)
+        except Exception as e:
+            logger.warning(f"Failed to fetch DeepL usage: {e}")
+            usage = None
+        if not usage or not usage.get('character_limit'):
+            return None
+        remaining = max(usage['character_limit'] - usage.get('character_count', 0), 0)
+        with self._lock:
+            self._remaining[api_key] = (remaining, time.monotonic())
+        return remaining
+
+    def consume(self, api_key: str, chars: int) -> None:
+        """
+        翻訳した文字数をキャッシュされた残り文字数から差し引く
+
+        Args:
+            api_key: DeepL APIキー
+            chars: 翻訳した文字数
+        """
+        with self._lock:
+            cached = self._remaining.get(api_key)
+            if cached is not None:
+                self._remaining[api_key] = (max(cached[0] - chars, 0), cached[1])
+
+    def invalidate(self, api_key: str) -> None:
+        """キャッシュされた残り文字数を破棄（使用制限のエラーが発生した場合など）"""
+        with self._lock:
+            self._remaining.pop(api_key, None)
@@ -1,14 +1,28 @@
 """
 レスポンス作成用のヘルパー関数
 """
-from typing import Dict, Any, Optional, Union
-from flask import jsonify, render_template, Response
+from typing import Dict, Any, Iterator, Optional, Union
+from urllib.parse import quote
+from flask import jsonify, render_template, send_file, Response
 import base64
+import io
+import json
 import logging
+import secrets
 
 
 logger = logging.getLogger(__name__)
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+_MULTIPART_CHUNK_SIZE = 64 * 1024
+
+# Acceptヘッダーで選択可能なレスポンス形式（*/* の場合は先頭のJSONを優先）
+_RESPONSE_FORMATS = [
+    ('application/json', 'json'),
+    ('application/octet-stream', 'binary'),
+    ('multipart/mixed', 'multipart'),
+]
+
 
 def create_error_response(message: str, status_code: int = 400, details: Optional[str] = None) -> Response:
     """
@@ -56,6 +70,105 @@ def create_success_response(data: Dict[str, Any], message: str = "Success") -> R
     return jsonify(response_data)
 
 
+def negotiate_response_format(accept_mimetypes) -> str:
+    """
+    Acceptヘッダーから翻訳結果のレスポンス形式を決定
+    
+    Args:
+        accept_mimetypes: リクエストのAcceptヘッダー（request.accept_mimetypes）
+    
+    Returns:
+        レスポンス形式（json、binary または multipart）
+    """
+    best = accept_mimetypes.best_match([mimetype for mimetype, _ in _RESPONSE_FORMATS])
+    if best is None and accept_mimetypes['multipart/*']:
+        return 'multipart'
+    for mimetype, format_type in _RESPONSE_FORMATS:
+        if best == mimetype:
+            return format_type
+    return 'json'
+
+
+def _encode_header_value(value: str) -> str:
+    """ヘッダー値をパーセントエンコード（非ASCII文字を含む場合があるため）"""
+    return quote(value or '', safe='')
+
+
+def create_binary_file_response(
+    translated_data: bytes,
+    translated_filename: str,
+    metadata: Dict[str, str],
+    mimetype: str = XLSX_MIMETYPE
+) -> Response:
+    """
+    翻訳済みファイルをバイナリのまま返すレスポンスを作成
+    
+    メタデータは X-Translation-* ヘッダー（パーセントエンコード）で返す。
+    
+    Args:
+        translated_data: 翻訳後のファイルデータ
+        translated_filename: 翻訳後のファイル名
+        metadata: レスポンスヘッダーに含めるメタデータ
+        mimetype: ファイルのMIMEタイプ
+    
+    Returns:
+        ファイルレスポンス
+    """
+    response = send_file(
+        io.BytesIO(translated_data),
+        as_attachment=True,
+        download_name=translated_filename,
+        mimetype=mimetype
+    )
+    for key, value in metadata.items():
+        header_name = 'X-Translation-' + '-'.join(part.capitalize() for part in key.split('_'))
+        response.headers[header_name] = _encode_header_value(str(value))
+    return response
+
+
+def create_multipart_response(
+    translated_data: bytes,
+    translated_filename: str,
+    metadata: Dict[str, Any],
+    mimetype: str = XLSX_MIMETYPE
+) -> Response:
+    """
+    JSONメタデータと翻訳済みファイルを multipart/mixed で返すレスポンスを作成
+    
+    本文は生成しながら送信するため、レスポンス全体を1つの文字列として組み立てない。
+    
+    Args:
+        translated_data: 翻訳後のファイルデータ
+        translated_filename: 翻訳後のファイル名
+        metadata: JSONパートに含めるメタデータ
+        mimetype: ファイルのMIMEタイプ
+    
+    Returns:
+        multipartレスポンス
+    """
+    boundary = f"excel-translator-{secrets.token_hex(16)}"
+    disposition = f"attachment; filename*=UTF-8''{_encode_header_value(translated_filename)}"
+
+    def generate() -> Iterator[bytes]:
+        yield (
+            f"--{boundary}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n\r\n"
+        ).encode('utf-8')
+        yield json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+        yield (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Disposition: {disposition}\r\n"
+            f"Content-Length: {len(translated_data)}\r\n\r\n"
+        ).encode('utf-8')
+        view = memoryview(translated_data)
+        for offset in range(0, len(view), _MULTIPART_CHUNK_SIZE):
+            yield bytes(view[offset:offset + _MULTIPART_CHUNK_SIZE])
+        yield f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+    return Response(generate(), mimetype=f"multipart/mixed; boundary={boundary}")
+
+
 def create_translation_result_response(
     original_filename: str,
     translated_filename: str,
@@ -63,7 +176,8 @@ def create_translation_result_response(
     context: str,
     source_lang: str,
     target_lang: str,
-    format_type: str = "html"
+    format_type: str = "html",
+    mimetype: str = XLSX_MIMETYPE
 ) -> Union[Response, str]:
     """
     翻訳結果のレスポンスを作成
@@ -75,11 +189,24 @@ def create_translation_result_response(
         context: 翻訳文脈
         source_lang: 翻訳元言語
         target_lang: 翻訳先言語
-        format_type: レスポンス形式（html または json）
+        format_type: レスポンス形式（html、json、binary または multipart）
+        mimetype: ファイルのMIMEタイプ（binary・multipartの場合）
     
     Returns:
         レスポンス
     """
+    if format_type in ("binary", "multipart"):
+        metadata = {
+            'original_filename': original_filename,
+            'translated_filename': translated_filename,
+            'context': context,
+            'source_lang': source_lang,
+            'target_lang': target_lang
+        }
+        if format_type == "binary":
+            return create_binary_file_response(translated_data, translated_filename, metadata, mimetype)
+        return create_multipart_response(translated_data, translated_filename, dict(metadata, success=True), mimetype)
+    
     encoded_data = base64.b64encode(translated_data).decode('utf-8')
     
     if format_type == "json":
@@ -0,0 +1,279 @@
+"""
+入力ファイルと翻訳パラメータをキーとする翻訳結果キャッシュ
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, IO, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+_COPY_CHUNK_SIZE = 1024 * 1024
+# 書き込み途中で終了したワーカーの一時ファイルを削除するまでの時間
+_TMP_GRACE_SECONDS = 3600
+
+
+def make_cache_key(file_digest: str, params: Dict[str, Any]) -> str:
+    """
+    入力ファイルのハッシュと翻訳パラメータからキャッシュのキーを作成
+
+    Args:
+        file_digest: 入力ファイルのSHA-256ハッシュ
+        params: 言語ペア・文脈・敬語レベル・出力形式などのパラメータ
+
+    Returns:
+        キャッシュのキー
+    """
+    payload = json.dumps({'file': file_digest, 'result': params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CachedResult:
+    """キャッシュされた翻訳結果"""
+    key: str
+    path: str
+    mimetype: str
+    extension: str
+    size: int
+    created_at: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class _TeeWriter:
+    """書き込まれたデータを送信先とキャッシュファイルの両方に書き込むライター"""
+
+    def __init__(self, stream: IO[bytes], cache_file: IO[bytes]):
+        self._stream = stream
+        self._cache_file = cache_file
+
+    def write(self, data) -> int:
+        self._cache_file.write(data)
+        return self._stream.write(data)
+
+    def flush(self) -> None:
+        self._stream.flush()
+
+
+class CacheWriter:
+    """
+    キャッシュへの書き込み
+
+    一時ファイルに書き込み、commit() で確定する。
+    commit() せずに abort() した場合（保存失敗・クライアント切断など）は破棄する。
+    """
+
+    def __init__(self, cache: 'ResultCache', key: str, mimetype: str, extension: str,
+                 metadata: Optional[Dict[str, Any]] = None):
+        self._cache = cache
+        self.key = key
+        self.mimetype = mimetype
+        self.extension = extension
+        self.metadata = dict(metadata or {})
+        fd, self._tmp_path = tempfile.mkstemp(dir=cache.root_dir, prefix='.tmp-')
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, data) -> int:
+        return self._file.write(data)
+
+    def tee(self, stream: IO[bytes]) -> _TeeWriter:
+        """送信先への書き込みと同時にキャッシュへ書き込むライターを作成"""
+        return _TeeWriter(stream, self._file)
+
+    def commit(self) -> None:
+        """書き込んだ内容をキャッシュに登録"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self._cache._commit(self.key, self._tmp_path, self.mimetype, self.extension, self.metadata)
+
+    def abort(self) -> None:
+        """書き込んだ内容を破棄（commit済みの場合は何もしない）"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        ResultCache._remove(self._tmp_path)
+
+
+class ResultCache:
+    """
+    ローカルディスク上の翻訳結果キャッシュ
+
+    同じファイルを同じパラメータで再度翻訳する場合に、解析やDeepL呼び出しを
+    行わずに前回の結果を返すために使用する。結果ファイルと
+    メタデータをキーごとに保存し、合計サイズが上限を超えた場合は
+    最終アクセスが古いものから削除する（LRU）。
+    ディレクトリを共有すれば複数ワーカーから利用できる。
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            max_bytes: 保存する結果ファイルの合計サイズの上限（バイト）
+        """
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """
+        キャッシュされた翻訳結果を取得
+
+        Args:
+            key: make_cache_key で作成したキー
+
+        Returns:
+            キャッシュされた結果（存在しない場合はNone）
+        """
+        paths = self._paths(key)
+        if paths is None:
+            return None
+        data_path, meta_path = paths
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            # LRU判定用に最終アクセス時刻を更新
+            os.utime(data_path)
+            size = os.path.getsize(data_path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return CachedResult(
+            key=key,
+            path=data_path,
+            mimetype=metadata['mimetype'],
+            extension=metadata['extension'],
+            size=size,
+            created_at=metadata['created_at'],
+            metadata=metadata.get('metadata', {})
+        )
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """キャッシュされた翻訳結果の内容を取得（存在しない場合はNone）"""
+        cached = self.get(key)
+        if cached is None:
+            return None
+        try:
+            with open(cached.path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def open_writer(self, key: str, mimetype: str, extension: str,
+                    metadata: Optional[Dict[str, Any]] = None) -> CacheWriter:
+        """
+        キャッシュへの書き込みを開始
+
+        Args:
+            key: make_cache_key で作成したキー
+            mimetype: 結果ファイルのMIMEタイプ
+            extension: 結果ファイルの拡張子（.xlsx など）
+            metadata: 結果と一緒に保存する付加情報
+
+        Returns:
+            書き込み用オブジェクト
+        """
+        if self._paths(key) is None:
+            raise ValueError(f"Invalid cache key: {key}")
+        return CacheWriter(self, key, mimetype, extension, metadata)
+
+    def put(self, key: str, data: bytes, mimetype: str, extension: str,
+            metadata: Optional[Dict[str, Any]] = None) -> None:
+        """翻訳結果をキャッシュに保存"""
+        writer = self.open_writer(key, mimetype, extension, metadata)
+        try:
+            writer.write(data)
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def put_file(self, key: str, path: str, mimetype: str, extension: str,
+                 metadata: Optional[Dict[str, Any]] = None) -> None:
+        """翻訳結果のファイルをキャッシュに保存"""
+        writer = self.open_writer(key, mimetype, extension, metadata)
+        try:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, writer, _COPY_CHUNK_SIZE)
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def evict(self, keep_key: Optional[str] = None) -> None:
+        """
+        合計サイズが上限を超えた場合に最終アクセスが古い結果を削除
+
+        Args:
+            keep_key: 削除対象から除外するキー
+        """
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            key, ext = os.path.splitext(name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.startswith('.tmp-'):
+                if now - stat.st_mtime > _TMP_GRACE_SECONDS:
+                    self._remove(path)
+                continue
+            if ext != '.bin':
+                continue
+            entries.append((stat.st_mtime, stat.st_size, key))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            if key == keep_key:
+                continue
+            # メタデータを先に削除し、メタデータがあれば本体も存在するようにする
+            for path in reversed(self._paths(key)):
+                self._remove(path)
+            total_size -= size
+            logger.info(f"Evicted cached result {key[:12]} ({size} bytes)")
+
+    def _commit(self, key: str, tmp_path: str, mimetype: str, extension: str,
+                extra: Dict[str, Any]) -> None:
+        """一時ファイルをキャッシュに登録"""
+        data_path, meta_path = self._paths(key)
+        metadata = {'mimetype': mimetype, 'extension': extension, 'created_at': time.time(), 'metadata': extra}
+        fd, meta_tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f)
+        # 本体を先に置き換え、メタデータがあれば本体も存在するようにする
+        os.replace(tmp_path, data_path)
+        os.replace(meta_tmp_path, meta_path)
+        logger.info(f"Cached result {key[:12]} ({os.path.getsize(data_path)} bytes)")
+        self.evict(keep_key=key)
+
+    def _paths(self, key: str):
+        """キーに対応する本体とメタデータのパスを取得（不正なキーはNone）"""
+        if not key or not _KEY_PATTERN.match(key):
+            return None
+        return (os.path.join(self.root_dir, f"{key}.bin"),
+                os.path.join(self.root_dir, f"{key}.json"))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """ファイルを削除（存在しない場合は無視）"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
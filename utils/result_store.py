@@ -0,0 +1,208 @@
+"""
+翻訳結果をサーバー側に保存し、ダウンロードトークンを発行するストア
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+# 保存途中（トークン作成前）のファイルを他のワーカーが削除しないための猶予時間
+_ORPHAN_GRACE_SECONDS = 60
+
+_TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+@dataclass
+class StoredResult:
+    """ストアに保存された翻訳結果"""
+    token: str
+    path: str
+    filename: str
+    mimetype: str
+    size: int
+    created_at: float
+
+
+class ResultStore:
+    """
+    コンテンツアドレス方式のローカルディスク結果ストア
+
+    ファイル本体はSHA-256をファイル名として blobs/ に保存し、
+    ダウンロードトークンごとのメタデータを tokens/ に保存する。
+    同じ内容の結果は1つのファイルを共有する。
+    有効期限切れのトークンと、合計サイズの上限を超えた古いファイルは
+    保存時に削除される。ディレクトリを共有すれば複数ワーカーから利用できる。
+    """
+
+    def __init__(self, root_dir: str, ttl_seconds: int = 3600, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            root_dir: 保存先ディレクトリ
+            ttl_seconds: トークンの有効期限（秒）
+            max_bytes: 保存するファイルの合計サイズの上限（バイト）
+        """
+        self.root_dir = root_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root_dir, 'blobs')
+        self.token_dir = os.path.join(root_dir, 'tokens')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.token_dir, exist_ok=True)
+
+    def put(self, data: bytes, filename: str, mimetype: str) -> str:
+        """
+        翻訳結果を保存してダウンロードトークンを発行
+
+        Args:
+            data: ファイルデータ
+            filename: ダウンロード時のファイル名
+            mimetype: MIMEタイプ
+
+        Returns:
+            ダウンロードトークン
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = os.path.join(self.blob_dir, digest)
+
+        if os.path.exists(blob_path):
+            # 同じ内容が保存済みの場合は最終アクセス時刻のみ更新
+            os.utime(blob_path)
+        else:
+            self._write_atomic(blob_path, data)
+
+        token = secrets.token_urlsafe(12)
+        metadata = {
+            'digest': digest,
+            'filename': filename,
+            'mimetype': mimetype,
+            'size': len(data),
+            'created_at': time.time()
+        }
+        self._write_atomic(self._token_path(token), json.dumps(metadata).encode('utf-8'))
+
+        self.evict(keep_digest=digest)
+        logger.info(f"Stored result {digest[:12]} ({len(data)} bytes) with token {token}")
+        return token
+
+    def get(self, token: str) -> Optional[StoredResult]:
+        """
+        トークンに対応する翻訳結果を取得
+
+        Args:
+            token: ダウンロードトークン
+
+        Returns:
+            保存された結果（存在しないか期限切れの場合はNone）
+        """
+        token_path = self._token_path(token)
+        if token_path is None:
+            return None
+
+        try:
+            with open(token_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - metadata['created_at'] > self.ttl_seconds:
+            self._remove(token_path)
+            return None
+
+        blob_path = os.path.join(self.blob_dir, metadata['digest'])
+        try:
+            # LRU判定用に最終アクセス時刻を更新
+            os.utime(blob_path)
+        except OSError:
+            return None
+
+        return StoredResult(
+            token=token,
+            path=blob_path,
+            filename=metadata['filename'],
+            mimetype=metadata['mimetype'],
+            size=metadata['size'],
+            created_at=metadata['created_at']
+        )
+
+    def evict(self, keep_digest: Optional[str] = None) -> None:
+        """
+        期限切れのトークンと上限を超えたファイルを削除
+
+        Args:
+            keep_digest: 削除対象から除外するファイルのハッシュ
+        """
+        now = time.time()
+        referenced = set()
+
+        for name in os.listdir(self.token_dir):
+            token_path = os.path.join(self.token_dir, name)
+            try:
+                with open(token_path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - metadata['created_at'] > self.ttl_seconds:
+                self._remove(token_path)
+            else:
+                referenced.add(metadata['digest'])
+
+        blobs = []
+        for name in os.listdir(self.blob_dir):
+            if name.startswith('.tmp-'):
+                continue
+            blob_path = os.path.join(self.blob_dir, name)
+            try:
+                stat = os.stat(blob_path)
+            except OSError:
+                continue
+            if (name not in referenced and name != keep_digest
+                    and now - stat.st_mtime > _ORPHAN_GRACE_SECONDS):
+                # どのトークンからも参照されないファイル
+                self._remove(blob_path)
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, name, blob_path))
+
+        total_size = sum(size for _, size, _, _ in blobs)
+        # 最終アクセスが古い順に削除
+        for _, size, name, blob_path in sorted(blobs):
+            if total_size <= self.max_bytes:
+                break
+            if name == keep_digest:
+                continue
+            self._remove(blob_path)
+            total_size -= size
+            logger.info(f"Evicted result {name[:12]} ({size} bytes)")
+
+    def _token_path(self, token: str) -> Optional[str]:
+        """トークンのメタデータファイルパスを取得（不正なトークンはNone）"""
+        if not token or not _TOKEN_PATTERN.match(token):
+            return None
+        return os.path.join(self.token_dir, f"{token}.json")
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """一時ファイル経由でアトミックに書き込み"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """ファイルを削除（存在しない場合は無視）"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,192 @@
+"""
+複数のリクエストが送信するバッチの公平なスケジューリング（小さいファイル優先・待機時間による優先度の引き上げ・クライアントごとの公平な配分）
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.cancellation import CancellationToken, TranslationCancelled
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleTicket:
+    """リクエストの送信の優先度（ファイルの複雑さスコア）とクライアント、取り消し状態"""
+
+    def __init__(self, client_id: Optional[str] = None, score: float = 0.0, priority_class: str = 'standard',
+                 cancellation: Optional[CancellationToken] = None):
+        """
+        Args:
+            client_id: クライアントの識別子（公平な配分の単位）
+            score: 複雑さスコア（小さいほど優先）
+            priority_class: 集計に使う優先度の分類（処理戦略）
+            cancellation: リクエストの取り消し状態（取り消された場合は送信枠を待たない）
+        """
+        self.client_id = client_id or 'anonymous'
+        self.score = score
+        self.priority_class = priority_class
+        self.cancellation = cancellation
+
+
+class _Waiter:
+    """送信枠を待っているバッチ"""
+
+    def __init__(self, ticket: ScheduleTicket, sequence: int):
+        self.ticket = ticket
+        self.sequence = sequence
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+
+
+class _ClassStats:
+    """優先度の分類ごとの待機数・待機時間"""
+
+    def __init__(self):
+        self.queued = 0
+        self.active = 0
+        self.granted = 0
+        self.cancelled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class FairScheduler:
+    """
+    プロセス内で同時にDeepLへ送信するバッチ数を制限し、送信枠を公平に割り当てるスケジューラー
+
+    送信枠が空いた場合、待機中のバッチのうち複雑さスコアから待機時間に応じた値
+    （aging_rate × 待機秒数）を引いた値が最も小さいものに割り当てる。小さいファイルを
+    優先しつつ、大きなファイルも待機が長くなれば順番が回ってくる。送信中・待機中の
+    クライアントで送信枠を等分した数（公平な配分）を既に使っているクライアントの
+    バッチは、配分に達していないクライアントのバッチの後に回す。待機中にリクエストが
+    取り消された場合は待機をやめて TranslationCancelled を送出する。スレッドセーフ。
+    """
+
+    def __init__(self, max_concurrent: int = 4, aging_rate: float = 100.0):
+        """
+        Args:
+            max_concurrent: 同時に送信するバッチ数の上限
+            aging_rate: 待機1秒あたりに複雑さスコアから引く値
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.aging_rate = aging_rate
+        self._waiters: List[_Waiter] = []
+        self._active_by_client: Dict[str, int] = {}
+        self._stats: Dict[str, _ClassStats] = {}
+        self._active = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _class_stats(self, priority_class: str) -> _ClassStats:
+        """優先度の分類の集計（ロック取得中に呼び出す）"""
+        stats = self._stats.get(priority_class)
+        if stats is None:
+            stats = self._stats[priority_class] = _ClassStats()
+        return stats
+
+    def _select(self, now: float) -> _Waiter:
+        """次に送信枠を割り当てるバッチを選択（ロック取得中に呼び出す）"""
+        clients = set(self._active_by_client) | {waiter.ticket.client_id for waiter in self._waiters}
+        fair_share = math.ceil(self.max_concurrent / len(clients))
+
+        def priority(waiter: _Waiter) -> tuple:
+            over_share = self._active_by_client.get(waiter.ticket.client_id, 0) >= fair_share
+            aged_score = waiter.ticket.score - self.aging_rate * (now - waiter.enqueued_at)
+            return over_share, aged_score, waiter.sequence
+
+        return min(self._waiters, key=priority)
+
+    def _grant(self) -> None:
+        """空いている送信枠を待機中のバッチに割り当てる（ロック取得中に呼び出す）"""
+        now = time.monotonic()
+        while self._waiters and self._active < self.max_concurrent:
+            waiter = self._select(now)
+            self._waiters.remove(waiter)
+            ticket = waiter.ticket
+            self._active += 1
+            self._active_by_client[ticket.client_id] = self._active_by_client.get(ticket.client_id, 0) + 1
+
+            wait = now - waiter.enqueued_at
+            stats = self._class_stats(ticket.priority_class)
+            stats.queued -= 1
+            stats.active += 1
+            stats.granted += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+            waiter.granted.set()
+
+    @contextmanager
+    def slot(self, ticket: Optional[ScheduleTicket] = None) -> Iterator[None]:
+        """
+        送信枠を確保し、ブロックを抜けるまで保持する
+
+        Args:
+            ticket: リクエストの優先度とクライアント（省略時は既定の優先度）
+
+        Raises:
+            TranslationCancelled: 送信枠を待っている間にリクエストが取り消された場合
+        """
+        ticket = ticket or ScheduleTicket()
+        with self._lock:
+            self._sequence += 1
+            waiter = _Waiter(ticket, self._sequence)
+            self._waiters.append(waiter)
+            self._class_stats(ticket.priority_class).queued += 1
+            self._grant()
+        if ticket.cancellation is None:
+            waiter.granted.wait()
+        else:
+            try:
+                ticket.cancellation.wait(waiter.granted)
+            except TranslationCancelled:
+                with self._lock:
+                    stats = self._class_stats(ticket.priority_class)
+                    stats.cancelled += 1
+                    if not waiter.granted.is_set():
+                        self._waiters.remove(waiter)
+                        stats.queued -= 1
+                        raise
+                # 取り消しと同時に送信枠が割り当てられた場合は枠を返してから送出
+                self._release(ticket)
+                raise
+        try:
+            yield
+        finally:
+            self._release(ticket)
+
+    def _release(self, ticket: ScheduleTicket) -> None:
+        """送信枠を返し、待機中のバッチに割り当てる"""
+        with self._lock:
+            self._active -= 1
+            remaining = self._active_by_client[ticket.client_id] - 1
+            if remaining:
+                self._active_by_client[ticket.client_id] = remaining
+            else:
+                del self._active_by_client[ticket.client_id]
+            self._class_stats(ticket.priority_class).active -= 1
+            self._grant()
+
+    def stats(self) -> Dict[str, Any]:
+        """優先度の分類ごとの待機中・送信中・取り消したバッチ数と待機時間"""
+        with self._lock:
+            now = time.monotonic()
+            oldest_wait: Dict[str, float] = {}
+            for waiter in self._waiters:
+                priority_class = waiter.ticket.priority_class
+                oldest_wait[priority_class] = max(oldest_wait.get(priority_class, 0.0), now - waiter.enqueued_at)
+            return {
+                priority_class: {
+                    'queued': stats.queued,
+                    'active': stats.active,
+                    'granted': stats.granted,
+                    'cancelled': stats.cancelled,
+                    'avg_wait_ms': round(stats.total_wait / stats.granted * 1000) if stats.granted else 0,
+                    'max_wait_ms': round(stats.max_wait * 1000),
+                    'oldest_wait_ms': round(oldest_wait.get(priority_class, 0.0) * 1000),
+                }
+                for priority_class, stats in self._stats.items()
+            }
@@ -0,0 +1,181 @@
+"""
+翻訳済みファイルをシリアライズしながら送信するためのストリーミングユーティリティ
+"""
+import io
+import logging
+import queue
+import threading
+import time
+from typing import Callable, IO, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_EOF = object()
+
+
+class StreamCancelled(BrokenPipeError):
+    """クライアント切断などでストリームが閉じられた"""
+    pass
+
+
+class _ChunkWriter:
+    """書き込まれたデータを一定サイズのチャンクにまとめて送出するライター"""
+
+    def __init__(self, emit: Callable[[bytes], None], chunk_size: int):
+        self._emit = emit
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._chunk_size:
+            self._emit(bytes(self._buffer[:self._chunk_size]))
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._emit(bytes(self._buffer))
+            self._buffer.clear()
+
+
+class WorkbookStream(io.RawIOBase):
+    """
+    保存処理を別スレッドで実行し、書き出されたバイト列を読み取るストリーム
+
+    保存関数にはシーク不可のライターが渡され、書き込まれたデータは
+    上限付きキューを経由して読み取り側に渡される。読み取りが追いつかない場合は
+    保存処理が待機するため、ファイル全体をメモリやディスクに保持しない。
+    close() が呼ばれると保存処理を中断し、スレッドの終了を待つ。
+    WSGIサーバーはレスポンスの送信完了時（クライアント切断を含む）にストリームを閉じるため、
+    ワークブックの保持に伴う後処理は on_close で行う。on_close はストリームが閉じられ、
+    かつ保存スレッドが終了した時点で1回だけ呼び出す（close() の待機時間内に保存スレッドが
+    終了しない場合は、保存スレッドの終了時に呼び出す）。
+    """
+
+    def __init__(self, save_func: Callable[[IO[bytes]], None], chunk_size: int = 64 * 1024,
+                 max_pending_chunks: int = 8, on_close: Optional[Callable[[], None]] = None,
+                 close_timeout: float = 5.0):
+        """
+        Args:
+            save_func: ライターを受け取って内容を書き出す関数
+            chunk_size: 送出するチャンクのサイズ（バイト）
+            max_pending_chunks: 読み取り待ちにできるチャンク数の上限
+            on_close: ストリームを閉じて保存スレッドが終了した後に呼び出す関数
+            close_timeout: close() で保存スレッドの終了を待つ時間（秒）
+        """
+        self._queue = queue.Queue(maxsize=max_pending_chunks)
+        self._cancelled = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._pending = memoryview(b'')
+        self._finished = False
+        self.bytes_written = 0
+        self.save_seconds: Optional[float] = None
+        self._on_close = on_close
+        self._close_timeout = close_timeout
+        # on_close を呼び出すまでに完了を待つ処理の数（ストリームのclose・保存スレッドの終了）
+        self._close_pending = 2
+        self._close_lock = threading.Lock()
+
+        self._thread = threading.Thread(
+            target=self._run, args=(save_func, chunk_size), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, save_func: Callable[[IO[bytes]], None], chunk_size: int) -> None:
+        """保存処理を実行（バックグラウンドスレッド）"""
+        start = time.perf_counter()
+        writer = _ChunkWriter(self._put, chunk_size)
+        try:
+            save_func(writer)
+            writer.flush()
+            self.save_seconds = time.perf_counter() - start
+            logger.info(f"Streamed {self.bytes_written} bytes in {self.save_seconds:.3f}s")
+        except StreamCancelled:
+            logger.info("Workbook stream cancelled before completion")
+        except BaseException as e:
+            logger.exception(f"Error while streaming workbook: {e}")
+            self._error = e
+        finally:
+            try:
+                self._put(_EOF)
+            except StreamCancelled:
+                pass
+            self._finish_close()
+
+    def _finish_close(self) -> None:
+        """ストリームのclose・保存スレッドの終了のいずれかが完了（両方が完了した時点で on_close を呼び出す）"""
+        with self._close_lock:
+            self._close_pending -= 1
+            if self._close_pending:
+                return
+        if self._on_close is not None:
+            self._on_close()
+
+    def _put(self, item) -> None:
+        """キューに追加（読み取り側が閉じられた場合は中断）"""
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                if item is not _EOF:
+                    self.bytes_written += len(item)
+                return
+            except queue.Full:
+                continue
+        raise StreamCancelled("Workbook stream was closed by the reader")
+
+    def _next_chunk(self) -> bool:
+        """次のチャンクを取得（終端の場合はFalse）"""
+        if self._finished:
+            return False
+        item = self._queue.get()
+        if item is _EOF:
+            self._finished = True
+            if self._error is not None:
+                raise IOError(f"Failed to serialize workbook: {self._error}") from self._error
+            return False
+        self._pending = memoryview(item)
+        return True
+
+    def prime(self) -> None:
+        """
+        最初のチャンクが書き出されるまで待機
+
+        保存処理が書き出し前に失敗した場合はここで例外を送出するため、
+        レスポンスを返す前にエラーを検出できる。
+        """
+        if not self._pending:
+            self._next_chunk()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed stream.")
+        while not self._pending:
+            if not self._next_chunk():
+                return 0
+        size = min(len(b), len(self._pending))
+        b[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        """ストリームを閉じ、保存スレッドを停止"""
+        if self.closed:
+            return
+        self._cancelled.set()
+        # 待機中の書き込みを解放
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._thread.join(timeout=self._close_timeout)
+        if self._thread.is_alive():
+            logger.warning("Workbook save thread did not stop in time; deferring on_close until it exits")
+        self._pending = memoryview(b'')
+        super().close()
+        self._finish_close()
@@ -0,0 +1,121 @@
+"""
+テキスト単位の翻訳キャッシュ（複数ファイル・スレッドで共有）
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """
+    言語ペアと原文をキーとする翻訳キャッシュ
+
+    複数のファイルを翻訳する際に、同じ原文を再度DeepLに送信しないために使用する。
+    pathを指定すると翻訳のたびに1行のJSONとして追記し、次回の実行でも再利用する
+    （不完全な最終行は無視する）。スレッドセーフ。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 保存先のファイルパス（省略時はメモリ上のみ）
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.chars_translated = 0
+        self._entries: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    @staticmethod
+    def make_key(source_lang: str, target_lang: str, text: str) -> str:
+        """言語ペアと原文からキーを作成"""
+        payload = json.dumps([source_lang.upper(), target_lang.upper(), text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """キャッシュヒット率（参照がない場合はNone）"""
+        total = self.hits + self.misses
+        return self.hits / total if total else None
+
+    def contains(self, source_lang: str, target_lang: str, text: str) -> bool:
+        """原文の翻訳がキャッシュにあるか判定（ヒット率には含めない）"""
+        return self.make_key(source_lang, target_lang, text) in self._entries
+
+    def get_many(self, source_lang: str, target_lang: str, texts: Iterable[str]) -> Dict[str, str]:
+        """
+        キャッシュされた翻訳を取得
+
+        Args:
+            source_lang: 翻訳元言語
+            target_lang: 翻訳先言語
+            texts: 原文
+
+        Returns:
+            キャッシュにあった原文と翻訳の対応
+        """
+        found = {}
+        misses = 0
+        for text in texts:
+            translation = self._entries.get(self.make_key(source_lang, target_lang, text))
+            if translation is None:
+                misses += 1
+            else:
+                found[text] = translation
+        with self._lock:
+            self.hits += len(found)
+            self.misses += misses
+        return found
+
+    def put_many(self, source_lang: str, target_lang: str, translations: Dict[str, str]) -> None:
+        """
+        翻訳を登録
+
+        Args:
+            source_lang: 翻訳元言語
+            target_lang: 翻訳先言語
+            translations: 原文と翻訳の対応
+        """
+        if not translations:
+            return
+        lines = []
+        with self._lock:
+            for text, translation in translations.items():
+                key = self.make_key(source_lang, target_lang, text)
+                self._entries[key] = translation
+                lines.append(json.dumps({'key': key, 'translation': translation}, ensure_ascii=False) + '\n')
+                self.chars_translated += len(text)
+            if self.path:
+                # O_APPENDの1回の書き込みで追記し、複数プロセスからの同時追記でも行が混ざらないようにする
+                fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+                try:
+                    os.write(fd, ''.join(lines).encode('utf-8'))
+                finally:
+                    os.close(fd)
+
+    def _load(self) -> None:
+        """保存先のファイルを読み込み"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry['key']] = entry['translation']
+                    except (ValueError, KeyError, TypeError):
+                        # 書き込み途中で終了した行
+                        continue
+        except FileNotFoundError:
+            return
+        logger.info(f"Loaded {len(self._entries)} cached translations from {self.path}")
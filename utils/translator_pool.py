@@ -0,0 +1,99 @@
+"""
+APIキーごとの翻訳インスタンスの共有とAPIキー検証結果のキャッシュ
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+
+logger = logging.getLogger(__name__)
+
+
+class TranslatorPool:
+    """
+    プロセス内でAPIキーごとに翻訳インスタンスを共有するプール
+
+    翻訳インスタンス（DeepLクライアントとHTTPセッション）はAPIキーごとに1つだけ作成し、
+    リクエストをまたいで再利用する。APIキーの検証結果は有効期限付きでキャッシュし、
+    有効期限内は検証のリクエストを送信しない。無効と判定された結果はキャッシュしない
+    （通信エラーによる一時的な失敗で全リクエストを拒否しないため）。
+    gunicornのpreload_appでマスタープロセスが作成したプールを継承した場合は、
+    ワーカープロセスで最初に使用したときに作り直す。スレッドセーフ。
+    """
+
+    def __init__(self, factory: Callable[[str], Any], validation_ttl: float = 600):
+        """
+        Args:
+            factory: APIキーから翻訳インスタンスを作成する関数
+            validation_ttl: APIキーの検証結果の有効期限（秒）
+        """
+        self.factory = factory
+        self.validation_ttl = validation_ttl
+        self.validations = 0
+        self._translators: Dict[str, Any] = {}
+        self._validated_at: Dict[str, float] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _reset_if_forked(self) -> None:
+        """別のプロセスから継承した場合は作成済みのインスタンスを破棄（ロック取得中に呼び出す）"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._translators.clear()
+            self._validated_at.clear()
+
+    def get(self, api_key: str) -> Any:
+        """
+        APIキーの翻訳インスタンスを取得（初回のみ作成）
+
+        Args:
+            api_key: DeepL APIキー
+
+        Returns:
+            翻訳インスタンス
+        """
+        with self._lock:
+            self._reset_if_forked()
+            translator = self._translators.get(api_key)
+            if translator is None:
+                translator = self.factory(api_key)
+                self._translators[api_key] = translator
+            return translator
+
+    def is_valid(self, api_key: str) -> bool:
+        """
+        APIキーが有効か判定（有効期限内の検証結果があれば再検証しない）
+
+        Args:
+            api_key: DeepL APIキー
+
+        Returns:
+            APIキーが有効な場合True
+        """
+        with self._lock:
+            self._reset_if_forked()
+            validated_at = self._validated_at.get(api_key)
+        if validated_at is not None and time.monotonic() - validated_at < self.validation_ttl:
+            return True
+
+        translator = self.get(api_key)
+        self.validations += 1
+        if not translator.validate_api_key():
+            self.invalidate(api_key)
+            return False
+        with self._lock:
+            self._validated_at[api_key] = time.monotonic()
+        return True
+
+    def invalidate(self, api_key: str) -> None:
+        """
+        APIキーの検証結果を破棄（翻訳中に認証エラーが発生した場合など）
+
+        Args:
+            api_key: DeepL APIキー
+        """
+        with self._lock:
+            if self._validated_at.pop(api_key, None) is not None:
+                logger.warning("Invalidated cached API key validation")
@@ -0,0 +1,223 @@
+"""
+アップロードデータのバッファ操作用ユーティリティ
+"""
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from typing import IO, Optional, Union
+
+from flask import Request
+
+
+BufferLike = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# このサイズを超えるアップロードはディスクに退避し、メモリマップで読み取る
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.environ.get('UPLOAD_SPOOL_DIR') or None
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BufferReader(io.RawIOBase):
+    """
+    バイトバッファをコピーせずに読み取るファイルライクオブジェクト
+
+    io.BytesIO は bytes 以外（memoryview など）を渡すと内容をコピーするため、
+    ZIP解析などファイルライクオブジェクトが必要な処理ではこのクラスを使用する。
+    """
+
+    def __init__(self, buffer: BufferLike):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._view is None:
+            raise ValueError("I/O operation on closed buffer.")
+        size = min(len(b), len(self._view) - self._pos)
+        if size <= 0:
+            return 0
+        b[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._pos + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position: {position}")
+        self._pos = position
+        return position
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        # memoryviewを解放して元のバッファ（mmapなど）を閉じられるようにする
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        super().close()
+
+
+def open_buffer_reader(buffer: BufferLike) -> io.IOBase:
+    """
+    バッファをコピーせずにファイルライクオブジェクトとして開く
+
+    Args:
+        buffer: バイトバッファ
+
+    Returns:
+        読み取り用のファイルライクオブジェクト
+    """
+    if isinstance(buffer, bytes):
+        # bytesを渡した場合、BytesIOは書き込むまで内容を共有する
+        return io.BytesIO(buffer)
+    return BufferReader(buffer)
+
+
+def read_header(buffer: BufferLike, size: int = 8) -> bytes:
+    """
+    バッファの先頭バイトを取得
+
+    Args:
+        buffer: バイトバッファ
+        size: 取得するバイト数
+
+    Returns:
+        先頭バイト列
+    """
+    return bytes(buffer[:size])
+
+
+def buffer_digest(buffer: BufferLike) -> str:
+    """
+    バッファ内容のSHA-256ハッシュを取得（チャンク単位で計算しコピーしない）
+
+    Args:
+        buffer: バイトバッファ
+
+    Returns:
+        16進数のハッシュ値
+    """
+    digest = hashlib.sha256()
+    view = memoryview(buffer).cast('B')
+    try:
+        for offset in range(0, len(view), _COPY_CHUNK_SIZE):
+            digest.update(view[offset:offset + _COPY_CHUNK_SIZE])
+    finally:
+        view.release()
+    return digest.hexdigest()
+
+
+class _SharedMapping(mmap.mmap):
+    """
+    UploadBufferが所有する読み取り専用メモリマップ
+
+    xlrdは渡されたmmapを解析後にclose()するため、共有バッファとして
+    使い続けられるよう close() を無効化し、所有者のみが解放できるようにする。
+    """
+
+    def close(self) -> None:
+        pass
+
+    def release(self) -> None:
+        super().close()
+
+
+class SpooledUploadRequest(Request):
+    """
+    アップロードファイルを閾値を超えた時点でディスクへ退避するリクエストクラス
+
+    フォーム解析時に本文を直接一時ファイルへ書き出すため、
+    ワーカーがアップロード全体をメモリに保持しない。
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None) -> IO[bytes]:
+        return tempfile.SpooledTemporaryFile(
+            max_size=UPLOAD_SPOOL_THRESHOLD, mode='rb+', dir=UPLOAD_SPOOL_DIR
+        )
+
+
+class UploadBuffer:
+    """
+    アップロードデータを読み取り専用バッファとして開くクラス
+
+    閾値以下のファイルはbytesとして読み込み、閾値を超えるファイルは
+    一時ファイルを読み取り専用でメモリマップする。アップロードのストリームが
+    既にディスク上にある場合はコピーせずにそのままマップする。
+    """
+
+    def __init__(self, stream: IO[bytes], threshold: int = None, spool_dir: Optional[str] = None):
+        """
+        Args:
+            stream: アップロードファイルのストリーム
+            threshold: メモリマップに切り替えるサイズ（バイト）
+            spool_dir: 退避用一時ファイルのディレクトリ
+        """
+        self.threshold = UPLOAD_SPOOL_THRESHOLD if threshold is None else threshold
+        self._spool_file = None
+        self._mmap = None
+
+        stream.seek(0, io.SEEK_END)
+        self.size = stream.tell()
+        stream.seek(0)
+
+        if self.size <= self.threshold or self.size == 0:
+            self.buffer = stream.read()
+            return
+
+        fileno = self._get_fileno(stream)
+        if fileno is None:
+            # ディスク上にないストリームはチャンク単位で一時ファイルへ退避
+            self._spool_file = tempfile.TemporaryFile(dir=spool_dir or UPLOAD_SPOOL_DIR)
+            shutil.copyfileobj(stream, self._spool_file, _COPY_CHUNK_SIZE)
+            self._spool_file.flush()
+            fileno = self._spool_file.fileno()
+
+        self._mmap = _SharedMapping(fileno, 0, access=mmap.ACCESS_READ)
+        self.buffer = self._mmap
+
+    @staticmethod
+    def _get_fileno(stream: IO[bytes]) -> Optional[int]:
+        """ストリームの実ファイルのディスクリプタを取得（なければNone）"""
+        try:
+            stream.flush()
+            return stream.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
+
+    @property
+    def is_mapped(self) -> bool:
+        """メモリマップで読み取っているかどうか"""
+        return self._mmap is not None
+
+    def close(self) -> None:
+        """バッファと一時ファイルを解放"""
+        self.buffer = None
+        if self._mmap is not None:
+            self._mmap.release()
+            self._mmap = None
+        if self._spool_file is not None:
+            self._spool_file.close()
+            self._spool_file = None
+
+    def __enter__(self) -> 'UploadBuffer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()